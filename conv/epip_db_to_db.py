@@ -121,6 +121,9 @@ def epip_db_to_db(source_database_file: Path, target_database_file: Path) -> Non
     with MdbxStorage(target_database_file, readonly=False) as target_db:
         with target_db.env.rw_transaction() as txn_write:
             with MdbxStorage(source_database_file, readonly=False) as source_db:
+                # The generators reload the same routes, route links and time demand types for many journeys
+                object_cache = source_db.enable_object_cache()
+
                 # This will deembed anything on the ServiceCalendar
                 with source_db.env.rw_transaction() as txn_write1:
 
@@ -211,6 +214,7 @@ def epip_db_to_db(source_database_file: Path, target_database_file: Path) -> Non
                     target_db.insert_any_object_on_queue(txn_write, avv_quay_name(target_db, txn_write))
                     target_db.insert_any_object_on_queue(txn_write, avv_sjp_order(target_db, txn_write))
 
+                log_all(logging.INFO, f"[epip_db_to_db] {object_cache}")
 
 
                     # TODO: overwrite with a single version
@@ -8,23 +8,23 @@ from storage.mdbx.core.implementation import MdbxStorage
 import logging
 
 
-def epip_db_to_xml(database_epip: Path, output_filename: Path) -> None:
+def epip_db_to_xml(database_epip: Path, output_filename: Path, jobs: int = 1) -> None:
     with MdbxStorage(database_epip) as db_epip:
         with db_epip.env.ro_transaction() as txn:
             log_all(logging.INFO, f"[epip_db_to_xml] building EPIP publication delivery from {database_epip}")
             publication_delivery: PublicationDelivery = export_epip_network_offer(db_epip, txn)
             log_all(logging.INFO, f"[epip_db_to_xml] serialising to {output_filename}")
-            export_publication_delivery_xml(publication_delivery, output_filename)
+            export_publication_delivery_xml(publication_delivery, output_filename, jobs)
             log_all(logging.INFO, f"[epip_db_to_xml] done: {output_filename}")
 
 
-def main(source: str, target: str) -> None:
+def main(source: str, target: str, jobs: int = 1) -> None:
     source_path = Path(source)
     if not source_path.exists():
         log_all(logging.ERROR, f"{source_path} does not exist.")
 
     else:
-        epip_db_to_xml(source_path, Path(target))
+        epip_db_to_xml(source_path, Path(target), jobs)
 
 
 if __name__ == "__main__":
@@ -39,12 +39,13 @@ if __name__ == "__main__":
         help="The NeTEx output filename, for example: netex-epip.xml.gz",
     )
     argument_parser.add_argument("--log_file", type=str, required=False, help="the logfile")
+    argument_parser.add_argument("--jobs", type=int, default=1, help="Render the members of the frames in this many processes")
 
     args = argument_parser.parse_args()
     mylogger = prepare_logger(logging.INFO, args.log_file)
 
     try:
-        main(args.epip, args.output)
+        main(args.epip, args.output, args.jobs)
     except Exception as e:
         log_all(logging.ERROR, f"{e} {traceback.format_exc()}")
         raise e
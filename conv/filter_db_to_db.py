@@ -1,9 +1,8 @@
 import logging
 from collections import defaultdict
-from collections.abc import Callable
 from functools import partial
 from pathlib import Path
-from typing import TypeVar, Any, Iterator, Generator
+from typing import TypeVar, Iterator, Generator, Iterable
 from operator import attrgetter
 
 from domain.netex import ResponsibilitySet
@@ -36,83 +35,8 @@ from utils.aux_logging import log_all, prepare_logger
 
 Tid = TypeVar("Tid", bound=EntityStructure)
 
-import re
-from collections.abc import Callable
-from typing import Any
 from storage.mdbx.core.references import resolve, resolve_embeddings_index
 
-_TOKEN_RE = re.compile(r"([^.[]+)|\[(\d*|\*)\]")
-
-def safe_attrgetter(path: str, default: Any = None) -> Callable[[object], Any]:
-    """
-    Supports:
-
-        id
-        name.value
-        quays[0].id
-        quays[].id
-        quays[*].id
-        stop_places[].quays[].id
-
-    Missing attributes return `default`.
-    """
-
-    operations: list[str | int | None] = []
-
-    for match in _TOKEN_RE.finditer(path):
-        attr, index = match.groups()
-
-        if attr is not None:
-            operations.append(attr)
-        elif index in ("", "*"):
-            operations.append(None)          # wildcard
-        else:
-            operations.append(int(index))
-
-    def apply(obj: Any, pos: int) -> Any:
-        if obj is default:
-            return default
-
-        if pos == len(operations):
-            return [obj]
-
-        op = operations[pos]
-
-        try:
-            if op is None:
-                # Wildcard
-                if obj is None:
-                    return default
-
-                result = []
-
-                for item in obj:
-                    value = apply(item, pos + 1)
-
-                    if value is default:
-                        continue
-
-                    if isinstance(value, list):
-                        result.extend(value)
-                    else:
-                        result.append(value)
-
-                return result if result else default
-
-            elif isinstance(op, int):
-                return apply(obj[op], pos + 1)
-
-            else:
-                if isinstance(obj, dict):
-                    return apply(obj.get(op, default), pos + 1)
-
-                return apply(getattr(obj, op), pos + 1)
-
-        except (AttributeError, IndexError, KeyError, TypeError):
-            return default
-
-    return lambda obj: apply(obj, 0)
-
 def id_filter(db_read: MdbxStorage, txn, clazz: type[EntityStructure], object_filters: set[str]) -> Generator[tuple[bytes, EntityStructure], None, None]:
     for object_filter in object_filters:
         pair = db_read.load_object_by_id_version(txn, object_filter, clazz)
@@ -123,52 +47,55 @@ def attribute_filter(
     db_read: MdbxStorage,
     txn,
     clazz: type[EntityStructure],
-    getter: Callable[[EntityStructure], str],
+    path: str,
     allowed_values: set[str],
 ) -> Generator[tuple[bytes, EntityStructure], None, None]:
-    for key, obj in db_read.iter_objects(txn, clazz):
-        attrs = set(getter(obj))
-        if not set([str(x) for x in getter(obj)]).isdisjoint(allowed_values):
-            # I don't think this should belong here...
-            this_class_idx = db_read.class_idx[clazz]
-            full_key = key + this_class_idx.ljust(4, b'\x00')
-            yield full_key, obj
+    # I don't think this should belong here...
+    this_class_idx = db_read.class_idx[clazz]
+    for key in db_read.find(txn, clazz, path, allowed_values):
+        full_key = key + this_class_idx.ljust(4, b'\x00')
+        yield full_key, db_read.load_object(txn, clazz, key)
 
 def custom_filter(
         db_read: MdbxStorage,
         txn):
 
-    for key, obj in db_read.iter_objects(txn, Line):
-        obj: Line
-        if obj.authority_ref and obj.authority_ref.ref == 'NL:DOVA:Authority:LMB' and obj.transport_mode == AllPublicTransportModesEnumeration.BUS:
+    for key in db_read.find(txn, Line, 'authority_ref.ref', ['NL:DOVA:Authority:LMB']):
+        obj: Line = db_read.load_object(txn, Line, key)
+        if obj.transport_mode == AllPublicTransportModesEnumeration.BUS:
             this_class_idx = db_read.class_idx[obj.__class__]
             full_key = key + this_class_idx.ljust(4, b'\x00')
             yield full_key, obj
 
-def filter_db_to_db(source_database_file: Path, target_database_file: Path, filter_function: callable, inward_classes: set[type[EntityStructure]], conditional_inward_classes: set[tuple[type[EntityStructure], type[EntityStructure]]]) -> None:
+def filter_db_to_db(
+    source_database_file: Path,
+    target_database_file: Path,
+    filter_function: callable,
+    inward_classes: set[type[EntityStructure]],
+    conditional_inward_classes: set[tuple[type[EntityStructure], type[EntityStructure]]],
+    attribute_indexes: Iterable[tuple[type[EntityStructure], str]] = (),
+) -> None:
     with MdbxStorage(source_database_file, readonly=False) as db_write:
         # Assure we have a inward index.
         resolve(db_write)
         resolve_embeddings_index(db_write)
+        # Only databases written before the inward index was maintained incrementally, without its version in the metadata, need a full rebuild.
         with db_write.env.rw_transaction() as txn:
-            db_write._index_references_inwards(txn, force=True)
+            db_write._index_references_inwards(txn)
+            # The attribute paths the filter function finds by, only built the first time.
+            for clazz, path in attribute_indexes:
+                db_write.create_attribute_index(txn, clazz, path)
             txn.commit()
 
     with MdbxStorage(source_database_file) as db_read:
-        # Assure we have a inward index.
-        with db_read.env.rw_transaction() as txn:
-            db_read._index_references_inwards(txn, force=True)
-            txn.commit()
-
         with db_read.env.ro_transaction() as txn:
-            visited: set[bytes] = set()
             full_keys = [full_key for full_key, obj in filter_function(db_read, txn)]
             with MdbxStorage(target_database_file, readonly=False) as db_write:
 
                 with db_write.env.rw_transaction() as txn_write:
                     db_write.insert_any_object_on_queue(
                         txn_write,
-                        db_read.load_references_by_object_values_dfs(txn, full_keys, inward_classes, conditional_inward_classes, visited),
+                        db_read.load_references_by_object_values_bfs(txn, full_keys, inward_classes, conditional_inward_classes),
                     )
                     txn_write.commit()
 
@@ -246,11 +173,17 @@ def main(source: str, target: str, object_type: str, attributes: list[str], inwa
 
         elif attributes[0] == 'custom':
             # TODO, fix argument
-            filter_db_to_db(source_path, Path(target), partial(custom_filter), inward_classes, conditional_inward_classes)
+            filter_db_to_db(source_path, Path(target), partial(custom_filter), inward_classes, conditional_inward_classes, [(Line, 'authority_ref.ref')])
 
         elif attributes is not None:
-            getter = safe_attrgetter(attributes[0], set())
-            filter_db_to_db(source_path, Path(target), partial(attribute_filter, clazz=clazz, getter=getter, allowed_values=set(attributes[1:])), inward_classes, conditional_inward_classes)
+            filter_db_to_db(
+                source_path,
+                Path(target),
+                partial(attribute_filter, clazz=clazz, path=attributes[0], allowed_values=set(attributes[1:])),
+                inward_classes,
+                conditional_inward_classes,
+                [(clazz, attributes[0])],
+            )
 
             # if clazz == ResponsibilitySet and ResponsibilitySet in inward_classes:
             #    with MdbxStorage(Path(target)) as db_read:
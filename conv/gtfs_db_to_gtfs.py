@@ -1,14 +1,23 @@
 import datetime
 import logging
+import multiprocessing as mp
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from itertools import groupby
 from pathlib import Path
-from typing import List, Iterator, cast, Any
+from typing import List, Iterator, cast, Any, Callable
+
+import duckdb
+from mdbx.mdbx import TXN
 
 from domain.netex.indexes.byid import getIndex
 from storage.mdbx.core.implementation import MdbxStorage
 from transformers.callsprofile import CallsProfile
 from transformers.gtfs import gtfs_calendar_and_dates2
-from transformers.gtfsprofile import GtfsProfile
+from transformers.gtfsprofile import GtfsProfile, gtfs_id_lookup
+from transformers.gtfscolumnar import ColumnBatch, STOP_TIME_COLUMNS, STOP_TIMES_SQL, append_stop_times
+from transformers.gtfswriter import GtfsTableWriter
 from domain.netex.model import (
     Line,
     StopPlace,
@@ -36,169 +45,297 @@ from domain.netex.model import (
 
 import zipfile
 from configuration import defaults
-from utils.aux_logging import prepare_logger
+from utils.aux_logging import prepare_logger, log_all
+
+
+def project_service_journeys(
+    db_read: MdbxStorage,
+    txn_read: TXN,
+    clazz: type[ServiceJourney] | type[TemplateServiceJourney],
+    service_journey_pattern_of: Callable[[ServiceJourney | TemplateServiceJourney], ServiceJourneyPattern | None],
+    trips: GtfsTableWriter,
+    stop_times: GtfsTableWriter,
+    frequencies: GtfsTableWriter | None = None,
+    start_key: bytes | None = None,
+    limit: int | None = None,
+    trip_ids: dict[str, str] | None = None,
+) -> None:
+    """Project the journeys of clazz to trips, stop times and frequencies. Trip ids that differ from the id are kept in trip_ids."""
+    service_journey: ServiceJourney | TemplateServiceJourney
+    for service_journey in db_read.iter_only_objects(txn_read, clazz, start_key, limit):
+        service_journey_pattern = service_journey_pattern_of(service_journey)
+        if not service_journey.calls:
+            assert service_journey_pattern is not None, f"{service_journey.id} does not have a ServiceJourneyPattern, but defines passing times."
+            CallsProfile.getCallsFromTimetabledPassingTimes(service_journey, service_journey_pattern)
+
+        trip = GtfsProfile.projectServiceJourneyToTrip(service_journey, service_journey_pattern)
+        trips.writerow(trip)
+        if trip_ids is not None and trip['trip_id'] != service_journey.id:
+            trip_ids[service_journey.id] = trip['trip_id']
+        stop_times.writerows(GtfsProfile.projectServiceJourneyToStopTimes(service_journey))
+        if frequencies is not None and isinstance(service_journey, TemplateServiceJourney):
+            frequencies.writerows(GtfsProfile.projectTemplateServiceJourneyToFrequency(service_journey))
+
+
+def initialize_worker(lookup: dict[str, str]) -> None:
+    """Runs in a subprocess: the GTFS ids of the stops, routes and services, as the main process projected them."""
+    gtfs_id_lookup.update(lookup)
+
+
+def project_service_journeys_range(
+    database: Path, start_key: bytes, limit: int, directory: Path
+) -> tuple[list[tuple[list[str] | None, int, Path]], dict[str, str]]:
+    """Runs in a subprocess: project a range of ServiceJourneys to chunks of trips.txt and stop_times.txt."""
+    trip_ids: dict[str, str] = {}
+    with MdbxStorage(database, readonly=True) as db_read:
+        # Consecutive journeys mostly share their ServiceJourneyPattern
+        db_read.enable_object_cache(maxsize=1_000)
 
+        def service_journey_pattern_of(service_journey: ServiceJourney | TemplateServiceJourney) -> ServiceJourneyPattern | None:
+            # By id only, as the index of the sequential projection
+            if service_journey.journey_pattern_ref is None:
+                return None
+            return db_read.load_object_by_id(txn_read, str(service_journey.journey_pattern_ref.ref), ServiceJourneyPattern, shared=True)
+
+        with db_read.env.ro_transaction() as txn_read:
+            with GtfsTableWriter(None, str(directory / 'trips.txt')) as trips, GtfsTableWriter(None, str(directory / 'stop_times.txt')) as stop_times:
+                project_service_journeys(
+                    db_read, txn_read, ServiceJourney, service_journey_pattern_of, trips, stop_times, start_key=start_key, limit=limit, trip_ids=trip_ids
+                )
 
-def extract(archive: zipfile.ZipFile, database: Path) -> None:
+    return [(trips.fieldnames, trips.rows, directory / 'trips.txt'), (stop_times.fieldnames, stop_times.rows, directory / 'stop_times.txt')], trip_ids
+
+
+def project_service_journeys_parallel(db_read: MdbxStorage, txn_read: TXN, jobs: int, trips: GtfsTableWriter, stop_times: GtfsTableWriter) -> None:
+    """
+    Projects the ServiceJourneys in ranges of their keys, each in a process with its own read transaction. The chunks
+    are added to the tables in the order of the keys, so the result is the same as the sequential projection. The
+    trip ids come back for the transfers that refer to the journeys.
+    """
+    # More ranges than processes, so a range of long journeys does not keep the others waiting
+    key_ranges = db_read.key_ranges(txn_read, ServiceJourney, jobs * 4)
+
+    with tempfile.TemporaryDirectory(prefix="gtfs_db_to_gtfs_", dir=db_read.path.parent) as chunk_directory:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=mp.get_context("spawn"), initializer=initialize_worker, initargs=(gtfs_id_lookup,)) as executor:
+            futures = []
+            for i, (start_key, limit) in enumerate(key_ranges):
+                directory = Path(chunk_directory) / str(i)
+                directory.mkdir()
+                futures.append(executor.submit(project_service_journeys_range, db_read.path, start_key, limit, directory))
+
+            for i, future in enumerate(futures):
+                [(trips_fieldnames, trips_rows, trips_path), (stop_times_fieldnames, stop_times_rows, stop_times_path)], trip_ids = future.result()
+                gtfs_id_lookup.update(trip_ids)
+                log_all(logging.INFO, f"[gtfs_db_to_gtfs] ServiceJourney range {i + 1}/{len(futures)}: {trips_rows} trips")
+                trips.append_chunk(trips_fieldnames, trips_rows, trips_path)
+                stop_times.append_chunk(stop_times_fieldnames, stop_times_rows, stop_times_path)
+                shutil.rmtree(trips_path.parent)
+
+
+def extract_network(archive: zipfile.ZipFile, db_read: MdbxStorage, txn_read: TXN) -> None:
+    """The agencies, routes, stops and levels."""
     agencies = {}
     used_agencies = set([])
     routes = {}
     stops = {}
     psas: dict[str, StopPlace]
-    max_date = str(datetime.date.today()).replace('-', '')
+
+    authority: Authority
+    for authority in db_read.iter_only_objects(txn_read, Authority):
+        agency = GtfsProfile.projectAuthorityToAgency(authority)
+        agencies[agency['agency_id']] = agency
+
+    operator: Operator
+    for operator in db_read.iter_only_objects(txn_read, Operator):
+        agency = GtfsProfile.projectOperatorToAgency(operator)
+        agencies[agency['agency_id']] = agency
+
+    stop_places = getIndex(db_read.iter_only_objects(txn_read, StopPlace))
+    levels = {}
+    quay_to_sp = {}
+    stop_place: StopPlace | None
+    for stop_place in stop_places.values():
+        if stop_place.quays:
+            for quay in stop_place.quays.taxi_stand_ref_or_quay_ref_or_quay:
+                # TODO: Replace with proper checks based on object type.
+                if hasattr(quay, "id"):
+                    quay_to_sp[quay.id] = stop_place
+                else:
+                    quay_to_sp[quay.ref] = stop_place
+
+        if stop_place.levels:
+            for level in stop_place.levels.level_ref_or_level:
+                if isinstance(level, Level):
+                    levels[level.id] = GtfsProfile.projectLevelToLevel(level)
+
+    psas = {}
+    psa: PassengerStopAssignment
+    sp: StopPlace | None
+    for psa in db_read.iter_only_objects(txn_read, PassengerStopAssignment):
+        if psa.taxi_rank_ref_or_stop_place_ref_or_stop_place is not None:
+            if isinstance(psa.taxi_rank_ref_or_stop_place_ref_or_stop_place, StopPlace):
+                sp = psa.taxi_rank_ref_or_stop_place_ref_or_stop_place
+            elif isinstance(psa.taxi_rank_ref_or_stop_place_ref_or_stop_place, StopPlaceRef):
+                sp = stop_places.get(psa.taxi_rank_ref_or_stop_place_ref_or_stop_place.ref, None)
+
+            if sp is not None:
+                if isinstance(psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point, ScheduledStopPoint) or isinstance(
+                    psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point, FareScheduledStopPoint
+                ):
+                    assert psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point.id is not None, "psa must have an id"
+                    psas[psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point.id] = sp
+                elif isinstance(psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point, ScheduledStopPointRef):
+                    assert psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point.ref is not None, "psa must have a ref"
+                    psas[psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point.ref] = sp
+
+        elif psa.taxi_stand_ref_or_quay_ref_or_quay is not None:
+            if isinstance(psa.taxi_stand_ref_or_quay_ref_or_quay, Quay):
+                sp = quay_to_sp.get(psa.taxi_stand_ref_or_quay_ref_or_quay.id, None)
+            elif isinstance(psa.taxi_stand_ref_or_quay_ref_or_quay, QuayRef):
+                sp = quay_to_sp.get(psa.taxi_stand_ref_or_quay_ref_or_quay.ref, None)
+
+            if sp is not None:
+                if isinstance(psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point, ScheduledStopPoint) or isinstance(
+                    psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point, FareScheduledStopPoint
+                ):
+                    assert psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point.id is not None, "psa must have an id"
+                    psas[psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point.id] = sp
+                elif isinstance(psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point, ScheduledStopPointRef):
+                    assert psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point.ref is not None, "psa must have a ref"
+                    psas[psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point.ref] = sp
+
+    # TODO: GTFS does not support Branding, so in order to facilitate it we will make it a separate Agency
+    # A branding must have an 'original' agency or authority
+    # for branding in db_read.iter_only_objects(txn_read, Branding):
+    #     agency = GtfsProfile.projectBrandingToAgency(branding)
+    #     agencies[agency['agency_id']] = agency
+
+    stop: dict[str, Any] | None
+    scheduled_stop_point: ScheduledStopPoint
+    for scheduled_stop_point in db_read.iter_only_objects(txn_read, ScheduledStopPoint):
+        assert scheduled_stop_point.id is not None, "ScheduledStopPoint must have an id"
+        stop_place = psas.get(scheduled_stop_point.id, None)
+        if stop_place is not None:
+            stop = GtfsProfile.projectStopPlaceToStop(stop_place)
+            stops[stop['stop_id']] = stop
+
+        stop = GtfsProfile.projectScheduledStopPointToStop(scheduled_stop_point, stop_place)
+        if stop is not None:
+            stops[stop['stop_id']] = stop
+            if stop_place is not None:
+                if stop_place.entrances is not None:
+                    for entrance in stop_place.entrances.parking_entrance_ref_or_entrance_ref_or_entrance:
+                        if isinstance(entrance, StopPlaceEntrance):
+                            stop = GtfsProfile.projectStopEntranceToStop(entrance, stop_place)
+                            if stop is not None:
+                                stops[stop['stop_id']] = stop
+
+    for line in db_read.iter_only_objects(txn_read, Line):
+        route = GtfsProfile.projectLineToRoute(line)
+        if route is not None:
+            routes[route['route_id']] = route
+            used_agencies.add(route['agency_id'])
+
+    GtfsProfile.writeToZipFile(archive, 'agency.txt', [y for x, y in agencies.items() if x in used_agencies], write_header=True)
+    GtfsProfile.writeToZipFile(archive, 'routes.txt', list(routes.values()), write_header=True)
+    GtfsProfile.writeToZipFile(archive, 'stops.txt', list(stops.values()), write_header=True)
+
+    if len(levels) > 0:
+        GtfsProfile.writeToZipFile(archive, 'levels.txt', list(levels.values()), write_header=True)
+
+
+def extract_calendars(db_read: MdbxStorage, txn_read: TXN) -> tuple[dict[str, dict[str, Any]], dict[str, list[dict[str, Any]]]]:
+    """The calendars and the calendar dates by service_id."""
     calendars: dict[str, dict[str, Any]] = {}
     calendar_dates: dict[str, list[dict[str, Any]]] = {}
 
-    # We can't append in a ZipFile
-    # GtfsProfile.writeToZipFile(archive, 'trips.txt', [GtfsProfile.empty_trip], write_header=True)
-    # GtfsProfile.writeToZipFile(archive, 'stop_times.txt', [GtfsProfile.empty_stop_time], write_header=True)
+    # GTFS Calendar and GTFS Calendar Dates
+    # A trip in GTFS points to a single service_id, this is analogue to ServiceJourney and DayTypeRef.
+    # A DayTypeAssignment is a relationship to a DayTypeRef; being either Available or Unavailable with a "Date" is analogue to calendar_dates.txt
+    # A DayTypeAssignment is a relationship to a DayTypeRef: being Available with an "OperatingPeriod" is analogue to calendar.txt
 
-    with MdbxStorage(database, readonly=True) as db_read:
-        with db_read.env.ro_transaction() as txn_read:
-            datasources: List[DataSource] = list(db_read.iter_only_objects(txn_read, DataSource, limit=1))
-
-            authority: Authority
-            for authority in db_read.iter_only_objects(txn_read, Authority):
-                agency = GtfsProfile.projectAuthorityToAgency(authority)
-                agencies[agency['agency_id']] = agency
-
-            operator: Operator
-            for operator in db_read.iter_only_objects(txn_read, Operator):
-                agency = GtfsProfile.projectOperatorToAgency(operator)
-                agencies[agency['agency_id']] = agency
-
-            stop_places = getIndex(db_read.iter_only_objects(txn_read, StopPlace))
-            levels = {}
-            quay_to_sp = {}
-            stop_place: StopPlace | None
-            for stop_place in stop_places.values():
-                if stop_place.quays:
-                    for quay in stop_place.quays.taxi_stand_ref_or_quay_ref_or_quay:
-                        # TODO: Replace with proper checks based on object type.
-                        if hasattr(quay, "id"):
-                            quay_to_sp[quay.id] = stop_place
-                        else:
-                            quay_to_sp[quay.ref] = stop_place
-
-                if stop_place.levels:
-                    for level in stop_place.levels.level_ref_or_level:
-                        if isinstance(level, Level):
-                            levels[level.id] = GtfsProfile.projectLevelToLevel(level)
-
-            psas = {}
-            psa: PassengerStopAssignment
-            sp: StopPlace | None
-            for psa in db_read.iter_only_objects(txn_read, PassengerStopAssignment):
-                if psa.taxi_rank_ref_or_stop_place_ref_or_stop_place is not None:
-                    if isinstance(psa.taxi_rank_ref_or_stop_place_ref_or_stop_place, StopPlace):
-                        sp = psa.taxi_rank_ref_or_stop_place_ref_or_stop_place
-                    elif isinstance(psa.taxi_rank_ref_or_stop_place_ref_or_stop_place, StopPlaceRef):
-                        sp = stop_places.get(psa.taxi_rank_ref_or_stop_place_ref_or_stop_place.ref, None)
-
-                    if sp is not None:
-                        if isinstance(psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point, ScheduledStopPoint) or isinstance(
-                            psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point, FareScheduledStopPoint
-                        ):
-                            assert psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point.id is not None, "psa must have an id"
-                            psas[psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point.id] = sp
-                        elif isinstance(psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point, ScheduledStopPointRef):
-                            assert psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point.ref is not None, "psa must have a ref"
-                            psas[psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point.ref] = sp
-
-                elif psa.taxi_stand_ref_or_quay_ref_or_quay is not None:
-                    if isinstance(psa.taxi_stand_ref_or_quay_ref_or_quay, Quay):
-                        sp = quay_to_sp.get(psa.taxi_stand_ref_or_quay_ref_or_quay.id, None)
-                    elif isinstance(psa.taxi_stand_ref_or_quay_ref_or_quay, QuayRef):
-                        sp = quay_to_sp.get(psa.taxi_stand_ref_or_quay_ref_or_quay.ref, None)
-
-                    if sp is not None:
-                        if isinstance(psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point, ScheduledStopPoint) or isinstance(
-                            psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point, FareScheduledStopPoint
-                        ):
-                            assert psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point.id is not None, "psa must have an id"
-                            psas[psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point.id] = sp
-                        elif isinstance(psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point, ScheduledStopPointRef):
-                            assert psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point.ref is not None, "psa must have a ref"
-                            psas[psa.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point.ref] = sp
-
-            # TODO: GTFS does not support Branding, so in order to facilitate it we will make it a separate Agency
-            # A branding must have an 'original' agency or authority
-            # for branding in db_read.iter_only_objects(txn_read, Branding):
-            #     agency = GtfsProfile.projectBrandingToAgency(branding)
-            #     agencies[agency['agency_id']] = agency
-
-            stop: dict[str, Any] | None
-            scheduled_stop_point: ScheduledStopPoint
-            for scheduled_stop_point in db_read.iter_only_objects(txn_read, ScheduledStopPoint):
-                assert scheduled_stop_point.id is not None, "ScheduledStopPoint must have an id"
-                stop_place = psas.get(scheduled_stop_point.id, None)
-                if stop_place is not None:
-                    stop = GtfsProfile.projectStopPlaceToStop(stop_place)
-                    stops[stop['stop_id']] = stop
-
-                stop = GtfsProfile.projectScheduledStopPointToStop(scheduled_stop_point, stop_place)
-                if stop is not None:
-                    stops[stop['stop_id']] = stop
-                    if stop_place is not None:
-                        if stop_place.entrances is not None:
-                            for entrance in stop_place.entrances.parking_entrance_ref_or_entrance_ref_or_entrance:
-                                if isinstance(entrance, StopPlaceEntrance):
-                                    stop = GtfsProfile.projectStopEntranceToStop(entrance, stop_place)
-                                    if stop is not None:
-                                        stops[stop['stop_id']] = stop
-
-            for line in db_read.iter_only_objects(txn_read, Line):
-                route = GtfsProfile.projectLineToRoute(line)
-                if route is not None:
-                    routes[route['route_id']] = route
-                    used_agencies.add(route['agency_id'])
-
-            GtfsProfile.writeToZipFile(archive, 'agency.txt', [y for x, y in agencies.items() if x in used_agencies], write_header=True)
-            GtfsProfile.writeToZipFile(archive, 'routes.txt', list(routes.values()), write_header=True)
-            GtfsProfile.writeToZipFile(archive, 'stops.txt', list(stops.values()), write_header=True)
-
-            if len(levels) > 0:
-                GtfsProfile.writeToZipFile(archive, 'levels.txt', list(levels.values()), write_header=True)
-
-            # GTFS Calendar and GTFS Calendar Dates
-            # A trip in GTFS points to a single service_id, this is analogue to ServiceJourney and DayTypeRef.
-            # A DayTypeAssignment is a relationship to a DayTypeRef; being either Available or Unavailable with a "Date" is analogue to calendar_dates.txt
-            # A DayTypeAssignment is a relationship to a DayTypeRef: being Available with an "OperatingPeriod" is analogue to calendar.txt
-
-            day_types: dict[str, DayType] = cast(dict[str, DayType], getIndex(db_read.iter_only_objects(txn_read, DayType)))
-
-            day_type: DayType
-
-            # TODO: replace
-            for day_type in db_read.iter_only_objects(txn_read, DayType):
-                GtfsProfile.temporaryDayTypeServiceId(day_type)
-
-            day_type_assignments: Iterator[DayTypeAssignment]
-            for day_type_ref, day_type_assignments in groupby(
-                db_read.iter_only_objects(txn_read, DayTypeAssignment), key=lambda day_type_assignment: day_type_assignment.day_type_ref
-            ):
-                day_type = day_types[day_type_ref.ref]
-                day_type_assignments_list = list(day_type_assignments)
-
-                if day_type.private_codes:
-                    service_ids = [private_code.value for private_code in day_type.private_codes.private_code if private_code.type_value == 'service_id']
-                    service_id = service_ids[0] if len(service_ids) > 0 else day_type.id
-                else:
-                    service_id = day_type.id
+    day_types: dict[str, DayType] = cast(dict[str, DayType], getIndex(db_read.iter_only_objects(txn_read, DayType)))
+
+    day_type: DayType
+
+    # TODO: replace
+    for day_type in db_read.iter_only_objects(txn_read, DayType):
+        GtfsProfile.temporaryDayTypeServiceId(day_type)
+
+    day_type_assignments: Iterator[DayTypeAssignment]
+    for day_type_ref, day_type_assignments in groupby(
+        db_read.iter_only_objects(txn_read, DayTypeAssignment), key=lambda day_type_assignment: day_type_assignment.day_type_ref
+    ):
+        day_type = day_types[day_type_ref.ref]
+        day_type_assignments_list = list(day_type_assignments)
+
+        if day_type.private_codes:
+            service_ids = [private_code.value for private_code in day_type.private_codes.private_code if private_code.type_value == 'service_id']
+            service_id = service_ids[0] if len(service_ids) > 0 else day_type.id
+        else:
+            service_id = day_type.id
 
-                assert service_id is not None, f"{day_type_ref}: service_id must not be None."
+        assert service_id is not None, f"{day_type_ref}: service_id must not be None."
 
-                exceptions = []
-                for calendar, calendar_date in gtfs_calendar_and_dates2(db_read, txn_read, day_type, day_type_assignments_list):
-                    if calendar is not None:
-                        calendars[service_id] = calendar
+        exceptions = []
+        for calendar, calendar_date in gtfs_calendar_and_dates2(db_read, txn_read, day_type, day_type_assignments_list):
+            if calendar is not None:
+                calendars[service_id] = calendar
 
-                    if calendar_date is not None:
-                        exceptions.append(calendar_date)
+            if calendar_date is not None:
+                exceptions.append(calendar_date)
 
-                l_dates = calendar_dates.get(service_id, [])
-                calendar_dates[service_id] = l_dates + exceptions
+        l_dates = calendar_dates.get(service_id, [])
+        calendar_dates[service_id] = l_dates + exceptions
 
+    return calendars, calendar_dates
+
+
+def project_transfers(db_read: MdbxStorage, txn_read: TXN) -> list[dict[str, Any]]:
+    """The transfers of the interchanges, which may contain duplicates."""
+    # transfers = [GtfsProfile.projectInterchangeRuleToTransfer(transfer) for transfer in db_read.iter_only_objects(txn_read, InterchangeRule)] + [GtfsProfile.projectServiceJourneyInterchangeToTransfer(transfer) for transfer in db_read.iter_only_objects(txn_read, ServiceJourneyInterchange)] + [GtfsProfile.projectServiceJourneyMeeting(transfer) for transfer in db_read.iter_only_objects(txn_read, JourneyMeeting)]
+    return [GtfsProfile.projectInterchangeRuleToTransfer(transfer) for transfer in db_read.iter_only_objects(txn_read, InterchangeRule)] + [
+        GtfsProfile.projectServiceJourneyInterchangeToTransfer(transfer) for transfer in db_read.iter_only_objects(txn_read, ServiceJourneyInterchange)
+    ]  # TODO: ServiceJourneyMeeting is missing
+
+
+def extract_feed_info(archive: zipfile.ZipFile, db_read: MdbxStorage, txn_read: TXN) -> None:
+    datasources: List[DataSource] = list(db_read.iter_only_objects(txn_read, DataSource, limit=1))
+
+    # TODO: This concept is deprecated, we need to store the CompositeFrame ValidBetween on something.
+    versions = list(db_read.iter_only_objects(txn_read, Version))
+
+    if len(datasources) > 0:
+        ds = datasources[0]
+
+        GtfsProfile.writeToZipFile(
+            archive,
+            'feed_info.txt',
+            [
+                {
+                    'feed_publisher_name': str(ds.name.content[0]) if ds and ds.name else defaults["feed_publisher_name"],
+                    'feed_publisher_url': ds.url if ds and ds.url else defaults["feed_publisher_url"],
+                    'feed_lang': 'en',  # TODO
+                    'default_lang': 'en',  # TODO
+                    'feed_start_date': (dt := versions[0].start_date) and str(dt.to_datetime().date()).replace('-', '') if len(versions) > 0 else '',
+                    'feed_end_date': (dt := versions[0].end_date) and str(dt.to_datetime().date()).replace('-', '') if len(versions) > 0 else '',
+                    'feed_version': str(datetime.date.today()).replace('-', ''),
+                    'feed_contact_email': ds.email if ds and ds.email else '',
+                    'feed_contact_url': '',
+                }
+            ],
+            write_header=True,
+        )
+
+
+def extract(archive: zipfile.ZipFile, database: Path, jobs: int = 1) -> None:
+    max_date = str(datetime.date.today()).replace('-', '')
+
+    with MdbxStorage(database, readonly=True) as db_read:
+        with db_read.env.ro_transaction() as txn_read:
+            extract_network(archive, db_read, txn_read)
+
+            calendars, calendar_dates = extract_calendars(db_read, txn_read)
             if len(calendars.values()) > 0:
                 GtfsProfile.writeToZipFile(archive, 'calendar.txt', list(calendars.values()), write_header=True)
 
@@ -213,65 +350,22 @@ def extract(archive: zipfile.ZipFile, database: Path) -> None:
 
             GtfsProfile.writeToZipFile(archive, 'calendar_dates.txt', [item for row in calendar_dates.values() for item in row], write_header=True)
 
-            trips = []
-            stop_times = []
-            service_journey_patterns = db_read.iter_only_objects(txn_read, ServiceJourneyPattern)
+            # The rows are written as they are projected, stop_times.txt directly into the archive, the others spooled
+            with GtfsTableWriter(archive, 'trips.txt', spool=True) as trips, GtfsTableWriter(archive, 'frequencies.txt', spool=True) as frequencies:
+                with GtfsTableWriter(archive, 'stop_times.txt') as stop_times:
+                    service_journey_patterns_index = getIndex(db_read.iter_only_objects(txn_read, ServiceJourneyPattern))
 
-            service_journey_patterns_index = getIndex(service_journey_patterns)
-            service_journey_pattern: ServiceJourneyPattern | None = None
+                    def service_journey_pattern_of(service_journey: ServiceJourney | TemplateServiceJourney) -> ServiceJourneyPattern | None:
+                        return service_journey_patterns_index.get(service_journey.journey_pattern_ref.ref) if service_journey.journey_pattern_ref else None
 
-            for service_journey in db_read.iter_only_objects(txn_read, ServiceJourney):
-                if not service_journey.calls:
-                    service_journey_pattern = (
-                        service_journey_patterns_index.get(service_journey.journey_pattern_ref.ref) if service_journey.journey_pattern_ref else None
-                    )
-                    assert service_journey_pattern is not None, f"{service_journey.id} does not have a ServiceJourneyPattern, but defines passing times."
-                    CallsProfile.getCallsFromTimetabledPassingTimes(service_journey, service_journey_pattern)
-
-                trip = GtfsProfile.projectServiceJourneyToTrip(service_journey, service_journey_pattern)
-                trips.append(trip)
-
-                stop_times += list(GtfsProfile.projectServiceJourneyToStopTimes(service_journey))
-
-            frequencies = []
-            for template_service_journey in db_read.iter_only_objects(txn_read, TemplateServiceJourney):
-                if not service_journey.calls:
-                    service_journey_pattern = (
-                        service_journey_patterns_index.get(template_service_journey.journey_pattern_ref.ref)
-                        if template_service_journey.journey_pattern_ref
-                        else None
-                    )
-                    assert (
-                        service_journey_pattern is not None
-                    ), f"{template_service_journey.id} does not have a ServiceJourneyPattern, but defines passing times."
-                    CallsProfile.getCallsFromTimetabledPassingTimes(template_service_journey, service_journey_pattern)
+                    if jobs > 1:
+                        project_service_journeys_parallel(db_read, txn_read, jobs, trips, stop_times)
+                    else:
+                        project_service_journeys(db_read, txn_read, ServiceJourney, service_journey_pattern_of, trips, stop_times)
 
-                trip = GtfsProfile.projectServiceJourneyToTrip(template_service_journey, service_journey_pattern)
-                trips.append(trip)
-
-                stop_times += list(GtfsProfile.projectServiceJourneyToStopTimes(service_journey))
-                frequencies += list(GtfsProfile.projectTemplateServiceJourneyToFrequency(template_service_journey))
-
-            # TODO: maybe do this per trip?
-            GtfsProfile.writeToZipFile(archive, 'trips.txt', trips, write_header=True)
-            if len(frequencies) > 0:
-                GtfsProfile.writeToZipFile(archive, 'frequencies.txt', frequencies, write_header=True)
-
-            GtfsProfile.writeToZipFile(archive, 'stop_times.txt', stop_times, write_header=True)
-
-            del trips
-            del frequencies
-            del stop_times
-            del routes
-            del agencies
-            del stops
-
-            transfers = [GtfsProfile.projectInterchangeRuleToTransfer(transfer) for transfer in db_read.iter_only_objects(txn_read, InterchangeRule)] + [
-                GtfsProfile.projectServiceJourneyInterchangeToTransfer(transfer) for transfer in db_read.iter_only_objects(txn_read, ServiceJourneyInterchange)
-            ]  # TODO: ServiceJourneyMeeting is missing
-
-            # transfers = [GtfsProfile.projectInterchangeRuleToTransfer(transfer) for transfer in db_read.iter_only_objects(txn_read, InterchangeRule)] + [GtfsProfile.projectServiceJourneyInterchangeToTransfer(transfer) for transfer in db_read.iter_only_objects(txn_read, ServiceJourneyInterchange)] + [GtfsProfile.projectServiceJourneyMeeting(transfer) for transfer in db_read.iter_only_objects(txn_read, JourneyMeeting)]
+                    project_service_journeys(db_read, txn_read, TemplateServiceJourney, service_journey_pattern_of, trips, stop_times, frequencies)
 
+            transfers = project_transfers(db_read, txn_read)
             transfers = list(
                 {
                     (
@@ -290,35 +384,93 @@ def extract(archive: zipfile.ZipFile, database: Path) -> None:
 
             GtfsProfile.writeToZipFile(archive, 'transfers.txt', transfers, write_header=True)
 
-            # TODO: This concept is deprecated, we need to store the CompositeFrame ValidBetween on something.
-            versions = list(db_read.iter_only_objects(txn_read, Version))
-
-            if len(datasources) > 0:
-                ds = datasources[0]
-
-                GtfsProfile.writeToZipFile(
-                    archive,
-                    'feed_info.txt',
-                    [
-                        {
-                            'feed_publisher_name': str(ds.name.content[0]) if ds and ds.name else defaults["feed_publisher_name"],
-                            'feed_publisher_url': ds.url if ds and ds.url else defaults["feed_publisher_url"],
-                            'feed_lang': 'en',  # TODO
-                            'default_lang': 'en',  # TODO
-                            'feed_start_date': (dt := versions[0].start_date) and str(dt.to_datetime().date()).replace('-', '') if len(versions) > 0 else '',
-                            'feed_end_date': (dt := versions[0].end_date) and str(dt.to_datetime().date()).replace('-', '') if len(versions) > 0 else '',
-                            'feed_version': str(datetime.date.today()).replace('-', ''),
-                            'feed_contact_email': ds.email if ds and ds.email else '',
-                            'feed_contact_url': '',
-                        }
-                    ],
-                    write_header=True,
-                )
+            extract_feed_info(archive, db_read, txn_read)
+
+
+TRANSFER_KEY = ['from_stop_id', 'to_stop_id', 'from_route_id', 'to_route_id', 'from_trip_id', 'to_trip_id', 'transfer_type', 'min_transfer_time']
+
+
+def extract_columnar(archive: zipfile.ZipFile, database: Path) -> None:
+    """
+    As extract(), but the trips, stop times, frequencies, calendars and transfers are collected in column batches in
+    DuckDB, which writes them. The times of the stop times are formatted, and the transfers deduplicated, in SQL.
+    """
+    with MdbxStorage(database, readonly=True) as db_read, tempfile.TemporaryDirectory(prefix="gtfs_db_to_gtfs_", dir=database.parent) as directory:
+        con = duckdb.connect(Path(directory, 'gtfs.duckdb').as_posix())
+        with db_read.env.ro_transaction() as txn_read:
+            extract_network(archive, db_read, txn_read)
+
+            calendars, calendar_dates = extract_calendars(db_read, txn_read)
+            calendar_batch = ColumnBatch(con, 'calendar')
+            for calendar in calendars.values():
+                calendar_batch.append_dict(calendar)
+            calendar_batch.copy_to_zip(archive, 'calendar.txt')
+
+            calendar_dates_batch = ColumnBatch(con, 'calendar_dates')
+            for exceptions in calendar_dates.values():
+                for calendar_date in exceptions:
+                    calendar_dates_batch.append_dict(calendar_date)
+            calendar_dates_batch.copy_to_zip(archive, 'calendar_dates.txt')
+
+            max_date = str(datetime.date.today()).replace('-', '')
+            for batch, column in ((calendar_batch, 'end_date'), (calendar_dates_batch, 'date')):
+                if batch.rows > 0:
+                    (date,) = cast(tuple[str | None], con.execute(f"SELECT max({column}) FROM {batch.table}").fetchone())
+                    max_date = max(max_date, date or max_date)
+            log_all(logging.INFO, f"[gtfs_db_to_gtfs] the calendars end at {max_date}")
+
+            service_journey_patterns_index = getIndex(db_read.iter_only_objects(txn_read, ServiceJourneyPattern))
+            trips = ColumnBatch(con, 'trips')
+            stop_times = ColumnBatch(con, 'stop_times', STOP_TIME_COLUMNS, batch_size=1_000_000)
+            frequencies = ColumnBatch(con, 'frequencies')
+
+            service_journey: ServiceJourney | TemplateServiceJourney
+            for clazz in (ServiceJourney, TemplateServiceJourney):
+                for service_journey in db_read.iter_only_objects(txn_read, clazz):
+                    service_journey_pattern = (
+                        service_journey_patterns_index.get(service_journey.journey_pattern_ref.ref) if service_journey.journey_pattern_ref else None
+                    )
+                    # The stop times are written from the passing times, without calls
+                    times = None
+                    if not service_journey.calls:
+                        assert service_journey_pattern is not None, f"{service_journey.id} does not have a ServiceJourneyPattern, but defines passing times."
+                        times = CallsProfile.getTimesFromTimetabledPassingTimes(service_journey, service_journey_pattern)
+
+                    trips.append_dict(GtfsProfile.projectServiceJourneyToTrip(service_journey, service_journey_pattern))
+                    append_stop_times(stop_times, service_journey, times)
+                    if isinstance(service_journey, TemplateServiceJourney):
+                        for frequency in GtfsProfile.projectTemplateServiceJourneyToFrequency(service_journey):
+                            frequencies.append_dict(frequency)
+
+            trips.copy_to_zip(archive, 'trips.txt')
+            frequencies.copy_to_zip(archive, 'frequencies.txt')
+            stop_times.copy_to_zip(archive, 'stop_times.txt', STOP_TIMES_SQL)
+
+            transfers = ColumnBatch(con, 'transfers')
+            for transfer in project_transfers(db_read, txn_read):
+                transfers.append_dict(transfer)
+            # As the dictionary of extract(): the last of the duplicates, in the place of the first
+            transfer_key = ', '.join(TRANSFER_KEY)
+            transfers.copy_to_zip(
+                archive,
+                'transfers.txt',
+                f"""
+                SELECT * EXCLUDE (n, first) FROM (SELECT *, rowid AS n, min(n) OVER (PARTITION BY {transfer_key}) AS first FROM transfers)
+                QUALIFY row_number() OVER (PARTITION BY {transfer_key} ORDER BY n DESC) = 1
+                ORDER BY first""",
+            )
+
+            extract_feed_info(archive, db_read, txn_read)
+
+        con.close()
 
 
-def main(netex: str, gtfs: str) -> None:
+def main(netex: str, gtfs: str, jobs: int = 1, columnar: bool = False) -> None:
     with zipfile.ZipFile(gtfs, 'w') as archive:
-        extract(archive, Path(netex))
+        if columnar:
+            extract_columnar(archive, Path(netex))
+        else:
+            extract(archive, Path(netex), jobs)
 
 
 if __name__ == '__main__':
@@ -327,7 +479,9 @@ if __name__ == '__main__':
     argument_parser = argparse.ArgumentParser(description='Convert prepared lmdb database into GTFS')
     argument_parser.add_argument('netex', type=str, help='The lmdb database')
     argument_parser.add_argument('gtfs', type=str, help='The output gtfs filename')
+    argument_parser.add_argument('--jobs', type=int, default=1, help='Project this many ranges of ServiceJourneys in parallel')
+    argument_parser.add_argument('--columnar', action="store_true", help='Write the timetable through column batches in DuckDB', default=False)
     argument_parser.add_argument('--log_file', type=str, required=False, help='the logfile')
     args = argument_parser.parse_args()
     prepare_logger(logging.INFO, args.log_file)
-    main(args.netex, args.gtfs)
+    main(args.netex, args.gtfs, args.jobs, args.columnar)
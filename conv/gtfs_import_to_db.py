@@ -6,23 +6,23 @@ from utils.aux_logging import log_all, prepare_logger
 import os
 
 
-def gtfs_import_to_db(source: Path, target: Path) -> None:
+def gtfs_import_to_db(source: Path, target: Path, jobs: int = 1) -> None:
     # Workaround for https://github.com/duckdb/duckdb/issues/8261
     try:
         os.remove(target.resolve())
     except OSError:
         pass
 
-    load_gtfs_to_duckdb(source, target)
+    load_gtfs_to_duckdb(source, target, jobs)
 
 
-def main(gtfs_file: str, database_file: str) -> None:
+def main(gtfs_file: str, database_file: str, jobs: int = 1) -> None:
     gtfs_path = Path(gtfs_file)
     if not gtfs_path.exists():
         log_all(logging.ERROR, f"{gtfs_path} does not exist.")
 
     else:
-        gtfs_import_to_db(gtfs_path, Path(database_file))
+        gtfs_import_to_db(gtfs_path, Path(database_file), jobs)
 
 
 if __name__ == "__main__":
@@ -33,10 +33,11 @@ if __name__ == "__main__":
     parser.add_argument('gtfs', type=str, help='GTFS file to import, for example: gtfs.zip')
     parser.add_argument('database', type=str, help='DuckDB file to overwrite and store contents of the import.')
     parser.add_argument('--log_file', type=str, required=False, help='the logfile')
+    parser.add_argument('--jobs', type=int, default=1, help='Load this many tables at the same time')
     args = parser.parse_args()
     mylogger = prepare_logger(logging.INFO, args.log_file)
     try:
-        main(args.gtfs, args.database)
+        main(args.gtfs, args.database, args.jobs)
     except Exception as e:
         log_all(logging.ERROR, f'{e}  {traceback.format_exc()}')
         raise e
@@ -8,21 +8,21 @@ from storage.lxml.serialization.xml import export_publication_delivery_xml
 from utils.aux_logging import log_all, prepare_logger
 
 
-def netex_db_to_generalframe(source: Path, target: Path) -> None:
+def netex_db_to_generalframe(source: Path, target: Path, jobs: int = 1) -> None:
     log_all(logging.INFO, f"[netex_db_to_generalframe] exporting {source} to {target}")
     with MdbxStorage(source) as storage:
         with storage.env.ro_transaction() as txn:
             publication_delivery = export_to_general_frame(storage, txn)
-            export_publication_delivery_xml(publication_delivery, target)
+            export_publication_delivery_xml(publication_delivery, target, jobs)
 
 
-def main(source: str, target: str) -> None:
+def main(source: str, target: str, jobs: int = 1) -> None:
     source_path = Path(source)
     if not source_path.exists():
         log_all(logging.ERROR, f"{source_path} does not exist.")
 
     else:
-        netex_db_to_generalframe(source_path, Path(target))
+        netex_db_to_generalframe(source_path, Path(target), jobs)
 
 
 if __name__ == '__main__':
@@ -32,7 +32,8 @@ if __name__ == '__main__':
     argument_parser.add_argument('database', type=str, help='lmdb to be read from')
     argument_parser.add_argument('output_filename', type=str, help='The output XML file')
     argument_parser.add_argument('--log_file', type=str, required=False, help='the logfile')
+    argument_parser.add_argument('--jobs', type=int, default=1, help='Render the members of the frame in this many processes')
     args = argument_parser.parse_args()
     prepare_logger(logging.INFO, args.log_file)
 
-    main(args.database, args.output_filename)
+    main(args.database, args.output_filename, args.jobs)
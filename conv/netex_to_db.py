@@ -1,35 +1,89 @@
+import tempfile
 import traceback
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import multiprocessing as mp
 
 from storage.mdbx.core.references import resolve, resolve_embeddings_index
 from storage.lxml.core.implementation import XmlStorage
 from storage.lxml.core.insert import insert_database, get_interesting_classes
 from storage.mdbx.core.implementation import MdbxStorage
+from storage.mdbx.core.dictionaries import train_dictionaries
+from storage.mdbx.core.implementation_spool import MdbxStorageSpool
+from storage.mdbx.serialization.combinedserializer import OBJECT_SERIALIZERS, DEFAULT_OBJECT_SERIALIZER
 from utils.aux_logging import log_all, log_flush
 import logging
 
 
-def netex_to_db(filenames: list[Path], database: Path, clean_database: bool = True) -> None:
-    with MdbxStorage(database, readonly=False) as storage:
+def parse_to_spool(database: Path, class_name_idx: dict[str, bytes], object_serializer: str, filename: Path, sub_filename: str, spool_path: Path) -> Path:
+    """Runs in a subprocess: parse one XML file, and spool the prepared objects for the writer."""
+    with XmlStorage(filename).open_netex_member(sub_filename) as sub_file:
+        with MdbxStorageSpool(database, spool_path, class_name_idx, object_serializer) as storage:
+            insert_database(storage, get_interesting_classes(), sub_file)
+
+    return spool_path
+
+
+def insert_parallel(storage: MdbxStorage, filenames: list[Path], jobs: int) -> None:
+    """
+    Parses all XML files, including the members of a zip file, in parallel. The single writer replays the spools in
+    the order of the sequential import, while the other files are still being parsed, so the result is the same.
+    A file is the unit of work, the frame defaults that apply to an object can be anywhere before it in its file.
+    """
+    members = [(filename, sub_filename) for filename in filenames for sub_filename in XmlStorage(filename).list_netex_files()]
+
+    with tempfile.TemporaryDirectory(prefix="netex_to_db_", dir=storage.path.parent) as spool_directory:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=mp.get_context("spawn")) as executor:
+            futures = [
+                executor.submit(
+                    parse_to_spool,
+                    storage.path,
+                    storage.class_name_idx,
+                    storage.object_serializer_name,
+                    filename,
+                    sub_filename,
+                    Path(spool_directory) / f"{i}.spool",
+                )
+                for i, (filename, sub_filename) in enumerate(members)
+            ]
+
+            for (filename, sub_filename), future in zip(members, futures):
+                spool_path = future.result()
+                log_all(logging.INFO, f"[netex_to_db] loading {filename}: {sub_filename}")
+                MdbxStorageSpool.replay(storage, spool_path)
+                spool_path.unlink()
+
+
+def netex_to_db(
+    filenames: list[Path], database: Path, clean_database: bool = True, jobs: int = 1, object_serializer: str = DEFAULT_OBJECT_SERIALIZER
+) -> None:
+    with MdbxStorage(database, readonly=False, object_serializer=object_serializer) as storage:
         if clean_database:
             log_all(logging.INFO, f"[netex_to_db] {database} is cleaned")
             storage.clean()
 
-        interesting_classes = get_interesting_classes()
-        for filename in filenames:
-            xml_storage = XmlStorage(filename)
-            for sub_file, real_filename in xml_storage.open_netex_file():
-                log_all(logging.INFO, f"[netex_to_db] loading {real_filename}")
-                insert_database(storage, interesting_classes, sub_file)
+        if jobs > 1:
+            insert_parallel(storage, filenames, jobs)
+        else:
+            interesting_classes = get_interesting_classes()
+            for filename in filenames:
+                xml_storage = XmlStorage(filename)
+                for sub_file, real_filename in xml_storage.open_netex_file():
+                    log_all(logging.INFO, f"[netex_to_db] loading {real_filename}")
+                    insert_database(storage, interesting_classes, sub_file)
+
+        if storage.serializer.zstd_codec is not None:
+            log_all(logging.INFO, "[netex_to_db] training compression dictionaries")
+            train_dictionaries(storage)
 
         log_all(logging.INFO, "[netex_to_db] resolving references")
-        resolve(storage)
+        resolve(storage, batched=True)
         log_all(logging.INFO, "[netex_to_db] resolving embeddings via index")
-        resolve_embeddings_index(storage)
+        resolve_embeddings_index(storage, batched=True)
         log_all(logging.INFO, f"[netex_to_db] done: {database}")
 
 
-def main(filenames: list[str], database: str, clean_database: bool = True) -> None:
+def main(filenames: list[str], database: str, clean_database: bool = True, jobs: int = 1, object_serializer: str = DEFAULT_OBJECT_SERIALIZER) -> None:
     # if filenames is not a list of str  => error
     if not (isinstance(filenames, list) and all(isinstance(item, str) for item in filenames)):
         log_all(logging.ERROR, 'filenames parameter must be a [] of file names.')
@@ -48,7 +102,7 @@ def main(filenames: list[str], database: str, clean_database: bool = True) -> No
             else:
                 paths.append(path)
 
-    netex_to_db(paths, Path(database), clean_database)
+    netex_to_db(paths, Path(database), clean_database, jobs, object_serializer)
 
 
 if __name__ == '__main__':
@@ -60,12 +114,16 @@ if __name__ == '__main__':
     argument_parser.add_argument('netex', nargs='+', default=[], help='NeTEx files')
     argument_parser.add_argument('database', type=str, help='The lmdb to be overwritten with the NeTEx context')
     argument_parser.add_argument('--clean_database', action="store_true", help='Clean the current file', default=False)
+    argument_parser.add_argument('--jobs', type=int, default=1, help='Parse this many XML files in parallel')
+    argument_parser.add_argument(
+        '--object_serializer', choices=OBJECT_SERIALIZERS.keys(), default=DEFAULT_OBJECT_SERIALIZER, help='How objects are stored in a new or cleaned database'
+    )
     argument_parser.add_argument('--log_file', type=str, required=False, help='the logfile')
     args = argument_parser.parse_args()
     prepare_logger(logging.INFO, args.log_file)
 
     try:
-        main(args.netex, args.database, args.clean_database)
+        main(args.netex, args.database, args.clean_database, args.jobs, args.object_serializer)
     except Exception as e:
         log_all(logging.ERROR, traceback.format_exc())
         raise e
@@ -1,156 +1,168 @@
 import logging
-from collections import defaultdict
-from typing import TypeVar, Any
+import multiprocessing as mp
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
-from netex import (
-    Route,
-    ServiceJourneyPattern,
+import numpy as np
+
+from domain.netex.model import (
+    DayType,
+    DayTypeAssignment,
+    EntityStructure,
     Line,
+    NoticeAssignment,
     PassengerStopAssignment,
-    ScheduledStopPoint,
-    EntityStructure,
-    DayTypeAssignment,
-    DayType,
-    UicOperatingPeriod,
     PublicationDelivery,
+    Route,
+    ScheduledStopPoint,
+    ServiceJourney,
+    ServiceJourneyPattern,
     TypeOfFrameRef,
-    ResponsibilitySet,
-    StopPointInJourneyPattern,
 )
-from netexio.attributes import update_attr
-from netexio.database import Database
-from netexio.dbaccess import recursive_resolve, load_referencing_inwards, load_generator, setup_database
-from netexio.pickleserializer import MyPickleSerializer
-from netexio.xml import export_publication_delivery_xml
+from storage.lxml.serialization.xml import export_publication_delivery_xml
+from storage.mdbx.core.implementation import MdbxStorage
+from storage.mdbx.core.references import resolve, resolve_embeddings_index
+from storage.mdbx.tools.graph import build_reference_graph, class_number, closure_graph, closure_memberships
 from transformers.epip import export_epip_network_offer
-from transformers.references import split_path
-from utils.profiles import EPIP_CLASSES
 from utils.aux_logging import log_all, prepare_logger
-from utils.utils import get_interesting_classes
-
-import multiprocessing
-from concurrent.futures import ProcessPoolExecutor
-
-Tid = TypeVar("Tid", bound=EntityStructure)
-
-
-def generate_epip_line_split(source_database_file: str, target_database_file: str, object_type: str, object_id: str) -> None:
-    filter_set = {Line, ServiceJourneyPattern, DayType, ScheduledStopPoint}
-    filter_set_assignment = {DayType: {DayTypeAssignment}, ScheduledStopPoint: {PassengerStopAssignment}}
-    with Database(source_database_file, serializer=MyPickleSerializer(compression=True), readonly=True, multithreaded=True) as db_read:
-        clazz = db_read.get_class_by_name(object_type)
-        split_by = db_read.get_single(clazz, object_id)
-
-        a, b = target_database_file.split('.lmdb')
-        new_target_database_file = a + '_' + split_by.id.replace(':', '_') + '.lmdb'
-        new_xml_file = a + '_' + split_by.id.replace(':', '_') + '.xml.gz'
-
-        with Database(new_target_database_file, serializer=MyPickleSerializer(compression=True), readonly=False) as db_write:
-            setup_database(db_write, classes=get_interesting_classes(EPIP_CLASSES), clean=True)
-
-            # TODO: This is memory intensive, ideally we only keep what we have resolved and yield the objects to write them into the database
-            resolved: list[Any] = []
-            recursive_resolve(db_read, split_by, resolved, split_by.id, filter_set, filter_set_assignment=filter_set_assignment)
-
-            for obj in resolved:
-                db_write.insert_one_object(obj)
-
-            result: dict[tuple[str, str, Any], list[str]] = defaultdict(list)
-
-            db_write.block_until_done()
-
-            # TODO: For now EPIP
-            # TODO: It seems that the ValueSet for some reason removes BISON:TypeOfResponsibilityRole:financing
-            removable_classes = db_write.tables() - EPIP_CLASSES
-            for removable_class in removable_classes:
-                for parent_id, parent_version, parent_class, path in load_referencing_inwards(db_write, removable_class):
-                    parent_klass: type[Any] = db_write.get_class_by_name(parent_class)  # TODO: refactor at load_referencing_*
-                    if parent_klass in EPIP_CLASSES:
-                        # Aggregate all parent_ids, so we prevent concurrency issues, and the cost of deserialisation and serialisation
-                        key = (parent_id, parent_version, parent_klass)
-                        result[key].append(path)
-                        # print(removable_class, key, path)
-
-            # TODO: Once removed the export should have less elements in the GeneralFrame, and only the relevant extra elements
-            for key, paths in result.items():
-                parent_id, parent_version, parent_klass = key
-                obj = db_write.get_single(parent_klass, parent_id, parent_version)
-                if obj:
-                    for path in paths:
-                        split = split_path(path)
-                        update_attr(obj, split, None)
-
-                    print("REMOVED", obj.id, paths)
-
-                    db_write.insert_one_object(obj, delete_embedding=True)
-
-                    # print("SHOULD REMOVE", parent_klass, parent_id, parent_version, paths)
-
-                else:
-                    print("MISSING", parent_klass, parent_id, parent_version, paths)
-
-            # db_write.block_until_done()
-            # rs: ResponsibilitySet = db_write.get_single(ResponsibilitySet, "RET:ResponsibilitySet:Partition_ALL")
-            # rs.roles.responsibility_role_assignment[0].responsible_area_ref.version = rs.version
-            # db_write.insert_one_object(rs, delete_embedding=True)
-
-            db_write.block_until_done()
 
+# The objects that reference an object in a split, as (referenced class, referencing class), that are part of the split
+SPLIT_INWARD_CLASSES: set[tuple[type[EntityStructure], type[EntityStructure]]] = {
+    (Line, Route),
+    (Route, ServiceJourneyPattern),
+    (ServiceJourneyPattern, ServiceJourney),
+    (Line, NoticeAssignment),
+    (ServiceJourneyPattern, NoticeAssignment),
+    (ServiceJourney, NoticeAssignment),
+    (DayType, DayTypeAssignment),
+    (ScheduledStopPoint, PassengerStopAssignment),
+}
+
+
+def split_paths(target: Path, object_id: str) -> tuple[Path, Path]:
+    name = f"{target.stem}_{object_id.replace(':', '_')}"
+    return target.with_name(name + target.suffix), target.with_name(name + ".xml.gz")
+
+
+def write_split_keys(db_read: MdbxStorage, clazz: type[EntityStructure], directory: Path) -> list[tuple[str, Path]]:
+    """
+    The full keys of the split of every object of clazz, to a file per object in directory. All splits are computed in
+    one pass over the reference graph, see closure_memberships(), objects they share are only visited once.
+    """
+    with db_read.env.ro_transaction() as txn:
+        graph = build_reference_graph(txn)
+        this_class_idx = db_read.class_idx[clazz].ljust(4, b'\x00')
+        object_ids = [(key + this_class_idx, obj.id) for key, obj in db_read.iter_objects(txn, clazz, fields=['id'])]
+
+    inward = [
+        (class_number(db_read.class_idx[referenced]), class_number(db_read.class_idx[referencing]))
+        for referenced, referencing in SPLIT_INWARD_CLASSES
+        if referenced in db_read.class_idx and referencing in db_read.class_idx
+    ]
+    graph = closure_graph(graph, inward)
+    roots = np.searchsorted(graph.keys, np.frombuffer(b''.join(full_key for full_key, _ in object_ids), dtype='>u8').astype(np.uint64)).astype(np.int32)
+    membership, sets = closure_memberships(graph, roots)
+    log_all(logging.INFO, f"[split_db_to_db] {len(object_ids)} splits of {graph.nodes} objects, {len(sets) - 1} distinct sets of splits")
+
+    # The nodes grouped by their set of splits, a split is the groups of the sets it is in
+    by_set = np.argsort(membership, kind='stable')
+    bounds = np.searchsorted(membership[by_set], np.arange(len(sets) + 1))
+    split_sets: list[list[int]] = [[] for _ in object_ids]
+    for s, members in enumerate(sets):
+        for i in members:
+            split_sets[i].append(s)
+
+    splits = []
+    for i, (_, object_id) in enumerate(object_ids):
+        keys = np.sort(np.concatenate([graph.keys[by_set[bounds[s] : bounds[s + 1]]] for s in split_sets[i]]))
+        keys_file = directory / f"{i}.keys"
+        keys.astype('>u8').tofile(keys_file)
+        splits.append((object_id, keys_file))
+
+    return splits
+
+
+def generate_epip_split(source_database_file: Path, target_database_file: Path, object_id: str, keys_file: Path) -> Path:
+    """Runs in a subprocess: write the objects of one split to its own database, and export it as EPIP."""
+    database_file, xml_file = split_paths(target_database_file, object_id)
+    full_keys = keys_file.read_bytes()
+
+    with MdbxStorage(source_database_file) as db_read:
+        with db_read.env.ro_transaction() as txn:
+            with MdbxStorage(database_file, readonly=False) as db_write:
+                db_write.clean()
+                with db_write.env.rw_transaction() as txn_write:
+                    db_write.insert_any_object_on_queue(
+                        txn_write, (obj for _, obj in db_read.load_objects_by_full_keys(txn, (full_keys[i : i + 8] for i in range(0, len(full_keys), 8))))
+                    )
+                    txn_write.commit()
+
+    with MdbxStorage(database_file, readonly=False) as db_write:
+        resolve(db_write)
+        resolve_embeddings_index(db_write)
+
+    with MdbxStorage(database_file) as db_epip:
+        with db_epip.env.ro_transaction() as txn:
             publication_delivery: PublicationDelivery = export_epip_network_offer(
-                db_write, composite_frame_id=split_by.id, type_of_frame_ref=TypeOfFrameRef(ref='epip:EU_PI_LINE_OFFER', version_ref='1.0')
+                db_epip, txn, composite_frame_id=object_id, type_of_frame_ref=TypeOfFrameRef(ref='epip:EU_PI_LINE_OFFER', version_ref='1.0')
             )
-            export_publication_delivery_xml(publication_delivery, new_xml_file)
-            print(new_xml_file)
+            export_publication_delivery_xml(publication_delivery, xml_file)
 
+    keys_file.unlink()
+    return xml_file
 
-def _process_wrapper(args):
-    source_database_file, target_database_file, object_type, object_id = args
-    generate_epip_line_split(source_database_file, target_database_file, object_type, object_id)
 
+def split_db_to_db(source_database_file: Path, target_database_file: Path, clazz: type[EntityStructure], jobs: int) -> None:
+    with tempfile.TemporaryDirectory(prefix="split_db_to_db_", dir=target_database_file.parent) as directory:
+        with MdbxStorage(source_database_file) as db_read:
+            splits = write_split_keys(db_read, clazz, Path(directory))
 
-def main(source_database_file: str, target_database_file: str, object_type: str) -> None:
-    object_ids = []
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=mp.get_context("spawn")) as executor:
+            futures = [executor.submit(generate_epip_split, source_database_file, target_database_file, object_id, keys_file) for object_id, keys_file in splits]
+            for (object_id, _), future in zip(splits, futures):
+                try:
+                    log_all(logging.INFO, f"[split_db_to_db] {object_id}: {future.result()}")
+                except Exception as e:
+                    log_all(logging.ERROR, f"[split_db_to_db] {object_id}: {e}")
 
-    with Database(source_database_file, serializer=MyPickleSerializer(compression=True), readonly=True) as db_read:
-        db_read.stats()
 
-        split_by: Tid
-        for split_by in load_generator(db_read, db_read.get_class_by_name(object_type)):
-            assert split_by.id is not None
-            object_ids.append(split_by.id)
+def main(source: str, target: str, object_type: str, jobs: int) -> None:
+    source_path = Path(source)
+    if not source_path.exists():
+        log_all(logging.ERROR, f"{source_path} does not exist.")
+        return
 
-    cpu_count = multiprocessing.cpu_count() - 1 or 1
-    args = [(source_database_file, target_database_file, object_type, object_id) for object_id in object_ids]
+    with MdbxStorage(source_path) as db_read:
+        clazz = db_read.idx_class.get(db_read.class_name_idx.get(object_type, None), None)
+    if clazz is None:
+        log_all(logging.ERROR, f"{object_type} does not exist.")
+        return
 
-    with ProcessPoolExecutor(max_workers=cpu_count) as executor:
-        futures = [executor.submit(generate_epip_line_split, *args) for args in args]
-        for future in futures:
-            try:
-                future.result()
-            except Exception as e:
-                print(f"Fout bij taak: {e}")
+    split_db_to_db(source_path, Path(target), clazz, jobs)
 
 
 if __name__ == "__main__":
     import argparse
     import traceback
 
-    parser = argparse.ArgumentParser(description="Filter the input by an object")
-    parser.add_argument("source", type=str, help="lmdb file to use as input of the transformation.")
+    parser = argparse.ArgumentParser(description="Split the input into an EPIP export per object")
+    parser.add_argument("source", type=str, help="MDBX file to use as input of the transformation.")
 
-    parser.add_argument('object_type', type=str, help='The NeTEx object type to filter, for example ServiceJourney')
+    parser.add_argument('object_type', type=str, help='The NeTEx object type to split by, for example Line')
 
     parser.add_argument(
         "target",
         type=str,
-        help="lmdb file to overwrite and store contents of the transformation.",
+        help="MDBX file, the name of every split is derived from it: the database and XML of a split are stored next to it.",
     )
 
+    parser.add_argument("--jobs", type=int, default=mp.cpu_count() - 1 or 1, help="Write this many splits at the same time")
     parser.add_argument("--log_file", type=str, required=False, help="the logfile")
     args = parser.parse_args()
     mylogger = prepare_logger(logging.INFO, args.log_file)
     try:
-        main(args.source, args.target, args.object_type)
+        main(args.source, args.target, args.object_type, args.jobs)
     except Exception as e:
         log_all(logging.ERROR, f"{e} {traceback.format_exc()}")
         raise e
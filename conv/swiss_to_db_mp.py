@@ -13,7 +13,9 @@ import multiprocessing as mp
 n_proc = 10
 
 
-def parse_and_enqueue(target: Path, queue: mp.Queue, source: Path, sub_filename: str) -> None:
+def parse_and_enqueue(
+    target: Path, queue: mp.Queue, class_name_idx: dict[str, bytes], object_serializer: str, writer_pid: int | None, source: Path, sub_filename: str
+) -> None:
     """Runs in a subprocess: parse XML and enqueue objects."""
 
     import zipfile
@@ -25,7 +27,7 @@ def parse_and_enqueue(target: Path, queue: mp.Queue, source: Path, sub_filename:
     with zipfile.ZipFile(source) as zip_file:
         with zip_file.open(sub_filename) as sub_file:
             interesting_classes = get_interesting_classes(SWISS_CLASSES)
-            with MdbxStorageQueue(target, queue) as storage:
+            with MdbxStorageQueue(target, queue, class_name_idx, object_serializer, writer_pid=writer_pid) as storage:
                 print(sub_filename)
                 insert_database(storage, interesting_classes, sub_file)
 
@@ -35,11 +37,13 @@ def swiss_to_db_mp(source: Path, target: Path, clean_database: bool = True) -> N
     all_names = xml_storage.list_netex_files()
 
     with MdbxStorageMP(target, readonly=False) as storage:
+        # What every producer needs to reach the writer
+        writer = (target, storage.queue, storage.class_name_idx, storage.object_serializer_name, storage.writer_pid)
         with ProcessPoolExecutor(max_workers=n_proc, mp_context=storage.ctx) as executor:
             futures = []
             for sub_filename in all_names:
                 if "_RESOURCE_" in sub_filename or '_SITE_' in sub_filename or '_SERVICECALENDAR_' in sub_filename:
-                    futures.append(executor.submit(parse_and_enqueue, target, storage.queue, source, sub_filename))
+                    futures.append(executor.submit(parse_and_enqueue, *writer, source, sub_filename))
 
             for future in as_completed(futures):
                 _res = future.result()
@@ -47,7 +51,7 @@ def swiss_to_db_mp(source: Path, target: Path, clean_database: bool = True) -> N
             futures = []
             for sub_filename in all_names:
                 if "_SERVICE_" in sub_filename or '_COMMON_' in sub_filename:
-                    futures.append(executor.submit(parse_and_enqueue, target, storage.queue, source, sub_filename))
+                    futures.append(executor.submit(parse_and_enqueue, *writer, source, sub_filename))
 
             for future in as_completed(futures):
                 _res = future.result()
@@ -55,7 +59,7 @@ def swiss_to_db_mp(source: Path, target: Path, clean_database: bool = True) -> N
             futures = []
             for sub_filename in all_names:
                 if "_TIMETABLE_" in sub_filename:
-                    futures.append(executor.submit(parse_and_enqueue, target, storage.queue, source, sub_filename))
+                    futures.append(executor.submit(parse_and_enqueue, *writer, source, sub_filename))
 
             for future in as_completed(futures):
                 _res = future.result()
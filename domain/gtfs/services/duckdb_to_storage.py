@@ -1,15 +1,18 @@
+import itertools
 from pathlib import Path
+from typing import Iterable
+
 import duckdb
 
 from domain.gtfs.transform.codespace import getCodespace
 from domain.gtfs.transform.datasource import getDataSource
-from domain.gtfs.transform.daytype import getDayTypes
+from domain.gtfs.transform.daytype import getDayTypes, getDayTypeAssignments, getOperatingPeriods
 from domain.gtfs.transform.line import getLines
 from domain.gtfs.transform.operator import getOperators
 from domain.gtfs.transform.scheduledstoppoint import getScheduledStopPoints
 from domain.gtfs.transform.servicejourney import getServiceJourneys
 from domain.gtfs.transform.stoparea import getStopAreas
-from domain.gtfs.transform.stopplace import getStopPlaces
+from domain.gtfs.transform.stopplace import getStopPlaces, getPassengerStopAssignments
 from domain.gtfs.transform.version import getVersion
 from domain.netex.model import (
     Codespace,
@@ -24,10 +27,23 @@ from domain.netex.model import (
     DayType,
     OperatingPeriod,
     DayTypeAssignment,
+    EntityStructure,
 )
 from storage.mdbx.core.implementation import MdbxStorage
 
 
+# Every chunk of objects is written in a transaction of its own, the objects are generated while they are written
+INSERT_CHUNK_SIZE = 10_000
+
+
+def insert_objects_in_chunks(
+    storage: MdbxStorage, klass: type[EntityStructure], objects: Iterable[EntityStructure], chunk_size: int = INSERT_CHUNK_SIZE
+) -> None:
+    iterator = iter(objects)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        storage.insert_objects_on_queue(klass, chunk)
+
+
 def to_storage(database_file: Path, storage: MdbxStorage) -> None:
     with duckdb.connect(database=database_file, read_only=True) as con:
         version = getVersion(con)
@@ -42,28 +58,13 @@ def to_storage(database_file: Path, storage: MdbxStorage) -> None:
 
         storage.insert_objects_on_queue(Codespace, [codespace])
         storage.insert_objects_on_queue(DataSource, [datasource])
-        storage.insert_objects_on_queue(Operator, getOperators(con, codespace, version))
-        storage.insert_objects_on_queue(Line, getLines(con, codespace, version))
-
-        stop_areas = getStopAreas(con, codespace, version)
-        storage.insert_objects_on_queue(StopArea, stop_areas)
-        storage.insert_objects_on_queue(ScheduledStopPoint, getScheduledStopPoints(con, codespace, version, stop_areas))
-        del stop_areas
-
-        stop_places, passenger_stop_assignments = getStopPlaces(con, codespace, version)
-        storage.insert_objects_on_queue(StopPlace, stop_places)
-        storage.insert_objects_on_queue(PassengerStopAssignment, passenger_stop_assignments)
-        del stop_places
-        del passenger_stop_assignments
-
-        day_types, day_type_assignments, operating_periods = getDayTypes(con, codespace, version)
-        storage.insert_objects_on_queue(DayType, day_types)
-        storage.insert_objects_on_queue(OperatingPeriod, operating_periods)
-        storage.insert_objects_on_queue(DayTypeAssignment, day_type_assignments)
-        del day_types
-        del day_type_assignments
-        del operating_periods
-
-    # Because we want to create trip_times, and remove it.
-    with duckdb.connect(database=database_file, read_only=False) as con:
-        storage.insert_objects_on_queue(ServiceJourney, getServiceJourneys(con, codespace, version))
+        insert_objects_in_chunks(storage, Operator, getOperators(con, codespace, version))
+        insert_objects_in_chunks(storage, Line, getLines(con, codespace, version))
+        insert_objects_in_chunks(storage, StopArea, getStopAreas(con, codespace, version))
+        insert_objects_in_chunks(storage, ScheduledStopPoint, getScheduledStopPoints(con, codespace, version))
+        insert_objects_in_chunks(storage, StopPlace, getStopPlaces(con, codespace, version))
+        insert_objects_in_chunks(storage, PassengerStopAssignment, getPassengerStopAssignments(con, codespace, version))
+        insert_objects_in_chunks(storage, DayType, getDayTypes(con, codespace, version))
+        insert_objects_in_chunks(storage, OperatingPeriod, getOperatingPeriods(con, codespace, version))
+        insert_objects_in_chunks(storage, DayTypeAssignment, getDayTypeAssignments(con, codespace, version))
+        insert_objects_in_chunks(storage, ServiceJourney, getServiceJourneys(con, codespace, version))
@@ -2,8 +2,11 @@ import csv
 import io
 import json
 import logging
-import os
+import shutil
+import tempfile
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import duckdb
@@ -28,69 +31,104 @@ from domain.gtfs.services.gtfs_inference import create_feed_info, handle_single_
 from utils.aux_logging import log_all
 
 
-def _handle_file(con: duckdb.DuckDBPyConnection, zip_file: zipfile.ZipFile, filename: str, column_mapping: dict[str, str]) -> None:
-    print(filename)
-    table = filename.split('/')[-1].replace('.txt', '')
-    with con.cursor() as cur:
-        sql_drop_table = f"""DROP TABLE IF EXISTS {table};"""
-        # print(sql_drop_table)
-        cur.execute(sql_drop_table)
-
-        if filename in [x.filename for x in zip_file.filelist]:
-            if filename not in {'shapes.txt'}:
-                detector = UniversalDetector()
-                for line in zip_file.open(filename, 'r'):
-                    detector.feed(line)
-                    if detector.done:
-                        break
-                detector.close()
-
-                assert detector.result is not None, "Detector must have a result"
-
-                with zip_file.open(filename, mode='r') as f:
-                    g = io.TextIOWrapper(f, detector.result['encoding'])
-                    reader = csv.reader(g)
-                    header = next(reader)
-
-                if (detector.result['encoding'] or '').lower() not in ('utf-8', 'utf-8-sig', 'ascii'):
-                    with zip_file.open(filename, 'r') as f_in:
-                        g = io.TextIOWrapper(f_in, detector.result['encoding'])
-                        with open("_tmp", 'w', encoding='UTF-8') as f_out:
-                            f_out.writelines(g)
-                else:
-                    zip_file.extract(filename)
-                    os.rename(filename, '_tmp')
-            else:
-                with zip_file.open(filename, mode='r') as f:
-                    g = io.TextIOWrapper(f, 'utf-8')
-                    reader = csv.reader(g)
-                    header = next(reader)
-
-                zip_file.extract(filename)
-                os.rename(filename, '_tmp')
-
-            filename = '_tmp'
-
-            this_mapping = {}
-            for column in header:
-                this_mapping[column] = column_mapping.get(column, 'VARCHAR')
-
-            missing_mapping = {}
-            for column in column_mapping.keys() - this_mapping.keys():
-                missing_mapping[column] = column_mapping.get(column, 'VARCHAR')
-
-            this_mapping_str = json.dumps(this_mapping)
-
-            sql_create_table = f"""CREATE TABLE {table} AS SELECT * FROM read_csv('{filename}', delim=',', quote='"', escape='"',header=true, auto_detect=true, columns = {this_mapping_str});"""
-            # print(sql_create_table)
-            cur.execute(sql_create_table)
+# The bytes of a member that are used to detect its encoding
+ENCODING_SAMPLE_SIZE = 4 * 1024**2
+
+GTFS_TABLES: list[tuple[str, dict[str, str]]] = [
+    ('feed_info.txt', feed_info_txt),
+    ('agency.txt', agency_txt),
+    ('calendar_dates.txt', calendar_dates_txt),
+    ('calendar.txt', calendar_txt),
+    ('routes.txt', routes_txt),
+    ('levels.txt', levels_txt),
+    ('stops.txt', stops_txt),
+    ('shapes.txt', shapes_txt),
+    ('trips.txt', trips_txt),
+    ('transfers.txt', transfers_txt),
+    ('stop_times.txt', stop_times_txt),
+    ('frequencies.txt', frequencies_txt),
+    ('pathways.txt', pathways_txt),
+]
+
+
+def _detect_encoding(zip_file: zipfile.ZipFile, filename: str, sample_size: int | None) -> str:
+    """The encoding of a member, from its first sample_size bytes, or from all of them without a sample_size."""
+    detector = UniversalDetector()
+    read = 0
+    with zip_file.open(filename, 'r') as f:
+        for line in f:
+            detector.feed(line)
+            read += len(line)
+            if detector.done or (sample_size is not None and read >= sample_size):
+                break
+    detector.close()
+
+    assert detector.result is not None, "Detector must have a result"
+    return detector.result['encoding'] or 'utf-8'
+
+
+def _extract(zip_file: zipfile.ZipFile, filename: str, encoding: str, target: Path) -> list[str]:
+    """Stream a member to target as UTF-8, and return its header."""
+    # Decoded as text, the bytes of a line in an encoding as UTF-16 do not end at the first newline byte
+    with zip_file.open(filename, mode='r') as f, io.TextIOWrapper(f, encoding, newline='') as text:
+        header = next(csv.reader([text.readline()]))
+
+    with zip_file.open(filename, 'r') as f_in:
+        if encoding.lower() in ('utf-8', 'utf-8-sig', 'ascii'):
+            with open(target, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+        else:
+            with open(target, 'w', encoding='UTF-8') as f_out:
+                shutil.copyfileobj(io.TextIOWrapper(f_in, encoding), f_out)
 
-            if filename == '_tmp':
-                os.remove('_tmp')
+    return header
 
-            for column in column_mapping.keys() - this_mapping.keys():
-                datatype = column_mapping.get(column, 'VARCHAR')
-                cur.execute(f"""ALTER TABLE {table} ADD COLUMN {column} {datatype};""")
+
+def _load_csv(cur: duckdb.DuckDBPyConnection, table: str, filename: Path, header: list[str], column_mapping: dict[str, str]) -> None:
+    this_mapping = {}
+    for column in header:
+        this_mapping[column] = column_mapping.get(column, 'VARCHAR')
+
+    this_mapping_str = json.dumps(this_mapping)
+
+    sql_create_table = f"""CREATE OR REPLACE TABLE {table} AS SELECT * FROM read_csv('{filename.as_posix()}', delim=',', quote='"', escape='"',header=true, auto_detect=true, columns = {this_mapping_str});"""
+    cur.execute(sql_create_table)
+
+    for column in column_mapping.keys() - this_mapping.keys():
+        datatype = column_mapping.get(column, 'VARCHAR')
+        cur.execute(f"""ALTER TABLE {table} ADD COLUMN {column} {datatype};""")
+
+
+def _handle_file(con: duckdb.DuckDBPyConnection, zip_path: Path, filename: str, column_mapping: dict[str, str], directory: Path) -> None:
+    """
+    Load one member into its table, on a connection of its own, so the members can be loaded at the same time. The
+    member is streamed to a file in directory, which is removed once it is loaded.
+    """
+    started = time.perf_counter()
+    table = filename.split('/')[-1].replace('.txt', '')
+    with con.cursor() as cur, zipfile.ZipFile(zip_path) as zip_file:
+        cur.execute(f"""DROP TABLE IF EXISTS {table};""")
+
+        if filename in zip_file.namelist():
+            encoding = 'utf-8' if filename in {'shapes.txt'} else _detect_encoding(zip_file, filename, ENCODING_SAMPLE_SIZE)
+            target = directory / f"{table}.csv"
+            try:
+                header = _extract(zip_file, filename, encoding, target)
+                _load_csv(cur, table, target, header, column_mapping)
+            except (duckdb.Error, UnicodeDecodeError) as e:
+                if filename in {'shapes.txt'}:
+                    raise
+                # Only a sample was used to detect the encoding, fall back to the whole member
+                encoding = _detect_encoding(zip_file, filename, None)
+                log_all(logging.WARNING, f"[gtfs_to_duckdb] {filename}: {e}, loading it again as {encoding}")
+                header = _extract(zip_file, filename, encoding, target)
+                _load_csv(cur, table, target, header, column_mapping)
+            finally:
+                target.unlink(missing_ok=True)
+
+            rows = cur.execute(f"""SELECT count(*) FROM {table};""").fetchone()[0]  # type: ignore[index]
+            duration = time.perf_counter() - started
+            log_all(logging.INFO, f"[gtfs_to_duckdb] {table}: {rows} rows in {duration:.1f}s, {rows / max(duration, 1e-9):.0f} rows/s")
 
         else:
             data_types = []
@@ -104,29 +142,25 @@ def _handle_file(con: duckdb.DuckDBPyConnection, zip_file: zipfile.ZipFile, file
             cur.execute(sql_create_table)
 
 
-def load_gtfs_to_duckdb(zip_file: Path, database_file: Path) -> None:
+def load_gtfs_to_duckdb(zip_file: Path, database_file: Path, jobs: int = 1) -> None:
     con: duckdb.DuckDBPyConnection = duckdb.connect(database=database_file)
 
-    zf = zipfile.ZipFile(zip_file.resolve())
-
-    # check if this is a GTFS file
-    if len(set(zf.namelist()) & {'agency.txt', 'routes.txt', 'trips.txt', 'stop_times.txt'}) == 0:
-        log_all(logging.ERROR, 'This is not a GTFS file')
-        return
-
-    _handle_file(con, zf, 'feed_info.txt', feed_info_txt)
-    _handle_file(con, zf, 'agency.txt', agency_txt)
-    _handle_file(con, zf, 'calendar_dates.txt', calendar_dates_txt)
-    _handle_file(con, zf, 'calendar.txt', calendar_txt)
-    _handle_file(con, zf, 'routes.txt', routes_txt)
-    _handle_file(con, zf, 'levels.txt', levels_txt)
-    _handle_file(con, zf, 'stops.txt', stops_txt)
-    _handle_file(con, zf, 'shapes.txt', shapes_txt)
-    _handle_file(con, zf, 'trips.txt', trips_txt)
-    _handle_file(con, zf, 'transfers.txt', transfers_txt)
-    _handle_file(con, zf, 'stop_times.txt', stop_times_txt)
-    _handle_file(con, zf, 'frequencies.txt', frequencies_txt)
-    _handle_file(con, zf, 'pathways.txt', pathways_txt)
+    with zipfile.ZipFile(zip_file.resolve()) as zf:
+        # check if this is a GTFS file
+        if len(set(zf.namelist()) & {'agency.txt', 'routes.txt', 'trips.txt', 'stop_times.txt'}) == 0:
+            log_all(logging.ERROR, 'This is not a GTFS file')
+            return
+
+        sizes = {info.filename: info.file_size for info in zf.infolist()}
+
+    # The tables do not depend on each other, the largest ones first, so they do not end up last on a single connection
+    tables = sorted(GTFS_TABLES, key=lambda table: -sizes.get(table[0], 0))
+
+    with tempfile.TemporaryDirectory(prefix="gtfs_to_duckdb_", dir=Path(database_file).resolve().parent) as directory:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(_handle_file, con, zip_file.resolve(), filename, column_mapping, Path(directory)) for filename, column_mapping in tables]
+            for future in futures:
+                future.result()
 
     create_feed_info(con)
     handle_single_agency(con)
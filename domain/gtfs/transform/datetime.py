@@ -1,3 +1,4 @@
+import functools
 import math
 import datetime
 from xsdata.models.datatype import XmlTime, XmlDateTime, XmlDate
@@ -14,6 +15,12 @@ def noonTimeToNeTEx(time: str) -> tuple[XmlTime, int]:
     return (XmlTime(hour=hour_i % 24, minute=int(minute), second=int(second)), day_offset)
 
 
+@functools.lru_cache(maxsize=None)
+def secondsToNeTEx(seconds: int) -> XmlTime:
+    """The time of a number of seconds since midnight within a day, see noonTimeToNeTEx(). XmlTime is immutable, every time of day is created once."""
+    return XmlTime(hour=seconds // 3600, minute=seconds // 60 % 60, second=seconds % 60)
+
+
 def date_to_xmldatetime(d: datetime.date) -> XmlDateTime:
     x = datetime.datetime.combine(d, datetime.datetime.min.time())
     return XmlDateTime.from_datetime(x)
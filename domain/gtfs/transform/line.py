@@ -2,6 +2,7 @@ from typing import Generator
 
 import duckdb
 
+from domain.gtfs.transform.rows import fetch_rows
 from domain.gtfs.transform.string import getRequiredString, getOptionalString
 from domain.gtfs.transform.operator import get_agency_id
 from domain.gtfs.transform.transporttype import gtfsRouteTypeToNeTEx
@@ -25,11 +26,7 @@ def getLines(con: duckdb.DuckDBPyConnection, codespace: Codespace, version: str)
     with con.cursor() as cur:
         cur.execute(lines_sql)
 
-        while True:
-            row = cur.fetchone()
-            if row is None:
-                break
-
+        for row in fetch_rows(cur):
             (
                 route_id,
                 route_short_name,
@@ -2,6 +2,7 @@ from typing import Generator
 
 import duckdb
 
+from domain.gtfs.transform.rows import fetch_rows
 from domain.netex.model import (
     Operator,
     PrivateCodes,
@@ -31,11 +32,7 @@ def getOperators(con: duckdb.DuckDBPyConnection, codespace: Codespace, version:
     with con.cursor() as cur:
         cur.execute(operators_sql)
 
-        while True:
-            row = cur.fetchone()
-            if row is None:
-                break
-
+        for row in fetch_rows(cur):
             (
                 agency_id,
                 agency_name,
@@ -0,0 +1,15 @@
+from typing import Any, Generator
+
+import duckdb
+
+FETCH_BATCH_SIZE = 10_000
+
+
+def fetch_rows(cur: duckdb.DuckDBPyConnection, batch_size: int = FETCH_BATCH_SIZE) -> Generator[tuple[Any, ...], None, None]:
+    """The rows of the query executed on cur, fetched in batches of batch_size instead of a round trip per row."""
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+
+        yield from rows
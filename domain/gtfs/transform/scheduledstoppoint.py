@@ -1,10 +1,10 @@
 from decimal import Decimal
-from typing import Iterable, Generator, cast
+from typing import Generator
 
 import duckdb
 
+from domain.gtfs.transform.rows import fetch_rows
 from domain.gtfs.transform.string import getRequiredString, getOptionalString
-from domain.netex.indexes.byid import getIndex
 from domain.netex.model import (
     ScheduledStopPoint,
     Codespace,
@@ -18,7 +18,7 @@ from domain.netex.model import (
     StopAreaRefStructure,
 )
 from domain.netex.services.ids import getId
-from domain.netex.services.refs import getFakeRef, getRef
+from domain.netex.services.refs import getFakeRef
 
 
 def get_stop_id(codespace: Codespace, stop_id: str) -> str:
@@ -30,21 +30,18 @@ def get_stop_id(codespace: Codespace, stop_id: str) -> str:
         return getId(codespace, ScheduledStopPoint, stop_id)
 
 
-def getScheduledStopPoints(
-    con: duckdb.DuckDBPyConnection, codespace: Codespace, version: str, stop_areas_input: Iterable[StopArea]
-) -> Generator[ScheduledStopPoint, None, None]:
-    ssp_sql = "SELECT DISTINCT stop_id, stop_name, stop_lat, stop_lon, stop_code, stop_desc, zone_id, stop_url, location_type, parent_station, wheelchair_boarding, stop_timezone, platform_code FROM stops WHERE location_type = 0 OR location_type IS NULL ORDER BY stop_id;"
-
-    stop_areas: dict[object, StopArea] = getIndex(stop_areas_input)
+def getScheduledStopPoints(con: duckdb.DuckDBPyConnection, codespace: Codespace, version: str) -> Generator[ScheduledStopPoint, None, None]:
+    # Whether the parent_station exists as StopArea, see getStopAreas(), is joined in
+    ssp_sql = """
+        SELECT DISTINCT stop_id, stop_name, stop_lat, stop_lon, stop_code, stop_desc, zone_id, stop_url, location_type, parent_station, wheelchair_boarding, stop_timezone, platform_code,
+        parent_station IN (SELECT stop_id FROM stops WHERE location_type = 1) AS parent_exists
+        FROM stops WHERE location_type = 0 OR location_type IS NULL ORDER BY stop_id;
+    """
 
     with con.cursor() as cur:
         cur.execute(ssp_sql)
 
-        while True:
-            row = cur.fetchone()
-            if row is None:
-                break
-
+        for row in fetch_rows(cur):
             (
                 stop_id,
                 stop_name,
@@ -59,19 +56,16 @@ def getScheduledStopPoints(
                 wheelchair_boarding,
                 stop_timezone,
                 platform_code,
+                parent_exists,
             ) = row
 
             my_stop_areas = None
             if parent_station is not None:
                 stop_area_ref = getId(codespace, StopArea, parent_station)
-                if stop_area_ref not in stop_areas:
+                if not parent_exists:
                     # TODO: Implement the logger here too
                     print(f"Parent {parent_station} not found, faking it.")
-                    my_stop_areas = StopAreaRefsRelStructure(stop_area_ref=[getFakeRef(stop_area_ref, StopAreaRefStructure, version)])
-                else:
-                    my_stop_areas = StopAreaRefsRelStructure(
-                        stop_area_ref=[cast(StopAreaRefStructure, getRef(stop_areas[stop_area_ref], StopAreaRefStructure))]
-                    )
+                my_stop_areas = StopAreaRefsRelStructure(stop_area_ref=[getFakeRef(stop_area_ref, StopAreaRefStructure, version)])
 
             scheduled_stop_point = ScheduledStopPoint(
                 id=get_stop_id(codespace, stop_id),
@@ -1,13 +1,16 @@
+import logging
+import time
 from decimal import Decimal
-from typing import Generator
+from typing import Any, Generator
 
 import duckdb
 
-from domain.gtfs.transform.datetime import noonTimeToNeTEx
+from domain.gtfs.transform.datetime import secondsToNeTEx
 from domain.gtfs.transform.daytype import get_service_id_dt
 from domain.gtfs.transform.directiontype import directionToNeTEx
 from domain.gtfs.transform.limitationstatus import wheelchairToNeTEx
 from domain.gtfs.transform.luggagecarriage import bicyclesToNeTEx
+from domain.gtfs.transform.rows import fetch_rows
 from domain.gtfs.transform.string import getOptionalString
 from domain.netex.model import (
     Codespace,
@@ -38,6 +41,7 @@ from domain.netex.model import (
 )
 from domain.netex.services.ids import getId
 from domain.netex.services.refs import getFakeRef
+from utils.aux_logging import log_all
 
 
 def get_trip_id(codespace: Codespace, trip_id: str) -> str:
@@ -61,212 +65,199 @@ def get_trip_id_sfs(codespace: Codespace, trip_id: str) -> str:
         return getId(codespace, ServiceFacilitySet, trip_id)
 
 
-def get_trip_id_call(codespace: Codespace, trip_id: str, sequence: int) -> str:
+def get_trip_id_call_prefix(codespace: Codespace, trip_id: str) -> str:
     if ':ServiceJourney:' in trip_id:
-        return trip_id.replace(':ServiceJourney:', ':Call:') + '_' + str(sequence)
+        return trip_id.replace(':ServiceJourney:', ':Call:') + '_'
     elif ':TemplateServiceJourney:' in trip_id:
-        return trip_id.replace(':TemplateServiceJourney:', ':Call:') + '_' + str(sequence)
+        return trip_id.replace(':TemplateServiceJourney:', ':Call:') + '_'
     else:
-        return getId(codespace, Call, trip_id) + '_' + str(sequence)
+        return getId(codespace, Call, trip_id) + '_'
+
+
+def get_trip_id_call(codespace: Codespace, trip_id: str, sequence: int) -> str:
+    return get_trip_id_call_prefix(codespace, trip_id) + str(sequence)
+
+
+# A row per call in stop_sequence order, the rows of a trip are consecutive. A GTFS time is relative to noon minus 12h, and beyond 24:00:00 on the
+# next day. The onward distance of a call is the distance of the next call from the last call before it that has a shape_dist_traveled.
+TRIPS_SQL = """
+SELECT
+trip_id, route_id, service_id, trip_short_name, trip_headsign, direction_id, block_id, wheelchair_accessible, bikes_allowed,
+stop_sequence, stop_headsign, ? || replace(stop_id, ':', '-') AS scheduled_stop_point_ref,
+arrival % 86400 AS arrival_time, arrival // 86400 AS arrival_day_offset,
+departure % 86400 AS departure_time, departure // 86400 AS departure_day_offset,
+COALESCE(drop_off_type, 0) AS drop_off_type, COALESCE(pickup_type, 0) AS pickup_type,
+lead(distance) OVER (PARTITION BY trip_id ORDER BY stop_sequence) AS onward_distance
+FROM (
+    SELECT
+    trip_id, stop_sequence, stop_headsign, stop_id, drop_off_type, pickup_type,
+    CAST(split_part(arrival_time, ':', 1) AS INTEGER) * 3600 + CAST(split_part(arrival_time, ':', 2) AS INTEGER) * 60 + CAST(split_part(arrival_time, ':', 3) AS INTEGER) AS arrival,
+    CAST(split_part(departure_time, ':', 1) AS INTEGER) * 3600 + CAST(split_part(departure_time, ':', 2) AS INTEGER) * 60 + CAST(split_part(departure_time, ':', 3) AS INTEGER) AS departure,
+    CAST(shape_dist_traveled AS DOUBLE) - COALESCE(last_value(CAST(NULLIF(shape_dist_traveled, 0) AS DOUBLE) IGNORE NULLS) OVER previous, 0) AS distance
+    FROM stop_times
+    WHERE trip_id NOT IN (SELECT trip_id FROM frequencies)
+    WINDOW previous AS (PARTITION BY trip_id ORDER BY stop_sequence ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING)
+) JOIN trips USING (trip_id)
+ORDER BY trip_id, stop_sequence;
+"""
+
+# The columns of TRIPS_SQL that belong to the trip, the others to a call
+TRIP_COLUMNS = 9
 
 
 def trips_iter(
-    con: duckdb.DuckDBPyConnection, batch_size: int = 100_000
-) -> Generator[tuple[str, list[tuple[str, str, str, str, str, int, str, str, int, int, str, str, str, str, int, int, int, int]]], None, None]:
+    con: duckdb.DuckDBPyConnection, codespace: Codespace, batch_size: int = 100_000
+) -> Generator[tuple[tuple[Any, ...], list[tuple[Any, ...]]], None, None]:
+    """Every trip with its calls, see TRIPS_SQL."""
     with con.cursor() as cur:
-        cursor = cur.execute(
-            """
-                    SELECT
-                    route_id, trip_id, service_id, trip_short_name, trip_headsign, direction_id, block_id, shape_id, wheelchair_accessible, bikes_allowed,
-                    stop_headsign, stop_id, arrival_time, departure_time, shape_dist_traveled, drop_off_type, pickup_type, stop_sequence
-                    FROM trip_times
-                """
-        )
+        cur.execute(TRIPS_SQL, [getId(codespace, ScheduledStopPoint, '')])
 
-        current_trip: str | None = None
-        current_block: list[tuple[str, str, str, str, str, int, str, str, int, int, str, str, str, str, int, int, int, int]] = []
+        current_trip: tuple[Any, ...] | None = None
+        current_block: list[tuple[Any, ...]] = []
 
-        while True:
-            rows = cursor.fetchmany(batch_size)
-            if not rows:
+        for row in fetch_rows(cur, batch_size):
+            if current_trip is None or row[0] != current_trip[0]:
                 if current_trip is not None:
                     yield current_trip, current_block
-                break
+                current_trip = row[:TRIP_COLUMNS]
+                current_block = []
+            current_block.append(row[TRIP_COLUMNS:])
 
-            for row in rows:
-                trip_id = row[1]
-                if trip_id != current_trip:
-                    if current_trip is not None:
-                        yield current_trip, current_block
-                    current_trip = trip_id
-                    current_block = []
-                current_block.append(row)
+        if current_trip is not None:
+            yield current_trip, current_block
 
 
 def getServiceJourneys(con: duckdb.DuckDBPyConnection, codespace: Codespace, version: str) -> Generator[ServiceJourney, None, None]:
     # shape_used = set([])
 
-    with con.cursor() as cur:
-        # This query does fill up the disk, but also prevents that a long running query eats all the memory in the Python Cache of DuckDB...
-        cur.execute(
-            "CREATE TABLE IF NOT EXISTS trip_times AS SELECT * FROM trips JOIN stop_times USING (trip_id) WHERE trip_id NOT IN (SELECT trip_id FROM frequencies) ORDER BY trip_id, stop_sequence;"
-        )
-
-        for trip_id, stops in trips_iter(cur):
-            (
-                route_id,
-                trip_id,
-                service_id,
-                trip_short_name,
-                trip_headsign,
-                direction_id,
-                block_id,
-                shape_id,
-                wheelchair_accessible,
-                bikes_allowed,
-                stop_headsign,
-                stop_id,
-                arrival_time,
-                departure_time,
-                shape_dist_traveled,
-                drop_off_type,
-                pickup_type,
-                stop_sequence,
-            ) = stops[0]
-
-            journey_pattern_view = (
-                JourneyPatternView(
-                    destination_display_ref_or_destination_display_view=DestinationDisplayView(
-                        name=MultilingualString(content=[TextType(value=trip_headsign)]), front_text=MultilingualString(content=[TextType(value=trip_headsign)])
-                    )
+    start = time.perf_counter()
+    trips = 0
+
+    for trip, stops in trips_iter(con, codespace):
+        (
+            trip_id,
+            route_id,
+            service_id,
+            trip_short_name,
+            trip_headsign,
+            direction_id,
+            block_id,
+            wheelchair_accessible,
+            bikes_allowed,
+        ) = trip
+
+        journey_pattern_view = (
+            JourneyPatternView(
+                destination_display_ref_or_destination_display_view=DestinationDisplayView(
+                    name=MultilingualString(content=[TextType(value=trip_headsign)]), front_text=MultilingualString(content=[TextType(value=trip_headsign)])
                 )
-                if trip_headsign
-                else None
-            )
-
-            accessibility_assessment = (
-                AccessibilityAssessment(
-                    id=get_trip_id_aa(codespace, trip_id), version=version, mobility_impaired_access=wheelchairToNeTEx(wheelchair_accessible)
-                )
-                if wheelchair_accessible
-                else None
             )
+            if trip_headsign
+            else None
+        )
 
-            block_ref = getFakeRef(getId(codespace, Block, block_id), BlockRef, None, "EXTERNAL") if block_id else None
+        accessibility_assessment = (
+            AccessibilityAssessment(id=get_trip_id_aa(codespace, trip_id), version=version, mobility_impaired_access=wheelchairToNeTEx(wheelchair_accessible))
+            if wheelchair_accessible
+            else None
+        )
 
-            luggage_carriage_facility_list = [bicyclesToNeTEx(bikes_allowed)]
+        block_ref = getFakeRef(getId(codespace, Block, block_id), BlockRef, None, "EXTERNAL") if block_id else None
 
-            facilities = None
-            if len(luggage_carriage_facility_list) > 0:
-                facilities = ServiceFacilitySetsRelStructure(
-                    restricted_service_facility_set_ref_or_service_facility_set_ref_or_service_facility_set=[
-                        ServiceFacilitySet(
-                            id=get_trip_id_sfs(codespace, trip_id),
-                            version=version,
-                            luggage_carriage_facility_list=LuggageCarriageFacilityList(value=luggage_carriage_facility_list),
-                        )
-                    ]
-                )
+        luggage_carriage_facility_list = [bicyclesToNeTEx(bikes_allowed)]
 
-            calls = CallsRelStructure()
-
-            prev_call = None
-            prev_shape_traveled = 0
-            prev_order = 1
-
-            for (
-                route_id,
-                trip_id,
-                service_id,
-                trip_short_name,
-                trip_headsign,
-                direction_id,
-                block_id,
-                shape_id,
-                wheelchair_accessible,
-                bikes_allowed,
-                stop_headsign,
-                stop_id,
-                arrival_time,
-                departure_time,
-                shape_dist_traveled,
-                drop_off_type,
-                pickup_type,
-                stop_sequence,
-            ) in stops:
-                destination_display_view = (
-                    DestinationDisplayView(
-                        name=MultilingualString(content=[TextType(value=stop_headsign)]), front_text=MultilingualString(content=[TextType(value=stop_headsign)])
+        facilities = None
+        if len(luggage_carriage_facility_list) > 0:
+            facilities = ServiceFacilitySetsRelStructure(
+                restricted_service_facility_set_ref_or_service_facility_set_ref_or_service_facility_set=[
+                    ServiceFacilitySet(
+                        id=get_trip_id_sfs(codespace, trip_id),
+                        version=version,
+                        luggage_carriage_facility_list=LuggageCarriageFacilityList(value=luggage_carriage_facility_list),
                     )
-                    if stop_headsign
-                    else None
+                ]
+            )
+
+        calls = CallsRelStructure()
+
+        call_id = get_trip_id_call_prefix(codespace, trip_id)
+
+        for order, (
+            stop_sequence,
+            stop_headsign,
+            scheduled_stop_point_ref,
+            arrival_time,
+            arrival_day_offset,
+            departure_time,
+            departure_day_offset,
+            drop_off,
+            pickup,
+            onward_distance,
+        ) in enumerate(stops, start=1):
+            destination_display_view = (
+                DestinationDisplayView(
+                    name=MultilingualString(content=[TextType(value=stop_headsign)]), front_text=MultilingualString(content=[TextType(value=stop_headsign)])
                 )
+                if stop_headsign
+                else None
+            )
 
-                from_point_ref = getId(codespace, ScheduledStopPoint, stop_id)
-                arrival_time_xml, arrival_dayoffset = noonTimeToNeTEx(arrival_time)
-                departure_time_xml, departure_dayoffset = noonTimeToNeTEx(departure_time)
-
-                if prev_call and shape_dist_traveled is not None:
-                    distance = shape_dist_traveled - prev_shape_traveled
-                    prev_call.onward_service_link_ref_or_onward_service_link_view = OnwardServiceLinkView(distance=Decimal(distance))
-                pickup = pickup_type if pickup_type else 0
-                drop_off = drop_off_type if drop_off_type else 0
-                call = Call(
-                    id=get_trip_id_call(codespace, trip_id, stop_sequence),
-                    version=version,
-                    fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view=getFakeRef(
-                        from_point_ref, ScheduledStopPointRef, version
-                    ),
-                    destination_display_ref_or_destination_display_view=destination_display_view,
-                    arrival=ArrivalStructure(time=arrival_time_xml, day_offset=arrival_dayoffset, for_alighting=bool(drop_off != 1)),
-                    departure=DepartureStructure(time=departure_time_xml, day_offset=departure_dayoffset, for_boarding=bool(pickup != 1)),
-                    request_stop=bool(pickup == 2 or pickup == 3 or drop_off == 2 or drop_off == 3),
-                    order=prev_order,
-                )  # stop_sequence is non-negative integer
-
-                calls.call.append(call)
-
-                prev_call = call
-                if shape_dist_traveled:
-                    prev_shape_traveled = shape_dist_traveled
-                prev_order += 1
-
-            service_journey = ServiceJourney(
-                id=get_trip_id(codespace, trip_id),
+            call = Call(
+                id=call_id + str(stop_sequence),
                 version=version,
-                flexible_line_ref_or_line_ref_or_line_view_or_flexible_line_view=getFakeRef(getId(codespace, Line, route_id), LineRef, version),
-                private_codes=PrivateCodes(private_code=[PrivateCode(value=trip_id, type_value="trip_id")]),
-                short_name=getOptionalString(trip_short_name),
-                day_types=DayTypeRefsRelStructure(day_type_ref=[getFakeRef(get_service_id_dt(codespace, service_id), DayTypeRef, version)]),
-                journey_pattern_view=journey_pattern_view,
-                direction_type=directionToNeTEx(direction_id),
-                block_ref=block_ref,
-                accessibility_assessment=accessibility_assessment,
-                facilities=facilities,
-                # link_sequence_projection_ref_or_link_sequence_projection=lsp,
-                calls=calls,
-            )
+                fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view=getFakeRef(
+                    scheduled_stop_point_ref, ScheduledStopPointRef, version
+                ),
+                onward_service_link_ref_or_onward_service_link_view=(
+                    OnwardServiceLinkView(distance=Decimal(onward_distance)) if onward_distance is not None else None
+                ),
+                destination_display_ref_or_destination_display_view=destination_display_view,
+                arrival=ArrivalStructure(time=secondsToNeTEx(arrival_time), day_offset=arrival_day_offset, for_alighting=bool(drop_off != 1)),
+                departure=DepartureStructure(time=secondsToNeTEx(departure_time), day_offset=departure_day_offset, for_boarding=bool(pickup != 1)),
+                request_stop=bool(pickup == 2 or pickup == 3 or drop_off == 2 or drop_off == 3),
+                order=order,
+            )  # stop_sequence is non-negative integer
+
+            calls.call.append(call)
+
+        service_journey = ServiceJourney(
+            id=get_trip_id(codespace, trip_id),
+            version=version,
+            flexible_line_ref_or_line_ref_or_line_view_or_flexible_line_view=getFakeRef(getId(codespace, Line, route_id), LineRef, version),
+            private_codes=PrivateCodes(private_code=[PrivateCode(value=trip_id, type_value="trip_id")]),
+            short_name=getOptionalString(trip_short_name),
+            day_types=DayTypeRefsRelStructure(day_type_ref=[getFakeRef(get_service_id_dt(codespace, service_id), DayTypeRef, version)]),
+            journey_pattern_view=journey_pattern_view,
+            direction_type=directionToNeTEx(direction_id),
+            block_ref=block_ref,
+            accessibility_assessment=accessibility_assessment,
+            facilities=facilities,
+            # link_sequence_projection_ref_or_link_sequence_projection=lsp,
+            calls=calls,
+        )
 
-            yield service_journey
-
-        cur.execute("DROP TABLE trip_times;")
-
-        # route_ref = None
-        # lsp: LinkSequenceProjection | LinkSequenceProjectionRef | None = None
-        # shape_id = get_or_none(shape_ids, i)
-        # if shape_id is not None:
-        #     if shape_id in shape_used:
-        #         lsp = getFakeRef(getId(LinkSequenceProjection, self.codespace, shape_id), LinkSequenceProjectionRef, self.version.version)
-        #     else:
-        #         lsps = self.getLineStrings(
-        #             {
-        #                 'query': (
-        #                     """select shape_id, shape_pt_lat, shape_pt_lon, shape_pt_sequence, shape_dist_traveled from shapes where shape_id = ? order by shape_id, shape_pt_sequence, shape_dist_traveled;"""
-        #                 ),
-        #                 'parameters': (shape_id,),
-        #             }
-        #         )
-        #         if len(lsps) > 0:
-        #             lsp = lsps[0]
-        #
-        #        shape_used.add(shape_id)
+        yield service_journey
+        trips += 1
+
+    duration = time.perf_counter() - start
+    log_all(logging.INFO, f"[servicejourney] {trips} trips in {duration:.1f}s, {trips / max(duration, 1e-9):.0f} trips/s")
+
+    # route_ref = None
+    # lsp: LinkSequenceProjection | LinkSequenceProjectionRef | None = None
+    # shape_id = get_or_none(shape_ids, i)
+    # if shape_id is not None:
+    #     if shape_id in shape_used:
+    #         lsp = getFakeRef(getId(LinkSequenceProjection, self.codespace, shape_id), LinkSequenceProjectionRef, self.version.version)
+    #     else:
+    #         lsps = self.getLineStrings(
+    #             {
+    #                 'query': (
+    #                     """select shape_id, shape_pt_lat, shape_pt_lon, shape_pt_sequence, shape_dist_traveled from shapes where shape_id = ? order by shape_id, shape_pt_sequence, shape_dist_traveled;"""
+    #                 ),
+    #                 'parameters': (shape_id,),
+    #             }
+    #         )
+    #         if len(lsps) > 0:
+    #             lsp = lsps[0]
+    #
+    #        shape_used.add(shape_id)
@@ -3,6 +3,7 @@ from typing import Generator
 
 import duckdb
 
+from domain.gtfs.transform.rows import fetch_rows
 from domain.gtfs.transform.string import getRequiredString, getOptionalString
 from domain.netex.model import StopArea, Codespace, PublicCodeStructure, PrivateCodes, PrivateCode, SimplePointVersionStructure, LocationStructure2
 from domain.netex.services.ids import getId
@@ -23,11 +24,7 @@ def getStopAreas(con: duckdb.DuckDBPyConnection, codespace: Codespace, version:
     with con.cursor() as cur:
         cur.execute(stoparea_sql)
 
-        while True:
-            row = cur.fetchone()
-            if row is None:
-                break
-
+        for row in fetch_rows(cur):
             (
                 stop_id,
                 stop_name,
@@ -1,9 +1,10 @@
 from decimal import Decimal
-from typing import cast, Union
+from typing import Any, Generator
 
 import duckdb
 
 from domain.gtfs.transform.limitationstatus import wheelchairToNeTEx
+from domain.gtfs.transform.rows import fetch_rows
 from domain.gtfs.transform.string import getRequiredString, getOptionalString
 from domain.netex.model import (
     Codespace,
@@ -24,7 +25,6 @@ from domain.netex.model import (
     LevelRef,
     ScheduledStopPointRef,
     ScheduledStopPoint,
-    TaxiStandRef,
     QuayRef,
     Quay,
     SiteEntrancesRelStructure,
@@ -33,22 +33,78 @@ from domain.netex.model import (
     AccessSpace,
 )
 from domain.netex.services.ids import getId
-from domain.netex.services.refs import getFakeRef, getRef
+from domain.netex.services.refs import getFakeRef
 
+# Every stop grouped by the StopPlace it becomes part of: the stop itself without a parent_station, otherwise its parent_station.
+# The stops without a parent_station come first in their group, the groups of which the parent_station does not exist come last.
+STOP_PLACES_SQL = """
+WITH distinct_stops AS (
+    SELECT DISTINCT stop_id, stop_name, stop_lat, stop_lon, stop_code, stop_desc, zone_id, stop_url, location_type, parent_station, wheelchair_boarding, stop_timezone, platform_code, level_id FROM stops
+), parents AS (
+    SELECT DISTINCT stop_id FROM distinct_stops WHERE parent_station IS NULL
+)
+SELECT distinct_stops.*, COALESCE(parent_station, distinct_stops.stop_id) AS stop_place
+FROM distinct_stops LEFT JOIN parents ON parents.stop_id = distinct_stops.parent_station
+ORDER BY parent_station IS NOT NULL AND parents.stop_id IS NULL, stop_place, parent_station IS NOT NULL, distinct_stops.stop_id;
+"""
+
+
+def _stop_place(codespace: Codespace, version: str, stop_place_id: str, row: tuple[Any, ...]) -> StopPlace:
+    (
+        stop_id,
+        stop_name,
+        stop_lat,
+        stop_lon,
+        stop_code,
+        stop_desc,
+        zone_id,
+        stop_url,
+        location_type,
+        _,
+        wheelchair_boarding,
+        stop_timezone,
+        _,
+        _,
+        _,
+    ) = row
 
-def getStopPlaces(con: duckdb.DuckDBPyConnection, codespace: Codespace, version: str) -> tuple[list[StopPlace], list[PassengerStopAssignment]]:
-    stop_places_sql = """SELECT DISTINCT stop_id, stop_name, stop_lat, stop_lon, stop_code, stop_desc, zone_id, stop_url, location_type, parent_station, wheelchair_boarding, stop_timezone, platform_code, level_id FROM stops ORDER BY COALESCE(parent_station, '') ASC, stop_id;"""
-    stop_places: dict[str, StopPlace] = {}
-    passenger_stop_assignments: list[PassengerStopAssignment] = []
+    return StopPlace(
+        id=stop_place_id,
+        version=version,
+        name=getRequiredString(stop_name),
+        public_code=PublicCodeStructure(value=stop_code) if stop_code is not None else None,
+        description=getOptionalString(stop_desc),
+        private_codes=PrivateCodes(private_code=[PrivateCode(value=stop_id, type_value="stop_id")]) if location_type == 1 else None,
+        locale=Locale(time_zone=stop_timezone) if stop_timezone is not None else None,
+        parent_zone_ref=ZoneRefStructure(ref=zone_id, version_ref="EXTERNAL") if zone_id is not None else None,
+        accessibility_assessment=(
+            AccessibilityAssessment(
+                id=getId(codespace, AccessibilityAssessment, 'StopPlace_' + stop_id),
+                version=version,
+                mobility_impaired_access=wheelchairToNeTEx(wheelchair_boarding),
+            )
+            if wheelchair_boarding is not None
+            else None
+        ),
+        info_links=(
+            InfoLinksRelStructure(info_link=[InfoLink(type_of_info_link=[TypeOfInfoLinkEnumeration.RESOURCE], value=stop_url)])
+            if stop_url is not None
+            else None
+        ),
+        centroid=SimplePointVersionStructure(
+            location=LocationStructure2(latitude=Decimal(str(stop_lat)), longitude=Decimal(str(stop_lon)), srs_name="urn:ogc:def:crs:EPSG::4326")
+        ),
+    )
 
+
+def getStopPlaces(con: duckdb.DuckDBPyConnection, codespace: Codespace, version: str) -> Generator[StopPlace, None, None]:
     with con.cursor() as cur:
-        cur.execute(stop_places_sql)
+        cur.execute(STOP_PLACES_SQL)
 
-        while True:
-            row = cur.fetchone()
-            if row is None:
-                break
+        stop_place: StopPlace | None = None
+        current_stop_place: str | None = None
 
+        for row in fetch_rows(cur):
             (
                 stop_id,
                 stop_name,
@@ -61,78 +117,26 @@ def getStopPlaces(con: duckdb.DuckDBPyConnection, codespace: Codespace, version:
                 location_type,
                 parent_station,
                 wheelchair_boarding,
-                stop_timezone,
-                platform_code,
+                _,
+                _,
                 level_id,
+                stop_place_key,
             ) = row
 
+            # The rows of a StopPlace are consecutive, it is complete when the next one starts
+            if stop_place_key != current_stop_place:
+                if stop_place is not None:
+                    yield stop_place
+                stop_place = None
+                current_stop_place = stop_place_key
+
             # Every stop that does not have a parent_station, will become a StopPlace
             if parent_station is None:
-                stop_place = StopPlace(
-                    id=getId(codespace, StopPlace, stop_id),
-                    version=version,
-                    name=getRequiredString(stop_name),
-                    public_code=PublicCodeStructure(value=stop_code) if stop_code is not None else None,
-                    description=getOptionalString(stop_desc),
-                    private_codes=PrivateCodes(private_code=[PrivateCode(value=stop_id, type_value="stop_id")]) if location_type == 1 else None,
-                    locale=Locale(time_zone=stop_timezone) if stop_timezone is not None else None,
-                    parent_zone_ref=ZoneRefStructure(ref=zone_id, version_ref="EXTERNAL") if zone_id is not None else None,
-                    accessibility_assessment=(
-                        AccessibilityAssessment(
-                            id=getId(codespace, AccessibilityAssessment, 'StopPlace_' + stop_id),
-                            version=version,
-                            mobility_impaired_access=wheelchairToNeTEx(wheelchair_boarding),
-                        )
-                        if wheelchair_boarding is not None
-                        else None
-                    ),
-                    info_links=(
-                        InfoLinksRelStructure(info_link=[InfoLink(type_of_info_link=[TypeOfInfoLinkEnumeration.RESOURCE], value=stop_url)])
-                        if stop_url is not None
-                        else None
-                    ),
-                    centroid=SimplePointVersionStructure(
-                        location=LocationStructure2(latitude=Decimal(str(stop_lat)), longitude=Decimal(str(stop_lon)), srs_name="urn:ogc:def:crs:EPSG::4326")
-                    ),
-                )
-                stop_places[stop_place.id] = stop_place  # type: ignore
-
-            else:
-                stop_place_id = getId(codespace, StopPlace, parent_station)
-                if stop_place_id in stop_places:
-                    stop_place = stop_places[getId(codespace, StopPlace, parent_station)]
-                else:
-                    # Last resort, fake an instance if it does not exist.
-                    stop_place = StopPlace(
-                        id=stop_place_id,
-                        version=version,
-                        name=getRequiredString(stop_name),
-                        public_code=PublicCodeStructure(value=stop_code) if stop_code is not None else None,
-                        description=getOptionalString(stop_desc),
-                        private_codes=PrivateCodes(private_code=[PrivateCode(value=stop_id, type_value="stop_id")]) if location_type == 1 else None,
-                        locale=Locale(time_zone=stop_timezone) if stop_timezone is not None else None,
-                        parent_zone_ref=ZoneRefStructure(ref=zone_id, version_ref="EXTERNAL") if zone_id is not None else None,
-                        accessibility_assessment=(
-                            AccessibilityAssessment(
-                                id=getId(codespace, AccessibilityAssessment, 'StopPlace_' + stop_id),
-                                version=version,
-                                mobility_impaired_access=wheelchairToNeTEx(wheelchair_boarding),
-                            )
-                            if wheelchair_boarding is not None
-                            else None
-                        ),
-                        info_links=(
-                            InfoLinksRelStructure(info_link=[InfoLink(type_of_info_link=[TypeOfInfoLinkEnumeration.RESOURCE], value=stop_url)])
-                            if stop_url is not None
-                            else None
-                        ),
-                        centroid=SimplePointVersionStructure(
-                            location=LocationStructure2(
-                                latitude=Decimal(str(stop_lat)), longitude=Decimal(str(stop_lon)), srs_name="urn:ogc:def:crs:EPSG::4326"
-                            )
-                        ),
-                    )
-                    stop_places[stop_place_id] = stop_place
+                stop_place = _stop_place(codespace, version, getId(codespace, StopPlace, stop_id), row)
+
+            elif stop_place is None:
+                # Last resort, fake an instance if it does not exist.
+                stop_place = _stop_place(codespace, version, getId(codespace, StopPlace, parent_station), row)
 
             if location_type == 1:
                 # Nothing to do, we already created the StopPlace
@@ -173,16 +177,6 @@ def getStopPlaces(con: duckdb.DuckDBPyConnection, codespace: Codespace, version:
 
                 stop_place.quays.taxi_stand_ref_or_quay_ref_or_quay.append(quay)
 
-                passenger_stop_assignment = PassengerStopAssignment(
-                    id=getId(codespace, PassengerStopAssignment, stop_id),
-                    version=version,
-                    fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point=getFakeRef(
-                        getId(codespace, ScheduledStopPoint, stop_id), ScheduledStopPointRef, version
-                    ),
-                    taxi_stand_ref_or_quay_ref_or_quay=cast(Union[TaxiStandRef, QuayRef, Quay], getRef(quay)),
-                )
-                passenger_stop_assignments.append(passenger_stop_assignment)
-
             elif location_type == 2:
                 # Entrance or Exit
                 if stop_place.entrances is None:
@@ -252,4 +246,21 @@ def getStopPlaces(con: duckdb.DuckDBPyConnection, codespace: Codespace, version:
 
                 stop_place.access_spaces.access_space_ref_or_access_space.append(access_space)
 
-    return list(stop_places.values()), passenger_stop_assignments
+        if stop_place is not None:
+            yield stop_place
+
+
+def getPassengerStopAssignments(con: duckdb.DuckDBPyConnection, codespace: Codespace, version: str) -> Generator[PassengerStopAssignment, None, None]:
+    """The assignment of every stop that becomes a Quay in getStopPlaces() to its ScheduledStopPoint."""
+    with con.cursor() as cur:
+        cur.execute("SELECT DISTINCT stop_id FROM stops WHERE location_type = 0 OR location_type = 4 ORDER BY stop_id;")
+
+        for (stop_id,) in fetch_rows(cur):
+            yield PassengerStopAssignment(
+                id=getId(codespace, PassengerStopAssignment, stop_id),
+                version=version,
+                fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point=getFakeRef(
+                    getId(codespace, ScheduledStopPoint, stop_id), ScheduledStopPointRef, version
+                ),
+                taxi_stand_ref_or_quay_ref_or_quay=getFakeRef(getId(codespace, Quay, stop_id), QuayRef, version),
+            )
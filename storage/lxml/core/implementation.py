@@ -34,6 +34,18 @@ class XmlStorage:
                 if l_zip_filename.endswith(".xml.gz") or l_zip_filename.endswith(".xml"):
                     yield zip_file.open(zip_filename), str(zip_filename)
 
+    def open_netex_member(self, name: str) -> IO[Any]:
+        """Open a single XML(.gz) file, by a name from list_netex_files()."""
+        if str(self.path).endswith(".xml.gz"):
+            return igzip_threaded.open(self.path, "rb", compresslevel=3, threads=3)  # type: ignore
+        elif str(self.path).endswith(".xml"):
+            return self.path.open("rb")
+        elif str(self.path).endswith(".zip"):
+            # The member shares the file of the archive, which is closed with the member once the archive is closed
+            with zipfile.ZipFile(self.path) as zip_file:
+                return zip_file.open(name)
+        raise ValueError(f"{self.path} is not a NeTEx file")
+
     def __init__(self, path: Path, readonly: bool = True):
         if readonly and not path.exists():
             raise
@@ -0,0 +1,170 @@
+import logging
+import multiprocessing as mp
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from io import StringIO, TextIOBase
+from typing import Any, Iterator
+
+from xsdata.formats.dataclass.serializers import XmlSerializer
+from xsdata.formats.dataclass.serializers.config import SerializerConfig
+from xsdata.formats.dataclass.serializers.mixins import EventIterator
+from xsdata.formats.dataclass.serializers.writers import XmlEventWriter
+from xsdata.utils import namespaces
+
+from utils.aux_logging import log_all
+
+MEMBER = "member"
+
+# The containers in a frame whose children are the members of the frame, which are generated from the database
+MEMBER_CONTAINERS = ("InFrameRelStructure", "GeneralFrameMembersRelStructure")
+
+# A member as it is handed to convert_member(): the object, namespace, qname, nillable and xsi_type of convert_dataclass()
+Member = tuple[Any, str | None, str | None, bool, str | None]
+
+
+def is_member_container(obj: Any) -> bool:
+    return type(obj).__name__.endswith(MEMBER_CONTAINERS)
+
+
+class FragmentWriter(XmlEventWriter):
+    """
+    An XmlEventWriter for the members of one container, without a document around them. It starts in the state the
+    writer of the whole document is in at the container: the same namespace prefixes, already declared, and the same
+    indentation level. A member is then rendered exactly as it would have been in place.
+    """
+
+    def __init__(self, config: SerializerConfig, ns_map: dict[str | None, str], level: int):
+        super().__init__(config, StringIO(), ns_map.copy())
+        self.ns_context = [self.ns_map]
+        self.current_level = level
+        # XMLGenerator has no public way to take prefixes as already declared, its private state is set instead. Every
+        # prefix in ns_map is declared at the container, as uri -> prefix.
+        if not (hasattr(self.handler, "_current_context") and hasattr(self.handler, "_ns_contexts")):
+            raise RuntimeError(f"{type(self.handler).__name__} does not keep its namespace context where FragmentWriter expects it")
+        self.handler._current_context = {uri: prefix for prefix, uri in ns_map.items()}  # type: ignore[attr-defined]
+        self.handler._ns_contexts = [self.handler._current_context]  # type: ignore[attr-defined]
+
+    def start_document(self) -> None:
+        pass
+
+    def end_document(self) -> None:
+        pass
+
+    def render(self, events: EventIterator) -> str:
+        self.output.truncate(0)
+        self.output.seek(0)
+        self.write(events)
+        return self.output.getvalue()  # type: ignore[attr-defined]
+
+
+worker_serializer: XmlSerializer | None = None
+
+
+def initialize_worker(config: SerializerConfig) -> None:
+    global worker_serializer
+    worker_serializer = XmlSerializer(config=config)
+
+
+def render_members(ns_map: dict[str | None, str], level: int, members: list[Member]) -> list[str]:
+    """Render the members of one container to fragments, in a process started by FrameSerializer.write()."""
+    assert worker_serializer is not None
+    writer = FragmentWriter(worker_serializer.config, ns_map, level)
+    return [writer.render(worker_serializer.convert_dataclass(*member)) for member in members]
+
+
+@dataclass
+class FrameSerializer(XmlSerializer):
+    """
+    An XmlSerializer for a PublicationDelivery with frames of which the members are generators over the database. The
+    envelope is generated as usual, but in a member container every member is handed to write() as a separate member
+    event, and generated by convert_member() into the XmlEventWriter before the next member is taken from the generator.
+    Only the member that is being written is held in memory, the output is the same as that of XmlSerializer.
+
+    With jobs > 1, the members are rendered to fragments in batches of batch_size by a pool of processes, and the
+    fragments are written in the order of the members. At most jobs * 2 batches are waiting to be written.
+    """
+
+    jobs: int = 1
+    batch_size: int = 256
+    members: int = field(default=0, init=False)
+    _containers: list[bool] = field(default_factory=list, init=False)
+
+    def write(self, out: TextIOBase, obj: Any, ns_map: dict[str | None, str] | None = None) -> None:
+        self.members = 0
+        self._containers = []
+        started = time.perf_counter()
+
+        handler = self.writer(config=self.config, output=out, ns_map=namespaces.clean_prefixes(ns_map) if ns_map else {})
+        if self.jobs > 1:
+            assert isinstance(handler, XmlEventWriter), "Only the members of an XmlEventWriter can be rendered in parallel"
+            with ProcessPoolExecutor(max_workers=self.jobs, mp_context=mp.get_context("spawn"), initializer=initialize_worker, initargs=(self.config,)) as executor:
+                handler.write(self.write_members_parallel(self.generate(obj), handler, executor))
+        else:
+            handler.write(self.write_members(self.generate(obj)))
+
+        duration = time.perf_counter() - started
+        log_all(logging.INFO, f"[xml] {self.members} members written in {duration:.1f}s, {self.members / max(duration, 1e-9):.0f} members/s")
+
+    def write_members(self, events: EventIterator) -> Iterator[tuple[Any, ...]]:
+        for event in events:
+            if event[0] == MEMBER:
+                self.members += 1
+                yield from self.convert_member(*event[1:])
+            else:
+                yield event
+
+    def write_members_parallel(self, events: EventIterator, handler: XmlEventWriter, executor: Executor) -> Iterator[tuple[Any, ...]]:
+        pending: deque[Future[list[str]]] = deque()
+        batch: list[Member] = []
+        state: tuple[dict[str | None, str], int] | None = None
+
+        def write_fragments(fragments: list[str]) -> None:
+            for fragment in fragments:
+                handler.handler.ignorableWhitespace(fragment)
+                # As the end tag of a member written by the handler itself
+                handler.pending_end_element = True
+
+        for event in events:
+            if event[0] == MEMBER:
+                if state is None:
+                    # Write the start tag of the container, as the start tag of its first member would
+                    handler.flush_start(False)
+                    state = (handler.ns_map, handler.current_level)
+
+                self.members += 1
+                batch.append(event[1:])
+                if len(batch) == self.batch_size:
+                    pending.append(executor.submit(render_members, *state, batch))
+                    batch = []
+                    while len(pending) > self.jobs * 2:
+                        write_fragments(pending.popleft().result())
+                continue
+
+            if state is not None:
+                # The end of the container: every member must be written before it
+                if batch:
+                    pending.append(executor.submit(render_members, *state, batch))
+                    batch = []
+                while pending:
+                    write_fragments(pending.popleft().result())
+                state = None
+
+            yield event
+
+    def convert_member(self, obj: Any, namespace: str | None, qname: str | None, nillable: bool, xsi_type: str | None) -> EventIterator:
+        self._containers.append(False)
+        yield from super().convert_dataclass(obj, namespace, qname, nillable, xsi_type)
+        self._containers.pop()
+
+    def convert_dataclass(
+        self, obj: Any, namespace: str | None = None, qname: str | None = None, nillable: bool = False, xsi_type: str | None = None
+    ) -> EventIterator:
+        if self._containers and self._containers[-1]:
+            yield MEMBER, obj, namespace, qname, nillable, xsi_type  # type: ignore[misc]
+            return
+
+        self._containers.append(is_member_container(obj))
+        yield from super().convert_dataclass(obj, namespace, qname, nillable, xsi_type)
+        self._containers.pop()
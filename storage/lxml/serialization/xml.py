@@ -1,22 +1,22 @@
 from pathlib import Path
 
 from isal import igzip_threaded
-from xsdata.formats.dataclass.serializers import XmlSerializer
 from xsdata.formats.dataclass.serializers.config import SerializerConfig
 from xsdata.formats.dataclass.serializers.writers import XmlEventWriter
 import zipfile
 import io
 from domain.netex.model import PublicationDelivery
+from storage.lxml.serialization.framewriter import FrameSerializer
 
 
 def export_publication_delivery_xml(
-    publication_delivery: PublicationDelivery, output_filename: Path
+    publication_delivery: PublicationDelivery, output_filename: Path, jobs: int = 1
 ) -> None:
     serializer_config = SerializerConfig(
         ignore_default_attributes=True, xml_declaration=True, pretty_print=True
     )
     serializer_config.ignore_default_attributes = True
-    serializer = XmlSerializer(config=serializer_config, writer=XmlEventWriter)
+    serializer = FrameSerializer(config=serializer_config, writer=XmlEventWriter, jobs=jobs)
 
     ns_map = {
         "": "http://www.netex.org.uk/netex",
@@ -0,0 +1,61 @@
+from collections import OrderedDict
+
+from mdbx.mdbx import TXN
+
+from domain.netex.model import EntityStructure
+
+
+class ObjectCache:
+    """
+    A bounded LRU cache of decoded objects by full key, for a single transaction: it is emptied as soon as it is used
+    with another transaction, and an insert in the transaction invalidates the object it writes.
+
+    The objects are shared copy-on-write: every caller that asks for a shared object may get the same instance, so it
+    must not be changed. A caller that changes an object loads it without shared=True, which decodes a private copy
+    and does not touch the cache, or copies the shared object with copy.deepcopy() before changing it.
+    """
+
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._objects: OrderedDict[bytes, EntityStructure] = OrderedDict()
+        # Keeping the transaction alive guarantees that another transaction is never mistaken for it
+        self._txn: TXN | None = None
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    def __repr__(self) -> str:
+        return f"ObjectCache({len(self._objects)}/{self.maxsize} objects, {self.hits} hits, {self.misses} misses)"
+
+    def _bind(self, txn: TXN) -> None:
+        if txn is not self._txn:
+            self._objects.clear()
+            self._txn = txn
+
+    def get(self, txn: TXN, full_key: bytes) -> EntityStructure | None:
+        self._bind(txn)
+        obj = self._objects.get(full_key)
+        if obj is None:
+            self.misses += 1
+            return None
+
+        self._objects.move_to_end(full_key)
+        self.hits += 1
+        return obj
+
+    def put(self, txn: TXN, full_key: bytes, obj: EntityStructure) -> None:
+        self._bind(txn)
+        self._objects[full_key] = obj
+        self._objects.move_to_end(full_key)
+        if len(self._objects) > self.maxsize:
+            self._objects.popitem(last=False)
+
+    def invalidate(self, txn: TXN, full_key: bytes) -> None:
+        if txn is self._txn:
+            self._objects.pop(full_key, None)
+
+    def clear(self) -> None:
+        self._objects.clear()
+        self._txn = None
@@ -0,0 +1,114 @@
+import logging
+
+import zstandard
+from mdbx import MDBXDBFlags
+from mdbx.mdbx import TXN
+
+from domain.netex.model import EntityStructure
+from storage.mdbx.core.implementation import MdbxStorage, DB_METADATA, DB_METADATA_FLAGS, METADATA_DICTIONARY
+from storage.objectserializer.codecs.zstd import ZstdCodec
+from utils.aux_logging import log_all
+
+
+def train_dictionaries(
+    storage: MdbxStorage,
+    min_records: int = 1_000,
+    max_samples: int = 10_000,
+    dictionary_size: int = 64 * 1024,
+    batch_size: int = 10_000,
+) -> None:
+    """
+    Train a zstd dictionary for every class map with at least min_records objects, keep it in the metadata map and
+    recompress the class map against it. A class map that already has a dictionary is not trained again, only the
+    records compressed without it, for example by a producer process that does not know the dictionaries, are
+    recompressed. The records are recompressed in a transaction per batch_size records. Requires a database with a
+    zstd object serializer, for other databases this does nothing.
+    """
+
+    if storage.serializer.zstd_codec is None:
+        log_all(logging.INFO, f"[dictionaries] {storage.object_serializer_name} does not use zstd, not training")
+        return
+
+    with storage.env.ro_transaction() as txn:
+        classes = list(storage.db_names(txn).items())
+
+    for class_idx, clazz in classes:
+        codec = storage.serializer.class_zstd_codec(clazz)
+        if codec is None:
+            continue
+
+        if codec.dictionary_id == 0:
+            # The dictionary is committed before any record that is compressed against it
+            with storage.env.rw_transaction() as txn:
+                dictionary = _train_dictionary(storage, txn, class_idx, codec, min_records, max_samples, dictionary_size)
+                if dictionary is None:
+                    continue
+
+                db_metadata = txn.create_map(name=DB_METADATA, flags=DB_METADATA_FLAGS)
+                db_metadata.put(txn, METADATA_DICTIONARY + class_idx, dictionary)
+                txn.commit()
+
+            storage.serializer.set_dictionary(clazz, dictionary)
+
+        before, after = _recompress(storage, class_idx, clazz, batch_size)
+        if before:
+            log_all(logging.INFO, f"[dictionaries] {clazz.__name__} recompressed {before} to {after} bytes")
+
+
+def _train_dictionary(
+    storage: MdbxStorage, txn: TXN, class_idx: bytes, codec: ZstdCodec, min_records: int, max_samples: int, dictionary_size: int
+) -> bytes | None:
+    db = txn.open_map(name=class_idx, flags=MDBXDBFlags.MDBX_DB_DEFAULTS)
+    entries = db.get_stat(txn).ms_entries
+    if entries < min_records:
+        return None
+
+    # Spread the samples over the class map, the first records are often all from the same file
+    step = max(1, entries // max_samples)
+    samples = []
+    with txn.cursor(db) as cursor:
+        for i, (_key, value) in enumerate(cursor.iter()):
+            if i % step == 0:
+                samples.append(codec.decode(value))
+
+    try:
+        return ZstdCodec.train(samples, dictionary_size)
+    except zstandard.ZstdError as e:
+        log_all(logging.WARNING, f"[dictionaries] {storage.idx_class[class_idx].__name__} could not be trained: {e}")
+        return None
+
+
+def _recompress(storage: MdbxStorage, class_idx: bytes, clazz: type[EntityStructure], batch_size: int) -> tuple[int, int]:
+    codec = storage.serializer.class_zstd_codec(clazz)
+    assert codec is not None
+
+    before = after = 0
+    start_key: bytes | None = None
+    while True:
+        # A transaction per batch, so a large class map does not need all of its pages dirty at once
+        with storage.env.rw_transaction() as txn:
+            db = txn.open_map(name=class_idx, flags=MDBXDBFlags.MDBX_DB_DEFAULTS)
+
+            # Values are not written while the cursor is iterating, but per batch
+            batch = []
+            with txn.cursor(db) as cursor:
+                for key, value in cursor.iter(start_key=start_key):
+                    if key == start_key:
+                        continue
+                    batch.append((key, value))
+                    if len(batch) >= batch_size:
+                        break
+
+            if not batch:
+                return before, after
+
+            for key, value in batch:
+                if ZstdCodec.frame_dictionary_id(value) != codec.dictionary_id:
+                    recompressed = codec.encode(codec.decode(value))
+                    storage._put_value(txn, db, class_idx, key, recompressed)
+                    before += len(value)
+                    after += len(recompressed)
+
+            txn.commit()
+
+        start_key = batch[-1][0]
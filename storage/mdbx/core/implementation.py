@@ -1,11 +1,15 @@
+import ctypes
+import hashlib
 import logging
 from collections import defaultdict
+from enum import Enum
 from pathlib import Path
 from types import TracebackType
-from typing import Optional, Type, Literal, Iterable, Generator, Self
+from typing import Any, Callable, Optional, Type, Literal, Iterable, Generator, Self, Sequence, cast
 
 from mdbx import Env, MDBXDBFlags
-from mdbx.mdbx import TXN
+import mdbx.mdbx as mdbx_bindings
+from mdbx.mdbx import TXN, DBI, Cursor, MDBXCursorOp, MDBXError, Iovec
 
 from domain.netex.model import (
     VersionOfObjectRefStructure,
@@ -16,10 +20,14 @@ from domain.netex.model import (
     DayTypeAssignment,
 )
 from domain.netex.services.model_typing import Tid
-from domain.netex.services.recursive_attributes import only_references
+from domain.netex.services.recursive_attributes import only_references, only_embedding
 from domain.netex.services.utils import get_boring_classes
 from domain.utils import get_object_name
-from storage.mdbx.serialization.combinedserializer import CombinedSerializer
+from storage.mdbx.core.cache import ObjectCache
+from storage.mdbx.core.keyset import KeySet
+from storage.mdbx.serialization.combinedserializer import CombinedSerializer, OBJECT_SERIALIZERS, DEFAULT_OBJECT_SERIALIZER
+from storage.objectserializer.schema.serializer import Schema
+from utils.attribute_path import safe_attrgetter, attribute_path_field
 from utils.aux_logging import log_all
 from storage.interface import Serializer
 
@@ -29,13 +37,65 @@ DB_ID_IDX = bytes(b'_id_idx')
 DB_REFERENCE_OUTWARD = bytes(b'_reference_outward')
 DB_REFERENCE_INWARD = bytes(b'_reference_inwards')
 DB_EMBEDDED_ID_IDX = bytes(b'_embedded_id_idx')
+DB_METADATA = bytes(b'_metadata')
+DB_ATTRIBUTE_IDX = bytes(b'_attribute_idx')
 
 DB_UNRESOLVED_FLAGS = MDBXDBFlags.MDBX_INTEGERKEY | MDBXDBFlags.MDBX_DUPSORT
 DB_ID_IDX_FLAGS = MDBXDBFlags.MDBX_DB_DEFAULTS
 DB_EMBEDDED_ID_IDX_FLAGS = MDBXDBFlags.MDBX_DB_DEFAULTS
+DB_METADATA_FLAGS = MDBXDBFlags.MDBX_DB_DEFAULTS
+DB_ATTRIBUTE_IDX_FLAGS = MDBXDBFlags.MDBX_DUPSORT | MDBXDBFlags.MDBX_DUPFIXED
+
+METADATA_OBJECT_SERIALIZER = b'object_serializer'
+METADATA_SCHEMA = b'schema\n'
+METADATA_DICTIONARY = b'dictionary\n'
+METADATA_ATTRIBUTE_INDEX = b'attribute_index\n'
+METADATA_INDEX = b'index\n'
+
+# Written for every index that is maintained on insert, a map without it is stale: see MdbxStorage._open_index()
+INDEX_VERSION = b'1'
+
+# Attribute values longer than this are indexed by their hash, mdbx keys are limited in size
+ATTRIBUTE_VALUE_MAX_LENGTH = 256
 DB_REFERENCE_OUTWARD_FLAGS = MDBXDBFlags.MDBX_INTEGERKEY | MDBXDBFlags.MDBX_DUPSORT | MDBXDBFlags.MDBX_DUPFIXED | MDBXDBFlags.MDBX_INTEGERDUP
 DB_REFERENCE_INWARD_FLAGS = MDBXDBFlags.MDBX_INTEGERKEY | MDBXDBFlags.MDBX_DUPSORT | MDBXDBFlags.MDBX_DUPFIXED | MDBXDBFlags.MDBX_INTEGERDUP
 
+# Keys loaded at once by the reference closures, see MdbxStorage.load_objects_by_full_keys()
+CLOSURE_BATCH_SIZE = 100_000
+
+# Encoded id, encoded references, embedded keys and the marshalled value of an object, see MdbxStorage.prepare_object()
+InsertRecord = tuple[bytes, list[bytes], list[bytes], bytes]
+
+
+# The key only cursor walk below uses private parts of the mdbx bindings (_lib, make_exception and Cursor._cursor), as
+# in libmdbx 0.3.2. When a release drops any of them, _iter_keys() falls back to the public Cursor.iter().
+_raw_cursor_get = getattr(getattr(mdbx_bindings, "_lib", None), "mdbx_cursor_get", None)
+_make_exception = getattr(mdbx_bindings, "make_exception", None)
+
+
+def _iter_keys(cursor: Cursor) -> Generator[bytes, None, None]:
+    """
+    The keys of the map of cursor, in order. Cursor.iter() copies every value into bytes, for a class map the whole
+    marshalled object, here only the key is copied.
+    """
+    raw_cursor = getattr(cursor, "_cursor", None)
+    if _raw_cursor_get is None or _make_exception is None or raw_cursor is None:
+        for key, _value in cursor.iter():
+            yield key
+        return
+
+    io_key = Iovec()
+    io_data = Iovec()
+    cursor_op = MDBXCursorOp.MDBX_FIRST
+    while True:
+        ret = _raw_cursor_get(raw_cursor, ctypes.byref(io_key), ctypes.byref(io_data), cursor_op)
+        if ret == MDBXError.MDBX_NOTFOUND:
+            return
+        if ret != MDBXError.MDBX_SUCCESS.value:
+            raise _make_exception(ret)
+        yield ctypes.string_at(io_key.iov_base, io_key.iov_len)
+        cursor_op = MDBXCursorOp.MDBX_NEXT
+
 
 class MdbxStorage:
     readonly: bool
@@ -44,8 +104,12 @@ class MdbxStorage:
     class_idx: dict[type[EntityStructure], bytes]
     idx_class: dict[bytes, type[EntityStructure]]
     class_name_idx: dict[str, bytes]
+    # By class idx, the getters of the attribute paths that are indexed, see create_attribute_index()
+    attribute_indexes: dict[bytes, dict[str, Callable[[object], Any]]]
+    # Opt-in, see enable_object_cache()
+    object_cache: ObjectCache | None
 
-    def __init__(self, path: Path, readonly: bool = True, initial_size: int = 8 * 1024**3):
+    def __init__(self, path: Path, readonly: bool = True, initial_size: int = 8 * 1024**3, object_serializer: str = DEFAULT_OBJECT_SERIALIZER):
         if readonly and not path.exists():
             raise
 
@@ -56,8 +120,14 @@ class MdbxStorage:
         self.class_idx = {}
         self.idx_class = {}
         self.class_name_idx = {}
+        self.attribute_indexes = {}
+        self.object_cache = None
         self.serializer = CombinedSerializer(get_boring_classes())
 
+        # Only used when the database is created or cleaned, an existing database keeps what it was written with.
+        self.new_object_serializer = object_serializer
+        self.object_serializer_name = DEFAULT_OBJECT_SERIALIZER
+
     def _populate_class_idx(self) -> None:
         if self.readonly:
             raise
@@ -71,17 +141,89 @@ class MdbxStorage:
             txn.create_map(name=DB_UNRESOLVED, flags=DB_UNRESOLVED_FLAGS)
             txn.create_map(name=DB_ID_IDX, flags=DB_ID_IDX_FLAGS)
             txn.create_map(name=DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)
+            txn.create_map(name=DB_EMBEDDED_ID_IDX, flags=DB_EMBEDDED_ID_IDX_FLAGS)
+            txn.create_map(name=DB_REFERENCE_INWARD, flags=DB_REFERENCE_INWARD_FLAGS)
+            with txn.create_map(name=DB_METADATA, flags=DB_METADATA_FLAGS) as db_metadata:
+                db_metadata.put(txn, METADATA_OBJECT_SERIALIZER, self.new_object_serializer.encode('utf-8'))
+                # Empty, and maintained from the first insert on
+                db_metadata.put(txn, METADATA_INDEX + DB_EMBEDDED_ID_IDX, INDEX_VERSION)
+                db_metadata.put(txn, METADATA_INDEX + DB_REFERENCE_INWARD, INDEX_VERSION)
             txn.commit()
 
     def _restore_class_idx(self) -> None:
         with self.env.ro_transaction() as txn:
             with txn.open_map(name=DB_CLASS_IDX, flags=DB_ID_IDX_FLAGS) as db_class_idx:
                 with txn.cursor(db_class_idx) as cur:
-                    for idx, name in cur.iter():
-                        clazz = self.serializer.name_object[name.decode('utf-8')]
-                        self.idx_class[idx] = clazz
-                        self.class_name_idx[get_object_name(clazz)] = idx
-                        self.class_idx[clazz] = idx
+                    self._set_class_idx({name.decode('utf-8'): idx for idx, name in cur.iter()})
+
+    def _restore_metadata(self) -> None:
+        schemas: list[bytes] = []
+        dictionaries: dict[bytes, bytes] = {}
+        attribute_indexes: list[bytes] = []
+        object_serializer = DEFAULT_OBJECT_SERIALIZER
+        with self.env.ro_transaction() as txn:
+            db_metadata = self._open_optional_map(txn, DB_METADATA, DB_METADATA_FLAGS)
+            if db_metadata is not None:
+                value = db_metadata.get(txn, METADATA_OBJECT_SERIALIZER)
+                if value is not None:
+                    object_serializer = value.decode('utf-8')
+
+                with txn.cursor(db_metadata) as cur:
+                    for key, value in cur.iter(METADATA_SCHEMA):
+                        if not key.startswith(METADATA_SCHEMA):
+                            break
+                        schemas.append(value)
+
+                    for key, value in cur.iter(METADATA_DICTIONARY):
+                        if not key.startswith(METADATA_DICTIONARY):
+                            break
+                        dictionaries[key[len(METADATA_DICTIONARY) :]] = value
+
+                    for key, _value in cur.iter(METADATA_ATTRIBUTE_INDEX):
+                        if not key.startswith(METADATA_ATTRIBUTE_INDEX):
+                            break
+                        attribute_indexes.append(key[len(METADATA_ATTRIBUTE_INDEX) :])
+
+        self._set_object_serializer(object_serializer)
+
+        self.attribute_indexes = {}
+        for attribute_index in attribute_indexes:
+            # The class idx is two bytes, followed by the path
+            self.attribute_indexes.setdefault(attribute_index[:2], {})[attribute_index[2:].decode('utf-8')] = safe_attrgetter(
+                attribute_index[2:].decode('utf-8'), set()
+            )
+
+        for class_idx, dictionary in dictionaries.items():
+            clazz = self.idx_class.get(class_idx)
+            if clazz is not None:
+                self.serializer.set_dictionary(clazz, dictionary)
+
+        schema_serializer = self.serializer.schema_serializer
+        if schema_serializer is not None:
+            for schema in schemas:
+                schema_serializer.register_schema(Schema.from_bytes(schema))
+
+            # Records written from now on refer to the current schema, it must be kept to read them after a model change.
+            if not self.readonly and schema_serializer.schema.to_bytes() not in schemas:
+                with self.env.rw_transaction() as txn:
+                    db_metadata = txn.create_map(name=DB_METADATA, flags=DB_METADATA_FLAGS)
+                    db_metadata.put(txn, METADATA_SCHEMA + schema_serializer.schema.fingerprint.to_bytes(4, 'big'), schema_serializer.schema.to_bytes())
+                    txn.commit()
+
+    def _set_object_serializer(self, name: str) -> None:
+        if name not in OBJECT_SERIALIZERS:
+            raise ValueError(f"{self.path} is written with the unknown object serializer {name}")
+
+        self.object_serializer_name = name
+        self.serializer.object_serializer = OBJECT_SERIALIZERS[name]()
+        self.serializer.class_object_serializers = {}
+
+    def _set_class_idx(self, class_name_idx: dict[str, bytes]) -> None:
+        for name, idx in class_name_idx.items():
+            clazz = self.serializer.name_object[name]
+            self.idx_class[idx] = clazz
+            self.class_name_idx[get_object_name(clazz)] = idx
+            self.class_idx[clazz] = idx
 
         self.serializer.set_class_idx(self.class_idx)
 
@@ -102,6 +244,7 @@ class MdbxStorage:
             self._populate_class_idx()
 
         self._restore_class_idx()
+        self._restore_metadata()
 
         return self
 
@@ -120,7 +263,7 @@ class MdbxStorage:
             txn = self.env.ro_transaction()
         with txn.cursor(db=None) as cur:
             for db_name, _ in cur.iter():
-                if db_name in (DB_CLASS_IDX, DB_UNRESOLVED, DB_ID_IDX, DB_UNRESOLVED, DB_REFERENCE_OUTWARD):
+                if db_name in (DB_CLASS_IDX, DB_UNRESOLVED, DB_ID_IDX, DB_UNRESOLVED, DB_REFERENCE_OUTWARD, DB_REFERENCE_INWARD, DB_EMBEDDED_ID_IDX, DB_METADATA, DB_ATTRIBUTE_IDX):
                     continue
 
                 clazz = self.idx_class.get(db_name, None)
@@ -131,7 +274,7 @@ class MdbxStorage:
     def db_names_iter(self, txn: TXN) -> Generator[type[EntityStructure], None, None]:
         with txn.cursor(db=None) as cur:
             for db_name, _ in cur.iter():
-                if db_name in (DB_CLASS_IDX, DB_UNRESOLVED, DB_ID_IDX, DB_UNRESOLVED, DB_REFERENCE_OUTWARD):
+                if db_name in (DB_CLASS_IDX, DB_UNRESOLVED, DB_ID_IDX, DB_UNRESOLVED, DB_REFERENCE_OUTWARD, DB_REFERENCE_INWARD, DB_EMBEDDED_ID_IDX, DB_METADATA, DB_ATTRIBUTE_IDX):
                     continue
 
                 clazz = self.idx_class.get(db_name, None)
@@ -148,77 +291,61 @@ class MdbxStorage:
                         dbi.drop(txn, delete=True)
             txn.commit()
         self._populate_class_idx()
+        self._restore_metadata()
 
     def fetch_all_references_by_class(
-        self, txn: TXN, clazzes: set[type[EntityStructure]], skip_existing: bool = False
+        self, txn: TXN, clazzes: set[type[EntityStructure]], skip_existing: bool = False, max_chunks: int | None = None
     ) -> Generator[EntityStructure, None, None]:
         # Scan for all collected objects, this delivers their keys, a full key needs to be created for the lookup in reference outward
         # Referenced objects may by itself introduce new references, hence it should be checked if the set contains (already) those
         # When the scan is complete, all referenced objects should be made available via the generator.
+        # The keys to yield are kept in a KeySet, see KeySet for max_chunks, the frontier is processed one level at a time.
 
         # TODO: filter clazzes on the classes that are actually in the database, this limits the set.
 
-        yielded_set: set[bytes] = set([])
-        partial: set[bytes] = set([])
+        with KeySet(max_chunks, self.path.parent) as yielded_set:
+            partial: list[bytes] = []
 
-        db_reference_outward = txn.open_map(DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)
-        cursor = txn.cursor(db_reference_outward)
-        for it in cursor.iter_dupsort_rows():
-            for referencing_key, reference_key in it:
-                referencing_class_idx = Serializer.full_key_to_clazz(referencing_key)
-                reference_class_idx = Serializer.full_key_to_clazz(reference_key)
-
-                # print(self.idx_class[referencing_class_idx], "->", self.idx_class[reference_class_idx])
-
-                if self.idx_class[referencing_class_idx] in clazzes:
-                    # if self.idx_class[reference_class_idx] not in clazzes:
-                    if reference_key not in yielded_set:
-                        yielded_set.add(reference_key)
+            db_reference_outward = txn.open_map(DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)
+            cursor = txn.cursor(db_reference_outward)
+            for it in cursor.iter_dupsort_rows():
+                for referencing_key, reference_key in it:
+                    referencing_class_idx = Serializer.full_key_to_clazz(referencing_key)
 
+                    if self.idx_class[referencing_class_idx] in clazzes:
                         # Why is this separate: we don't want to expose objects that we already export,
                         # but we do want to search if there are any references used.
-                        partial.add(reference_key)
-                    # print(self.idx_class[referencing_class_idx], "->", self.idx_class[reference_class_idx])
-                else:
-                    # print(self.idx_class[referencing_class_idx])
-                    pass
-
-        # Our selected objects may contain references themselves, obviously we need to have those too
-        partial_new: set[bytes]
-
-        while True:
-            partial_new = set([])
-            for referencing_key in partial:
-                referencing_class_idx = Serializer.full_key_to_clazz(referencing_key)
-                for t in cursor.iter_dupsort_rows(start_key=referencing_key):
-                    for referencing_key2, reference_key in t:
-                        # referencing_class_idx2 = Serializer.full_key_to_clazz(referencing_key2) # TODO: Waarom stond deze hier?
-                        # we skip when we can't find a matching key
-                        if referencing_key2 != referencing_key:
-                            break
-                        reference_class_idx = Serializer.full_key_to_clazz(reference_key)
-                        if self.idx_class[reference_class_idx] not in clazzes:
-                            if reference_key not in partial_new and reference_key not in yielded_set:
-                                partial_new.add(reference_key)
-                    break  # We only want the single needle, which is found by the start_key.
-            if len(partial_new) == 0:
-                break
-            else:
-                yielded_set.update(partial_new)
-                partial = partial_new.copy()
-
-        # TODO: we are still missing the objects that are referenced from the reference
-
-        for full_reference in yielded_set:
-            # TODO: We can optimise this by grouping the objects per class, and then fetch the groups in one access pattern
-            obj = self.load_object_by_full_key(txn, full_reference)
-            if obj:
-                if skip_existing:
-                    if obj.__class__ not in clazzes:
-                        log_all(logging.DEBUG, f"yielding unexpected class {obj.__class__} not in interesting classes {clazzes}")
-                        yield obj
-                else:
-                    yield obj
+                        if yielded_set.add(reference_key):
+                            partial.append(reference_key)
+
+            # Our selected objects may contain references themselves, obviously we need to have those too
+            while partial:
+                partial_new: list[bytes] = []
+                # Seeking in the integer order of the map keeps the cursor moving forward
+                for referencing_key in sorted(partial, key=lambda k: int.from_bytes(k, 'little')):
+                    for t in cursor.iter_dupsort_rows(start_key=referencing_key):
+                        for referencing_key2, reference_key in t:
+                            # we skip when we can't find a matching key
+                            if referencing_key2 != referencing_key:
+                                break
+                            reference_class_idx = Serializer.full_key_to_clazz(reference_key)
+                            if self.idx_class[reference_class_idx] not in clazzes:
+                                if yielded_set.add(reference_key):
+                                    partial_new.append(reference_key)
+                        break  # We only want the single needle, which is found by the start_key.
+                partial = partial_new
+
+            # TODO: we are still missing the objects that are referenced from the reference
+
+            for batch in yielded_set.batches(CLOSURE_BATCH_SIZE):
+                for _full_reference, obj in self.load_objects_by_full_keys(txn, batch):
+                    if obj:
+                        if skip_existing:
+                            if obj.__class__ not in clazzes:
+                                log_all(logging.DEBUG, f"yielding unexpected class {obj.__class__} not in interesting classes {clazzes}")
+                                yield obj
+                        else:
+                            yield obj
 
     # TODO: Rename
     def other_classes(self, txn: TXN, clazzes: set[type[EntityStructure]]) -> Generator[EntityStructure, None, None]:
@@ -228,6 +355,113 @@ class MdbxStorage:
         for clazz in other_classes:
             yield from self.iter_only_objects(txn, clazz)
 
+    @staticmethod
+    def _open_optional_map(txn: TXN, name: bytes, flags: int) -> DBI | None:
+        # Indices that were introduced later may not exist in older databases. They are built by their _index_* method,
+        # until then they are not maintained, and queries fall back to what they did before.
+        try:
+            return txn.open_map(name=name, flags=flags)
+        except:  # noqa: E722
+            return None
+
+    def _open_index(self, txn: TXN, name: bytes, flags: int) -> DBI | None:
+        """
+        An index that is maintained on insert, or None. A map written before it was maintained, or by a writer that did
+        not maintain it, has no INDEX_VERSION in the metadata: it is neither maintained nor read until its _index_*
+        method has rebuilt it.
+        """
+        db_metadata = self._open_optional_map(txn, DB_METADATA, DB_METADATA_FLAGS)
+        if db_metadata is None or db_metadata.get(txn, METADATA_INDEX + name) != INDEX_VERSION:
+            return None
+
+        return self._open_optional_map(txn, name, flags)
+
+    @staticmethod
+    def _mark_index(txn: TXN, name: bytes) -> None:
+        db_metadata = txn.create_map(name=DB_METADATA, flags=DB_METADATA_FLAGS)
+        db_metadata.put(txn, METADATA_INDEX + name, INDEX_VERSION)
+
+    def prepare_object(self, this_class_idx: bytes, obj: Tid, embedded_ids: bool = True) -> InsertRecord:
+        """
+        Everything an insert needs from the object itself, without touching the database: the encoded id, the encoded
+        references, the keys of the embedded objects and the marshalled value. This is the expensive part of an insert,
+        and can be computed by any process that shares the class index of this storage. Without embedded_ids, when the
+        database does not maintain the embedded id index, the embedded objects are not even walked.
+        """
+        my_id = self.serializer.encode_key_idx(str(obj.id), obj.version if hasattr(obj, "version") else None, this_class_idx)
+        references = [self.serializer.encode_key(ref, version, referenced_class) for referenced_class, ref, version in only_references(obj, self.serializer)]
+        embedded_keys = [embedded_key for embedded_key, _embedded in only_embedding(self.serializer, obj)] if embedded_ids else []
+        value = self.serializer.marshall(obj, obj.__class__)
+        return my_id, references, embedded_keys, value
+
+    def _insert_record(
+        self,
+        txn: TXN,
+        db: DBI,
+        db_unresolved: DBI,
+        db_id_idx: DBI,
+        db_reference_outward: DBI,
+        db_reference_inward: DBI | None,
+        db_embedded_id_idx: DBI | None,
+        this_class_idx: bytes,
+        record: InsertRecord,
+    ) -> None:
+        my_id, references, embedded_keys, value = record
+
+        # First: check if the id already exists, then we must overwrite.
+        full_key = db_id_idx.get(txn, my_id)
+        if full_key is not None:
+            key = Serializer.full_key_to_idx(full_key)
+            if db_reference_inward is not None:
+                for reference_key in list(self._load_references_by_fullkey(txn, full_key)):
+                    db_reference_inward.delete(txn, reference_key, full_key)
+            try:
+                db_reference_outward.delete(txn, full_key)
+            except:  # noqa: E722
+                pass
+
+            previous = db.get(txn, key) if db_embedded_id_idx is not None or this_class_idx in self.attribute_indexes else None
+            if previous is not None:
+                # The previous version of the object may have embedded objects that are no longer there.
+                if db_embedded_id_idx is not None:
+                    clazz = self.idx_class[this_class_idx]
+                    for embedded_key, _embedded in only_embedding(self.serializer, self.serializer.unmarshall(previous, clazz)):
+                        if db_embedded_id_idx.get(txn, embedded_key) == full_key:
+                            db_embedded_id_idx.delete(txn, embedded_key)
+
+                # And other attribute values
+                if this_class_idx in self.attribute_indexes:
+                    self._update_attribute_indexes(txn, this_class_idx, key, previous, False)
+        else:
+            key = db_id_idx.get_sequence(txn, 1).to_bytes(4, 'little')
+            full_key = Serializer.get_fullkey_by_class_idx(key, this_class_idx)
+
+        if this_class_idx in self.attribute_indexes:
+            self._update_attribute_indexes(txn, this_class_idx, key, value, True)
+
+        for unresolved_value in references:
+            resolved_idx = db_id_idx.get(txn, unresolved_value)
+            if resolved_idx:
+                db_reference_outward.put(txn, full_key, resolved_idx)
+                if db_reference_inward is not None:
+                    db_reference_inward.put(txn, resolved_idx, full_key)
+            else:
+                db_unresolved.put(txn, full_key, unresolved_value)
+
+        # Keep track where embedded objects can be found, so references towards them can be resolved incrementally.
+        if db_embedded_id_idx is not None:
+            for embedded_key in embedded_keys:
+                db_embedded_id_idx.put(txn, embedded_key, full_key)
+
+        self._put_value(txn, db, this_class_idx, key, value)
+        db_id_idx.put(txn, my_id, full_key)
+
+    def _put_value(self, txn: TXN, db: DBI, this_class_idx: bytes, key: bytes, value: bytes) -> None:
+        """Write the marshalled value of an object in its class map, every write goes through here so the object cache never returns the previous value."""
+        db.put(txn, key, value)
+        if self.object_cache is not None:
+            self.object_cache.invalidate(txn, Serializer.get_fullkey_by_class_idx(key, this_class_idx))
+
     def insert_any_object_on_queue(self, txn: TXN, objects: Iterable[Tid]) -> None:
         if self.readonly:
             raise
@@ -235,36 +469,14 @@ class MdbxStorage:
         db_unresolved = txn.open_map(name=DB_UNRESOLVED, flags=DB_UNRESOLVED_FLAGS)
         db_id_idx = txn.open_map(name=DB_ID_IDX, flags=DB_ID_IDX_FLAGS)
         db_reference_outward = txn.open_map(name=DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)
+        db_reference_inward = self._open_index(txn, DB_REFERENCE_INWARD, DB_REFERENCE_INWARD_FLAGS)
+        db_embedded_id_idx = self._open_index(txn, DB_EMBEDDED_ID_IDX, DB_EMBEDDED_ID_IDX_FLAGS)
 
         for obj in objects:
             this_class_idx = self.class_idx[obj.__class__]
             db = txn.create_map(name=this_class_idx)
-
-            my_id = self.serializer.encode_key_idx(str(obj.id), obj.version if hasattr(obj, "version") else None, this_class_idx)
-
-            # First: check if the id already exists, then we must overwrite.
-            full_key = db_id_idx.get(txn, my_id)
-            if full_key is not None:
-                key = Serializer.full_key_to_idx(full_key)
-                try:
-                    db_reference_outward.delete(txn, full_key)
-                except:  # noqa: E722
-                    pass
-            else:
-                key = db_id_idx.get_sequence(txn, 1).to_bytes(4, 'little')
-                full_key = Serializer.get_fullkey_by_class_idx(key, this_class_idx)
-
-            for referenced_class, ref, version in only_references(obj, self.serializer):
-                unresolved_value = self.serializer.encode_key(ref, version, referenced_class)
-                resolved_idx = db_id_idx.get(txn, unresolved_value)
-                if resolved_idx:
-                    db_reference_outward.put(txn, full_key, resolved_idx)
-                else:
-                    db_unresolved.put(txn, full_key, unresolved_value)
-
-            value = self.serializer.marshall(obj, obj.__class__)
-            db.put(txn, key, value)
-            db_id_idx.put(txn, my_id, full_key)
+            record = self.prepare_object(this_class_idx, obj, db_embedded_id_idx is not None)
+            self._insert_record(txn, db, db_unresolved, db_id_idx, db_reference_outward, db_reference_inward, db_embedded_id_idx, this_class_idx, record)
 
     # Deprecate this one
     def insert_objects_on_queue(self, klass: type[EntityStructure], objects: Iterable[EntityStructure], empty: bool = False) -> None:
@@ -272,44 +484,139 @@ class MdbxStorage:
             raise
 
         this_class_idx = self.class_idx[klass]
+        with self.env.rw_transaction() as txn:
+            embedded_ids = self._open_index(txn, DB_EMBEDDED_ID_IDX, DB_EMBEDDED_ID_IDX_FLAGS) is not None
+            self._insert_records(txn, this_class_idx, (self.prepare_object(this_class_idx, obj, embedded_ids) for obj in objects), empty)
+            txn.commit()
+
+    def insert_records_on_queue(self, this_class_idx: bytes, records: Iterable[InsertRecord], empty: bool = False) -> None:
+        """Writes records from prepare_object() in one transaction, exactly as insert_objects_on_queue() would."""
+        if self.readonly:
+            raise
 
         with self.env.rw_transaction() as txn:
-            db = txn.create_map(name=this_class_idx)
-            db_unresolved = txn.open_map(name=DB_UNRESOLVED, flags=DB_UNRESOLVED_FLAGS)
-            db_id_idx = txn.open_map(name=DB_ID_IDX, flags=DB_ID_IDX_FLAGS)
-            db_reference_outward = txn.open_map(name=DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)
+            self._insert_records(txn, this_class_idx, records, empty)
+            txn.commit()
+
+    def _insert_records(self, txn: TXN, this_class_idx: bytes, records: Iterable[InsertRecord], empty: bool = False) -> int:
+        db = txn.create_map(name=this_class_idx)
+        db_unresolved = txn.open_map(name=DB_UNRESOLVED, flags=DB_UNRESOLVED_FLAGS)
+        db_id_idx = txn.open_map(name=DB_ID_IDX, flags=DB_ID_IDX_FLAGS)
+        db_reference_outward = txn.open_map(name=DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)
+        db_reference_inward = self._open_index(txn, DB_REFERENCE_INWARD, DB_REFERENCE_INWARD_FLAGS)
+        db_embedded_id_idx = self._open_index(txn, DB_EMBEDDED_ID_IDX, DB_EMBEDDED_ID_IDX_FLAGS)
+
+        if empty:
+            db.drop(txn, delete=False)
+
+        count = 0
+        for record in records:
+            self._insert_record(txn, db, db_unresolved, db_id_idx, db_reference_outward, db_reference_inward, db_embedded_id_idx, this_class_idx, record)
+            count += 1
+
+        return count
+
+    @staticmethod
+    def _attribute_index_key(this_class_idx: bytes, path: str, value: Any) -> bytes:
+        encoded = str(value.value if isinstance(value, Enum) else value).encode('utf-8')
+        if len(encoded) > ATTRIBUTE_VALUE_MAX_LENGTH:
+            encoded = b'\x00' + hashlib.blake2b(encoded, digest_size=16).digest()
+        return this_class_idx + path.encode('utf-8') + b'\n' + encoded
+
+    def _attribute_index_keys(self, this_class_idx: bytes, value: bytes) -> set[bytes]:
+        attribute_indexes = self.attribute_indexes[this_class_idx]
+
+        # Only the fields the paths start with are decoded, safe_attrgetter reads the top level from the dict
+        fields = sorted({attribute_path_field(path) for path in attribute_indexes})
+        values = self.serializer.unmarshall_fields(value, self.idx_class[this_class_idx], fields)
+        return {
+            self._attribute_index_key(this_class_idx, path, attribute_value)
+            for path, getter in attribute_indexes.items()
+            for attribute_value in getter(values)
+            if attribute_value is not None
+        }
+
+    def _update_attribute_indexes(self, txn: TXN, this_class_idx: bytes, key: bytes, value: bytes, add: bool) -> None:
+        db_attribute_idx = txn.open_map(name=DB_ATTRIBUTE_IDX, flags=DB_ATTRIBUTE_IDX_FLAGS)
+        for attribute_index_key in self._attribute_index_keys(this_class_idx, value):
+            if add:
+                db_attribute_idx.put(txn, attribute_index_key, key)
+            else:
+                db_attribute_idx.delete(txn, attribute_index_key, key)
 
-            if empty:
-                db.drop(txn, delete=False)
+    def create_attribute_index(self, txn: TXN, clazz: type[Tid], path: str, force: bool = False) -> None:
+        """
+        Index the objects of clazz by the values at path, a safe_attrgetter path such as authority_ref.ref or
+        stop_places[].quays[].id. The index is kept in the database and maintained by every insert from then on, it is
+        only built when it is new or forced. See find().
+        """
+        if self.readonly:
+            raise
 
-            for obj in objects:
-                my_id = self.serializer.encode_key(str(obj.id), obj.version if hasattr(obj, "version") else None, obj.__class__)
+        this_class_idx = self.class_idx[clazz]
+        metadata_key = METADATA_ATTRIBUTE_INDEX + this_class_idx + path.encode('utf-8')
+        db_metadata = txn.create_map(name=DB_METADATA, flags=DB_METADATA_FLAGS)
+        if not force and db_metadata.get(txn, metadata_key) is not None:
+            return
 
-                # First: check if the id already exists, then we must overwrite.
-                full_key = db_id_idx.get(txn, my_id)
-                if full_key is not None:
-                    key = Serializer.full_key_to_idx(full_key)
-                    try:
-                        db_reference_outward.delete(txn, full_key)
-                    except:  # noqa: E722
-                        pass
-                else:
-                    key = db_id_idx.get_sequence(txn, 1).to_bytes(4, 'little')
-                    full_key = Serializer.get_fullkey_by_class_idx(key, this_class_idx)
+        # Not an empty value, the mdbx bindings do not store those
+        db_metadata.put(txn, metadata_key, path.encode('utf-8'))
+        attribute_indexes = self.attribute_indexes.setdefault(this_class_idx, {})
+        attribute_indexes[path] = safe_attrgetter(path, set())
+
+        db_attribute_idx = txn.create_map(name=DB_ATTRIBUTE_IDX, flags=DB_ATTRIBUTE_IDX_FLAGS)
+        if force:
+            prefix = this_class_idx + path.encode('utf-8') + b'\n'
+            stale: set[bytes] = set()
+            with txn.cursor(db_attribute_idx) as cursor:
+                for key, _value in cursor.iter(prefix):
+                    if not key.startswith(prefix):
+                        break
+                    stale.add(key)
+            for key in stale:
+                db_attribute_idx.delete(txn, key)
 
-                for referenced_class, ref, version in only_references(obj, self.serializer):
-                    unresolved_value = self.serializer.encode_key(ref, version, referenced_class)
-                    resolved_idx = db_id_idx.get(txn, unresolved_value)
-                    if resolved_idx:
-                        db_reference_outward.put(txn, full_key, resolved_idx)
-                    else:
-                        db_unresolved.put(txn, full_key, unresolved_value)
+        db = self._open_optional_map(txn, this_class_idx, MDBXDBFlags.MDBX_DB_DEFAULTS)
+        if db is None:
+            return
 
-                value = self.serializer.marshall(obj, klass)
-                db.put(txn, key, value)
-                db_id_idx.put(txn, my_id, full_key)
+        getter = attribute_indexes[path]
+        field = attribute_path_field(path)
+        with txn.cursor(db) as cursor:
+            for key, value in cursor.iter():
+                attribute_values = getter(self.serializer.unmarshall_fields(value, clazz, [field]))
+                for attribute_index_key in {self._attribute_index_key(this_class_idx, path, v) for v in attribute_values if v is not None}:
+                    db_attribute_idx.put(txn, attribute_index_key, key)
 
-            txn.commit()
+    def find(self, txn: TXN, clazz: type[Tid], path: str, values: Iterable[Any]) -> Generator[bytes, None, None]:
+        """
+        The local keys of the objects of clazz with any of values at path. Values are compared by their string, or the
+        value of an enum. Without an attribute index for the path, this falls back to a scan of the class map.
+        """
+        this_class_idx = self.class_idx[clazz]
+        wanted = sorted({self._attribute_index_key(this_class_idx, path, value) for value in values})
+
+        if path in self.attribute_indexes.get(this_class_idx, {}):
+            db_attribute_idx = txn.open_map(name=DB_ATTRIBUTE_IDX, flags=DB_ATTRIBUTE_IDX_FLAGS)
+            seen: set[bytes] = set()
+            with txn.cursor(db_attribute_idx) as cursor:
+                for attribute_index_key in wanted:
+                    for it in cursor.iter_dupsort_rows(start_key=attribute_index_key):
+                        for index_key, key in it:
+                            if index_key != attribute_index_key:
+                                break
+                            if key not in seen:
+                                seen.add(key)
+                                yield key
+                        break
+            return
+
+        log_all(logging.WARNING, f"[storage] no attribute index for {clazz.__name__} {path}, falling back to a scan")
+        getter = safe_attrgetter(path, set())
+        wanted_set = set(wanted)
+        for key, obj in self.iter_objects(txn, clazz, fields=[attribute_path_field(path)]):
+            if any(self._attribute_index_key(this_class_idx, path, value) in wanted_set for value in getter(obj) if value is not None):
+                yield key
 
     def _load_references_by_fullkey(self, txn: TXN, full_key: bytes) -> Generator[bytes, None, None]:
         db = txn.open_map(DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)
@@ -328,6 +635,19 @@ class MdbxStorage:
             yield self.idx_class[class_idx], reference_local_key
 
     def _load_references_inwards_by_fullkey(self, txn: TXN, full_key: bytes) -> Generator[bytes, None, None]:
+        db_inward = self._open_index(txn, DB_REFERENCE_INWARD, DB_REFERENCE_INWARD_FLAGS)
+        if db_inward is not None:
+            cursor = txn.cursor(db_inward)
+            for it in cursor.iter_dupsort_rows(start_key=full_key):
+                for reference_key, referencing_key in it:
+                    if reference_key != full_key:
+                        break
+
+                    yield referencing_key
+                break
+            return
+
+        log_all(logging.WARNING, "[storage] no inward reference index, falling back to a full scan")
         db = txn.open_map(DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)
         cursor = txn.cursor(db)
         for it in cursor.iter_dupsort_rows():
@@ -336,6 +656,10 @@ class MdbxStorage:
                     yield referencing_key
 
     def _load_references_inwards_by_fullkeys(self, txn: TXN, full_keys: set[bytes]) -> Generator[tuple[bytes, bytes], None, None]:
+        if self._open_index(txn, DB_REFERENCE_INWARD, DB_REFERENCE_INWARD_FLAGS) is not None:
+            yield from self._load_references_inwards_by_fullkeys_index(txn, full_keys)
+            return
+
         # This will do everything in one sequential scan
         db = txn.open_map(DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)
         cursor = txn.cursor(db)
@@ -345,29 +669,48 @@ class MdbxStorage:
                     yield reference_key, referencing_key
 
     def _index_references_inwards(self, txn: TXN, force: bool = False) -> None:
-        create = True
-        try:
-            db_inward = txn.open_map(DB_REFERENCE_INWARD, flags=DB_REFERENCE_INWARD_FLAGS)
-            create = db_inward.get_stat(txn).ms_entries > 0 or force
-        except:  # noqa: E722
-            pass
-        finally:
-            if create:
-                db_inward = txn.create_map(DB_REFERENCE_INWARD, flags=DB_REFERENCE_INWARD_FLAGS)
-                db_inward.drop(txn, delete=False)
-                db = txn.open_map(DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)
-                cursor = txn.cursor(db)
-
-                for it in cursor.iter_dupsort_rows():
-                    for referencing_key, reference_key in it:
-                        db_inward.put(txn, reference_key, referencing_key)
+        """
+        The inward reference index is maintained on insert and resolve. Databases that were written before, or by a
+        writer that does not maintain it, only get it (re)built from the outward references when it is missing, stale or
+        forced.
+        """
+        create = force or self._open_index(txn, DB_REFERENCE_INWARD, DB_REFERENCE_INWARD_FLAGS) is None
+        if create:
+            db_inward = txn.create_map(DB_REFERENCE_INWARD, flags=DB_REFERENCE_INWARD_FLAGS)
+            db_inward.drop(txn, delete=False)
+            db = txn.open_map(DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)
+            cursor = txn.cursor(db)
+
+            for it in cursor.iter_dupsort_rows():
+                for referencing_key, reference_key in it:
+                    db_inward.put(txn, reference_key, referencing_key)
+            self._mark_index(txn, DB_REFERENCE_INWARD)
+
+    def _index_embedded_ids(self, txn: TXN, force: bool = False) -> DBI:
+        """
+        The embedded id index is maintained on insert. Databases that were written before, or by a writer that does
+        not maintain it, only get it (re)built by a full scan when it is missing, stale or when forced.
+        """
+        db_embedded_id_idx = self._open_index(txn, DB_EMBEDDED_ID_IDX, DB_EMBEDDED_ID_IDX_FLAGS)
+        if force or db_embedded_id_idx is None:
+            db_embedded_id_idx = txn.create_map(DB_EMBEDDED_ID_IDX, flags=DB_EMBEDDED_ID_IDX_FLAGS)
+            db_embedded_id_idx.drop(txn, delete=False)
+            for clazz in set(self.db_names(txn).values()):
+                this_class_idx = self.class_idx[clazz]
+                for key, obj in self.iter_objects(txn, clazz):
+                    full_key = Serializer.get_fullkey_by_class_idx(key, this_class_idx)
+                    for embedded_key, _embedded in only_embedding(self.serializer, obj):
+                        db_embedded_id_idx.put(txn, embedded_key, full_key)
+            self._mark_index(txn, DB_EMBEDDED_ID_IDX)
+
+        return db_embedded_id_idx
 
     def _load_references_inwards_by_fullkeys_index(self, txn: TXN, full_keys: set[bytes]) -> Generator[tuple[bytes, bytes], None, None]:
         db = txn.open_map(DB_REFERENCE_INWARD, flags=DB_REFERENCE_INWARD_FLAGS)
         cursor = txn.cursor(db)
 
-        # Maybe sort full_keys?
-        for full_key in full_keys:
+        # Seeking in the integer order of the map keeps the cursor moving forward
+        for full_key in sorted(full_keys, key=lambda k: int.from_bytes(k, 'little')):
             for it in cursor.iter_dupsort_rows(start_key=full_key):
                 for reference_key, referencing_key in it:
                     if reference_key != full_key:
@@ -424,16 +767,26 @@ class MdbxStorage:
         for clazz, key in self.load_references_by_object(txn, obj, inwards):
             yield self.load_object(txn, clazz, key)
 
-    def load_references_by_object_values_dfs(
+    def load_references_by_object_values_bfs(
         self,
         txn: TXN,
         full_keys: list[bytes],
         inward_classes: set[type[EntityStructure]] = {NoticeAssignment, DayTypeAssignment},
         conditional_inward_classes: set[tuple[type[EntityStructure], type[EntityStructure]]] = {(PassengerStopAssignment, ScheduledStopPoint)},
-        visited: set[bytes] = set(),
+        visited: KeySet | None = None,
+        max_chunks: int | None = None,
     ) -> Generator[EntityStructure, None, None]:
+        """
+        The objects of full_keys and everything they reference, and the objects of inward_classes that reference them.
+        Without visited, every call starts with an empty KeySet of its own, see KeySet for max_chunks. The frontier is
+        loaded one level at a time, in sorted batches: a breadth-first walk.
+        """
+        if visited is None:
+            with KeySet(max_chunks, self.path.parent) as own_visited:
+                yield from self.load_references_by_object_values_bfs(txn, full_keys, inward_classes, conditional_inward_classes, own_visited)
+            return
 
-        stack = list(full_keys)
+        frontier = list(full_keys)
 
         # Ideally we would only check objects that would make sense to check
         clazz_idxs = [self.class_idx[clazz] for clazz in inward_classes]
@@ -442,40 +795,39 @@ class MdbxStorage:
         for f, t in conditional_inward_classes:
             conditional[self.class_idx[t]].add(self.class_idx[f])
 
-        while stack:
+        while frontier:
             to_visit_inwards: set[bytes] = set([])
 
-            while stack:
-                identifier = stack.pop()
-
-                if identifier not in visited:
-                    visited.add(identifier)
+            while frontier:
+                # The whole level is loaded in sorted batches, the references of this level form the next one
+                level = [identifier for identifier in sorted(set(frontier)) if visited.add(identifier)]
+                frontier = []
 
-                    full_key = identifier
-                    obj = self.load_object_by_full_key(txn, full_key)
-                    if obj:
-                        # print(obj.id)
-                        yield obj
+                for start in range(0, len(level), CLOSURE_BATCH_SIZE):
+                    for full_key, obj in self.load_objects_by_full_keys(txn, level[start : start + CLOSURE_BATCH_SIZE]):
+                        if obj:
+                            # print(obj.id)
+                            yield obj
 
-                        this_clazz_idx, key = Serializer.full_key_to_clazz_idx(full_key)
-                        if this_clazz_idx in clazz_idxs or this_clazz_idx in conditional:
-                            to_visit_inwards.add(full_key)
+                            this_clazz_idx, key = Serializer.full_key_to_clazz_idx(full_key)
+                            if this_clazz_idx in clazz_idxs or this_clazz_idx in conditional:
+                                to_visit_inwards.add(full_key)
 
-                        for referenced_full_key in self.load_references_by_clazz_full_key(txn, full_key, False):
-                            # TODO: We could move the visited check here? we could also make our stack a set?
-                            stack.append(referenced_full_key)
+                            for referenced_full_key in self.load_references_by_clazz_full_key(txn, full_key, False):
+                                if referenced_full_key not in visited:
+                                    frontier.append(referenced_full_key)
 
             for referencing_full_key, referenced_full_key in self._load_references_inwards_by_fullkeys_index(txn, to_visit_inwards):
                 # print("by_fullkeys", referenced_full_key)
                 if referenced_full_key not in visited:
                     referenced_clazz_idx, _referenced_key = Serializer.full_key_to_clazz_idx(referenced_full_key)
                     if referenced_clazz_idx in clazz_idxs:
-                        stack.append(referenced_full_key)
+                        frontier.append(referenced_full_key)
                     else:
                         referencing_clazz_idx, _referencing_key = Serializer.full_key_to_clazz_idx(referencing_full_key)
                         if referencing_clazz_idx in conditional.get(referenced_clazz_idx, {}):
                             # print("by conditional", referenced_full_key)
-                            stack.append(referenced_full_key)
+                            frontier.append(referenced_full_key)
 
     def load_object_by_id_version(
         self, txn: TXN, id: str, clazz: type[EntityStructure], version: Optional[str] = None
@@ -498,7 +850,43 @@ class MdbxStorage:
                     return resolved_idx, self.load_object_by_full_key(txn, resolved_idx)
             return None
 
-    def load_object_by_full_key(self, txn: TXN, full_key: bytes) -> Optional[EntityStructure]:
+    def load_object_by_id(self, txn: TXN, id: str, clazz: type[Tid], shared: bool = False) -> Optional[Tid]:
+        """
+        The object of clazz with id, whatever its version. Like an index by id of all objects of clazz, as getIndex(),
+        with more versions of the same id the last one in key order is returned.
+        """
+        this_class_idx = self.class_idx[clazz]
+        prefix = self.serializer.encode_prefix(id)
+        key: bytes | None = None
+        db_id_idx = txn.open_map(name=DB_ID_IDX, flags=DB_ID_IDX_FLAGS)
+        with txn.cursor(db_id_idx) as cursor:
+            for check_key, full_key in cursor.iter(prefix):
+                if not check_key.startswith(prefix):
+                    break
+                check_class_idx, check_key_idx = Serializer.full_key_to_clazz_idx(full_key)
+                if check_class_idx == this_class_idx and (key is None or check_key_idx > key):
+                    key = check_key_idx
+
+        if key is None:
+            return None
+        return self.load_object(txn, clazz, key, shared)
+
+    def enable_object_cache(self, maxsize: int = 10_000) -> ObjectCache:
+        """
+        Keep up to maxsize decoded objects of the current transaction for the loads that ask for a shared object, see
+        ObjectCache for what callers may do with them.
+        """
+        self.object_cache = ObjectCache(maxsize)
+        return self.object_cache
+
+    def load_object_by_full_key(self, txn: TXN, full_key: bytes, shared: bool = False) -> Optional[EntityStructure]:
+        """With shared, the object may come from and is kept in the object cache, and must not be changed."""
+        object_cache = self.object_cache if shared else None
+        if object_cache is not None:
+            cached = object_cache.get(txn, full_key)
+            if cached is not None:
+                return cached
+
         this_clazz_idx, key = Serializer.full_key_to_clazz_idx(full_key)
         clazz = self.idx_class[this_clazz_idx]
 
@@ -506,12 +894,41 @@ class MdbxStorage:
             value = db.get(txn, key)
             if value:
                 obj: EntityStructure = self.serializer.unmarshall(value, clazz)
+                if object_cache is not None:
+                    object_cache.put(txn, full_key, obj)
                 return obj
 
         return None
 
-    def load_object(self, txn: TXN, clazz: type[Tid], key: bytes) -> Tid:
+    def load_objects_by_full_keys(self, txn: TXN, full_keys: Iterable[bytes]) -> Generator[tuple[bytes, EntityStructure], None, None]:
+        """
+        load_object_by_full_key() for many keys at once. The keys are grouped per class and sorted, so every class map
+        is walked once with a single cursor, in the order of its pages, instead of a random seek per key. Yields the
+        full key and the object in that order, once per key, for the keys that have an object.
+        """
+        by_class: dict[bytes, dict[bytes, bytes]] = defaultdict(dict)
+        for full_key in full_keys:
+            this_clazz_idx, key = Serializer.full_key_to_clazz_idx(full_key)
+            by_class[this_clazz_idx][key] = full_key
+
+        for this_clazz_idx in sorted(by_class):
+            clazz = self.idx_class[this_clazz_idx]
+            db = self._open_optional_map(txn, this_clazz_idx, MDBXDBFlags.MDBX_DB_DEFAULTS)
+            if db is None:
+                continue
+
+            keys = by_class[this_clazz_idx]
+            with txn.cursor(db) as cursor:
+                for key in sorted(keys):
+                    value = cursor.get(key, MDBXCursorOp.MDBX_SET_KEY)
+                    if value:
+                        yield keys[key], self.serializer.unmarshall(value, clazz)
+
+    def load_object(self, txn: TXN, clazz: type[Tid], key: bytes, shared: bool = False) -> Tid:
         this_class_idx = self.class_idx[clazz]
+        if shared and self.object_cache is not None:
+            return cast(Tid, self.load_object_by_full_key(txn, Serializer.get_fullkey_by_class_idx(key, this_class_idx), True))
+
         with txn.open_map(name=this_class_idx, flags=MDBXDBFlags.MDBX_DB_DEFAULTS) as db:
             value = db.get(txn, key)
             assert value is not None
@@ -522,8 +939,7 @@ class MdbxStorage:
             # idx = ((int.from_bytes(this_class_idx, 'little') << 32) | int.from_bytes(key, 'little')).to_bytes(8, 'little')
             return obj
 
-    # TODO: It would be nice if we could do a caching layer here
-    def load_object_by_reference(self, txn: TXN, ref: VersionOfObjectRefStructure) -> Optional[EntityStructure]:
+    def load_object_by_reference(self, txn: TXN, ref: VersionOfObjectRefStructure, shared: bool = False) -> Optional[EntityStructure]:
         with txn.open_map(name=DB_ID_IDX, flags=DB_ID_IDX_FLAGS) as db_id_idx:
             # TODO: With our current schema, we always will have a name_of_ref_class filled in.
             if ref.name_of_ref_class is not None:
@@ -534,7 +950,7 @@ class MdbxStorage:
                 )
                 full_key = db_id_idx.get(txn, key)
                 if full_key is not None:
-                    return self.load_object_by_full_key(txn, full_key)
+                    return self.load_object_by_full_key(txn, full_key, shared)
 
             if True:
                 # TODO: Fallback should not happen, because the references should already have been updated, but since we are here
@@ -546,7 +962,7 @@ class MdbxStorage:
                         referenced_class_idx, referenced_key = Serializer.full_key_to_clazz_idx(resolved_idx)
                         # We now want to check if the referenced_class_idx actually matches what should be "possible"
 
-                        return self.load_object(txn, self.idx_class[referenced_class_idx], referenced_key)
+                        return self.load_object(txn, self.idx_class[referenced_class_idx], referenced_key, shared)
                     else:
                         break
 
@@ -554,6 +970,25 @@ class MdbxStorage:
         raise Exception(f"Can't load element from key {ref.ref} via {key!r}.")
         return None
 
+    def key_ranges(self, txn: TXN, clazz: type[EntityStructure], count: int) -> list[tuple[bytes, int]]:
+        """
+        Split the keys of clazz in at most count consecutive ranges of the same size, as the start_key and limit of
+        scan_objects() and iter_objects(), for example to process a class in parallel.
+        """
+        db = self._open_optional_map(txn, self.class_idx[clazz], MDBXDBFlags.MDBX_DB_DEFAULTS)
+        if db is None:
+            return []
+
+        entries = db.get_stat(txn).ms_entries
+        limit = -(-entries // max(count, 1))
+        ranges = []
+        with txn.cursor(db) as cursor:
+            for i, key in enumerate(_iter_keys(cursor)):
+                if i % limit == 0:
+                    ranges.append((key, limit))
+
+        return ranges
+
     def scan_objects(self, txn: TXN, clazz: type[Tid], start_key: bytes | None = None, limit: int | None = None) -> Generator[bytes, None, None]:
         with txn.open_map(name=self.class_idx[clazz], flags=MDBXDBFlags.MDBX_DB_DEFAULTS) as db:
             with txn.cursor(db) as cursor:
@@ -567,7 +1002,13 @@ class MdbxStorage:
                         if count >= limit:
                             break
 
-    def iter_objects(self, txn: TXN, clazz: type[Tid], start_key: bytes | None = None, limit: int | None = None) -> Generator[tuple[bytes, Tid], None, None]:
+    def iter_objects(
+        self, txn: TXN, clazz: type[Tid], start_key: bytes | None = None, limit: int | None = None, fields: Sequence[str] | None = None
+    ) -> Generator[tuple[bytes, Tid], None, None]:
+        """
+        Iterate over the local keys and objects of clazz. When fields is given, the objects are projections: only
+        those fields are decoded and set, accessing any other field raises an AttributeError. Never write them back.
+        """
         try:
             db = txn.open_map(name=self.class_idx[clazz], flags=MDBXDBFlags.MDBX_DB_DEFAULTS)
             entries = db.get_stat(txn).ms_entries
@@ -581,14 +1022,27 @@ class MdbxStorage:
                 if count % 100 == 0:
                     log_all(logging.INFO, f"{clazz.__name__} processed: {count}/{entries}")
 
-                yield key, self.serializer.unmarshall(value, clazz)
+                if fields is None:
+                    yield key, self.serializer.unmarshall(value, clazz)
+                else:
+                    yield key, self._projection(clazz, self.serializer.unmarshall_fields(value, clazz, fields))
                 count += 1
                 if limit and count >= limit:
                     break
             log_all(logging.INFO, f"{clazz.__name__} processed: {count}/{entries}")
 
-    def iter_only_objects(self, txn: TXN, clazz: type[Tid], start_key: bytes | None = None, limit: int | None = None) -> Generator[Tid, None, None]:
-        for _key, obj in self.iter_objects(txn, clazz, start_key, limit):
+    @staticmethod
+    def _projection(clazz: type[Tid], values: dict[str, Any]) -> Tid:
+        # An instance without running __init__, so the fields that are not projected are not even defaulted
+        obj = clazz.__new__(clazz)
+        for name, value in values.items():
+            setattr(obj, name, value)
+        return obj
+
+    def iter_only_objects(
+        self, txn: TXN, clazz: type[Tid], start_key: bytes | None = None, limit: int | None = None, fields: Sequence[str] | None = None
+    ) -> Generator[Tid, None, None]:
+        for _key, obj in self.iter_objects(txn, clazz, start_key, limit, fields):
             yield obj
 
     def copy_map(self, txn: TXN, remote_storage: "MdbxStorage", remote_txn: TXN, clazz: type[EntityStructure]) -> None:
@@ -1,36 +1,54 @@
 import logging
+import queue as queue_module
+import time
 from pathlib import Path
 from types import TracebackType
-from typing import Optional, Type, Literal, Iterable
+from typing import Optional, Type, Literal, Iterable, Self
 import multiprocessing as mp
 
 from utils.aux_logging import log_all
 
-from mdbx.mdbx import DBI, Env
-
 from domain.netex.services.model_typing import Tid
-from domain.netex.services.recursive_attributes import only_references
-from storage.interface import Storage
-from storage.mdbx.core.implementation import MdbxStorage, DB_ID_IDX, DB_REFERENCE_OUTWARD, DB_UNRESOLVED, \
-    DB_ID_IDX_FLAGS
+from storage.mdbx.core.implementation import MdbxStorage
+from storage.mdbx.core.implementation_queue import MdbxStorageQueue, QueueMessage
 
 
 class MdbxStorageMP(MdbxStorage):
-    queue: mp.Queue  # type: ignore
-    writer: mp.Process
+    """
+    A MdbxStorage with a single writer process, fed by any number of producers through a queue. The producers are
+    MdbxStorageQueue instances, see producer(), which can be passed to other processes together with the queue.
+
+    The writer takes the keys from the mdbx sequence of _id_idx, as any other insert does, and commits after
+    commit_records objects or commit_seconds, whichever comes first. It never commits an empty transaction.
+    """
+
+    queue: queue_module.Queue[QueueMessage | None]
+    writer: mp.Process | None
 
-    def __init__(self, path: Path, readonly: bool = True, initial_size: int = 8 * 1024**3):
+    def __init__(
+        self,
+        path: Path,
+        readonly: bool = True,
+        initial_size: int = 8 * 1024**3,
+        queue_size: int = 1_000,
+        commit_records: int = 100_000,
+        commit_seconds: float = 5.0,
+    ):
         super().__init__(path, readonly, initial_size)
+        self.commit_records = commit_records
+        self.commit_seconds = commit_seconds
         self.ctx = mp.get_context("spawn")
         self.manager = self.ctx.Manager()
-        self.queue = self.manager.Queue(maxsize=1000)
+        self.queue = self.manager.Queue(maxsize=queue_size)
+        self.writer = None
 
-    def __enter__(self) -> Storage:
+    def __enter__(self) -> Self:
         super().__enter__()
 
         if not self.readonly:
-            self.writer = mp.Process(target=self.consumer, args=(self.queue, self.path.as_posix(), self.max_dbs, self.initial_size, self.next_entry))
+            self.writer = self.ctx.Process(target=MdbxStorageMP.consumer, args=(self.queue, self.path, self.commit_records, self.commit_seconds))
             self.writer.start()
+            self._producer = self.producer()
 
         return self
 
@@ -40,118 +58,67 @@ class MdbxStorageMP(MdbxStorage):
         exception_value: Optional[BaseException],
         exception_traceback: Optional[TracebackType],
     ) -> Literal[False]:
-        if self.writer.is_alive():
-            self.queue.put(None)
+        if self.writer is not None:
+            self._producer.__exit__(exception_type, exception_value, exception_traceback)
+            if self.writer.is_alive():
+                try:
+                    self._producer._send(None)
+                except RuntimeError:
+                    # Died while waiting, reported below by its exit code
+                    pass
             self.writer.join()
 
-        return super().__exit__(exception_type, exception_value, exception_traceback)
+        self.manager.shutdown()
+        super().__exit__(exception_type, exception_value, exception_traceback)
 
-    def insert_objects_on_queue(self, klass: type[Tid], objects: Iterable[Tid], empty: bool = False) -> None:
-        log_all(logging.DEBUG, f"[mp] insert_objects_on_queue {klass}")
+        if self.writer is not None and self.writer.exitcode != 0 and exception_type is None:
+            raise RuntimeError(f"[mp] writer exited with {self.writer.exitcode}")
 
+        return False
+
+    def producer(self) -> MdbxStorageQueue:
+        return MdbxStorageQueue(self.path, self.queue, self.class_name_idx, self.object_serializer_name, writer_pid=self.writer_pid)
+
+    @property
+    def writer_pid(self) -> int | None:
+        """For the producers in other processes, see MdbxStorageQueue."""
+        return self.writer.pid if self.writer is not None else None
+
+    def insert_objects_on_queue(self, klass: type[Tid], objects: Iterable[Tid], empty: bool = False) -> None:
         if self.readonly:
             raise
 
-        this_class_idx = self.class_idx[klass]
-
-        with self.env.ro_transaction() as txn:
-            db_id_idx = txn.open_map(DB_ID_IDX, flags=DB_ID_IDX_FLAGS)
-
-            # if empty:
-            #    txn.drop(db=db, delete=False)
-
-            for obj in objects:
-                # TODO: do the serial increment here too
-                # TODO: do overwriting here too
-                key = self.next_entry = self.next_entry + 1
-
-                full_key = ((int.from_bytes(this_class_idx, 'little') << 32) | key).to_bytes(8, 'little')
-                for referenced_class_idx, ref, version in only_references(obj, self.serializer):
-                    unresolved_value = self.serializer.encode_key_idx(ref, version, referenced_class_idx)
-                    resolved_idx = db_id_idx.get(txn, unresolved_value)
-                    if resolved_idx:
-                        self.queue.put(
-                            (
-                                DB_REFERENCE_OUTWARD,
-                                full_key,
-                                resolved_idx,
-                            )
-                        )
-                    else:
-                        self.queue.put(
-                            (
-                                DB_UNRESOLVED,
-                                full_key,
-                                unresolved_value,
-                            )
-                        )
-
-                value = self.serializer.marshall(obj, klass)
-                self.queue.put(
-                    (
-                        this_class_idx,
-                        key.to_bytes(4, 'little'),
-                        value,
-                    )
-                )
-                self.queue.put(
-                    (
-                        DB_ID_IDX,
-                        self.serializer.encode_key(str(obj.id), obj.version if hasattr(obj, "version") else None, obj.__class__),
-                        full_key,
-                    )
-                )
+        self._producer.insert_objects_on_queue(klass, objects, empty)
 
     @staticmethod
-    def consumer(queue: mp.Queue, path: str, max_dbs: int, initial_size: int, next_entry: int) -> None:  # type: ignore
-        # TODO: Replace NextEntry with mdbx sequence generator?
-
-        env = Env(
-            path,
-            maxdbs=max_dbs,
-            # map_size=self.initial_size,
-            # writemap=True,
-            # metasync=True,
-            # sync=True,
-            # subdir=True,
-        )
-
-        while True:
-            dbis: dict[bytes, DBI] = {}
-            with env.rw_transaction() as txn:
-                while True:
-                    try:
-                        items = queue.get(timeout=0.05)  # probeer een nieuw item
-                    except Exception:
-                        # timeout → commit de transactie (door contextmanager) en start opnieuw
-                        break
-
-                    if items is None:
-                        # commit wat er nog in txn zit, daarna stoppen
-                        txn.commit()
-                        return
-
-                    for item in items:
-                        db_name, key, value = item
-
-                        if db_name == DB_ID_IDX:
-                            # DB_ID_IDX, encoded_key, partial
-                            # INWARD, resolved_idx, partial
-                            value = (value | next_entry).to_bytes(8, 'little')
-                        elif db_name == DB_UNRESOLVED or db_name == DB_REFERENCE_OUTWARD:
-                            # UNRESOLVED, partial, resolved_value
-                            # OUTWARD, partial, resolved_idx
-                            key = (key | next_entry).to_bytes(8, 'little')
-                        else:
-                            # dbname, None, value
-                            key = next_entry.to_bytes(4, 'little')
-
-                        dbi = dbis.get(db_name)
-                        if dbi is None:
-                            dbi = dbis[db_name] = txn.create_map(db_name)
-
-                        dbi.put(txn, key, value)
-
-                    # When the entire item is inserted, increment
-                    next_entry += 1
-                txn.commit()
+    def consumer(queue: queue_module.Queue[QueueMessage | None], path: Path, commit_records: int, commit_seconds: float) -> None:
+        with MdbxStorage(path, readonly=False) as storage:
+            while True:
+                # Block until there is work, so an idle writer does not commit
+                message = queue.get()
+                if message is None:
+                    return
+
+                start = time.monotonic()
+                records = 0
+                with storage.env.rw_transaction() as txn:
+                    while message is not None:
+                        this_class_idx, batch, empty = message
+                        records += storage._insert_records(txn, this_class_idx, batch, empty)
+
+                        remaining = commit_seconds - (time.monotonic() - start)
+                        if records >= commit_records or remaining <= 0:
+                            break
+
+                        try:
+                            message = queue.get(timeout=remaining)
+                        except queue_module.Empty:
+                            break
+
+                    txn.commit()
+
+                elapsed = time.monotonic() - start
+                log_all(logging.INFO, f"[mp] committed {records} objects in {elapsed:.1f}s, {queue.qsize()} batches waiting")
+
+                if message is None:
+                    return
@@ -1,70 +1,112 @@
 import logging
+import os
+import time
 from pathlib import Path
-from typing import Iterable, Any
-import multiprocessing as mp
+from queue import Queue, Full
+from types import TracebackType
+from typing import Optional, Type, Literal, Iterable, Self
 
 from utils.aux_logging import log_all
 
 from domain.netex.services.model_typing import Tid
-from domain.netex.services.recursive_attributes import only_references
-from storage.mdbx.core.implementation import MdbxStorage, DB_ID_IDX, DB_REFERENCE_OUTWARD, DB_UNRESOLVED, \
-    DB_ID_IDX_FLAGS
+from storage.mdbx.core.implementation import MdbxStorage, InsertRecord
+
+# A batch of prepared records for one class, and if the class must be emptied first: see MdbxStorage.insert_records_on_queue()
+QueueMessage = tuple[bytes, list[InsertRecord], bool]
+
+# Seconds a put waits on a full queue before checking that the writer is still alive
+PUT_TIMEOUT = 1.0
+
+
+def process_alive(pid: int) -> bool:
+    """If the process exists, also from a process that did not start it. An exited process that was not reaped yet is not alive."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            # The state follows the command, which is in parentheses and may contain spaces
+            return stat.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except OSError:
+        return True
 
 
 class MdbxStorageQueue(MdbxStorage):
-    queue: mp.Queue[list[tuple[bytes, Any, Any]]]
+    """
+    A producer for the writer process of MdbxStorageMP, it never opens the database itself: the class index and the
+    object serializer are passed by the writer. Objects are prepared here, in the producing process, and sent in
+    batches to the single writer, which assigns their keys.
+
+    Putting on a full queue blocks until the writer catches up, the time spent waiting is the backpressure reported on
+    exit. When writer_pid is given, a put that keeps waiting raises a RuntimeError once the writer is gone.
+    """
+
+    queue: Queue[QueueMessage | None]
 
-    def __init__(self, path: Path, queue: mp.Queue[list[tuple[bytes, Any, Any]]]):
+    def __init__(
+        self,
+        path: Path,
+        queue: Queue[QueueMessage | None],
+        class_name_idx: dict[str, bytes],
+        object_serializer: str,
+        batch_size: int = 1_000,
+        writer_pid: int | None = None,
+    ):
         super().__init__(path, readonly=True)
         self.queue = queue
+        self.writer_pid = writer_pid
+        self.batch_size = batch_size
+        self._set_class_idx(class_name_idx)
+        self._set_object_serializer(object_serializer)
+
+        self.batches = 0
+        self.records = 0
+        self.blocked_seconds = 0.0
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exception_type: Optional[Type[BaseException]],
+        exception_value: Optional[BaseException],
+        exception_traceback: Optional[TracebackType],
+    ) -> Literal[False]:
+        log_all(logging.INFO, f"[queue] {self.records} objects in {self.batches} batches, {self.blocked_seconds:.1f}s waiting on the writer")
+        return False
+
+    def _send(self, message: QueueMessage | None) -> None:
+        while True:
+            try:
+                self.queue.put(message, timeout=PUT_TIMEOUT)
+                return
+            except Full:
+                if self.writer_pid is not None and not process_alive(self.writer_pid):
+                    raise RuntimeError(f"[queue] the writer process {self.writer_pid} is gone") from None
+
+    def _put(self, message: QueueMessage) -> None:
+        start = time.monotonic()
+        self._send(message)
+        self.blocked_seconds += time.monotonic() - start
+        self.batches += 1
+        self.records += len(message[1])
 
     def insert_objects_on_queue(self, klass: type[Tid], objects: Iterable[Tid], empty: bool = False) -> None:
         log_all(logging.DEBUG, f"[queue] insert_objects_on_queue {klass}")
 
         this_class_idx = self.class_idx[klass]
 
-        with self.env.ro_transaction() as txn:
-            db_id_idx = txn.open_map(DB_ID_IDX, flags=DB_ID_IDX_FLAGS)
-
-            for obj in objects:
-                # Each insert will receive a unique key, therefore they must be grouped together
-                updates: list[tuple[bytes, Any, Any]] = []
-
-                partial_key = int.from_bytes(this_class_idx, 'little') << 32
-                for referenced_class_idx, ref, version in only_references(obj, self.serializer):
-                    unresolved_value = self.serializer.encode_key(ref, version, referenced_class_idx, include_clazz=True)
-                    resolved_idx = db_id_idx.get(txn, unresolved_value)
-                    if resolved_idx:
-                        updates.append(
-                            (
-                                DB_REFERENCE_OUTWARD,
-                                partial_key,
-                                resolved_idx,
-                            )
-                        )
-                    else:
-                        updates.append(
-                            (
-                                DB_UNRESOLVED,
-                                partial_key,
-                                unresolved_value,
-                            )
-                        )
-
-                value = self.serializer.marshall(obj, klass)
-                updates.append(
-                    (
-                        this_class_idx,
-                        None,
-                        value,
-                    )
-                )
-                updates.append(
-                    (
-                        DB_ID_IDX,
-                        self.serializer.encode_key(str(obj.id), obj.version if hasattr(obj, "version") else None, obj.__class__, include_clazz=True),
-                        partial_key,
-                    )
-                )
-
-                self.queue.put(updates)
+        records: list[InsertRecord] = []
+        for obj in objects:
+            records.append(self.prepare_object(this_class_idx, obj))
+            if len(records) >= self.batch_size:
+                self._put((this_class_idx, records, empty))
+                records = []
+                empty = False
+
+        if len(records) > 0 or empty:
+            self._put((this_class_idx, records, empty))
@@ -0,0 +1,61 @@
+import logging
+import pickle
+from pathlib import Path
+from types import TracebackType
+from typing import Optional, Type, Literal, Iterable, BinaryIO, Generator, Self
+
+from utils.aux_logging import log_all
+
+from domain.netex.services.model_typing import Tid
+from storage.mdbx.core.implementation import MdbxStorage, InsertRecord
+
+
+class MdbxStorageSpool(MdbxStorage):
+    """
+    A MdbxStorage for a worker process that never opens the database. Instead of writing, every batch passed to
+    insert_objects_on_queue() is prepared (marshalled, references and embedded objects encoded) and appended to a spool
+    file. The single writer replays the spool with replay(), which writes exactly what a direct insert would have.
+    """
+
+    spool: BinaryIO
+
+    def __init__(self, path: Path, spool_path: Path, class_name_idx: dict[str, bytes], object_serializer: str):
+        super().__init__(path, readonly=True)
+        self.spool_path = spool_path
+        self._set_class_idx(class_name_idx)
+        self._set_object_serializer(object_serializer)
+
+    def __enter__(self) -> Self:
+        self.spool = self.spool_path.open("wb")
+        return self
+
+    def __exit__(
+        self,
+        exception_type: Optional[Type[BaseException]],
+        exception_value: Optional[BaseException],
+        exception_traceback: Optional[TracebackType],
+    ) -> Literal[False]:
+        self.spool.close()
+        return False
+
+    def insert_objects_on_queue(self, klass: type[Tid], objects: Iterable[Tid], empty: bool = False) -> None:
+        log_all(logging.DEBUG, f"[spool] insert_objects_on_queue {klass}")
+
+        this_class_idx = self.class_idx[klass]
+        records = [self.prepare_object(this_class_idx, obj) for obj in objects]
+        pickle.dump((this_class_idx, records, empty), self.spool, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def read(spool_path: Path) -> Generator[tuple[bytes, list[InsertRecord], bool], None, None]:
+        with spool_path.open("rb") as spool:
+            while True:
+                try:
+                    yield pickle.load(spool)
+                except EOFError:
+                    return
+
+    @staticmethod
+    def replay(storage: MdbxStorage, spool_path: Path) -> None:
+        # Every batch gets its own transaction, as it would have had when inserted directly.
+        for this_class_idx, records, empty in MdbxStorageSpool.read(spool_path):
+            storage.insert_records_on_queue(this_class_idx, records, empty)
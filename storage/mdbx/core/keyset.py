@@ -0,0 +1,152 @@
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from types import TracebackType
+from typing import Iterator
+
+import numpy as np
+from mdbx import Env, MDBXDBFlags
+
+from storage.interface import Serializer
+
+DB_KEYSET = b'_keyset'
+
+# Local keys per bitmap chunk, a chunk takes CHUNK_BITS // 8 bytes
+CHUNK_BITS = 1 << 16
+
+
+class KeySet:
+    """
+    A set of full keys in bitmaps, one bit per local key of a class, in chunks of CHUNK_BITS local keys. The local keys
+    come from a single sequence for all classes, so a chunk is only allocated for the ranges a class actually uses.
+
+    With max_chunks, at most that many chunks are kept in memory: the least recently used ones are spilled to a
+    temporary mdbx environment, in directory, and read back when they are needed again.
+    """
+
+    def __init__(self, max_chunks: int | None = None, directory: Path | None = None):
+        # The chunk that is being used must stay in memory
+        if max_chunks is not None and max_chunks < 1:
+            raise ValueError(f"max_chunks must be at least 1, not {max_chunks}")
+
+        self.max_chunks = max_chunks
+        self.directory = directory
+        self._size = 0
+        self._chunks: OrderedDict[bytes, bytearray] = OrderedDict()
+        # Every chunk, in memory or spilled, as class_idx + chunk number
+        self._chunk_ids: set[bytes] = set()
+        self._spill: tempfile.TemporaryDirectory[str] | None = None
+        self._env: Env | None = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __repr__(self) -> str:
+        return f"KeySet({self._size} keys, {len(self._chunks)}/{len(self._chunk_ids)} chunks in memory)"
+
+    def __enter__(self) -> "KeySet":
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, exc_value: BaseException | None, traceback: TracebackType | None) -> None:
+        self.close()
+
+    @staticmethod
+    def _locate(full_key: bytes) -> tuple[bytes, int]:
+        this_clazz_idx, key = Serializer.full_key_to_clazz_idx(full_key)
+        local_key = int.from_bytes(key, 'little')
+        return this_clazz_idx + (local_key // CHUNK_BITS).to_bytes(4, 'big'), local_key % CHUNK_BITS
+
+    def _chunk(self, chunk_id: bytes, create: bool) -> bytearray | None:
+        chunk = self._chunks.get(chunk_id)
+        if chunk is not None:
+            self._chunks.move_to_end(chunk_id)
+            return chunk
+
+        if chunk_id in self._chunk_ids:
+            chunk = self._read_spilled(chunk_id)
+        elif create:
+            chunk = bytearray(CHUNK_BITS // 8)
+            self._chunk_ids.add(chunk_id)
+        else:
+            return None
+
+        self._chunks[chunk_id] = chunk
+        if self.max_chunks is not None and len(self._chunks) > self.max_chunks:
+            self._spill_chunks()
+        return chunk
+
+    def _spill_chunks(self) -> None:
+        assert self.max_chunks is not None
+        if self._env is None:
+            self._spill = tempfile.TemporaryDirectory(dir=self.directory, prefix="keyset_")
+            self._env = Env((Path(self._spill.name) / "keyset.mdbx").as_posix(), maxdbs=1)
+
+        # A quarter at once, so a write transaction is not needed for every chunk that is read
+        with self._env.rw_transaction() as txn:
+            db = txn.create_map(name=DB_KEYSET, flags=MDBXDBFlags.MDBX_DB_DEFAULTS)
+            for _ in range(max(1, self.max_chunks // 4)):
+                chunk_id, chunk = self._chunks.popitem(last=False)
+                db.put(txn, chunk_id, bytes(chunk))
+            txn.commit()
+
+    def _read_spilled(self, chunk_id: bytes) -> bytearray:
+        assert self._env is not None
+        with self._env.ro_transaction() as txn:
+            db = txn.open_map(name=DB_KEYSET, flags=MDBXDBFlags.MDBX_DB_DEFAULTS)
+            value = db.get(txn, chunk_id)
+            assert value is not None
+            return bytearray(value)
+
+    def add(self, full_key: bytes) -> bool:
+        """Add the key, and return if it was new."""
+        chunk_id, bit = self._locate(full_key)
+        chunk = self._chunk(chunk_id, True)
+        assert chunk is not None
+        mask = 1 << (bit % 8)
+        if chunk[bit // 8] & mask:
+            return False
+
+        chunk[bit // 8] |= mask
+        self._size += 1
+        return True
+
+    def __contains__(self, full_key: object) -> bool:
+        if not isinstance(full_key, bytes):
+            return False
+
+        chunk_id, bit = self._locate(full_key)
+        chunk = self._chunk(chunk_id, False)
+        return chunk is not None and bool(chunk[bit // 8] & (1 << (bit % 8)))
+
+    def __iter__(self) -> Iterator[bytes]:
+        """The keys per class, in the order of their local keys."""
+        for chunk_id in sorted(self._chunk_ids):
+            chunk = self._chunk(chunk_id, False)
+            assert chunk is not None
+            this_clazz_idx = chunk_id[:2]
+            first = int.from_bytes(chunk_id[2:], 'big') * CHUNK_BITS
+            bits = np.unpackbits(np.frombuffer(chunk, dtype=np.uint8), bitorder='little')
+            local_keys = (np.flatnonzero(bits) + first).astype('<u4').tobytes()
+            for i in range(0, len(local_keys), 4):
+                yield Serializer.get_fullkey_by_class_idx(local_keys[i : i + 4], this_clazz_idx)
+
+    def batches(self, batch_size: int) -> Iterator[list[bytes]]:
+        batch: list[bytes] = []
+        for full_key in self:
+            batch.append(full_key)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def close(self) -> None:
+        self._chunks.clear()
+        self._chunk_ids.clear()
+        self._size = 0
+        if self._env is not None:
+            self._env.close()
+            self._env = None
+        if self._spill is not None:
+            self._spill.cleanup()
+            self._spill = None
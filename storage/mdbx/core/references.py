@@ -1,12 +1,14 @@
 import logging
+import time
+from collections import defaultdict
+from itertools import groupby
 
 from mdbx import MDBXCursorOp, MDBXDBFlags
 
-from domain.netex.indexes.inverse_class import collect_classes_index
 from utils.aux_logging import log_all
 from domain.netex.services.model_typing import Tid
 from domain.netex.model import EntityStructure, EntityInVersionStructure, NameOfClass
-from domain.netex.services.recursive_attributes import only_reference_objects, only_embedding, embedding_obj_iter
+from domain.netex.services.recursive_attributes import only_reference_objects, embedding_obj_iter
 from domain.utils import get_object_name
 from storage.interface import Serializer
 
@@ -14,14 +16,14 @@ from storage.mdbx.core.implementation import (
     MdbxStorage,
     DB_UNRESOLVED,
     DB_REFERENCE_OUTWARD,
+    DB_REFERENCE_INWARD,
     DB_ID_IDX,
-    DB_EMBEDDED_ID_IDX,
     DB_UNRESOLVED_FLAGS,
     DB_REFERENCE_OUTWARD_FLAGS,
+    DB_REFERENCE_INWARD_FLAGS,
     DB_ID_IDX_FLAGS,
-    DB_EMBEDDED_ID_IDX_FLAGS,
 )
-from mdbx.mdbx import TXN
+from mdbx.mdbx import TXN, DBI, Cursor
 from typing import Optional, Generator, Any, cast
 
 
@@ -61,280 +63,286 @@ def resolve_embeddings_iterable(
             yield key, obj, candidate
 
 
-def resolve(storage: MdbxStorage) -> None:
-    log_all(logging.INFO, "[resolve] resolving references")
-    if storage.readonly:
-        raise
+def _patch_references(
+    storage: MdbxStorage,
+    txn: TXN,
+    referencing_obj: EntityStructure,
+    references_to_fix: list[tuple[bytes, bytes, bool, bool]],
+    referenced_versions: Optional[dict[bytes, str]] = None,
+) -> None:
+    """
+    Rewrites the references of referencing_obj that were resolved with a different class or version, so the stored
+    object matches the entry in the outward reference index. The object is patched in place, writing it back is up to
+    the caller. An optional referenced_versions dict caches the versions of referenced objects between calls.
+    """
+
+    for resolved_idx, value, version_change, class_change in references_to_fix:
+        referenced_class_idx, referenced_key = Serializer.full_key_to_clazz_idx(resolved_idx)
+
+        for reference in only_reference_objects(referencing_obj):
+            if isinstance(reference.name_of_ref_class, str):
+                # TODO: I think we want to write to the console that a NameOfRefClass has been specified that does not match the natural scope of the Reference.
+                # print(reference.name_of_ref_class, reference)
+                if reference.name_of_ref_class not in storage.serializer.name_object:
+                    reference.name_of_ref_class = NameOfClass.DATA_MANAGED_OBJECT
+                name_of_ref_class = reference.name_of_ref_class
+
+            elif not reference.name_of_ref_class or (reference.name_of_ref_class.value not in storage.serializer.name_object):
+                # TODO: Add a warning.
+                reference.name_of_ref_class = NameOfClass.DATA_MANAGED_OBJECT
+
+            else:
+                name_of_ref_class = reference.name_of_ref_class.value
+
+            cmp_value = storage.serializer.encode_key(
+                reference.ref, getattr(reference, "version", "any"), storage.serializer.name_object[name_of_ref_class]
+            )
+            if value == cmp_value:
+                if class_change:
+                    referenced_class = storage.idx_class[referenced_class_idx]
+                    reference.name_of_ref_class = NameOfClass(
+                        get_object_name(referenced_class)
+                    )  # I am very afraid how this might be handled in terms of comparisons later.
+                if version_change:
+                    version = referenced_versions.get(resolved_idx) if referenced_versions is not None else None
+                    if version is None:
+                        referenced_clazz = storage.idx_class[referenced_class_idx]
+                        referenced_obj: EntityInVersionStructure = cast(EntityInVersionStructure, storage.load_object(txn, referenced_clazz, referenced_key))
+                        version = referenced_obj.version
+                        if referenced_versions is not None:
+                            referenced_versions[resolved_idx] = version
+                    reference.version = version
+
+
+def _match_reference(value: bytes, candidates: list[tuple[bytes, bytes]], separator: bytes) -> tuple[bytes | None, bool, bool]:
+    """
+    Resolves an encoded reference (id, version, class) against candidates, the sorted (key, full_key) pairs of the id
+    index that start with prefix. It follows the same order of preference as the prefix-fallback in resolve():
+    an exact match, then the same id and version with another class, then the same id and class with another version,
+    and finally the last entry with the same id.
+
+    Returns the resolved full key, and whether the version and the class of the reference have to change.
+    """
+
+    for check_key, check_idx in candidates:
+        if check_key == value:
+            return check_idx, False, False
+
+    parts = value.split(separator)
+    class_part = separator + parts[-1]
+    parts.pop()
+    version_prefix = separator.join(parts) + separator
+
+    # Alternative 1, id + version exists, class does not match
+    for check_key, check_idx in candidates:
+        if check_key.startswith(version_prefix):
+            return check_idx, False, True
+
+    # Alternative 2, id exists
+    resolved_idx: bytes | None = None
+    for check_key, check_idx in candidates:
+        if check_key.endswith(class_part):
+            return check_idx, True, False
+        resolved_idx = check_idx
+
+    return resolved_idx, resolved_idx is not None, resolved_idx is not None
+
+
+def _id_prefix(value: bytes, separator: bytes) -> bytes:
+    # The candidates of a reference are all keys that share its id, see _match_reference.
+    return separator.join(value.split(separator)[:-2]) + separator
+
+
+def _fetch_candidates(cursor: Cursor, prefix: bytes) -> list[tuple[bytes, bytes]]:
+    candidates: list[tuple[bytes, bytes]] = []
+    for check_key, check_idx in cursor.iter(prefix):
+        if not check_key.startswith(prefix):
+            break
+        candidates.append((check_key, check_idx))
+    return candidates
+
+
+def _resolve_rows(storage: MdbxStorage, txn: TXN, db_index: DBI) -> tuple[int, int, int]:
+    """
+    Resolves _unresolved row by row against db_index, rewriting a referencing object as soon as its row is done.
+
+    Returns the number of references seen, resolved, and the number of rewritten referencing objects.
+    """
 
     # TODO: get exclusively from KeyCodec
     separator = bytes([10])
 
     seen_count = 0
+    resolved_count = 0
+    rewritten_count = 0
+
+    db_unresolved = txn.open_map(DB_UNRESOLVED, flags=DB_UNRESOLVED_FLAGS)
+    db_reference_forward = txn.open_map(DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)
+    db_reference_inward = storage._open_index(txn, DB_REFERENCE_INWARD, DB_REFERENCE_INWARD_FLAGS)
+
+    cursor = txn.cursor(db=db_index)
+    unresolved_cursor = txn.cursor(db=db_unresolved)
+    for it in unresolved_cursor.iter_dupsort_rows():
+        references_to_fix: list[tuple[bytes, bytes, bool, bool]] = []
+
+        for idx, value in it:
+            seen_count += 1
+            if seen_count % 1_000_000 == 0:
+                log_all(logging.INFO, f"[resolve] {seen_count} references processed...")
+
+            resolved_idx = db_index.get(txn, value)  # This will be the id + version + class check
+            class_change = False
+            version_change = False
+            if not resolved_idx:
+                resolved_idx, version_change, class_change = _match_reference(value, _fetch_candidates(cursor, _id_prefix(value, separator)), separator)
+
+            if resolved_idx:
+                if version_change or class_change:
+                    references_to_fix.append((resolved_idx, value, version_change, class_change))
+
+                db_reference_forward.put(txn, idx, resolved_idx)
+                if db_reference_inward is not None:
+                    db_reference_inward.put(txn, resolved_idx, idx)
+                unresolved_cursor.delete(MDBXCursorOp.MDBX_PREV)
+                resolved_count += 1
+
+        # In this situation the original reference was incomplete
+        if len(references_to_fix) > 0:
+            referencing_class_idx, referencing_key = Serializer.full_key_to_clazz_idx(idx)
+            referencing_class = storage.idx_class[referencing_class_idx]
+            referencing_obj: EntityStructure = storage.load_object(txn, referencing_class, referencing_key)
+            _patch_references(storage, txn, referencing_obj, references_to_fix)
+
+            db = txn.open_map(referencing_class_idx, flags=MDBXDBFlags.MDBX_DB_DEFAULTS)
+            storage._put_value(txn, db, referencing_class_idx, referencing_key, storage.serializer.marshall(referencing_obj, referencing_obj.__class__))
+            rewritten_count += 1
+
+    return seen_count, resolved_count, rewritten_count
+
+
+def _resolve_batched(storage: MdbxStorage, txn: TXN, db_index: DBI) -> tuple[int, int, int]:
+    """
+    Set oriented variant of _resolve_rows(), with identical output.
+
+    Instead of walking _unresolved row by row, all unresolved values are read once and deduplicated. The distinct
+    values are then visited in key order, so the candidates in db_index are fetched by a single cursor that only
+    moves forward: a merge join of the sorted unresolved values against the index. All new outward (and inward)
+    references are written in one pass, and the referencing objects that need a class or version change are rewritten class by class
+    in key order, instead of once per group of references.
+    """
+
+    # TODO: get exclusively from KeyCodec
+    separator = bytes([10])
+
+    db_unresolved = txn.open_map(DB_UNRESOLVED, flags=DB_UNRESOLVED_FLAGS)
+    db_reference_forward = txn.open_map(DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)
+    db_reference_inward = storage._open_index(txn, DB_REFERENCE_INWARD, DB_REFERENCE_INWARD_FLAGS)
+
+    # Many objects reference the same object, every distinct value is looked up only once.
+    unresolved: dict[bytes, list[bytes]] = defaultdict(list)
+    seen_count = 0
+    with txn.cursor(db_unresolved) as cursor:
+        for idx, value in cursor.iter():
+            unresolved[value].append(idx)
+            seen_count += 1
+
+    resolved: list[tuple[bytes, bytes]] = []
+    references_to_fix: dict[bytes, list[tuple[bytes, bytes, bool, bool]]] = defaultdict(list)
+
+    with txn.cursor(db_index) as cursor:
+        prefix: bytes | None = None
+        candidates: list[tuple[bytes, bytes]] = []
+
+        for value in sorted(unresolved.keys()):
+            # Values sharing the id prefix are adjacent, their candidates are only fetched once.
+            value_prefix = _id_prefix(value, separator)
+            if value_prefix != prefix:
+                prefix = value_prefix
+                candidates = _fetch_candidates(cursor, prefix)
+
+            resolved_idx, version_change, class_change = _match_reference(value, candidates, separator)
+            if resolved_idx is None:
+                continue
+
+            for idx in unresolved.pop(value):
+                resolved.append((idx, resolved_idx))
+                if version_change or class_change:
+                    references_to_fix[idx].append((resolved_idx, value, version_change, class_change))
+
+    # The reference maps are integer keyed, writing in integer order keeps the puts local.
+    resolved.sort(key=lambda pair: (int.from_bytes(pair[0], 'little'), int.from_bytes(pair[1], 'little')))
+    for idx, resolved_idx in resolved:
+        db_reference_forward.put(txn, idx, resolved_idx)
+
+    if db_reference_inward is not None:
+        for resolved_idx, idx in sorted(((resolved_idx, idx) for idx, resolved_idx in resolved), key=lambda pair: (int.from_bytes(pair[0], 'little'), int.from_bytes(pair[1], 'little'))):
+            db_reference_inward.put(txn, resolved_idx, idx)
+
+    # Rewriting what remains is cheaper than deleting every resolved entry from the dupsort map.
+    if len(resolved) > 0:
+        remaining = sorted(((idx, value) for value, idxs in unresolved.items() for idx in idxs), key=lambda pair: int.from_bytes(pair[0], 'little'))
+        db_unresolved.drop(txn, delete=False)
+        for idx, value in remaining:
+            db_unresolved.put(txn, idx, value)
+
+    # In this situation the original reference was incomplete, group the rewrites per class in key order
+    referenced_versions: dict[bytes, str] = {}
+    rewrites = sorted(references_to_fix.items(), key=lambda item: (Serializer.full_key_to_clazz(item[0]), Serializer.full_key_to_idx(item[0])))
+    for referencing_class_idx, group in groupby(rewrites, key=lambda item: Serializer.full_key_to_clazz(item[0])):
+        referencing_class = storage.idx_class[referencing_class_idx]
+        db = txn.open_map(referencing_class_idx, flags=MDBXDBFlags.MDBX_DB_DEFAULTS)
+        for idx, fixes in group:
+            referencing_key = Serializer.full_key_to_idx(idx)
+            referencing_obj: EntityStructure = storage.load_object(txn, referencing_class, referencing_key)
+            _patch_references(storage, txn, referencing_obj, fixes, referenced_versions)
+            storage._put_value(txn, db, referencing_class_idx, referencing_key, storage.serializer.marshall(referencing_obj, referencing_obj.__class__))
+
+    return seen_count, len(resolved), len(references_to_fix)
+
+
+def _resolve_against(storage: MdbxStorage, txn: TXN, db_index: DBI, batched: bool) -> None:
+    """
+    The single resolution engine behind resolve() and resolve_embeddings_index(), which only differ in the index
+    (_id_idx or _embedded_id_idx) the unresolved references are matched against. The work is proportional to the
+    number of unresolved references, not to the size of the database.
+    """
+
+    db_unresolved = txn.open_map(DB_UNRESOLVED, flags=DB_UNRESOLVED_FLAGS)
+    log_all(logging.INFO, f"[unresolved references] {db_unresolved.get_stat(txn).ms_entries}")
+
+    start_time = time.perf_counter()
+    if batched:
+        seen_count, resolved_count, rewritten_count = _resolve_batched(storage, txn, db_index)
+    else:
+        seen_count, resolved_count, rewritten_count = _resolve_rows(storage, txn, db_index)
+    elapsed = time.perf_counter() - start_time
+
+    log_all(logging.INFO, f"[unresolved references] {db_unresolved.get_stat(txn).ms_entries}")
+    log_all(
+        logging.INFO,
+        f"[resolve] {resolved_count}/{seen_count} references resolved, {rewritten_count} objects rewritten "
+        f"in {elapsed:.2f}s ({seen_count / elapsed if elapsed > 0 else 0:.0f} references/s)",
+    )
+
+
+def resolve(storage: MdbxStorage, batched: bool = False) -> None:
+    log_all(logging.INFO, "[resolve] resolving references")
+    if storage.readonly:
+        raise
 
     with storage.env.rw_transaction() as txn:
-        db_unresolved = txn.open_map(DB_UNRESOLVED, flags=DB_UNRESOLVED_FLAGS)
         db_id_idx = txn.open_map(DB_ID_IDX, flags=DB_ID_IDX_FLAGS)
-        db_reference_forward = txn.open_map(DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)
-
-        log_all(logging.INFO, f"[unresolved references] {db_unresolved.get_stat(txn).ms_entries}")
-
-        unresolved_cursor = txn.cursor(db=db_unresolved)
-        for it in unresolved_cursor.iter_dupsort_rows():
-            references_to_fix: list[tuple[bytes, bytes | None, bool, bool]] = []
-
-            for idx, value in it:
-                seen_count += 1
-                if seen_count % 1_000_000 == 0:
-                    log_all(logging.INFO, f"[resolve] {seen_count} references processed...")
-                parts: list[bytes]
-                prefix: bytes
-                resolved_idx = db_id_idx.get(txn, value)  # This will be the id + version + class check
-                class_change = False
-                version_change = False
-                if not resolved_idx:
-                    cursor = txn.cursor(db=db_id_idx)
-
-                    parts = storage.serializer.split_key(value)
-                    class_part = separator + parts[-1]
-
-                    # Alternative 1, id + version exists, class does not match
-                    parts.pop()
-                    prefix = separator.join(parts) + separator
-                    for check_key, check_idx in cursor.iter(prefix):
-                        if check_key.startswith(prefix):
-                            class_change = check_idx
-                            resolved_idx = check_idx
-                        break
-
-                    if not resolved_idx:
-                        # Alternative 2, id exists
-                        parts.pop()
-
-                        prefix = separator.join(parts) + separator
-                        for check_key, check_idx in cursor.iter(prefix):
-                            if check_key.startswith(prefix) and check_key.endswith(class_part):
-                                class_change = False
-                                version_change = check_idx
-                                resolved_idx = check_idx
-                                break
-
-                            elif check_key.startswith(prefix):
-                                class_change = check_idx
-                                version_change = check_idx
-                                resolved_idx = check_idx
-                                # Continue to find a better match
-
-                            else:
-                                break
-
-                if resolved_idx:
-                    if version_change or class_change:
-                        references_to_fix.append((resolved_idx, value, version_change, class_change))
-
-                    # f = storage.load_object_by_full_key(txn, idx)
-                    # t = storage.load_object_by_full_key(txn, resolved_idx)
-
-                    # print(f"{f.id} {f.__class__} -> {t.id} {t.__class__}")
-
-                    db_reference_forward.put(txn, idx, resolved_idx)
-                    unresolved_cursor.delete(MDBXCursorOp.MDBX_PREV)
-
-                # else:
-                #    print("unresolved", value, idx)
-
-            # In this situation the original reference was incomplete
-            if len(references_to_fix) > 0:
-                referencing_class_idx, referencing_key = Serializer.full_key_to_clazz_idx(idx)
-                referencing_class = storage.idx_class[referencing_class_idx]
-                referencing_obj: EntityStructure = storage.load_object(txn, referencing_class, referencing_key)
-
-                for resolved_idx, value, version_change, class_change in references_to_fix:
-                    referenced_class_idx, referenced_key = Serializer.full_key_to_clazz_idx(resolved_idx)
-
-                    for reference in only_reference_objects(referencing_obj):
-                        if isinstance(reference.name_of_ref_class, str):
-                            # TODO: I think we want to write to the console that a NameOfRefClass has been specified that does not match the natural scope of the Reference.
-                            # print(reference.name_of_ref_class, reference)
-                            if reference.name_of_ref_class not in storage.serializer.name_object:
-                                reference.name_of_ref_class = NameOfClass.DATA_MANAGED_OBJECT
-                            name_of_ref_class = reference.name_of_ref_class
-
-                        elif not reference.name_of_ref_class or (reference.name_of_ref_class.value not in storage.serializer.name_object):
-                            # TODO: Add a warning.
-                            reference.name_of_ref_class = NameOfClass.DATA_MANAGED_OBJECT
-
-                        else:
-                            name_of_ref_class = reference.name_of_ref_class.value
-
-                        cmp_value = storage.serializer.encode_key(
-                            reference.ref, getattr(reference, "version", "any"), storage.serializer.name_object[name_of_ref_class]
-                        )
-                        if value == cmp_value:
-                            if class_change:
-                                referenced_class = storage.idx_class[referenced_class_idx]
-                                reference.name_of_ref_class = NameOfClass(
-                                    get_object_name(referenced_class)
-                                )  # I am very afraid how this might be handled in terms of comparisons later.
-                            if version_change:
-                                referenced_clazz = storage.idx_class[referenced_class_idx]
-                                referenced_obj: EntityInVersionStructure = cast(EntityInVersionStructure, storage.load_object(txn, referenced_clazz, referenced_key))
-                                reference.version = referenced_obj.version
-
-                # TODO: buffer this write to ~10000 objects of the same type?
-                db = txn.open_map(referencing_class_idx, flags=MDBXDBFlags.MDBX_DB_DEFAULTS)
-                db.put(txn, referencing_key, storage.serializer.marshall(referencing_obj, referencing_obj.__class__))
-
-        log_all(logging.INFO, f"[unresolved references] {db_unresolved.get_stat(txn).ms_entries}")
+        _resolve_against(storage, txn, db_id_idx, batched)
         txn.commit()
 
 
-def resolve_embeddings_index(storage: MdbxStorage) -> None:
+def resolve_embeddings_index(storage: MdbxStorage, batched: bool = False) -> None:
     log_all(logging.INFO, "[resolve] resolving embeddings")
-
-    missing_classes = set([])
-    unresolved_pairs: dict[bytes, set[bytes]] = {}
-    parts: list[bytes]
-
-    # TODO: fix with keycodec
-    separator = bytes([10])
-
     if storage.readonly:
         raise
 
     with storage.env.rw_transaction() as txn:
-        db_unresolved = txn.open_map(DB_UNRESOLVED, flags=DB_UNRESOLVED_FLAGS)
-        db_id_idx = txn.create_map(DB_EMBEDDED_ID_IDX, flags=DB_EMBEDDED_ID_IDX_FLAGS)
-        db_reference_forward = txn.open_map(DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)
-
-        unresolved_cursor = txn.cursor(db=db_unresolved)
-        for idx, value in unresolved_cursor.iter():
-            # print(idx, value)
-            parts = storage.serializer.split_key(value)
-            unresolved_pairs.setdefault(value, set()).add(idx)
-            missing_classes.add(storage.idx_class[parts[-1]])
-
-        log_all(logging.INFO, f"[unresolved references] {db_unresolved.get_stat(txn).ms_entries}")
-
-        used_classes_in_database = set(storage.db_names(txn).values())
-        index = collect_classes_index(used_classes_in_database, scope_classes=missing_classes)
-        clazzes: set[type] = set().union(*index.values())
-
-        for clazz in clazzes:
-            this_class_idx = storage.class_idx[clazz]
-            db = txn.open_map(this_class_idx, flags=MDBXDBFlags.MDBX_DB_DEFAULTS)
-            with txn.cursor(db) as cur:
-                for idx, value in cur.iter():
-                    full_key = idx + this_class_idx.ljust(4, b'\x00')
-                    obj: EntityStructure = storage.serializer.unmarshall(value, clazz)
-
-                    # TODO: None should be replaced with the set of potential sub classes, hence the superset of missing_classes
-                    for candidate, _obj in only_embedding(storage.serializer, obj):  # we zouden hier direct het path binnen het object ook kunnen opslaan
-                        db_id_idx.put(txn, candidate, full_key)
-
-        # TODO: If this works, deduplicate the code with the regular one
-        unresolved_cursor = txn.cursor(db=db_unresolved)
-        for it in unresolved_cursor.iter_dupsort_rows():
-            references_to_fix: list[tuple[bytes, bytes, bool, bool]] = []
-
-            for idx, value in it:
-                prefix: bytes
-                resolved_idx = db_id_idx.get(txn, value)  # This will be the id + version + class check
-                class_change = False
-                version_change = False
-                if not resolved_idx:
-                    cursor = txn.cursor(db=db_id_idx)
-
-                    parts = storage.serializer.split_key(value)
-                    class_part = separator + parts[-1]
-
-                    # Alternative 1, id + version exists, class does not match
-                    parts.pop()
-                    prefix = separator.join(parts) + separator
-                    for check_key, check_idx in cursor.iter(prefix):
-                        if check_key.startswith(prefix):
-                            class_change = check_idx
-                            resolved_idx = check_idx
-                        break
-
-                    if not resolved_idx:
-                        # Alternative 2, id exists
-                        parts.pop()
-
-                        prefix = separator.join(parts) + separator
-                        for check_key, check_idx in cursor.iter(prefix):
-                            if check_key.startswith(prefix) and check_key.endswith(class_part):
-                                class_change = False
-                                version_change = check_idx
-                                resolved_idx = check_idx
-                                break
-
-                            elif check_key.startswith(prefix):
-                                class_change = check_idx
-                                version_change = check_idx
-                                resolved_idx = check_idx
-                                # Continue to find a better match
-
-                            else:
-                                break
-
-                if resolved_idx:
-                    if version_change or class_change:
-                        references_to_fix.append((resolved_idx, value, version_change, class_change))
-
-                    # f = storage.load_object_by_full_key(txn, idx)
-                    # t = storage.load_object_by_full_key(txn, resolved_idx)
-
-                    # print(f"{f.id} {f.__class__} -> {t.id} {t.__class__}")
-
-                    db_reference_forward.put(txn, idx, resolved_idx)
-                    unresolved_cursor.delete(MDBXCursorOp.MDBX_PREV)
-
-                # else:
-                #    print("unresolved", value, idx)
-
-            # In this situation the original reference was incomplete
-            if len(references_to_fix) > 0:
-                referencing_class_idx, referencing_key = Serializer.full_key_to_clazz_idx(idx)
-                referencing_class = storage.idx_class[referencing_class_idx]
-                referencing_obj: EntityStructure = storage.load_object(txn, referencing_class, referencing_key)
-
-                for resolved_idx, value, version_change, class_change in references_to_fix:
-                    referenced_class_idx, referenced_key = Serializer.full_key_to_clazz_idx(resolved_idx)
-
-                    for reference in only_reference_objects(referencing_obj):
-                        if isinstance(reference.name_of_ref_class, str):
-                            # TODO: I think we want to write to the console that a NameOfRefClass has been specified that does not match the natural scope of the Reference.
-                            # print(reference.name_of_ref_class, reference)
-                            if reference.name_of_ref_class not in storage.serializer.name_object:
-                                reference.name_of_ref_class = NameOfClass.DATA_MANAGED_OBJECT
-                            name_of_ref_class = reference.name_of_ref_class
-
-                        elif not reference.name_of_ref_class or (reference.name_of_ref_class.value not in storage.serializer.name_object):
-                            # TODO: Add a warning.
-                            reference.name_of_ref_class = NameOfClass.DATA_MANAGED_OBJECT
-
-                        else:
-                            name_of_ref_class = reference.name_of_ref_class.value
-
-                        cmp_value = storage.serializer.encode_key(
-                            reference.ref, getattr(reference, "version", "any"), storage.serializer.name_object[name_of_ref_class]
-                        )
-                        if value == cmp_value:
-                            if class_change:
-                                referenced_class = storage.idx_class[referenced_class_idx]
-                                reference.name_of_ref_class = NameOfClass(
-                                    get_object_name(referenced_class)
-                                )  # I am very afraid how this might be handled in terms of comparisons later.
-                            if version_change:
-                                referenced_clazz = storage.idx_class[referenced_class_idx]
-                                referenced_obj: EntityInVersionStructure = cast(EntityInVersionStructure, storage.load_object(txn, referenced_clazz, referenced_key))
-                                reference.version = referenced_obj.version
-
-                # TODO: buffer this write to ~10000 objects of the same type?
-                db = txn.open_map(referencing_class_idx, flags=MDBXDBFlags.MDBX_DB_DEFAULTS)
-                db.put(txn, referencing_key, storage.serializer.marshall(referencing_obj, referencing_obj.__class__))
-
-        log_all(logging.INFO, f"[unresolved references] {db_unresolved.get_stat(txn).ms_entries}")
-
-        db_id_idx.drop(txn, delete=True)
+        # The index is maintained on insert, only databases without it require a full scan here.
+        db_embedded_id_idx = storage._index_embedded_ids(txn)
+        _resolve_against(storage, txn, db_embedded_id_idx, batched)
         txn.commit()
@@ -1,19 +1,32 @@
-from typing import Any, cast
+from typing import Any, Callable, Sequence, cast
 
-from domain.netex import EntityStructure
+from domain.netex import EntityStructure, model as netex
 from domain.netex.services.model_typing import Tid
 from storage.interface import Serializer
 from storage.keycodec.interface import KeyCodec
 from storage.keycodec.baseline import BaseLineKeyCodec
 from storage.objectserializer.interface import ObjectSerializer
 from storage.objectserializer.codecs.lz4 import Lz4Codec
+from storage.objectserializer.codecs.zstd import ZstdCodec
 from storage.objectserializer.cloudpickle.serializer import CloudPickleSerializer
 from storage.objectserializer.pipeline import PipelineSerializer
+from storage.objectserializer.schema.serializer import SchemaSerializer, model_classes
+
+# The object serializers a database can be created with, the name is stored in the database itself.
+OBJECT_SERIALIZERS: dict[str, Callable[[], ObjectSerializer]] = {
+    "cloudpickle+lz4": lambda: PipelineSerializer(object_serializer=CloudPickleSerializer(), codecs=[Lz4Codec()]),
+    "schema+lz4": lambda: PipelineSerializer(object_serializer=SchemaSerializer(model_classes(netex)), codecs=[Lz4Codec()]),
+    "cloudpickle+zstd": lambda: PipelineSerializer(object_serializer=CloudPickleSerializer(), codecs=[ZstdCodec()]),
+    "schema+zstd": lambda: PipelineSerializer(object_serializer=SchemaSerializer(model_classes(netex)), codecs=[ZstdCodec()]),
+}
+DEFAULT_OBJECT_SERIALIZER = "cloudpickle+lz4"
 
 
 class CombinedSerializer(Serializer):
     key_codec: type[KeyCodec]
     object_serializer: ObjectSerializer
+    # Overrides object_serializer for classes with a trained dictionary, see set_dictionary()
+    class_object_serializers: dict[type[Any], ObjectSerializer]
 
     def __init__(
         self,
@@ -24,6 +37,38 @@ class CombinedSerializer(Serializer):
         super().__init__(classes)
         self.key_codec = key_codec
         self.object_serializer = object_serializer
+        self.class_object_serializers = {}
+
+    @property
+    def schema_serializer(self) -> SchemaSerializer | None:
+        object_serializer = self.object_serializer
+        if isinstance(object_serializer, PipelineSerializer):
+            object_serializer = object_serializer.object_serializer
+
+        return object_serializer if isinstance(object_serializer, SchemaSerializer) else None
+
+    @property
+    def zstd_codec(self) -> ZstdCodec | None:
+        return self.class_zstd_codec(None)
+
+    def class_zstd_codec(self, clazz: type[Any] | None) -> ZstdCodec | None:
+        """The zstd codec objects of clazz are compressed with, if any."""
+        object_serializer = self.class_object_serializers.get(clazz, self.object_serializer) if clazz is not None else self.object_serializer
+        if isinstance(object_serializer, PipelineSerializer):
+            for codec in object_serializer.codecs:
+                if isinstance(codec, ZstdCodec):
+                    return codec
+
+        return None
+
+    def set_dictionary(self, clazz: type[Any], dictionary: bytes) -> None:
+        """Compress objects of clazz against dictionary, requires an object serializer with a ZstdCodec."""
+        zstd_codec = self.zstd_codec
+        if zstd_codec is None or not isinstance(self.object_serializer, PipelineSerializer):
+            raise ValueError("Dictionaries require an object serializer with zstd compression")
+
+        codecs = [zstd_codec.with_dictionary(dictionary) if codec is zstd_codec else codec for codec in self.object_serializer.codecs]
+        self.class_object_serializers[clazz] = PipelineSerializer(object_serializer=self.object_serializer.object_serializer, codecs=codecs)
 
     def encode_key_idx(self, id: str, version: str | None, clazz_idx: bytes) -> bytes:
         return self.key_codec.encode_key_idx(id, version, clazz_idx)
@@ -35,7 +80,11 @@ class CombinedSerializer(Serializer):
         return self.key_codec.split_key(key)
 
     def marshall(self, obj: Any, clazz: type[Tid]) -> bytes:
-        return self.object_serializer.dumps(obj)
+        return self.class_object_serializers.get(clazz, self.object_serializer).dumps(obj)
 
     def unmarshall(self, obj: bytes, clazz: type[Tid]) -> Tid:
-        return cast(Tid, self.object_serializer.loads(obj))
+        # Any codec sharing the dictionaries decodes any record, so the class does not have to be exact
+        return cast(Tid, self.class_object_serializers.get(clazz, self.object_serializer).loads(obj))
+
+    def unmarshall_fields(self, obj: bytes, clazz: type[Tid], fields: Sequence[str]) -> dict[str, Any]:
+        return self.class_object_serializers.get(clazz, self.object_serializer).loads_fields(obj, fields)
@@ -7,13 +7,25 @@ from domain.netex.services.model_typing import Tid
 from domain.netex.services.utils import get_boring_classes
 from domain.utils import get_object_name
 from storage.mdbx.core.implementation import MdbxStorage, DB_ID_IDX, DB_UNRESOLVED, DB_REFERENCE_OUTWARD, DB_CLASS_IDX
+from storage.mdbx.tools.graph import (
+    build_graph,
+    order_graph,
+    count_forward_refs,
+    build_reference_graph,
+    order_reference_graph,
+    count_forward_references,
+)
+from domain.netex.services.recursive_attributes import get_all_geo_elements
+from transformers.projection import Reprojection, reprojection_update
 import time
+import tracemalloc
 
 def benchmark_mdbx(storage: MdbxStorage) -> None:
     db_names = storage.db_names()
     results = []
     results_metadata = []
     total_entries = 0
+    total_bytes = 0
     total_elapsed = 0.0
 
     with storage.env.ro_transaction() as txn:
@@ -21,6 +33,7 @@ def benchmark_mdbx(storage: MdbxStorage) -> None:
             db = txn.open_map(db_name, flags=MDBXDBFlags.MDBX_DB_DEFAULTS)
             entries = db.get_stat(txn).ms_entries
             start_time = time.perf_counter()
+            size = 0
 
             with (
                 txn.cursor(db) as cursor,
@@ -33,12 +46,14 @@ def benchmark_mdbx(storage: MdbxStorage) -> None:
             ):
                 for key, value in cursor.iter():
                     _obj: Tid = storage.serializer.unmarshall(value, clazz)
+                    size += len(value)
                     pbar.update(1)
 
             elapsed = time.perf_counter() - start_time
-            results.append((get_object_name(clazz), entries, elapsed))
+            results.append((get_object_name(clazz), entries, size, elapsed))
 
             total_entries += entries
+            total_bytes += size
             total_elapsed += elapsed
 
         for db_name in (DB_CLASS_IDX, DB_ID_IDX, DB_UNRESOLVED, DB_REFERENCE_OUTWARD):
@@ -65,13 +80,15 @@ def benchmark_mdbx(storage: MdbxStorage) -> None:
 
     # Markdown-tabel printen
     print("\n### LMDB Benchmark Results")
-    print("| Database | Entries | Time (s) |")
-    print("|----------|--------:|---------:|")
-    for name, entries, elapsed in results:
+    file_size = sum(f.stat().st_size for f in storage.path.iterdir()) if storage.path.is_dir() else storage.path.stat().st_size
+    print(f"Object serializer: {storage.object_serializer_name}, file size: {file_size}")
+    print("| Database | Entries | Bytes | Time (s) |")
+    print("|----------|--------:|------:|---------:|")
+    for name, entries, size, elapsed in results:
         if name[0] != '_':
-            print(f"| {name} | {entries} | {elapsed:.4f} |")
+            print(f"| {name} | {entries} | {size} | {elapsed:.4f} |")
 
-    print(f"| Total: | {total_entries} | {total_elapsed:.4f} |")
+    print(f"| Total: | {total_entries} | {total_bytes} | {total_elapsed:.4f} |")
 
     print("\n## Metadata")
     print("| Database | Entries | Time (s) |")
@@ -81,9 +98,75 @@ def benchmark_mdbx(storage: MdbxStorage) -> None:
             print(f"| {name} | {entries} | {elapsed:.4f} |")
 
 
+def benchmark_export_order(storage: MdbxStorage) -> None:
+    """Compare the export order of the dict based order_graph() with the CSR based order_reference_graph()."""
+    results = []
+
+    with storage.env.ro_transaction() as txn:
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        try:
+            graph = build_graph(txn)
+            order = order_graph(graph)
+            results.append(("order_graph", len(order), str(count_forward_refs(order, graph)), time.perf_counter() - start_time, tracemalloc.get_traced_memory()[1]))
+            del graph, order
+        except RecursionError:
+            results.append(("order_graph", 0, "RecursionError", time.perf_counter() - start_time, tracemalloc.get_traced_memory()[1]))
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        reference_graph = build_reference_graph(txn)
+        reference_order = order_reference_graph(reference_graph)
+        forwards = count_forward_references(reference_graph, reference_order)
+        results.append(("order_reference_graph", len(reference_order), str(forwards), time.perf_counter() - start_time, tracemalloc.get_traced_memory()[1]))
+        tracemalloc.stop()
+
+    print("\n### Export order")
+    print("| Implementation | Objects | Forward references | Time (s) | Peak memory (MB) |")
+    print("|----------------|--------:|-------------------:|---------:|-----------------:|")
+    for name, objects, forwards, elapsed, peak in results:
+        print(f"| {name} | {objects} | {forwards} | {elapsed:.4f} | {peak / 2**20:.1f} |")
+
+
+def benchmark_reprojection(storage: MdbxStorage, crs_to: str = "urn:ogc:def:crs:EPSG::4326") -> None:
+    """The points per second of reprojection per object, against the batches of reprojection_update()."""
+    results = []
+
+    with storage.env.ro_transaction() as txn:
+        geo_classes = set(storage.db_names(txn).values()).intersection(set(get_all_geo_elements()))
+
+        start_time = time.perf_counter()
+        objects = 0
+        points = 0
+        for clazz in geo_classes:
+            for _key, obj in storage.iter_objects(txn, clazz):
+                batch = Reprojection(crs_to, force_latlon=True)
+                batch.add(obj)
+                batch.apply()
+                objects += 1
+                points += batch.points
+        results.append(("per object", objects, points, time.perf_counter() - start_time))
+
+        start_time = time.perf_counter()
+        objects = sum(1 for _ in reprojection_update(storage, txn, crs_to, force_latlon=True))
+        results.append(("reprojection_update", objects, points, time.perf_counter() - start_time))
+
+    print("\n### Reprojection")
+    print("| Implementation | Objects | Points | Time (s) | Points/s |")
+    print("|----------------|--------:|-------:|---------:|---------:|")
+    for name, objects, points, elapsed in results:
+        print(f"| {name} | {objects} | {points} | {elapsed:.4f} | {points / max(elapsed, 1e-9):.0f} |")
+
+
 if __name__ == "__main__":
     import sys
 
     interesting_members = get_boring_classes()
     with MdbxStorage(Path(sys.argv[1]), readonly=True) as storage:
-        benchmark_mdbx(storage)
+        if sys.argv[2:] == ["export_order"]:
+            benchmark_export_order(storage)
+        elif sys.argv[2:] == ["reprojection"]:
+            benchmark_reprojection(storage)
+        else:
+            benchmark_mdbx(storage)
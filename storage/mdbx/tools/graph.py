@@ -13,9 +13,12 @@ from storage.mdbx.core.implementation import (
 )
 
 from domain.netex.model import EntityStructure
-from collections import defaultdict
+from array import array
+from collections import Counter, defaultdict
 from typing import Iterable, Generator
 
+import numpy as np
+
 
 # --- 1) graph bouwen (nodes uit DB_ID_IDX, edges uit DB_REFERENCE_OUTWARD) ---
 def build_graph(txn: TXN) -> dict[bytes, set[bytes]]:
@@ -258,19 +261,369 @@ def list_forward_examples(order: list[bytes], graph: dict[bytes, set[bytes]], li
     return out
 
 
-# --- 7) streaming export generator ---
-def export_objects(txn: TXN, storage: MdbxStorage) -> Generator[EntityStructure, None, None]:
+# -------------------------
+# 6) Compacte graaf: integer node ids in CSR layout
+# -------------------------
+class ReferenceGraph:
+    """
+    The reference graph in NumPy arrays, for databases where a dict of sets of full keys does not fit in memory. The
+    nodes are numbered in the byte order of their full keys, so sorting nodes sorts their keys; keys[node] is the full
+    key as a big-endian integer. The references of node u are indices[indptr[u]:indptr[u + 1]]. Like the nodes that
+    strongly_connected_components() reaches through build_graph(), a referenced key is a node, also without an object.
+    """
+
+    def __init__(self, keys: np.ndarray, sources: np.ndarray, targets: np.ndarray):
+        self.keys = np.unique(np.concatenate((keys, sources, targets)))
+        self.nodes = len(self.keys)
+
+        source_ids = np.searchsorted(self.keys, sources).astype(np.int32)
+        by_source = np.argsort(source_ids, kind='stable')
+        self.indices = np.searchsorted(self.keys, targets)[by_source].astype(np.int32)
+        self.indptr = np.zeros(self.nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(source_ids, minlength=self.nodes), out=self.indptr[1:])
+
+    @property
+    def edges(self) -> int:
+        return len(self.indices)
+
+    @property
+    def classes(self) -> np.ndarray:
+        # full_key[4:6] as a big-endian number, which orders like Serializer.full_key_to_clazz()
+        return ((self.keys >> 16) & 0xFFFF).astype(np.uint16)
+
+    def full_key(self, node: int) -> bytes:
+        return int(self.keys[node]).to_bytes(8, 'big')
+
+    def references(self, node: int) -> np.ndarray:
+        return self.indices[self.indptr[node] : self.indptr[node + 1]]
+
+
+def full_keys_to_array(full_keys: bytes | bytearray) -> np.ndarray:
+    return np.frombuffer(full_keys, dtype='>u8').astype(np.uint64)
+
+
+def build_reference_graph(txn: TXN) -> ReferenceGraph:
+    """build_graph() into a ReferenceGraph: the keys are collected as bytes, 8 per key, instead of as objects in sets."""
+    keys = bytearray()
+    sources = bytearray()
+    targets = bytearray()
+
+    db_ids = txn.open_map(DB_ID_IDX, flags=DB_ID_IDX_FLAGS)
+    with txn.cursor(db_ids) as cursor:
+        for _, full_idx in cursor:
+            keys += full_idx
+
+    db_refs = txn.open_map(DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)
+    with txn.cursor(db_refs) as cursor:
+        for referencing_key, reference_key in cursor:
+            sources += referencing_key
+            targets += reference_key
+
+    return ReferenceGraph(full_keys_to_array(keys), full_keys_to_array(sources), full_keys_to_array(targets))
+
+
+def strongly_connected_components_csr(graph: ReferenceGraph) -> tuple[np.ndarray, int]:
+    """
+    Iterative Tarjan over a ReferenceGraph, with an explicit call stack, so long reference chains do not hit the
+    recursion limit. Returns the component of every node and the number of components. The components are numbered
+    in the order they are completed, so a component is numbered after every component it references.
+    """
+    nodes = graph.nodes
+    indptr = memoryview(graph.indptr)
+    indices = memoryview(graph.indices)
+
+    component = np.full(nodes, -1, dtype=np.int32)
+    component_of = memoryview(component)
+    index_of = memoryview(np.full(nodes, -1, dtype=np.int32))
+    lowlink = memoryview(np.zeros(nodes, dtype=np.int32))
+    stack = memoryview(np.empty(nodes, dtype=np.int32))
+    call_node = memoryview(np.empty(nodes, dtype=np.int32))
+    call_edge = memoryview(np.empty(nodes, dtype=np.int64))
+
+    index = 0
+    components = 0
+    top = 0
+    for root in range(nodes):  # in key order, voor determinisme
+        if index_of[root] >= 0:
+            continue
+
+        index_of[root] = lowlink[root] = index
+        index += 1
+        stack[top] = root
+        top += 1
+        call_node[0] = root
+        call_edge[0] = indptr[root]
+        depth = 1
+
+        while depth:
+            v = call_node[depth - 1]
+            e = call_edge[depth - 1]
+            end = indptr[v + 1]
+            descended = False
+            while e < end:
+                w = indices[e]
+                e += 1
+                if index_of[w] < 0:
+                    call_edge[depth - 1] = e
+                    index_of[w] = lowlink[w] = index
+                    index += 1
+                    stack[top] = w
+                    top += 1
+                    call_node[depth] = w
+                    call_edge[depth] = indptr[w]
+                    depth += 1
+                    descended = True
+                    break
+
+                # A node without a component is still on the stack
+                if component_of[w] < 0 and index_of[w] < lowlink[v]:
+                    lowlink[v] = index_of[w]
+
+            if descended:
+                continue
+
+            depth -= 1
+            if lowlink[v] == index_of[v]:
+                while True:
+                    top -= 1
+                    w = stack[top]
+                    component_of[w] = components
+                    if w == v:
+                        break
+                components += 1
+
+            if depth:
+                u = call_node[depth - 1]
+                if lowlink[v] < lowlink[u]:
+                    lowlink[u] = lowlink[v]
+
+    return component, components
+
+
+def order_component(graph: ReferenceGraph, members: list[int], classes: np.ndarray, scc_lookahead_threshold: int = 500) -> list[int]:
+    """greedy_minimize_forward_within_scc() and sort_scc_by_internal_indegree() over the node ids of a ReferenceGraph."""
+    inside = set(members)
+    out_inside = {n: {v for v in graph.references(n).tolist() if v in inside} for n in members}
+
+    if len(members) > scc_lookahead_threshold:
+        indeg = Counter(v for vs in out_inside.values() for v in vs)
+        return sorted(members, key=lambda n: (-indeg[n], int(classes[n]), n))
+
+    remaining = set(members)
+    order: list[int] = []
+    while remaining:
+        best = min(remaining, key=lambda n: (len(out_inside[n]), int(classes[n]), n))
+        order.append(best)
+        remaining.remove(best)
+        for u in remaining:
+            out_inside[u].discard(best)
+
+    return order
+
+
+def order_reference_graph(graph: ReferenceGraph, scc_lookahead_threshold: int = 500) -> np.ndarray:
+    """
+    order_graph() over a ReferenceGraph: Kahn on the reversed condensation, which writes a component after the
+    components it references, and clusters the components by their smallest class. Returns the node ids in export
+    order. The queues of available components are arrays of 4 bytes per component.
+    """
+    component, count = strongly_connected_components_csr(graph)
+    classes = graph.classes
+
+    sizes = np.bincount(component, minlength=count)
+    min_class = np.full(count, 0xFFFF, dtype=np.uint16)
+    np.minimum.at(min_class, component, classes)
+    members = np.argsort(component, kind='stable').astype(np.int32)
+    member_ptr = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(sizes, out=member_ptr[1:])
+
+    # The edges of the condensation, once per pair of components
+    sources = np.repeat(component, np.diff(graph.indptr))
+    targets = component[graph.indices]
+    cross = sources != targets
+    pairs = np.unique(sources[cross].astype(np.int64) * count + targets[cross])
+    sources = (pairs // count).astype(np.int32)
+    targets = (pairs % count).astype(np.int32)
+    del pairs, cross
+
+    # A component becomes available when every component it references has been written
+    remaining = np.bincount(sources, minlength=count)
+    preds = sources[np.argsort(targets, kind='stable')]
+    pred_ptr = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(targets, minlength=count), out=pred_ptr[1:])
+    del sources, targets
+
+    queues: dict[int, array[int]] = {}
+    heads: dict[int, int] = {}
+    initial = np.flatnonzero(remaining == 0)
+    initial = initial[np.lexsort((initial, sizes[initial], min_class[initial]))].astype(np.int32)
+    for cls, start, length in zip(*np.unique(min_class[initial], return_index=True, return_counts=True)):
+        queue = array('i')
+        queue.frombytes(initial[start : start + length].tobytes())
+        queues[int(cls)] = queue
+        heads[int(cls)] = 0
+    del initial
+
+    result = np.empty(graph.nodes, dtype=np.int32)
+    result_v = memoryview(result)
+    remaining_v = memoryview(remaining)
+    members_v = memoryview(members)
+    member_ptr_v = memoryview(member_ptr)
+    preds_v = memoryview(preds)
+    pred_ptr_v = memoryview(pred_ptr)
+    min_class_v = memoryview(min_class)
+    written = 0
+
+    while True:
+        # Cluster the class with the smallest index among the available components
+        current_class = min((cls for cls, queue in queues.items() if heads[cls] < len(queue)), default=None)
+        if current_class is None:
+            break
+
+        queue = queues[current_class]
+        head = heads[current_class]
+        while head < len(queue):
+            s = queue[head]
+            head += 1
+
+            start = member_ptr_v[s]
+            end = member_ptr_v[s + 1]
+            if end - start == 1:
+                result_v[written] = members_v[start]
+                written += 1
+            else:
+                ordered = order_component(graph, members[start:end].tolist(), classes, scc_lookahead_threshold)
+                result[written : written + len(ordered)] = ordered
+                written += len(ordered)
+
+            for i in range(pred_ptr_v[s], pred_ptr_v[s + 1]):
+                p = preds_v[i]
+                remaining_v[p] -= 1
+                if remaining_v[p] == 0:
+                    cls = min_class_v[p]
+                    if cls not in queues:
+                        queues[cls] = array('i')
+                        heads[cls] = 0
+                    queues[cls].append(p)
+
+        # Everything queued for this class has been written
+        queues[current_class] = array('i')
+        heads[current_class] = 0
+
+    return result
+
+
+def count_forward_references(graph: ReferenceGraph, order: np.ndarray) -> int:
+    """count_forward_refs() over a ReferenceGraph and an order of its node ids."""
+    position = np.empty(graph.nodes, dtype=np.int64)
+    position[order] = np.arange(len(order))
+    sources = np.repeat(np.arange(graph.nodes, dtype=np.int32), np.diff(graph.indptr))
+    return int(np.count_nonzero(position[sources] < position[graph.indices]))
+
+
+# -------------------------
+# 7) Closures van veel roots tegelijk
+# -------------------------
+def class_number(class_idx: bytes) -> int:
+    """The class_idx of a class as it is in ReferenceGraph.classes."""
+    return int.from_bytes(class_idx, 'big')
+
+
+def closure_graph(graph: ReferenceGraph, inward: Iterable[tuple[int, int]]) -> ReferenceGraph:
+    """
+    The graph of what the closure of a node takes along: everything it references and, for every pair of (referenced
+    class, referencing class) in inward, the objects of the referencing class that reference it.
+    """
+    classes = graph.classes.astype(np.uint32)
+    sources = np.repeat(np.arange(graph.nodes, dtype=np.int32), np.diff(graph.indptr))
+    targets = graph.indices
+    pairs = np.array([(referenced << 16) | referencing for referenced, referencing in inward], dtype=np.uint32)
+    taken = np.isin((classes[targets] << 16) | classes[sources], pairs)
+    return ReferenceGraph(
+        graph.keys, graph.keys[np.concatenate((sources, targets[taken]))], graph.keys[np.concatenate((targets, sources[taken]))]
+    )
+
+
+def closure_memberships(graph: ReferenceGraph, roots: np.ndarray) -> tuple[np.ndarray, list[frozenset[int]]]:
+    """
+    The closures of all roots in a single pass, instead of a traversal per root: the roots are propagated over the
+    components of the graph, from a component to the components it references, in the reverse order of completion.
+    A closure does not continue into another root. The node ids of roots are those of graph. Returns for every node the index of the set of roots, by their
+    position in roots, of which it is in the closure, and these sets; sets[0] is the empty set. Objects shared by the
+    same roots share their set, a union of two sets is only computed once.
+    """
+    # Without the references to the roots, a closure does not continue into another root
+    nodes = np.repeat(np.arange(graph.nodes, dtype=np.int32), np.diff(graph.indptr))
+    is_root = np.zeros(graph.nodes, dtype=np.bool_)
+    is_root[roots] = True
+    kept = ~is_root[graph.indices]
+    graph = ReferenceGraph(graph.keys, graph.keys[nodes[kept]], graph.keys[graph.indices[kept]])
+
+    component, count = strongly_connected_components_csr(graph)
+    sources = component[np.repeat(np.arange(graph.nodes, dtype=np.int32), np.diff(graph.indptr))]
+    targets = component[graph.indices]
+    between = sources != targets
+    # A component is numbered after every component it references, from the highest number every edge into a component is seen before its own edges
+    edges = np.unique((sources[between].astype(np.int64) << 32) | targets[between].astype(np.int64))[::-1]
+    edge_sources = memoryview((edges >> 32).astype(np.int32))
+    edge_targets = memoryview((edges & 0xFFFFFFFF).astype(np.int32))
+
+    sets: list[frozenset[int]] = [frozenset()]
+    interned: dict[frozenset[int], int] = {frozenset(): 0}
+    unions: dict[tuple[int, int], int] = {}
+
+    def intern(members: frozenset[int]) -> int:
+        result = interned.get(members)
+        if result is None:
+            result = interned[members] = len(sets)
+            sets.append(members)
+        return result
+
+    def union(a: int, b: int) -> int:
+        if a == b or b == 0:
+            return a
+        if a == 0:
+            return b
+        pair = (a, b) if a < b else (b, a)
+        result = unions.get(pair)
+        if result is None:
+            result = unions[pair] = intern(sets[a] | sets[b])
+        return result
+
+    membership = np.zeros(count, dtype=np.int32)
+    for i, node in enumerate(roots.tolist()):
+        c = int(component[node])
+        membership[c] = union(int(membership[c]), intern(frozenset((i,))))
+
+    membership_of = memoryview(membership)
+    for e in range(len(edge_sources)):
+        m = membership_of[edge_sources[e]]
+        if m:
+            d = edge_targets[e]
+            membership_of[d] = union(membership_of[d], m)
+
+    return membership[component], sets
+
+
+# --- 8) streaming export generator ---
+def export_objects(txn: TXN, storage: MdbxStorage, batch_size: int = 10_000) -> Generator[EntityStructure, None, None]:
     log_all(logging.INFO, "[export_objects] building export order...")
-    graph = build_graph(txn)
-    order = order_graph(graph)
-    total_forwards = count_forward_refs(order, graph)
+    graph = build_reference_graph(txn)
+    order = order_reference_graph(graph)
+    total_forwards = count_forward_references(graph, order)
     total = len(order)
     log_all(logging.INFO, f"[export_objects] exporting {total} objects ({total_forwards} forward references)")
-    # stream objects (consumed lazily during XML serialisation)
-    for i, full_key in enumerate(order, start=1):
-        if i % 100_000 == 0:
-            log_all(logging.INFO, f"[export_objects] {i}/{total} objects exported...")
-        obj = storage.load_object_by_full_key(txn, full_key)
-        if obj:
-            yield obj
+    # only the keys are needed from here on
+    keys = graph.keys
+    del graph
+    # stream objects (consumed lazily during XML serialisation), loaded per batch_size in the order of the database
+    for start in range(0, total, batch_size):
+        if start and start % 100_000 < batch_size:
+            log_all(logging.INFO, f"[export_objects] {start}/{total} objects exported...")
+        full_keys = [int(key).to_bytes(8, 'big') for key in keys[order[start : start + batch_size]]]
+        objects = dict(storage.load_objects_by_full_keys(txn, full_keys))
+        for full_key in full_keys:
+            obj = objects.get(full_key)
+            if obj:
+                yield obj
     log_all(logging.INFO, f"[export_objects] {total} objects exported")
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from typing import Sequence
+
+import zstandard
+
+from storage.objectserializer.interface import ByteCodec
+
+
+class ZstdCodec(ByteCodec):
+    """
+    Zstandard compression codec, optionally against a trained dictionary.
+
+    Small records of the same class repeat most of their structure, which a dictionary trained on samples of them
+    captures once. Every frame carries the id of the dictionary it was compressed with, so a codec decodes the frames
+    of any dictionary in the shared dictionaries mapping, and frames compressed without a dictionary.
+    """
+
+    def __init__(
+        self,
+        compression_level: int = 3,
+        dictionary: bytes | None = None,
+        dictionaries: dict[int, bytes] | None = None,
+    ):
+        self._compression_level = compression_level
+        # By dictionary id, shared with the codecs created by with_dictionary()
+        self._dictionaries = dictionaries if dictionaries is not None else {}
+        self._decompressors: dict[int, zstandard.ZstdDecompressor] = {}
+
+        if dictionary is None:
+            self.dictionary_id = 0
+            self._compressor = zstandard.ZstdCompressor(level=compression_level)
+        else:
+            dict_data = zstandard.ZstdCompressionDict(dictionary)
+            self.dictionary_id = dict_data.dict_id()
+            self._dictionaries[self.dictionary_id] = dictionary
+            self._compressor = zstandard.ZstdCompressor(level=compression_level, dict_data=dict_data)
+
+    @staticmethod
+    def train(samples: Sequence[bytes], dictionary_size: int = 64 * 1024) -> bytes:
+        """Train a dictionary on samples of the uncompressed records, raises zstandard.ZstdError on too few samples."""
+        return zstandard.train_dictionary(dictionary_size, list(samples)).as_bytes()
+
+    @staticmethod
+    def frame_dictionary_id(data: bytes) -> int:
+        return zstandard.get_frame_parameters(data).dict_id
+
+    def with_dictionary(self, dictionary: bytes) -> ZstdCodec:
+        """A codec that compresses against dictionary, and decodes everything this codec decodes."""
+        return ZstdCodec(self._compression_level, dictionary, self._dictionaries)
+
+    def encode(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def decode(self, data: bytes) -> bytes:
+        dictionary_id = self.frame_dictionary_id(data)
+        decompressor = self._decompressors.get(dictionary_id)
+        if decompressor is None:
+            if dictionary_id == 0:
+                decompressor = zstandard.ZstdDecompressor()
+            else:
+                dictionary = self._dictionaries.get(dictionary_id)
+                if dictionary is None:
+                    raise ValueError(f"Record is compressed with the unknown dictionary {dictionary_id}")
+                decompressor = zstandard.ZstdDecompressor(dict_data=zstandard.ZstdCompressionDict(dictionary))
+            self._decompressors[dictionary_id] = decompressor
+
+        return decompressor.decompress(data)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, Sequence
 
 
 class ObjectSerializer(ABC):
@@ -23,6 +23,15 @@ class ObjectSerializer(ABC):
         """
         raise NotImplementedError
 
+    def loads_fields(self, data: bytes, fields: Sequence[str]) -> dict[str, Any]:
+        """
+        Deserialize only the given fields of an object.
+
+        Serializers that can skip the other fields override this, the default deserializes the entire object.
+        """
+        obj = self.loads(data)
+        return {field: getattr(obj, field) for field in fields}
+
 
 class ByteCodec(ABC):
     """
@@ -28,6 +28,14 @@ class PipelineSerializer(ObjectSerializer):
         self._object_serializer = object_serializer
         self._codecs = tuple(codecs)
 
+    @property
+    def object_serializer(self) -> ObjectSerializer:
+        return self._object_serializer
+
+    @property
+    def codecs(self) -> tuple[ByteCodec, ...]:
+        return self._codecs
+
     def dumps(self, obj: Any) -> bytes:
         data = self._object_serializer.dumps(obj)
 
@@ -41,3 +49,9 @@ class PipelineSerializer(ObjectSerializer):
             data = codec.decode(data)
 
         return self._object_serializer.loads(data)
+
+    def loads_fields(self, data: bytes, fields: Sequence[str]) -> dict[str, Any]:
+        for codec in reversed(self._codecs):
+            data = codec.decode(data)
+
+        return self._object_serializer.loads_fields(data, fields)
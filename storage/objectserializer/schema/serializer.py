@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import inspect
+import json
+import pickle
+from decimal import Decimal
+from enum import Enum
+from types import ModuleType
+from typing import Any, Callable, Iterable, Sequence
+from xml.etree.ElementTree import QName
+
+from xsdata.formats.dataclass.models.generics import AnyElement, DerivedElement
+from xsdata.models.datatype import XmlDate, XmlDateTime, XmlDuration, XmlPeriod, XmlTime
+
+from storage.objectserializer.interface import ObjectSerializer
+
+# Values that are not a primitive, a list or a registered class are encoded as a tuple starting with a negative tag.
+_TAG_TUPLE = -1
+_TAG_DICT = -2
+_TAG_PICKLE = -3
+
+# Scalar types that round trip through their string representation.
+_STRING_TYPES: dict[type, tuple[int, Callable[[str], Any]]] = {
+    Decimal: (-10, Decimal),
+    XmlDuration: (-14, XmlDuration),
+    XmlPeriod: (-15, XmlPeriod),
+    QName: (-16, QName),
+}
+_STRING_TAGS: dict[int, Callable[[str], Any]] = {tag: factory for tag, factory in _STRING_TYPES.values()}
+
+# Named tuples of primitives, parsing their string representation is much slower than rebuilding them from the fields.
+_TUPLE_TYPES: dict[type, int] = {
+    XmlDateTime: -11,
+    XmlDate: -12,
+    XmlTime: -13,
+}
+_TUPLE_TAGS: dict[int, type] = {tag: clazz for clazz, tag in _TUPLE_TYPES.items()}
+
+_PRIMITIVES = (str, int, float, bool, bytes, type(None))
+
+# Builds a value from its encoded tuple, given the decoders of the schema the record was written with.
+_Decoder = Callable[[tuple[Any, ...], list[Any]], Any]
+
+
+def model_classes(module: ModuleType) -> list[type]:
+    """
+    All dataclasses and enums that module exports, in a stable order. The classes of a package are defined in its
+    submodules, as with the clusters layout of xsdata, so those count as well; classes imported from elsewhere do not.
+    """
+    names = getattr(module, '__all__', None)
+    members = [(name, getattr(module, name)) for name in names] if names is not None else inspect.getmembers(module, inspect.isclass)
+
+    classes: dict[type, None] = {}
+    for _name, clazz in sorted(members, key=lambda member: member[0]):
+        if not inspect.isclass(clazz) or not (clazz.__module__ == module.__name__ or clazz.__module__.startswith(module.__name__ + '.')):
+            continue
+        if dataclasses.is_dataclass(clazz) or issubclass(clazz, Enum):
+            classes[clazz] = None
+
+    return list(classes)
+
+
+def _class_name(clazz: type) -> str:
+    return f"{clazz.__module__}.{clazz.__qualname__}"
+
+
+class Schema:
+    """
+    The field table of a set of classes: a class is identified by its position, and the fields of a dataclass by
+    their position in dataclasses.fields(). A schema is identified by a fingerprint of its contents, which is written
+    in front of every record, so records remain readable after the model has changed.
+    """
+
+    def __init__(self, classes: list[tuple[str, list[str] | None]]):
+        # A class name, with the names of its fields, or None for an enum
+        self.classes = classes
+        self.fingerprint = int.from_bytes(hashlib.blake2b(self.to_bytes(), digest_size=4).digest(), 'little')
+
+    @staticmethod
+    def from_classes(classes: Iterable[type]) -> Schema:
+        return Schema(
+            [
+                (_class_name(clazz), [field.name for field in dataclasses.fields(clazz)] if dataclasses.is_dataclass(clazz) else None)
+                for clazz in list(classes) + [AnyElement, DerivedElement]
+            ]
+        )
+
+    @staticmethod
+    def from_bytes(data: bytes) -> Schema:
+        return Schema([(name, fields) for name, fields in json.loads(data)])
+
+    def to_bytes(self) -> bytes:
+        return json.dumps(self.classes, separators=(',', ':')).encode('utf-8')
+
+
+class SchemaSerializer(ObjectSerializer):
+    """
+    Serializer that encodes dataclasses by their schema instead of by name.
+
+    A dataclass becomes a tuple of its class index followed by the index and value of every field that differs from
+    its default, an enum becomes a tuple of its class index and value. The resulting tree of tuples, lists and
+    primitives is written by pickle, which does not have to store a class path or a field name anymore.
+
+    Records written with another schema can be read after registering that schema, fields that no longer exist are
+    dropped, new fields get their default. Because every field of a record is a separate value in the tree,
+    loads_fields() decodes the requested fields without building the rest of the object.
+    """
+
+    def __init__(self, classes: Iterable[type]):
+        classes = list(classes)
+        self._schema = Schema.from_classes(classes)
+        self._by_name: dict[str, type] = {_class_name(clazz): clazz for clazz in classes + [AnyElement, DerivedElement]}
+
+        self._class_id: dict[type, int] = {}
+        self._encode_fields: dict[type, list[tuple[int, str, Any]]] = {}
+        for class_id, (name, fields) in enumerate(self._schema.classes):
+            clazz = self._by_name[name]
+            self._class_id[clazz] = class_id
+            if fields is not None:
+                self._encode_fields[clazz] = [(i, field.name, self._default(field)) for i, field in enumerate(dataclasses.fields(clazz))]
+
+        self._decoders: dict[int, list[_Decoder | None]] = {}
+        # By fingerprint, the class and the field names of every class id, for loads_fields()
+        self._schema_classes: dict[int, list[tuple[type | None, list[str] | None]]] = {}
+        self.register_schema(self._schema)
+
+    @property
+    def schema(self) -> Schema:
+        return self._schema
+
+    @staticmethod
+    def _default(field: dataclasses.Field[Any]) -> Any:
+        if field.default is not dataclasses.MISSING:
+            return field.default
+        elif field.default_factory is not dataclasses.MISSING:
+            return field.default_factory()
+        return dataclasses.MISSING
+
+    def register_schema(self, schema: Schema) -> None:
+        """Make records written with schema readable."""
+        decoders: list[_Decoder | None] = []
+        for name, fields in schema.classes:
+            clazz = self._by_name.get(name)
+            if clazz is None:
+                decoders.append(None)
+            elif fields is None:
+                decoders.append(self._enum_decoder(clazz))
+            else:
+                known = {field.name for field in dataclasses.fields(clazz) if field.init}
+                decoders.append(self._dataclass_decoder(clazz, [field if field in known else None for field in fields]))
+
+        self._decoders[schema.fingerprint] = decoders
+        self._schema_classes[schema.fingerprint] = [(self._by_name.get(name), fields) for name, fields in schema.classes]
+
+    def _enum_decoder(self, clazz: type) -> _Decoder:
+        decode_value = self._decode_value
+
+        def decode(value: tuple[Any, ...], decoders: list[_Decoder | None]) -> Any:
+            return clazz(decode_value(value[1], decoders))
+
+        return decode
+
+    def _dataclass_decoder(self, clazz: type, names: list[str | None]) -> _Decoder:
+        decode_value = self._decode_value
+
+        if None in names:
+            # Written with another schema, skip the fields that no longer exist
+            def decode_other(value: tuple[Any, ...], decoders: list[_Decoder | None]) -> Any:
+                kwargs = {}
+                for i in range(1, len(value), 2):
+                    name = names[value[i]]
+                    if name is not None:
+                        kwargs[name] = decode_value(value[i + 1], decoders)
+                return clazz(**kwargs)
+
+            return decode_other
+
+        def decode(value: tuple[Any, ...], decoders: list[_Decoder | None]) -> Any:
+            kwargs = {}
+            fields = iter(value)
+            next(fields)
+            for i, field_value in zip(fields, fields):
+                # Most values are primitives, only descend into the others
+                field_type = type(field_value)
+                if field_type is tuple or field_type is list:
+                    field_value = decode_value(field_value, decoders)
+                kwargs[names[i]] = field_value
+            return clazz(**kwargs)
+
+        return decode
+
+    def _encode_value(self, value: Any) -> Any:
+        value_type = type(value)
+        if value_type in _PRIMITIVES:
+            return value
+        elif value_type is list:
+            return [self._encode_value(item) for item in value]
+
+        encode_fields = self._encode_fields.get(value_type)
+        if encode_fields is not None:
+            encoded: list[Any] = [self._class_id[value_type]]
+            for i, name, default in encode_fields:
+                field_value = getattr(value, name)
+                if field_value is default or (type(field_value) is type(default) and field_value == default):
+                    continue
+                encoded.append(i)
+                encoded.append(self._encode_value(field_value))
+            return tuple(encoded)
+
+        class_id = self._class_id.get(value_type)
+        if class_id is not None:
+            return class_id, self._encode_value(value.value)
+
+        string_type = _STRING_TYPES.get(value_type)
+        if string_type is not None:
+            return string_type[0], str(value)
+
+        tuple_tag = _TUPLE_TYPES.get(value_type)
+        if tuple_tag is not None:
+            return tuple_tag, *value
+        elif value_type is tuple:
+            return _TAG_TUPLE, [self._encode_value(item) for item in value]
+        elif value_type is dict:
+            return _TAG_DICT, [(self._encode_value(k), self._encode_value(v)) for k, v in value.items()]
+
+        return _TAG_PICKLE, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _decode_value(self, value: Any, decoders: list[_Decoder | None]) -> Any:
+        value_type = type(value)
+        if value_type is tuple:
+            tag = value[0]
+            if tag >= 0:
+                decoder = decoders[tag]
+                if decoder is None:
+                    raise ValueError("Record contains a class that is not part of the model anymore")
+                return decoder(value, decoders)
+            elif tag == _TAG_TUPLE:
+                return tuple(self._decode_value(item, decoders) for item in value[1])
+            elif tag == _TAG_DICT:
+                return {self._decode_value(k, decoders): self._decode_value(v, decoders) for k, v in value[1]}
+            elif tag == _TAG_PICKLE:
+                return pickle.loads(value[1])
+
+            tuple_type = _TUPLE_TAGS.get(tag)
+            if tuple_type is not None:
+                return tuple_type(*value[1:])
+            return _STRING_TAGS[tag](value[1])
+        elif value_type is list:
+            return [self._decode_value(item, decoders) for item in value]
+
+        return value
+
+    def dumps(self, obj: Any) -> bytes:
+        return pickle.dumps((self._schema.fingerprint, self._encode_value(obj)), protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _load_tree(self, data: bytes) -> tuple[int, Any, list[_Decoder | None]]:
+        fingerprint, value = pickle.loads(data)
+        decoders = self._decoders.get(fingerprint)
+        if decoders is None:
+            raise ValueError(f"Unknown schema {fingerprint:08x}, register it first")
+
+        return fingerprint, value, decoders
+
+    def loads(self, data: bytes) -> Any:
+        _fingerprint, value, decoders = self._load_tree(data)
+        return self._decode_value(value, decoders)
+
+    def loads_fields(self, data: bytes, fields: Sequence[str]) -> dict[str, Any]:
+        fingerprint, value, decoders = self._load_tree(data)
+
+        clazz, names = (None, None) if type(value) is not tuple or value[0] < 0 else self._schema_classes[fingerprint][value[0]]
+        if clazz is None or names is None:
+            # Not a dataclass
+            obj = self._decode_value(value, decoders)
+            return {field: getattr(obj, field) for field in fields}
+
+        wanted = set(fields)
+        values: dict[str, Any] = {}
+        for i in range(1, len(value), 2):
+            name = names[value[i]]
+            if name in wanted:
+                values[name] = self._decode_value(value[i + 1], decoders)
+
+        if len(values) < len(wanted):
+            dataclass_fields = {field.name: field for field in dataclasses.fields(clazz)}
+            for name in wanted - values.keys():
+                if name not in dataclass_fields:
+                    raise AttributeError(f"{clazz.__name__} has no field {name}")
+                default = self._default(dataclass_fields[name])
+                if default is dataclasses.MISSING:
+                    # A required field the record does not have, fails as the full decode does
+                    obj = self._decode_value(value, decoders)
+                    return {field: getattr(obj, field) for field in fields}
+                values[name] = default
+
+        return values
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import dataclasses
+import pickle
+from decimal import Decimal
+from enum import Enum
+from types import ModuleType
+from typing import Any
+
+import pytest
+from xsdata.models.datatype import XmlDateTime, XmlTime
+
+from domain.netex import model as netex
+from domain.netex.model import ScheduledStopPoint, PrivateCode, PrivateCodes, MultilingualString, TextType, LocationStructure2
+
+from storage.objectserializer.cloudpickle.serializer import CloudPickleSerializer
+from storage.objectserializer.schema.serializer import Schema, SchemaSerializer, _TAG_PICKLE, model_classes
+from storage.objectserializer.tests.contracts.serializer_contract import (
+    assert_serializer_roundtrip,
+)
+
+SCHEDULED_STOP_POINT = ScheduledStopPoint(
+    id="NL:OPENOV:ScheduledStopPoint:1",
+    version="1",
+    name=MultilingualString(content=[TextType(lang="nl", value="Hello World")]),
+    private_codes=PrivateCodes(private_code=[PrivateCode(type_value="type", value="value")]),
+    location=LocationStructure2(longitude=Decimal('12.13'), latitude=Decimal('23.16')),
+)
+
+
+@dataclasses.dataclass(kw_only=True)
+class Evolved:
+    name: str | None = None
+    added: list[str] = dataclasses.field(default_factory=list)
+
+
+@dataclasses.dataclass(kw_only=True)
+class Required:
+    name: str | None = None
+    code: str
+
+
+@pytest.fixture(scope="module")
+def object_serializer() -> SchemaSerializer:
+    return SchemaSerializer(model_classes(netex) + [Evolved, Required])
+
+
+def test_schema_roundtrip(object_serializer: SchemaSerializer) -> None:
+    assert_serializer_roundtrip(
+        object_serializer,
+        SCHEDULED_STOP_POINT,
+    )
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        None,
+        True,
+        False,
+        0,
+        -1,
+        123456789,
+        "",
+        "hello world",
+        b"binary data",
+        [],
+        [1, 2, 3],
+        (1, "a"),
+        {},
+        {
+            "key": "value",
+        },
+        Decimal("1.5"),
+        XmlDateTime.from_string("2026-01-01T12:00:00+01:00"),
+        XmlTime.from_string("23:59:00"),
+        {1, 2},
+    ],
+)
+def test_schema_builtin_types(
+    object_serializer: SchemaSerializer,
+    value: Any,
+) -> None:
+    assert_serializer_roundtrip(
+        object_serializer,
+        value,
+    )
+
+
+def test_schema_encodes_model_objects_by_class(object_serializer: SchemaSerializer) -> None:
+    """
+    A model object is a tuple starting with its class id, not a pickle of the object.
+    """
+
+    _fingerprint, value = pickle.loads(object_serializer.dumps(SCHEDULED_STOP_POINT))
+
+    name = f"{ScheduledStopPoint.__module__}.{ScheduledStopPoint.__qualname__}"
+    assert value[0] != _TAG_PICKLE
+    assert object_serializer.schema.classes[value[0]][0] == name
+
+
+def test_model_classes_of_a_package() -> None:
+    """
+    xsdata generates a package that imports its classes from submodules.
+    """
+
+    package = ModuleType("generated")
+    submodule = ModuleType("generated.cluster")
+
+    @dataclasses.dataclass
+    class Defined:
+        pass
+
+    class Kind(Enum):
+        A = "a"
+
+    for clazz in (Defined, Kind):
+        clazz.__module__ = submodule.__name__
+        setattr(package, clazz.__name__, clazz)
+
+    # Imported from elsewhere, so not a class of the model
+    package.Evolved = Evolved
+    package.__all__ = ["Kind", "Defined", "Evolved"]
+
+    assert model_classes(package) == [Defined, Kind]
+    assert model_classes(netex)
+
+
+def test_schema_is_smaller_than_cloudpickle(object_serializer: SchemaSerializer) -> None:
+    """
+    Neither the class paths nor the field names are part of a record.
+    """
+
+    assert len(object_serializer.dumps(SCHEDULED_STOP_POINT)) < len(CloudPickleSerializer().dumps(SCHEDULED_STOP_POINT)) / 2
+
+
+def test_schema_reads_records_of_a_registered_schema(object_serializer: SchemaSerializer) -> None:
+    """
+    A record written before "removed" was dropped from, and "added" was added to Evolved.
+    """
+
+    name = f"{Evolved.__module__}.{Evolved.__qualname__}"
+    old_schema = Schema([(name, ["removed", "name"])])
+    record = pickle.dumps((old_schema.fingerprint, (0, 0, "gone", 1, "kept")))
+
+    with pytest.raises(ValueError):
+        object_serializer.loads(record)
+
+    object_serializer.register_schema(Schema.from_bytes(old_schema.to_bytes()))
+
+    assert object_serializer.loads(record) == Evolved(name="kept")
+
+
+def test_schema_loads_fields(object_serializer: SchemaSerializer) -> None:
+    data = object_serializer.dumps(SCHEDULED_STOP_POINT)
+
+    assert object_serializer.loads_fields(data, ["id", "name", "responsibility_set_ref_attribute"]) == {
+        "id": SCHEDULED_STOP_POINT.id,
+        "name": SCHEDULED_STOP_POINT.name,
+        "responsibility_set_ref_attribute": None,
+    }
+
+    with pytest.raises(AttributeError):
+        object_serializer.loads_fields(data, ["unknown"])
+
+
+def test_schema_loads_fields_without_a_required_field(object_serializer: SchemaSerializer) -> None:
+    """
+    A record written before the required "code" was added to Required.
+    """
+
+    name = f"{Required.__module__}.{Required.__qualname__}"
+    old_schema = Schema([(name, ["name"])])
+    object_serializer.register_schema(old_schema)
+    record = pickle.dumps((old_schema.fingerprint, (0, 0, "kept")))
+
+    assert object_serializer.loads_fields(record, ["name"]) == {"name": "kept"}
+
+    # The same error as the full decode, not a value of dataclasses.MISSING
+    with pytest.raises(TypeError):
+        object_serializer.loads(record)
+    with pytest.raises(TypeError):
+        object_serializer.loads_fields(record, ["name", "code"])
+
+
+def test_cloudpickle_loads_fields() -> None:
+    """
+    Serializers that cannot skip fields deserialize the entire object.
+    """
+
+    serializer = CloudPickleSerializer()
+
+    assert serializer.loads_fields(serializer.dumps(SCHEDULED_STOP_POINT), ["id"]) == {"id": SCHEDULED_STOP_POINT.id}
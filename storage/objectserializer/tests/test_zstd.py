@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from storage.objectserializer.cloudpickle.serializer import CloudPickleSerializer
+from storage.objectserializer.codecs.zstd import ZstdCodec
+from storage.objectserializer.pipeline import PipelineSerializer
+
+from storage.objectserializer.tests.contracts.serializer_contract import (
+    assert_serializer_roundtrip,
+)
+
+from domain.netex.model import ScheduledStopPoint, PrivateCode, PrivateCodes, MultilingualString, TextType, LocationStructure2
+from decimal import Decimal
+
+
+def scheduled_stop_point(i: int) -> ScheduledStopPoint:
+    return ScheduledStopPoint(
+        id=f"NL:OPENOV:ScheduledStopPoint:{i}",
+        version="1",
+        name=MultilingualString(content=[TextType(lang="nl", value=f"Stop {i}")]),
+        private_codes=PrivateCodes(private_code=[PrivateCode(type_value="type", value=str(i))]),
+        location=LocationStructure2(longitude=Decimal(f'12.{i}'), latitude=Decimal(f'23.{i}')),
+    )
+
+
+@pytest.fixture(scope="module")
+def dictionary() -> bytes:
+    samples = [CloudPickleSerializer().dumps(scheduled_stop_point(i)) for i in range(1_000)]
+    return ZstdCodec.train(samples, 4 * 1024)
+
+
+@pytest.mark.parametrize("value", [None, "", "hello world", [1, 2, 3], {"key": "value"}])
+def test_zstd_builtin_types(value: Any) -> None:
+    assert_serializer_roundtrip(
+        PipelineSerializer(object_serializer=CloudPickleSerializer(), codecs=[ZstdCodec()]),
+        value,
+    )
+
+
+def test_zstd_dictionary_roundtrip(dictionary: bytes) -> None:
+    assert_serializer_roundtrip(
+        PipelineSerializer(object_serializer=CloudPickleSerializer(), codecs=[ZstdCodec().with_dictionary(dictionary)]),
+        scheduled_stop_point(1_001),
+    )
+
+
+def test_zstd_dictionary_is_smaller(dictionary: bytes) -> None:
+    """
+    A small record is mostly structure that the dictionary already contains.
+    """
+
+    raw = CloudPickleSerializer().dumps(scheduled_stop_point(1_001))
+    codec = ZstdCodec()
+
+    assert len(codec.with_dictionary(dictionary).encode(raw)) < len(codec.encode(raw)) / 2
+
+
+def test_zstd_decodes_frames_of_every_shared_dictionary(dictionary: bytes) -> None:
+    raw = CloudPickleSerializer().dumps(scheduled_stop_point(1_001))
+    codec = ZstdCodec()
+    with_dictionary = codec.with_dictionary(dictionary)
+
+    assert ZstdCodec.frame_dictionary_id(with_dictionary.encode(raw)) == with_dictionary.dictionary_id != 0
+    assert codec.decode(with_dictionary.encode(raw)) == raw
+    assert with_dictionary.decode(codec.encode(raw)) == raw
+
+    with pytest.raises(ValueError):
+        ZstdCodec().decode(with_dictionary.encode(raw))
@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+from storage.lxml.core.implementation import XmlStorage
+
+
+def open_files() -> int:
+    return len(os.listdir("/proc/self/fd"))
+
+
+class TestXmlStorage(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "netex.zip"
+        with zipfile.ZipFile(self.path, "w") as archive:
+            archive.writestr("a.xml", b"<a/>")
+            archive.writestr("b.xml", b"<b/>")
+            archive.writestr("readme.txt", b"")
+
+    def test_members_are_listed(self) -> None:
+        self.assertEqual(XmlStorage(self.path).list_netex_files(), ["a.xml", "b.xml"])
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "counts the open file descriptors")
+    def test_archive_is_closed_with_its_member(self) -> None:
+        before = open_files()
+        members = []
+        for name in XmlStorage(self.path).list_netex_files():
+            with XmlStorage(self.path).open_netex_member(name) as member:
+                self.assertEqual(member.read(), f"<{name[0]}/>".encode())
+            # Kept, so the archive is not closed by the garbage collector instead
+            members.append(member)
+
+        self.assertEqual(open_files(), before)
@@ -0,0 +1,74 @@
+from domain.netex.model import Line, AuthorityRef, AllPublicTransportModesEnumeration, MultilingualString, TextType
+
+from tests.base import MdbxStorageTestCase
+
+
+def make_line(id: str, authority: str, transport_mode: AllPublicTransportModesEnumeration, names: list[str]) -> Line:
+    return Line(
+        id=id,
+        version="1",
+        name=MultilingualString(content=[TextType(value=name) for name in names]),
+        authority_ref=AuthorityRef(ref=authority, version="1"),
+        transport_mode=transport_mode,
+    )
+
+
+class TestAttributeIndex(MdbxStorageTestCase):
+    def find_ids(self, path: str, values: list[str]) -> set[str]:
+        with self.storage.env.ro_transaction() as txn:
+            return {self.storage.load_object(txn, Line, key).id for key in self.storage.find(txn, Line, path, values)}
+
+    def test_find_with_and_without_index(self) -> None:
+        self.storage.insert_objects_on_queue(
+            Line,
+            [
+                make_line("l1", "a1", AllPublicTransportModesEnumeration.BUS, ["One", "Een"]),
+                make_line("l2", "a2", AllPublicTransportModesEnumeration.RAIL, ["Two"]),
+                make_line("l3", "a1", AllPublicTransportModesEnumeration.RAIL, ["Three"]),
+            ],
+        )
+
+        expected = {
+            ("authority_ref.ref", "a1"): {"l1", "l3"},
+            ("transport_mode", "rail"): {"l2", "l3"},
+            ("name.content[].value", "Een"): {"l1"},
+            ("name.content[].value", "Four"): set(),
+        }
+
+        # Scans until the index exists, then the same answers come from the index
+        for path, value in expected:
+            self.assertEqual(self.find_ids(path, [value]), expected[(path, value)])
+
+        with self.storage.env.rw_transaction() as txn:
+            for path in {path for path, _value in expected}:
+                self.storage.create_attribute_index(txn, Line, path)
+            txn.commit()
+
+        for path, value in expected:
+            self.assertEqual(self.find_ids(path, [value]), expected[(path, value)])
+
+        self.assertEqual(self.find_ids("authority_ref.ref", ["a1", "a2"]), {"l1", "l2", "l3"})
+
+    def test_index_is_maintained_on_insert(self) -> None:
+        self.storage.insert_objects_on_queue(Line, [make_line("l1", "a1", AllPublicTransportModesEnumeration.BUS, ["One"])])
+
+        with self.storage.env.rw_transaction() as txn:
+            self.storage.create_attribute_index(txn, Line, "authority_ref.ref")
+            txn.commit()
+
+        # Overwrite l1 with another authority, and add l2
+        self.storage.insert_objects_on_queue(
+            Line,
+            [
+                make_line("l1", "a2", AllPublicTransportModesEnumeration.BUS, ["One"]),
+                make_line("l2", "a1", AllPublicTransportModesEnumeration.BUS, ["Two"]),
+            ],
+        )
+
+        self.assertEqual(self.find_ids("authority_ref.ref", ["a1"]), {"l2"})
+        self.assertEqual(self.find_ids("authority_ref.ref", ["a2"]), {"l1"})
+
+        # The declaration is kept by the database
+        self.storage.attribute_indexes = {}
+        self.storage._restore_metadata()
+        self.assertEqual(set(self.storage.attribute_indexes[self.storage.class_idx[Line]]), {"authority_ref.ref"})
@@ -0,0 +1,90 @@
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from conv.split_db_to_db import write_split_keys
+from domain.netex.model import Line, LineRef, Route
+from storage.mdbx.core.references import resolve
+from storage.mdbx.tools.graph import ReferenceGraph, closure_graph, closure_memberships, full_keys_to_array
+
+from tests.base import MdbxStorageTestCase
+
+
+def full_key(idx: int, class_idx: int) -> bytes:
+    return idx.to_bytes(4, 'little') + class_idx.to_bytes(2, 'big') + b'\x00\x00'
+
+
+def reference_graph(graph: dict[bytes, set[bytes]]) -> ReferenceGraph:
+    edges = [(u, v) for u, vs in graph.items() for v in vs]
+    return ReferenceGraph(
+        full_keys_to_array(b''.join(graph.keys())), full_keys_to_array(b''.join(u for u, _ in edges)), full_keys_to_array(b''.join(v for _, v in edges))
+    )
+
+
+def closure(graph: ReferenceGraph, root: int, roots: set[int]) -> set[int]:
+    seen = {root}
+    stack = [root]
+    while stack:
+        for node in graph.references(stack.pop()).tolist():
+            if node not in seen and node not in roots:
+                seen.add(node)
+                stack.append(node)
+    return seen
+
+
+class TestClosureMemberships(unittest.TestCase):
+    def test_same_closures_as_a_traversal_per_root(self) -> None:
+        rng = random.Random(7)
+        for trial in range(50):
+            nodes = [full_key(i, rng.randint(0, 3)) for i in range(rng.randint(1, 40))]
+            graph: dict[bytes, set[bytes]] = {node: set() for node in nodes}
+            for _ in range(rng.randint(0, 2 * len(nodes))):
+                graph[rng.choice(nodes)].add(rng.choice(nodes))
+
+            with self.subTest(trial=trial):
+                csr = reference_graph(graph)
+                roots = np.array(sorted(rng.sample(range(csr.nodes), rng.randint(1, min(5, csr.nodes)))), dtype=np.int32)
+                membership, sets = closure_memberships(csr, roots)
+
+                self.assertEqual(sets[0], frozenset())
+                self.assertEqual(len(sets), len(set(sets)))
+                for i, root in enumerate(roots.tolist()):
+                    expected = closure(csr, root, set(roots.tolist()) - {root})
+                    self.assertEqual({node for node in range(csr.nodes) if i in sets[membership[node]]}, expected)
+
+    def test_inward_references_of_a_class_pair_are_taken_along(self) -> None:
+        line, route, other_route, journey, stop = full_key(1, 1), full_key(2, 2), full_key(3, 2), full_key(4, 3), full_key(5, 4)
+        # route -> line, journey -> route -> stop, other_route -> stop
+        csr = reference_graph({line: set(), route: {line, stop}, other_route: {stop}, journey: {route}, stop: set()})
+
+        pulled = closure_graph(csr, [(1, 2), (2, 3)])
+        members = closure(pulled, int(np.searchsorted(pulled.keys, full_keys_to_array(line)[0])), set())
+
+        # The route of the line and its journey, not the other route that only shares the stop
+        self.assertEqual({pulled.full_key(node) for node in members}, {line, route, journey, stop})
+
+
+class TestSplitKeys(MdbxStorageTestCase):
+    def test_every_line_gets_its_routes_and_journey_patterns(self) -> None:
+        line, route, sjp = self.make_line_route_sjp()
+        other_line = Line(id="l2", version="1")
+        other_route = Route(id="r2", version="1", line_ref=LineRef(ref="l2", version="1"))
+        with self.storage.env.rw_transaction() as txn_write:
+            self.storage.insert_any_object_on_queue(txn_write, [line, route, sjp, other_line, other_route])
+            txn_write.commit()
+        resolve(self.storage)
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        splits = write_split_keys(self.storage, Line, Path(tmp.name))
+
+        with self.storage.env.ro_transaction() as txn:
+            ids = {}
+            for object_id, keys_file in splits:
+                full_keys = keys_file.read_bytes()
+                ids[object_id] = {obj.id for _, obj in self.storage.load_objects_by_full_keys(txn, [full_keys[i : i + 8] for i in range(0, len(full_keys), 8)])}
+
+        self.assertEqual(ids, {"l1": {"l1", "r1", "sjp1"}, "l2": {"l2", "r2"}})
@@ -0,0 +1,81 @@
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from mdbx import MDBXDBFlags
+
+from domain.netex.model import ScheduledStopPoint, MultilingualString, TextType, LocationStructure2
+
+from storage.mdbx.core.dictionaries import train_dictionaries
+from storage.mdbx.core.implementation import MdbxStorage, DB_METADATA, DB_METADATA_FLAGS, METADATA_DICTIONARY
+from storage.objectserializer.codecs.zstd import ZstdCodec
+
+from tests.base import MdbxStorageTestCase
+
+
+def scheduled_stop_point(i: int) -> ScheduledStopPoint:
+    return ScheduledStopPoint(
+        id=f"SSP:{i}",
+        version="1",
+        name=MultilingualString(content=[TextType(lang="nl", value=f"Stop {i}")]),
+        location=LocationStructure2(longitude=Decimal(f"5.{i}"), latitude=Decimal(f"52.{i}")),
+    )
+
+
+class TestDictionaries(MdbxStorageTestCase):
+    def test_class_map_is_recompressed_against_its_dictionary(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = Path(tmp.name) / "zstd.mdbx"
+
+        ssps = [scheduled_stop_point(i) for i in range(500)]
+
+        with MdbxStorage(path, readonly=False, object_serializer="schema+zstd") as storage:
+            storage.insert_objects_on_queue(ScheduledStopPoint, ssps)
+            class_idx = storage.class_idx[ScheduledStopPoint]
+            with storage.env.ro_transaction() as txn:
+                before = self.map_size(txn, class_idx)
+
+            with mock.patch.object(storage, "env", wraps=storage.env) as env:
+                train_dictionaries(storage, min_records=100, dictionary_size=4 * 1024, batch_size=100)
+
+            # Training, and a transaction per batch of recompressed records
+            self.assertGreater(env.rw_transaction.call_count, len(ssps) // 100)
+
+            with storage.env.ro_transaction() as txn:
+                after = self.map_size(txn, class_idx)
+
+            # Inserted after training, compressed against the dictionary right away
+            storage.insert_objects_on_queue(ScheduledStopPoint, [scheduled_stop_point(500)])
+
+        self.assertLess(after, before)
+
+        with MdbxStorage(path) as storage:
+            codec = storage.serializer.class_zstd_codec(ScheduledStopPoint)
+            assert codec is not None
+            self.assertNotEqual(codec.dictionary_id, 0)
+
+            with storage.env.ro_transaction() as txn:
+                objects = {obj.id: obj for obj in storage.iter_only_objects(txn, ScheduledStopPoint)}
+                self.assertEqual(objects, {obj.id: obj for obj in ssps + [scheduled_stop_point(500)]})
+
+                db = txn.open_map(name=class_idx, flags=MDBXDBFlags.MDBX_DB_DEFAULTS)
+                with txn.cursor(db) as cursor:
+                    self.assertEqual({ZstdCodec.frame_dictionary_id(value) for _key, value in cursor.iter()}, {codec.dictionary_id})
+
+                db_metadata = txn.open_map(DB_METADATA, flags=DB_METADATA_FLAGS)
+                self.assertIsNotNone(db_metadata.get(txn, METADATA_DICTIONARY + class_idx))
+
+    def test_small_class_maps_and_lz4_are_not_trained(self) -> None:
+        self.storage.insert_objects_on_queue(ScheduledStopPoint, [scheduled_stop_point(1)])
+        train_dictionaries(self.storage)
+
+        self.assertIsNone(self.storage.serializer.zstd_codec)
+        self.assertEqual(self.storage.serializer.class_object_serializers, {})
+
+    @staticmethod
+    def map_size(txn, class_idx: bytes) -> int:  # type: ignore[no-untyped-def]
+        db = txn.open_map(name=class_idx, flags=MDBXDBFlags.MDBX_DB_DEFAULTS)
+        with txn.cursor(db) as cursor:
+            return sum(len(value) for _key, value in cursor.iter())
@@ -1,6 +1,16 @@
-from domain.netex.model import DayType, DayTypesRelStructure, ServiceCalendar
+from domain.netex.model import DayType, DayTypeAssignment, DayTypeRef, DayTypesRelStructure, ServiceCalendar
 
-from storage.mdbx.core.references import resolve_embeddings_iterable
+from storage.mdbx.core.implementation import (
+    DB_EMBEDDED_ID_IDX,
+    DB_EMBEDDED_ID_IDX_FLAGS,
+    DB_METADATA,
+    DB_METADATA_FLAGS,
+    DB_UNRESOLVED,
+    DB_UNRESOLVED_FLAGS,
+    INDEX_VERSION,
+    METADATA_INDEX,
+)
+from storage.mdbx.core.references import resolve, resolve_embeddings_index, resolve_embeddings_iterable
 
 from tests.base import MdbxStorageTestCase
 
@@ -45,3 +55,59 @@ class TestEmbeddings(MdbxStorageTestCase):
         with self.storage.env.ro_transaction() as txn_read:
             self.assertIsNone(self.storage.load_object_by_id_version(txn_read, "missing", DayType, "1"))
             self.assertIsNone(self.storage.load_object_by_id_version(txn_read, "missing", DayType))
+
+    def test_embedded_id_index_is_maintained_on_insert(self) -> None:
+        day_type = DayType(id="dt1", version="1")
+        calendar = ServiceCalendar(id="sc1", version="1", day_types=DayTypesRelStructure(day_type_ref_or_day_type_dummy=[day_type]))
+        assignment = DayTypeAssignment(id="dta1", version="1", order=1, day_type_ref=DayTypeRef(ref="dt1", version="1"))
+
+        with self.storage.env.rw_transaction() as txn_write:
+            self.storage.insert_any_object_on_queue(txn_write, [calendar, assignment])
+            txn_write.commit()
+
+        with self.storage.env.ro_transaction() as txn_read:
+            db_embedded_id_idx = txn_read.open_map(DB_EMBEDDED_ID_IDX, flags=DB_EMBEDDED_ID_IDX_FLAGS)
+            self.assertEqual(db_embedded_id_idx.get_stat(txn_read).ms_entries, 1)
+
+        # DayType dt1 only exists embedded, hence the regular resolve leaves it unresolved.
+        resolve(self.storage)
+        resolve_embeddings_index(self.storage)
+
+        with self.storage.env.ro_transaction() as txn_read:
+            self.assertEqual(txn_read.open_map(DB_UNRESOLVED, flags=DB_UNRESOLVED_FLAGS).get_stat(txn_read).ms_entries, 0)
+            referenced = list(self.storage.load_references_by_object_values(txn_read, assignment, inwards=False))
+            # The index is persistent, it is not dropped after resolving.
+            db_embedded_id_idx = txn_read.open_map(DB_EMBEDDED_ID_IDX, flags=DB_EMBEDDED_ID_IDX_FLAGS)
+            self.assertEqual(db_embedded_id_idx.get_stat(txn_read).ms_entries, 1)
+
+        self.assertEqual([obj.id for obj in referenced], ["sc1"])
+
+    def test_embedded_id_index_forgets_removed_embeddings_on_overwrite(self) -> None:
+        calendar = ServiceCalendar(id="sc1", version="1", day_types=DayTypesRelStructure(day_type_ref_or_day_type_dummy=[DayType(id="dt1", version="1")]))
+
+        with self.storage.env.rw_transaction() as txn_write:
+            self.storage.insert_any_object_on_queue(txn_write, [calendar])
+            self.storage.insert_any_object_on_queue(txn_write, [ServiceCalendar(id="sc1", version="1")])
+            txn_write.commit()
+
+        with self.storage.env.ro_transaction() as txn_read:
+            db_embedded_id_idx = txn_read.open_map(DB_EMBEDDED_ID_IDX, flags=DB_EMBEDDED_ID_IDX_FLAGS)
+            self.assertEqual(db_embedded_id_idx.get_stat(txn_read).ms_entries, 0)
+
+    def test_stale_embedded_id_index_is_rebuilt(self) -> None:
+        calendar = ServiceCalendar(id="sc1", version="1", day_types=DayTypesRelStructure(day_type_ref_or_day_type_dummy=[DayType(id="dt1", version="1")]))
+
+        # As written before the index was maintained on insert: the map exists, without its version.
+        with self.storage.env.rw_transaction() as txn_write:
+            txn_write.open_map(DB_METADATA, flags=DB_METADATA_FLAGS).delete(txn_write, METADATA_INDEX + DB_EMBEDDED_ID_IDX)
+            self.storage.insert_any_object_on_queue(txn_write, [calendar])
+            txn_write.commit()
+
+        with self.storage.env.ro_transaction() as txn_read:
+            self.assertEqual(txn_read.open_map(DB_EMBEDDED_ID_IDX, flags=DB_EMBEDDED_ID_IDX_FLAGS).get_stat(txn_read).ms_entries, 0)
+
+        resolve_embeddings_index(self.storage)
+
+        with self.storage.env.ro_transaction() as txn_read:
+            self.assertEqual(txn_read.open_map(DB_EMBEDDED_ID_IDX, flags=DB_EMBEDDED_ID_IDX_FLAGS).get_stat(txn_read).ms_entries, 1)
+            self.assertEqual(txn_read.open_map(DB_METADATA, flags=DB_METADATA_FLAGS).get(txn_read, METADATA_INDEX + DB_EMBEDDED_ID_IDX), INDEX_VERSION)
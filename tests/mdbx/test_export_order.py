@@ -0,0 +1,87 @@
+import random
+import unittest
+
+import numpy as np
+
+from domain.netex.model import Line, Route, ServiceJourneyPattern
+
+from storage.mdbx.core.references import resolve
+from storage.mdbx.tools.graph import (
+    ReferenceGraph,
+    build_graph,
+    build_reference_graph,
+    count_forward_references,
+    count_forward_refs,
+    full_keys_to_array,
+    order_graph,
+    order_reference_graph,
+    strongly_connected_components,
+    strongly_connected_components_csr,
+)
+
+from tests.base import MdbxStorageTestCase
+
+
+def full_key(idx: int, class_idx: int) -> bytes:
+    return idx.to_bytes(4, 'little') + class_idx.to_bytes(2, 'little') + b'\x00\x00'
+
+
+def reference_graph(graph: dict[bytes, set[bytes]]) -> ReferenceGraph:
+    edges = [(u, v) for u, vs in graph.items() for v in vs]
+    return ReferenceGraph(
+        full_keys_to_array(b''.join(graph.keys())), full_keys_to_array(b''.join(u for u, _ in edges)), full_keys_to_array(b''.join(v for _, v in edges))
+    )
+
+
+class TestExportOrder(unittest.TestCase):
+    def test_same_components_and_forward_references_as_order_graph(self) -> None:
+        rng = random.Random(42)
+        for trial in range(50):
+            nodes = [full_key(i, rng.randint(0, 3)) for i in range(rng.randint(1, 40))]
+            graph: dict[bytes, set[bytes]] = {node: set() for node in nodes}
+            for _ in range(rng.randint(0, 3 * len(nodes))):
+                # Now and then a reference to a key without an object
+                graph[rng.choice(nodes)].add(rng.choice(nodes + [full_key(1000, 1)]))
+
+            with self.subTest(trial=trial):
+                csr = reference_graph(graph)
+                component, count = strongly_connected_components_csr(csr)
+                components: dict[int, set[bytes]] = {}
+                for node, c in enumerate(component.tolist()):
+                    components.setdefault(c, set()).add(csr.full_key(node))
+
+                self.assertEqual(len(components), count)
+                self.assertEqual({frozenset(c) for c in components.values()}, {frozenset(c) for c in strongly_connected_components(graph)})
+
+                order = order_graph(graph)
+                reference_order = order_reference_graph(csr)
+                self.assertEqual(sorted(csr.full_key(node) for node in reference_order.tolist()), sorted(order))
+                self.assertEqual(count_forward_references(csr, reference_order), count_forward_refs(order, graph))
+
+    def test_long_reference_chain(self) -> None:
+        # Far beyond the recursion limit of a recursive Tarjan
+        keys = np.arange(100_000, dtype=np.uint64) << np.uint64(32)
+        csr = ReferenceGraph(keys, keys[:-1], keys[1:])
+
+        order = order_reference_graph(csr)
+
+        self.assertEqual(order.tolist(), list(range(99_999, -1, -1)))
+        self.assertEqual(count_forward_references(csr, order), 0)
+
+
+class TestExportOrderDatabase(MdbxStorageTestCase):
+    def test_referenced_objects_come_first(self) -> None:
+        line, route, sjp = self.make_line_route_sjp()
+        with self.storage.env.rw_transaction() as txn_write:
+            self.storage.insert_any_object_on_queue(txn_write, [sjp, route, line])
+            txn_write.commit()
+        resolve(self.storage)
+
+        with self.storage.env.ro_transaction() as txn:
+            graph = build_graph(txn)
+            csr = build_reference_graph(txn)
+            order = [csr.full_key(node) for node in order_reference_graph(csr).tolist()]
+            classes = [type(self.storage.load_object_by_full_key(txn, key)) for key in order]
+
+        self.assertEqual(sorted(order), sorted(graph.keys()))
+        self.assertEqual(classes, [Line, Route, ServiceJourneyPattern])
@@ -39,3 +39,17 @@ class TestFetchByReference(MdbxStorageTestCase):
         assert result is not None
         self.assertEqual(result.id, "1")
         self.assertIsInstance(result, (Authority, Operator))
+
+    def test_fetch_by_id_of_a_class(self) -> None:
+        _insert_authority_and_operator(self.storage)
+        self.storage.insert_objects_on_queue(Operator, [Operator(id="10", version="1"), Operator(id="1", version="2")])
+
+        with self.storage.env.ro_transaction() as txn_read:
+            # Whatever the version, but only the class asked for and not an id that starts with it
+            operator = self.storage.load_object_by_id(txn_read, "1", Operator)
+            self.assertIsInstance(operator, Operator)
+            assert operator is not None
+            self.assertEqual((operator.id, operator.version), ("1", "2"))
+
+            self.assertIsInstance(self.storage.load_object_by_id(txn_read, "1", Authority), Authority)
+            self.assertIsNone(self.storage.load_object_by_id(txn_read, "2", Operator))
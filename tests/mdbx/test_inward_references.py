@@ -1,4 +1,7 @@
-from domain.netex.model import Route, ServiceJourneyPattern
+from domain.netex.model import Line, LineRef, Route, ServiceJourneyPattern
+
+from storage.mdbx.core.implementation import DB_METADATA, DB_METADATA_FLAGS, DB_REFERENCE_INWARD, DB_REFERENCE_INWARD_FLAGS, METADATA_INDEX
+from storage.mdbx.core.references import resolve
 
 from tests.base import MdbxStorageTestCase
 
@@ -34,3 +37,59 @@ class TestInwardReferences(MdbxStorageTestCase):
             sjp_referrers = list(self.storage.load_references_by_object_values(txn_read, sjp, inwards=True))
 
         self.assertEqual(sjp_referrers, [])
+
+    def test_inward_index_is_maintained_by_resolve(self) -> None:
+        line, route, sjp = self.make_line_route_sjp()
+
+        with self.storage.env.rw_transaction() as txn_write:
+            # Referencing objects first, so the edges are only added by resolve.
+            self.storage.insert_any_object_on_queue(txn_write, [sjp, route, line])
+            txn_write.commit()
+
+        resolve(self.storage, batched=True)
+
+        with self.storage.env.ro_transaction() as txn_read:
+            line_referrers = {(type(obj), obj.id) for obj in self.storage.load_references_by_object_values(txn_read, line, inwards=True)}
+            route_referrers = {(type(obj), obj.id) for obj in self.storage.load_references_by_object_values(txn_read, route, inwards=True)}
+
+        self.assertEqual(line_referrers, {(Route, "r1")})
+        self.assertEqual(route_referrers, {(ServiceJourneyPattern, "sjp1")})
+
+    def test_inward_index_forgets_overwritten_references(self) -> None:
+        line, route, sjp = self.make_line_route_sjp()
+        other = Line(id="l2", version="1")
+
+        with self.storage.env.rw_transaction() as txn_write:
+            self.storage.insert_any_object_on_queue(txn_write, [line, other, route, sjp])
+            # The same Route, now referencing the other Line.
+            self.storage.insert_any_object_on_queue(txn_write, [Route(id="r1", version="1", line_ref=LineRef(ref="l2", version="1"))])
+            txn_write.commit()
+
+        with self.storage.env.ro_transaction() as txn_read:
+            line_referrers = list(self.storage.load_references_by_object_values(txn_read, line, inwards=True))
+            other_referrers = {(type(obj), obj.id) for obj in self.storage.load_references_by_object_values(txn_read, other, inwards=True)}
+
+        self.assertEqual(line_referrers, [])
+        self.assertEqual(other_referrers, {(Route, "r1")})
+
+    def test_stale_inward_index_is_rebuilt(self) -> None:
+        line, route, sjp = self.make_line_route_sjp()
+
+        # As written before the index was maintained on insert: the map exists, but is empty and without its version.
+        with self.storage.env.rw_transaction() as txn_write:
+            txn_write.open_map(DB_METADATA, flags=DB_METADATA_FLAGS).delete(txn_write, METADATA_INDEX + DB_REFERENCE_INWARD)
+            self.storage.insert_any_object_on_queue(txn_write, [line, route, sjp])
+            txn_write.commit()
+
+        with self.storage.env.ro_transaction() as txn_read:
+            self.assertEqual(txn_read.open_map(DB_REFERENCE_INWARD, flags=DB_REFERENCE_INWARD_FLAGS).get_stat(txn_read).ms_entries, 0)
+            # Not trusted, the references are found by a scan of the outward references
+            self.assertEqual({obj.id for obj in self.storage.load_references_by_object_values(txn_read, line, inwards=True)}, {"r1"})
+
+        with self.storage.env.rw_transaction() as txn_write:
+            self.storage._index_references_inwards(txn_write)
+            txn_write.commit()
+
+        with self.storage.env.ro_transaction() as txn_read:
+            self.assertEqual(txn_read.open_map(DB_REFERENCE_INWARD, flags=DB_REFERENCE_INWARD_FLAGS).get_stat(txn_read).ms_entries, 2)
+            self.assertEqual({obj.id for obj in self.storage.load_references_by_object_values(txn_read, line, inwards=True)}, {"r1"})
@@ -0,0 +1,31 @@
+from unittest import mock
+
+from domain.netex.model import ScheduledStopPoint
+from storage.mdbx.core import implementation
+
+from tests.base import MdbxStorageTestCase
+
+
+class TestKeyRanges(MdbxStorageTestCase):
+    def test_key_ranges_cover_every_object_once(self) -> None:
+        self.storage.insert_objects_on_queue(ScheduledStopPoint, [ScheduledStopPoint(id=f"ssp{i}", version="1") for i in range(10)])
+
+        with self.storage.env.ro_transaction() as txn:
+            key_ranges = self.storage.key_ranges(txn, ScheduledStopPoint, 3)
+            self.assertEqual([limit for _start_key, limit in key_ranges], [4, 4, 4])
+
+            keys = [key for start_key, limit in key_ranges for key in self.storage.scan_objects(txn, ScheduledStopPoint, start_key, limit)]
+            self.assertEqual(keys, list(self.storage.scan_objects(txn, ScheduledStopPoint)))
+
+    def test_key_ranges_of_a_class_without_objects(self) -> None:
+        with self.storage.env.ro_transaction() as txn:
+            self.assertEqual(self.storage.key_ranges(txn, ScheduledStopPoint, 3), [])
+
+    def test_key_ranges_without_the_raw_cursor(self) -> None:
+        self.storage.insert_objects_on_queue(ScheduledStopPoint, [ScheduledStopPoint(id=f"ssp{i}", version="1") for i in range(10)])
+
+        with self.storage.env.ro_transaction() as txn:
+            key_ranges = self.storage.key_ranges(txn, ScheduledStopPoint, 3)
+            # As with bindings that no longer have the private cursor call
+            with mock.patch.object(implementation, "_raw_cursor_get", None):
+                self.assertEqual(self.storage.key_ranges(txn, ScheduledStopPoint, 3), key_ranges)
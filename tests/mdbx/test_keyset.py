@@ -0,0 +1,70 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from storage.mdbx.core.keyset import CHUNK_BITS, KeySet
+from storage.interface import Serializer
+
+
+def full_key(local_key: int, class_idx: int) -> bytes:
+    return Serializer.get_fullkey_by_class_idx(local_key.to_bytes(4, 'little'), class_idx.to_bytes(2, 'little'))
+
+
+class TestKeySet(unittest.TestCase):
+    def test_add_and_contains(self) -> None:
+        with KeySet() as keys:
+            self.assertTrue(keys.add(full_key(5, 1)))
+            self.assertFalse(keys.add(full_key(5, 1)))
+            self.assertTrue(keys.add(full_key(5, 2)))
+
+            self.assertIn(full_key(5, 1), keys)
+            self.assertIn(full_key(5, 2), keys)
+            self.assertNotIn(full_key(6, 1), keys)
+            self.assertNotIn(full_key(5 + CHUNK_BITS, 1), keys)
+            self.assertEqual(len(keys), 2)
+
+    def test_iterates_per_class_in_local_key_order(self) -> None:
+        added = [full_key(local_key, class_idx) for class_idx in (3, 1) for local_key in (3 * CHUNK_BITS + 1, 256, 7, 0)]
+        with KeySet() as keys:
+            for key in added:
+                keys.add(key)
+
+            self.assertEqual(
+                list(keys), [full_key(local_key, class_idx) for class_idx in (1, 3) for local_key in (0, 7, 256, 3 * CHUNK_BITS + 1)]
+            )
+            self.assertEqual([len(batch) for batch in keys.batches(3)], [3, 3, 2])
+
+    def test_chunks_are_spilled_and_read_back(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+
+        added = [full_key(chunk * CHUNK_BITS + chunk, class_idx) for class_idx in (1, 2) for chunk in range(10)]
+        keys = KeySet(max_chunks=4, directory=Path(tmp.name))
+        for key in added:
+            self.assertTrue(keys.add(key))
+
+        self.assertEqual(len(list(Path(tmp.name).iterdir())), 1)
+        for key in added:
+            self.assertIn(key, keys)
+            self.assertFalse(keys.add(key))
+        self.assertEqual(list(keys), sorted(added, key=lambda key: (key[4:6], int.from_bytes(key[:4], 'little'))))
+
+        keys.close()
+        self.assertEqual(list(Path(tmp.name).iterdir()), [])
+
+    def test_a_single_chunk_in_memory(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+
+        # Every other key is in another chunk, which spills the chunk of the previous one
+        added = [full_key(chunk * CHUNK_BITS, 1) for chunk in (0, 1, 0, 2)]
+        with KeySet(max_chunks=1, directory=Path(tmp.name)) as keys:
+            self.assertEqual([keys.add(key) for key in added], [True, True, False, True])
+            self.assertEqual(len(keys), 3)
+            for key in added:
+                self.assertIn(key, keys)
+            self.assertEqual(list(keys), sorted(set(added), key=lambda key: int.from_bytes(key[:4], 'little')))
+
+    def test_max_chunks_below_one_is_rejected(self) -> None:
+        with self.assertRaises(ValueError):
+            KeySet(max_chunks=0)
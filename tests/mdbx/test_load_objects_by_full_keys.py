@@ -0,0 +1,30 @@
+from domain.netex.model import Line, Route, ServiceJourneyPattern
+
+from tests.base import MdbxStorageTestCase
+
+
+class TestLoadObjectsByFullKeys(MdbxStorageTestCase):
+    def test_objects_are_loaded_per_class_in_key_order(self) -> None:
+        line, route, sjp = self.make_line_route_sjp()
+        lines = [line] + [Line(id=f"l{i}", version="1") for i in range(2, 5)]
+
+        with self.storage.env.rw_transaction() as txn_write:
+            self.storage.insert_any_object_on_queue(txn_write, [*lines, route, sjp])
+            txn_write.commit()
+
+        with self.storage.env.ro_transaction() as txn:
+            full_keys = [full_key for full_key, _obj in (self.storage.load_object_by_id_version(txn, obj.id, type(obj), "1") for obj in [sjp, *lines, route])]
+            missing = full_keys[0][:4] + self.storage.class_idx[Route].ljust(4, b'\x00')
+
+            # Unordered, a key twice and a key without an object
+            loaded = list(self.storage.load_objects_by_full_keys(txn, list(reversed(full_keys)) + [full_keys[2], missing]))
+
+        self.assertEqual(sorted(full_key for full_key, _obj in loaded), sorted(full_keys))
+        self.assertEqual({full_key: obj for full_key, obj in loaded}, dict(zip(full_keys, [sjp, *lines, route])))
+
+        # One walk per class, in the order of the keys
+        classes = [type(obj) for _full_key, obj in loaded]
+        self.assertEqual([clazz for i, clazz in enumerate(classes) if i == 0 or classes[i - 1] != clazz], sorted(set(classes), key=lambda clazz: self.storage.class_idx[clazz]))
+        for clazz in (Line, Route, ServiceJourneyPattern):
+            keys = [full_key[:4] for full_key, obj in loaded if type(obj) is clazz]
+            self.assertEqual(keys, sorted(keys))
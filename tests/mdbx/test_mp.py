@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from queue import Queue
+from unittest import mock
+
+from domain.netex.model import Line, LineRef, Route, RouteRef, ServiceJourneyPattern
+
+from storage.mdbx.core.implementation import MdbxStorage
+from storage.mdbx.core.implementation_mp import MdbxStorageMP
+from storage.mdbx.core.implementation_queue import MdbxStorageQueue, process_alive
+
+
+class TestMdbxStorageMP(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "mp.mdbx"
+
+    def test_writer_process_inserts_batches_from_producers(self) -> None:
+        line = Line(id="l1", version="1")
+        route = Route(id="r1", version="1", line_ref=LineRef(ref="l1", version="1"))
+        sjp = ServiceJourneyPattern(id="sjp1", version="1", route_ref_or_route_view=RouteRef(ref="r1", version="1"))
+
+        # Commit after every object, to exercise multiple transactions.
+        with MdbxStorageMP(self.path, readonly=False, commit_records=1) as storage:
+            storage.insert_objects_on_queue(Line, [line])
+            with storage.producer() as producer:
+                producer.insert_objects_on_queue(Route, [route])
+                producer.insert_objects_on_queue(ServiceJourneyPattern, [sjp])
+
+            self.assertEqual(producer.records, 2)
+            self.assertEqual(producer.batches, 2)
+
+        with MdbxStorage(self.path) as written:
+            with written.env.ro_transaction() as txn:
+                self.assertEqual(list(written.iter_only_objects(txn, Line)), [line])
+                self.assertEqual(list(written.iter_only_objects(txn, Route)), [route])
+
+                # Inserted after what they reference, so the references were resolved by the writer.
+                sjp_references = {(type(obj), obj.id) for obj in written.load_references_by_object_values(txn, sjp, False)}
+                route_references = {(type(obj), obj.id) for obj in written.load_references_by_object_values(txn, route, False)}
+
+        self.assertEqual(sjp_references, {(Route, "r1")})
+        self.assertEqual(route_references, {(Line, "l1")})
+
+    @unittest.skipUnless(os.path.isdir("/proc/self"), "tells an exited process from a running one by its state")
+    def test_producer_raises_when_the_writer_is_gone(self) -> None:
+        with MdbxStorage(self.path, readonly=False) as storage:
+            class_name_idx = storage.class_name_idx
+
+        # Exited, but not reaped yet, as a writer that died while its parent is still producing
+        writer = subprocess.Popen([sys.executable, "-c", ""])
+        self.addCleanup(writer.wait)
+        deadline = time.monotonic() + 10
+        while process_alive(writer.pid) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(process_alive(os.getpid()))
+        self.assertFalse(process_alive(writer.pid))
+
+        queue: Queue[object] = Queue(maxsize=1)
+        queue.put(None)
+        producer = MdbxStorageQueue(self.path, queue, class_name_idx, storage.object_serializer_name, batch_size=1, writer_pid=writer.pid)
+
+        with mock.patch("storage.mdbx.core.implementation_queue.PUT_TIMEOUT", 0.01):
+            with self.assertRaises(RuntimeError):
+                producer.insert_objects_on_queue(Line, [Line(id="l1", version="1")])
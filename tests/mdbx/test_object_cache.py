@@ -0,0 +1,65 @@
+from mdbx import MDBXDBFlags
+
+from domain.netex.model import Line, LineRef
+
+from tests.base import MdbxStorageTestCase
+
+
+class TestObjectCache(MdbxStorageTestCase):
+    def test_shared_loads_are_cached_per_transaction(self) -> None:
+        line, _route, _sjp = self.make_line_route_sjp()
+        self.storage.insert_objects_on_queue(Line, [line])
+        ref = LineRef(ref="l1", version="1")
+
+        # Not enabled, shared loads decode every time
+        with self.storage.env.ro_transaction() as txn:
+            self.assertIsNot(self.storage.load_object_by_reference(txn, ref, shared=True), self.storage.load_object_by_reference(txn, ref, shared=True))
+
+        object_cache = self.storage.enable_object_cache(maxsize=1)
+        with self.storage.env.ro_transaction() as txn:
+            shared = self.storage.load_object_by_reference(txn, ref, shared=True)
+            self.assertIs(self.storage.load_object_by_reference(txn, ref, shared=True), shared)
+
+            # A private copy, which the caller may change
+            private = self.storage.load_object_by_reference(txn, ref)
+            self.assertIsNot(private, shared)
+            self.assertEqual(private, shared)
+
+        self.assertEqual((object_cache.hits, object_cache.misses), (1, 1))
+
+        # Another transaction starts empty
+        with self.storage.env.ro_transaction() as txn:
+            self.assertIsNot(self.storage.load_object_by_reference(txn, ref, shared=True), shared)
+
+        self.assertEqual((object_cache.hits, object_cache.misses), (1, 2))
+
+    def test_insert_invalidates_the_cached_object(self) -> None:
+        line, _route, _sjp = self.make_line_route_sjp()
+        self.storage.insert_objects_on_queue(Line, [line])
+        self.storage.enable_object_cache()
+
+        with self.storage.env.rw_transaction() as txn:
+            cached = self.storage.load_object_by_reference(txn, LineRef(ref="l1", version="1"), shared=True)
+            self.storage.insert_any_object_on_queue(txn, [Line(id="l1", version="1", public_code="1")])
+            reloaded = self.storage.load_object_by_reference(txn, LineRef(ref="l1", version="1"), shared=True)
+
+        self.assertIsNot(reloaded, cached)
+        self.assertEqual(reloaded.public_code, "1")
+
+    def test_direct_writes_invalidate_the_cached_object(self) -> None:
+        line, _route, _sjp = self.make_line_route_sjp()
+        self.storage.insert_objects_on_queue(Line, [line])
+        self.storage.enable_object_cache()
+
+        # Reference patching and recompression write the class map directly, not through an insert
+        with self.storage.env.rw_transaction() as txn:
+            cached = self.storage.load_object_by_reference(txn, LineRef(ref="l1", version="1"), shared=True)
+            class_idx = self.storage.class_idx[Line]
+            db = txn.open_map(class_idx, flags=MDBXDBFlags.MDBX_DB_DEFAULTS)
+            with txn.cursor(db) as cursor:
+                key, _value = next(iter(cursor.iter()))
+            self.storage._put_value(txn, db, class_idx, key, self.storage.serializer.marshall(Line(id="l1", version="1", public_code="1"), Line))
+            reloaded = self.storage.load_object_by_reference(txn, LineRef(ref="l1", version="1"), shared=True)
+
+        self.assertIsNot(reloaded, cached)
+        self.assertEqual(reloaded.public_code, "1")
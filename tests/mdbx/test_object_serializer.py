@@ -0,0 +1,74 @@
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from domain.netex.model import ScheduledStopPoint, MultilingualString, TextType
+
+from storage.mdbx.core.implementation import MdbxStorage, DB_METADATA, DB_METADATA_FLAGS, METADATA_SCHEMA
+
+from tests.base import MdbxStorageTestCase
+
+
+class TestObjectSerializer(MdbxStorageTestCase):
+    def test_object_serializer_is_kept_by_the_database(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = Path(tmp.name) / "schema.mdbx"
+
+        ssp = ScheduledStopPoint(id="1", version="1", name=MultilingualString(content=[TextType(value="ssp")]))
+
+        with MdbxStorage(path, readonly=False, object_serializer="schema+lz4") as storage:
+            storage.insert_objects_on_queue(ScheduledStopPoint, [ssp])
+
+        # Without asking for it, the database is read with the serializer it was written with.
+        with MdbxStorage(path) as storage:
+            self.assertEqual(storage.object_serializer_name, "schema+lz4")
+            with storage.env.ro_transaction() as txn:
+                self.assertEqual(list(storage.iter_only_objects(txn, ScheduledStopPoint)), [ssp])
+
+                db_metadata = txn.open_map(DB_METADATA, flags=DB_METADATA_FLAGS)
+                with txn.cursor(db_metadata) as cursor:
+                    schemas = [key for key, _value in cursor.iter() if key.startswith(METADATA_SCHEMA)]
+
+        self.assertEqual(len(schemas), 1)
+
+    def test_clean_switches_the_object_serializer(self) -> None:
+        self.assertEqual(self.storage.object_serializer_name, "cloudpickle+lz4")
+
+        self.storage.new_object_serializer = "schema+lz4"
+        self.storage.clean()
+
+        self.assertEqual(self.storage.object_serializer_name, "schema+lz4")
+
+    def test_iter_objects_projects_fields(self) -> None:
+        ssp = ScheduledStopPoint(id="1", version="1", name=MultilingualString(content=[TextType(value="ssp")]))
+
+        for object_serializer in ("cloudpickle+lz4", "schema+lz4"):
+            with self.subTest(object_serializer=object_serializer):
+                self.storage.new_object_serializer = object_serializer
+                self.storage.clean()
+                self.storage.insert_objects_on_queue(ScheduledStopPoint, [ssp])
+
+                with self.storage.env.ro_transaction() as txn:
+                    [projection] = list(self.storage.iter_only_objects(txn, ScheduledStopPoint, fields=["id", "version", "responsibility_set_ref_attribute"]))
+
+                self.assertIsInstance(projection, ScheduledStopPoint)
+                self.assertEqual((projection.id, projection.version, projection.responsibility_set_ref_attribute), ("1", "1", None))
+                with self.assertRaises(AttributeError):
+                    projection.name
+
+    def test_projection_does_not_decode_other_fields(self) -> None:
+        ssp = ScheduledStopPoint(id="1", version="1", name=MultilingualString(content=[TextType(value="ssp")]))
+
+        self.storage.new_object_serializer = "schema+lz4"
+        self.storage.clean()
+        self.storage.insert_objects_on_queue(ScheduledStopPoint, [ssp])
+
+        with mock.patch.object(MultilingualString, "__init__", autospec=True, side_effect=MultilingualString.__init__) as init:
+            with self.storage.env.ro_transaction() as txn:
+                # Built from its fields, an unpickled object would not run __init__
+                self.assertEqual(list(self.storage.iter_only_objects(txn, ScheduledStopPoint)), [ssp])
+                self.assertEqual(init.call_count, 1)
+
+                list(self.storage.iter_only_objects(txn, ScheduledStopPoint, fields=["id", "version"]))
+                self.assertEqual(init.call_count, 1)
@@ -15,7 +15,7 @@ from tests.base import MdbxStorageTestCase
 
 
 class TestRecursiveReferences(MdbxStorageTestCase):
-    def test_dfs_walks_outward_reference_chain(self) -> None:
+    def test_bfs_walks_outward_reference_chain(self) -> None:
         line, route, sjp = self.make_line_route_sjp()
 
         with self.storage.env.rw_transaction() as txn_write:
@@ -36,12 +36,12 @@ class TestRecursiveReferences(MdbxStorageTestCase):
             full_key, loaded_sjp = result
             self.assertEqual(loaded_sjp, sjp)
 
-            visited = list(self.storage.load_references_by_object_values_dfs(txn_read, [full_key]))
+            visited = list(self.storage.load_references_by_object_values_bfs(txn_read, [full_key]))
 
         visited_ids = {(obj.__class__, obj.id) for obj in visited}
         self.assertGreaterEqual(visited_ids, {(ServiceJourneyPattern, "sjp1"), (Route, "r1"), (Line, "l1")})
 
-    def test_dfs_terminates_on_cyclic_references(self) -> None:
+    def test_bfs_terminates_on_cyclic_references(self) -> None:
         # Line <-> Route reference each other, forming a cycle.
         line = Line(
             id="l1",
@@ -64,9 +64,26 @@ class TestRecursiveReferences(MdbxStorageTestCase):
             self.assertIsNotNone(result)
             assert result is not None
             full_key, _ = result
-            visited = list(self.storage.load_references_by_object_values_dfs(txn_read, [full_key]))
+            visited = list(self.storage.load_references_by_object_values_bfs(txn_read, [full_key]))
 
         visited_ids = [(obj.__class__, obj.id) for obj in visited]
         # Terminates despite the cycle, and `visited` yields each object exactly once.
         self.assertEqual(set(visited_ids), {(Line, "l1"), (Route, "r1")})
         self.assertEqual(len(visited_ids), 2)
+
+    def test_bfs_starts_every_call_with_an_empty_visited_set(self) -> None:
+        line, route, sjp = self.make_line_route_sjp()
+
+        with self.storage.env.rw_transaction() as txn_write:
+            self.storage.insert_any_object_on_queue(txn_write, [line, route, sjp])
+            txn_write.commit()
+
+        with self.storage.env.ro_transaction() as txn_read:
+            result = self.storage.load_object_by_id_version(txn_read, "sjp1", ServiceJourneyPattern, "1")
+            assert result is not None
+            full_key, _ = result
+            first = list(self.storage.load_references_by_object_values_bfs(txn_read, [full_key]))
+            second = list(self.storage.load_references_by_object_values_bfs(txn_read, [full_key]))
+
+        self.assertEqual(first, second)
+        self.assertEqual({type(obj) for obj in first}, {ServiceJourneyPattern, Route, Line})
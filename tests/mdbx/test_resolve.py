@@ -0,0 +1,58 @@
+import tempfile
+from pathlib import Path
+
+from domain.netex.model import Line, LineRef, MultilingualString, Route, RouteRef, ServiceJourneyPattern, TextType
+
+from storage.mdbx.core.implementation import MdbxStorage, DB_REFERENCE_OUTWARD, DB_REFERENCE_OUTWARD_FLAGS, DB_UNRESOLVED, DB_UNRESOLVED_FLAGS
+from storage.mdbx.core.references import resolve
+
+from tests.base import MdbxStorageTestCase
+
+
+def _insert_unresolved(storage: MdbxStorage) -> None:
+    # Referencing objects first, so every reference stays unresolved at insert time.
+    # The Route references a Line version that does not exist, forcing a version change.
+    line = Line(id="l1", version="1", name=MultilingualString(content=[TextType(value="Line l1")]))
+    route = Route(id="r1", version="1", line_ref=LineRef(ref="l1", version="2"))
+    sjp = ServiceJourneyPattern(id="sjp1", version="1", route_ref_or_route_view=RouteRef(ref="r1", version="1"))
+    dangling = ServiceJourneyPattern(id="sjp2", version="1", route_ref_or_route_view=RouteRef(ref="missing", version="1"))
+
+    with storage.env.rw_transaction() as txn_write:
+        storage.insert_any_object_on_queue(txn_write, [sjp, dangling, route, line])
+        txn_write.commit()
+
+
+def _dump(storage: MdbxStorage) -> tuple[list[tuple[bytes, bytes]], list[tuple[bytes, bytes]], list[Route]]:
+    with storage.env.ro_transaction() as txn_read:
+        with txn_read.cursor(txn_read.open_map(DB_REFERENCE_OUTWARD, flags=DB_REFERENCE_OUTWARD_FLAGS)) as cursor:
+            outward = list(cursor.iter())
+        with txn_read.cursor(txn_read.open_map(DB_UNRESOLVED, flags=DB_UNRESOLVED_FLAGS)) as cursor:
+            unresolved = list(cursor.iter())
+        routes = list(storage.iter_only_objects(txn_read, Route))
+    return outward, unresolved, routes
+
+
+class TestResolve(MdbxStorageTestCase):
+    def test_batched_resolve_matches_resolve(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+
+        _insert_unresolved(self.storage)
+        resolve(self.storage)
+
+        with MdbxStorage(Path(tmp.name) / "batched.mdbx", readonly=False) as batched:
+            _insert_unresolved(batched)
+            resolve(batched, batched=True)
+
+            self.assertEqual(_dump(batched), _dump(self.storage))
+
+    def test_batched_resolve_updates_version_and_keeps_dangling(self) -> None:
+        _insert_unresolved(self.storage)
+        resolve(self.storage, batched=True)
+
+        outward, unresolved, routes = _dump(self.storage)
+
+        # The Route -> Line and ServiceJourneyPattern -> Route references are resolved, the dangling one is not.
+        self.assertEqual(len(outward), 2)
+        self.assertEqual(len(unresolved), 1)
+        self.assertEqual(routes[0].line_ref.version, "1")
@@ -0,0 +1,60 @@
+import tempfile
+from pathlib import Path
+
+from domain.netex.model import Line, Route, ServiceJourneyPattern
+
+from storage.mdbx.core.implementation import (
+    MdbxStorage,
+    DB_ID_IDX,
+    DB_ID_IDX_FLAGS,
+    DB_UNRESOLVED,
+    DB_UNRESOLVED_FLAGS,
+    DB_REFERENCE_OUTWARD,
+    DB_REFERENCE_OUTWARD_FLAGS,
+    DB_REFERENCE_INWARD,
+    DB_REFERENCE_INWARD_FLAGS,
+    DB_EMBEDDED_ID_IDX,
+    DB_EMBEDDED_ID_IDX_FLAGS,
+)
+from storage.mdbx.core.implementation_spool import MdbxStorageSpool
+
+from tests.base import MdbxStorageTestCase
+
+
+def _dump(storage: MdbxStorage) -> dict[bytes, list[tuple[bytes, bytes]]]:
+    maps = [
+        (DB_ID_IDX, DB_ID_IDX_FLAGS),
+        (DB_UNRESOLVED, DB_UNRESOLVED_FLAGS),
+        (DB_REFERENCE_OUTWARD, DB_REFERENCE_OUTWARD_FLAGS),
+        (DB_REFERENCE_INWARD, DB_REFERENCE_INWARD_FLAGS),
+        (DB_EMBEDDED_ID_IDX, DB_EMBEDDED_ID_IDX_FLAGS),
+    ] + [(storage.class_idx[clazz], 0) for clazz in (Line, Route, ServiceJourneyPattern)]
+
+    with storage.env.ro_transaction() as txn:
+        result = {}
+        for name, flags in maps:
+            with txn.cursor(txn.open_map(name, flags=flags)) as cursor:
+                result[name] = list(cursor.iter())
+        return result
+
+
+class TestSpool(MdbxStorageTestCase):
+    def test_replayed_spool_equals_direct_insert(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+
+        line, route, sjp = self.make_line_route_sjp()
+        batches: list[tuple[type, list]] = [(Line, [line]), (ServiceJourneyPattern, [sjp]), (Route, [route]), (Line, [line])]
+
+        for clazz, objects in batches:
+            self.storage.insert_objects_on_queue(clazz, objects)
+
+        with MdbxStorage(Path(tmp.name) / "spooled.mdbx", readonly=False) as spooled:
+            spool_path = Path(tmp.name) / "0.spool"
+            with MdbxStorageSpool(spooled.path, spool_path, spooled.class_name_idx, spooled.object_serializer_name) as worker:
+                for clazz, objects in batches:
+                    worker.insert_objects_on_queue(clazz, objects)
+
+            MdbxStorageSpool.replay(spooled, spool_path)
+
+            self.assertEqual(_dump(spooled), _dump(self.storage))
@@ -0,0 +1,243 @@
+import unittest
+
+import numpy as np
+from xsdata.models.datatype import XmlDuration, XmlTime
+
+from domain.netex.model import (
+    JourneyRunTime,
+    JourneyRunTimesRelStructure,
+    JourneyWaitTime,
+    JourneyWaitTimesRelStructure,
+    LinksInJourneyPatternRelStructure,
+    PointsInJourneyPatternRelStructure,
+    ScheduledStopPointRef,
+    ServiceJourney,
+    ServiceJourneyPattern,
+    ServiceJourneyPatternRef,
+    StopPointInJourneyPattern,
+    StopPointInJourneyPatternRef,
+    TimeDemandType,
+    TimeDemandTypeRef,
+    TimingLinkInJourneyPattern,
+    TimingLinkRefStructure,
+    TimingPointInJourneyPattern,
+)
+from transformers.callsprofile import CallsProfile, JourneyTimes, TimingProfiles
+
+RUN_TIMES = {'tl_a': 300, 'tl_b': 600, 'tl_d': 120}
+
+
+def service_journey_pattern(with_links_in_sequence: bool = False) -> ServiceJourneyPattern:
+    """a -> b -> c, d -> e: c does not have a run time, d is a TimingPointInJourneyPattern of a stop."""
+
+    def onward(ref: str | None) -> TimingLinkRefStructure | None:
+        return TimingLinkRefStructure(ref=ref, version='1') if ref is not None and not with_links_in_sequence else None
+
+    points = [
+        StopPointInJourneyPattern(
+            id='TEST:StopPointInJourneyPattern:a',
+            version='1',
+            order=1,
+            scheduled_stop_point_ref=ScheduledStopPointRef(ref='a', version='1'),
+            onward_timing_link_ref=onward('tl_a'),
+            for_boarding=True,
+            for_alighting=False,
+        ),
+        StopPointInJourneyPattern(
+            id='TEST:StopPointInJourneyPattern:b',
+            version='1',
+            order=2,
+            scheduled_stop_point_ref=ScheduledStopPointRef(ref='b', version='1'),
+            onward_timing_link_ref=onward('tl_b'),
+        ),
+        StopPointInJourneyPattern(
+            id='TEST:StopPointInJourneyPattern:c', version='1', order=3, scheduled_stop_point_ref=ScheduledStopPointRef(ref='c', version='1')
+        ),
+        TimingPointInJourneyPattern(
+            id='TEST:TimingPointInJourneyPattern:d',
+            version='1',
+            order=4,
+            timing_point_ref_or_scheduled_stop_point_ref_or_parking_point_ref_or_relief_point_ref=ScheduledStopPointRef(ref='d', version='1'),
+            onward_timing_link_ref=onward('tl_d'),
+        ),
+        StopPointInJourneyPattern(
+            id='TEST:StopPointInJourneyPattern:e',
+            version='1',
+            order=5,
+            scheduled_stop_point_ref=ScheduledStopPointRef(ref='e', version='1'),
+            for_boarding=False,
+            for_alighting=True,
+        ),
+    ]
+
+    links_in_sequence = None
+    if with_links_in_sequence:
+        # The run times of the links become the onward links of the points, the same position in sequence
+        links_in_sequence = LinksInJourneyPatternRelStructure(
+            service_link_in_journey_pattern_or_timing_link_in_journey_pattern=[
+                TimingLinkInJourneyPattern(
+                    id=f'TEST:TimingLinkInJourneyPattern:{ref}',
+                    version='1',
+                    order=order,
+                    timing_link_ref=TimingLinkRefStructure(ref=ref, version='1'),
+                    run_times=JourneyRunTimesRelStructure(
+                        journey_run_time=[
+                            JourneyRunTime(timing_link_ref=TimingLinkRefStructure(ref=ref, version='1'), run_time=XmlDuration(f'PT{RUN_TIMES[ref]}S'))
+                        ]
+                    ),
+                )
+                for order, ref in enumerate(('tl_a', 'tl_b'), start=1)
+            ]
+        )
+
+    return ServiceJourneyPattern(
+        id='TEST:ServiceJourneyPattern:1',
+        version='1',
+        points_in_sequence=PointsInJourneyPatternRelStructure(
+            point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern=points
+        ),
+        links_in_sequence=links_in_sequence,
+    )
+
+
+def time_demand_type() -> TimeDemandType:
+    return TimeDemandType(
+        id='TEST:TimeDemandType:1',
+        version='1',
+        run_times=JourneyRunTimesRelStructure(
+            journey_run_time=[
+                JourneyRunTime(timing_link_ref=TimingLinkRefStructure(ref=ref, version='1'), run_time=XmlDuration(f'PT{run_time}S'))
+                for ref, run_time in RUN_TIMES.items()
+            ]
+        ),
+        wait_times=JourneyWaitTimesRelStructure(
+            journey_wait_time=[
+                JourneyWaitTime(
+                    timing_point_ref_or_scheduled_stop_point_ref_or_parking_point_ref_or_relief_point_ref=ScheduledStopPointRef(ref='b', version='1'),
+                    wait_time=XmlDuration('PT60S'),
+                )
+            ]
+        ),
+    )
+
+
+def service_journey() -> ServiceJourney:
+    # Five minutes before midnight, the journey ends on the next day
+    return ServiceJourney(
+        id='TEST:ServiceJourney:1',
+        version='1',
+        journey_pattern_ref=ServiceJourneyPatternRef(ref='TEST:ServiceJourneyPattern:1', version='1'),
+        time_demand_type_ref=TimeDemandTypeRef(ref='TEST:TimeDemandType:1', version='1'),
+        departure_time=XmlTime(23, 55, 0),
+        departure_day_offset=0,
+    )
+
+
+class TestCallsProfile(unittest.TestCase):
+    def test_timing_profile_is_relative_to_the_departure(self) -> None:
+        profile = CallsProfile.getTimingProfile(service_journey_pattern(), time_demand_type())
+
+        self.assertEqual(profile.order, [1, 2, 3, 4, 5])
+        self.assertEqual([ssp_ref.ref for ssp_ref in profile.scheduled_stop_point_refs], ['a', 'b', 'c', 'd', 'e'])
+        # A point arrives after the run time of the previous one and departs after its wait time, without a run time
+        # from c the arrival at d is the one at c
+        self.assertEqual(profile.arrival.tolist(), [0, 300, 960, 960, 1080])
+        self.assertEqual(profile.departure.tolist(), [0, 360, 960, 960, 1080])
+
+    def test_calls_of_a_time_demand_type(self) -> None:
+        sj = service_journey()
+        CallsProfile.getCallsFromTimeDemandType(sj, service_journey_pattern(), time_demand_type())
+
+        self.assertEqual(
+            [
+                (
+                    call.id,
+                    call.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view.ref,
+                    call.arrival.time,
+                    call.arrival.day_offset,
+                    call.arrival.for_alighting,
+                    call.departure.time,
+                    call.departure.day_offset,
+                    call.departure.for_boarding,
+                )
+                for call in sj.calls.call
+            ],
+            [
+                ('TEST:Call:1-1', 'a', XmlTime(23, 55, 0), 0, False, XmlTime(23, 55, 0), 0, True),
+                ('TEST:Call:1-2', 'b', XmlTime(0, 0, 0), 1, None, XmlTime(0, 1, 0), 1, None),
+                ('TEST:Call:1-3', 'c', XmlTime(0, 11, 0), 1, None, XmlTime(0, 11, 0), 1, None),
+                ('TEST:Call:1-4', 'd', XmlTime(0, 11, 0), 1, True, XmlTime(0, 11, 0), 1, True),
+                ('TEST:Call:1-5', 'e', XmlTime(0, 13, 0), 1, True, XmlTime(0, 13, 0), 1, False),
+            ],
+        )
+
+    def test_passing_times_of_a_time_demand_type(self) -> None:
+        sj = service_journey()
+        CallsProfile.getPassingTimesFromTimeDemandType(sj, service_journey_pattern(), time_demand_type())
+
+        # The departure from a point is given at its arrival
+        self.assertEqual(
+            [
+                (
+                    passing_time.id,
+                    passing_time.point_in_journey_pattern_ref.ref,
+                    passing_time.arrival_time,
+                    passing_time.arrival_day_offset,
+                    passing_time.departure_time,
+                    passing_time.departure_day_offset,
+                )
+                for passing_time in sj.passing_times.timetabled_passing_time
+            ],
+            [
+                ('TEST:TimetabledPassingTime:1-1', 'TEST:StopPointInJourneyPattern:a', XmlTime(23, 55, 0), 0, XmlTime(23, 55, 0), 0),
+                ('TEST:TimetabledPassingTime:1-2', 'TEST:StopPointInJourneyPattern:b', XmlTime(0, 0, 0), 1, XmlTime(0, 0, 0), 1),
+                ('TEST:TimetabledPassingTime:1-3', 'TEST:StopPointInJourneyPattern:c', XmlTime(0, 11, 0), 1, XmlTime(0, 11, 0), 1),
+                ('TEST:TimetabledPassingTime:1-4', 'TEST:StopPointInJourneyPattern:d', XmlTime(0, 11, 0), 1, XmlTime(0, 11, 0), 1),
+                ('TEST:TimetabledPassingTime:1-5', 'TEST:StopPointInJourneyPattern:e', XmlTime(0, 13, 0), 1, XmlTime(0, 13, 0), 1),
+            ],
+        )
+
+    def test_timing_profiles_are_owned_by_the_caller(self) -> None:
+        tdt = time_demand_type()
+        self.assertIsNot(CallsProfile.getTimingProfile(service_journey_pattern(), tdt), CallsProfile.getTimingProfile(service_journey_pattern(), tdt))
+
+        timing_profiles: TimingProfiles = {}
+        profile = CallsProfile.getTimingProfile(service_journey_pattern(), tdt, timing_profiles)
+        self.assertIs(CallsProfile.getTimingProfile(service_journey_pattern(), tdt, timing_profiles), profile)
+        self.assertEqual(len(timing_profiles), 1)
+
+    def test_missing_times_are_not_emitted(self) -> None:
+        points = service_journey_pattern().points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern[:2]
+        # As getTimesFromTimetabledPassingTimes() for passing times without an arrival or departure time
+        times = JourneyTimes(
+            [1, 2],
+            points,
+            [StopPointInJourneyPatternRef(ref=point.id, version='1') for point in points],
+            [point.scheduled_stop_point_ref for point in points],
+            np.array([-1, 86460], dtype=np.int64),
+            np.array([86100, -1], dtype=np.int64),
+        )
+
+        calls = times.getCalls(service_journey()).call
+        self.assertEqual(
+            [(call.arrival.time, call.arrival.day_offset, call.departure.time, call.departure.day_offset) for call in calls],
+            [(None, None, XmlTime(23, 55, 0), 0), (XmlTime(0, 1, 0), 1, None, None)],
+        )
+
+        passing_times = times.getTimetabledPassingTimes(service_journey()).timetabled_passing_time
+        self.assertEqual(
+            [(passing_time.arrival_time, passing_time.arrival_day_offset) for passing_time in passing_times], [(None, None), (XmlTime(0, 1, 0), 1)]
+        )
+
+    def test_known_profile_still_sets_the_onward_links(self) -> None:
+        tdt = time_demand_type()
+        timing_profiles: TimingProfiles = {}
+        profile = CallsProfile.getTimingProfile(service_journey_pattern(with_links_in_sequence=True), tdt, timing_profiles)
+
+        # Another copy of the same ServiceJourneyPattern, as loaded for the next journey
+        sjp = service_journey_pattern(with_links_in_sequence=True)
+        self.assertIs(CallsProfile.getTimingProfile(sjp, tdt, timing_profiles), profile)
+
+        points = sjp.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern
+        self.assertEqual([point.onward_timing_link_ref.ref if point.onward_timing_link_ref else None for point in points], ['tl_a', 'tl_b', None, None, None])
+        self.assertEqual(profile.arrival.tolist(), [0, 300, 960, 960, 960])
@@ -0,0 +1,112 @@
+import io
+import unittest
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from xsdata.formats.dataclass.serializers import XmlSerializer
+from xsdata.formats.dataclass.serializers.config import SerializerConfig
+from xsdata.formats.dataclass.serializers.writers import XmlEventWriter
+
+from storage.lxml.serialization.framewriter import FrameSerializer
+
+NS = "http://www.netex.org.uk/netex"
+GML = "http://www.opengis.net/gml/3.2"
+
+
+@dataclass
+class Pos:
+    value: str = field(metadata={"type": "Element", "name": "pos", "namespace": GML})
+
+    class Meta:
+        name = "Point"
+        namespace = GML
+
+
+@dataclass
+class Stop:
+    id: str = field(metadata={"type": "Attribute"})
+    name: str | None = field(default=None, metadata={"type": "Element", "name": "Name", "namespace": NS})
+    point: Pos | None = field(default=None, metadata={"type": "Element", "name": "Point", "namespace": GML})
+
+    class Meta:
+        name = "Stop"
+        namespace = NS
+
+
+@dataclass
+class StopsInFrameRelStructure:
+    stop: list[Stop] = field(default_factory=list, metadata={"type": "Element", "name": "Stop", "namespace": NS})
+
+
+@dataclass
+class Frame:
+    id: str = field(metadata={"type": "Attribute"})
+    name: str | None = field(default=None, metadata={"type": "Element", "name": "Name", "namespace": NS})
+    stops: StopsInFrameRelStructure | None = field(default=None, metadata={"type": "Element", "name": "stops", "namespace": NS})
+
+    class Meta:
+        name = "Frame"
+        namespace = NS
+
+
+class TestFrameWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.config = SerializerConfig(ignore_default_attributes=True, xml_declaration=True, indent="  ")
+        self.ns_map = {"": NS}
+
+    def test_output_is_the_same_as_xmlserializer(self) -> None:
+        frame = Frame(id="frame", name="Frame", stops=StopsInFrameRelStructure(stop=[Stop(id=str(i), name=f"Stop {i}") for i in range(3)]))
+
+        expected = io.StringIO()
+        XmlSerializer(config=self.config, writer=XmlEventWriter).write(expected, frame, self.ns_map)
+
+        serializer = FrameSerializer(config=self.config, writer=XmlEventWriter)
+        out = io.StringIO()
+        serializer.write(out, frame, self.ns_map)
+
+        self.assertEqual(out.getvalue(), expected.getvalue())
+        self.assertEqual(serializer.members, 3)
+
+    def test_members_are_written_one_at_a_time(self) -> None:
+        out = io.StringIO()
+        written: list[bool] = []
+
+        def stops() -> Iterator[Stop]:
+            for i in range(3):
+                # Before the next member is generated, the previous one must be in the output
+                written.append(i == 0 or f'<Stop id="{i - 1}"' in out.getvalue())
+                yield Stop(id=str(i))
+
+        frame = Frame(id="frame", stops=StopsInFrameRelStructure(stop=stops()))
+        FrameSerializer(config=self.config, writer=XmlEventWriter).write(out, frame, self.ns_map)
+
+        self.assertEqual(written, [True, True, True])
+        self.assertIn('<Stop id="2"', out.getvalue())
+
+    def test_parallel_output_is_the_same_as_serial(self) -> None:
+        frames = [Frame(id="frame", name="Frame", stops=StopsInFrameRelStructure(stop=[Stop(id=str(i), name=f"Stop {i}") for i in range(count)])) for count in (0, 1, 7)]
+
+        for frame in frames:
+            with self.subTest(members=len(frame.stops.stop) if frame.stops else 0):
+                expected = io.StringIO()
+                XmlSerializer(config=self.config, writer=XmlEventWriter).write(expected, frame, self.ns_map)
+
+                serializer = FrameSerializer(config=self.config, writer=XmlEventWriter, jobs=2, batch_size=2)
+                out = io.StringIO()
+                serializer.write(out, frame, self.ns_map)
+
+                self.assertEqual(out.getvalue(), expected.getvalue())
+
+    def test_parallel_member_declaring_a_new_prefix(self) -> None:
+        # The gml namespace is not in ns_map, every member declares its own prefix for it
+        frame = Frame(id="frame", stops=StopsInFrameRelStructure(stop=[Stop(id=str(i), point=Pos(value=f"{i} {i}")) for i in range(3)]))
+
+        expected = io.StringIO()
+        XmlSerializer(config=self.config, writer=XmlEventWriter).write(expected, frame, self.ns_map)
+        self.assertEqual(expected.getvalue().count(f'="{GML}"'), 3)
+
+        serializer = FrameSerializer(config=self.config, writer=XmlEventWriter, jobs=2, batch_size=2)
+        out = io.StringIO()
+        serializer.write(out, frame, self.ns_map)
+
+        self.assertEqual(out.getvalue(), expected.getvalue())
@@ -0,0 +1,65 @@
+import io
+import unittest
+import zipfile
+
+import duckdb
+
+from transformers.gtfscolumnar import ColumnBatch, STOP_TIME_COLUMNS, STOP_TIMES_SQL
+
+
+class TestColumnBatch(unittest.TestCase):
+    def setUp(self) -> None:
+        self.con = duckdb.connect()
+        self.addCleanup(self.con.close)
+
+    def test_rows_are_inserted_per_batch(self) -> None:
+        trips = ColumnBatch(self.con, 'trips', batch_size=2)
+        for trip_id in ('1', '2', '3'):
+            trips.append_dict({'trip_id': trip_id, 'route_id': 'r', 'block_id': None, 'wheelchair_accessible': 0, 'bikes_allowed': ''})
+
+        self.assertEqual(trips.rows, 2)
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            trips.copy_to_zip(archive, 'trips.txt')
+            ColumnBatch(self.con, 'frequencies').copy_to_zip(archive, 'frequencies.txt')
+
+        self.assertEqual(trips.rows, 3)
+        with zipfile.ZipFile(buffer) as archive:
+            self.assertEqual(archive.namelist(), ['trips.txt'])
+            self.assertEqual(
+                archive.read('trips.txt').decode().splitlines(),
+                ['trip_id,route_id,block_id,wheelchair_accessible,bikes_allowed', '1,r,,0,', '2,r,,0,', '3,r,,0,'],
+            )
+
+    def test_stop_times_are_formatted_in_sql(self) -> None:
+        stop_times = ColumnBatch(self.con, 'stop_times', STOP_TIME_COLUMNS)
+        stop_times.append('1', 8 * 3600, 8 * 3600 + 30, 'a', 1)
+        stop_times.append('1', 25 * 3600 + 61, -1, 'b', -1)
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            stop_times.copy_to_zip(archive, 'stop_times.txt', STOP_TIMES_SQL)
+
+        with zipfile.ZipFile(buffer) as archive:
+            self.assertEqual(
+                archive.read('stop_times.txt').decode().splitlines()[1:],
+                ['1,08:00:00,08:00:30,a,1,,,,,,,1', '1,25:01:01,,b,,,,,,,,1'],
+            )
+
+    def test_columns_are_extended_across_batches(self) -> None:
+        stop_times = ColumnBatch(self.con, 'stop_times', STOP_TIME_COLUMNS, batch_size=2)
+        stop_times.append('1', 60, 60, 'a', 1)
+        stop_times.extend(['1', '1', '1'], [120, 180, 240], [130, 180, -1], ['b', 'c', 'd'], [2, 3, 4])
+
+        self.assertEqual(stop_times.rows, 4)
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            stop_times.copy_to_zip(archive, 'stop_times.txt', STOP_TIMES_SQL)
+
+        with zipfile.ZipFile(buffer) as archive:
+            self.assertEqual(
+                [line.split(',')[:5] for line in archive.read('stop_times.txt').decode().splitlines()[1:]],
+                [['1', '00:01:00', '00:01:00', 'a', '1'], ['1', '00:02:00', '00:02:10', 'b', '2'], ['1', '00:03:00', '00:03:00', 'c', '3'], ['1', '00:04:00', '', 'd', '4']],
+            )
@@ -0,0 +1,68 @@
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+import duckdb
+
+from domain.gtfs.services import gtfs_to_duckdb
+from domain.gtfs.services.gtfs_to_duckdb import load_gtfs_to_duckdb
+
+FEED = {
+    'agency.txt': 'agency_id,agency_name,agency_url,agency_timezone\na,Agency,https://example.com,Europe/Amsterdam\n',
+    'routes.txt': 'route_id,agency_id,route_short_name,route_type\nr,a,1,3\n',
+    'calendar_dates.txt': 'service_id,date,exception_type\ns,20250101,1\n',
+    'trips.txt': 'route_id,service_id,trip_id\nr,s,t1\nr,s,t2\n',
+    'stop_times.txt': 'trip_id,arrival_time,departure_time,stop_id,stop_sequence\n'
+    + ''.join(f't{trip},08:0{i}:00,08:0{i}:00,s{i},{i}\n' for trip in (1, 2) for i in range(3)),
+}
+
+
+class TestLoadGtfsToDuckDB(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = Path(tmp.name)
+        self.zip_path = self.directory / 'gtfs.zip'
+        self.database = self.directory / 'gtfs.duckdb'
+
+    def write_feed(self, stops: bytes) -> None:
+        with zipfile.ZipFile(self.zip_path, 'w') as archive:
+            for filename, content in FEED.items():
+                archive.writestr(filename, content)
+            archive.writestr('stops.txt', stops)
+
+    def test_tables_are_loaded_concurrently(self) -> None:
+        self.write_feed('stop_id,stop_name,stop_lat,stop_lon\n'.encode() + ''.join(f's{i},Stop {i},52.0,5.0\n' for i in range(3)).encode())
+
+        load_gtfs_to_duckdb(self.zip_path, self.database, jobs=4)
+
+        with duckdb.connect(str(self.database)) as con:
+            counts = {table: con.execute(f"SELECT count(*) FROM {table}").fetchone()[0] for table in ('trips', 'stop_times', 'stops', 'pathways')}  # type: ignore[index]
+        self.assertEqual(counts, {'trips': 2, 'stop_times': 6, 'stops': 3, 'pathways': 0})
+        # Nothing is left behind next to the database
+        self.assertEqual(sorted(path.name for path in self.directory.iterdir()), ['gtfs.duckdb', 'gtfs.zip'])
+
+    def test_encoding_beyond_the_sample_is_loaded_again(self) -> None:
+        # Enough text for chardet to recognise it
+        names = ['Gare de Besançon', 'Genève Cornavin', 'Hôtel de Ville', 'Saint-Étienne Châteaucreux', 'Orléans Centre', 'Montréal Métro', 'Tübingen Hbf'] * 20
+        self.write_feed(
+            'stop_id,stop_name,stop_lat,stop_lon\n'.encode()
+            + ''.join(f's{i},Stop {i},52.0,5.0\n' for i in range(200)).encode()
+            + ''.join(f'n{i:03},{name},47.2,6.0\n' for i, name in enumerate(names)).encode('latin-1')
+        )
+
+        with mock.patch.object(gtfs_to_duckdb, 'ENCODING_SAMPLE_SIZE', 1024):
+            load_gtfs_to_duckdb(self.zip_path, self.database)
+
+        with duckdb.connect(str(self.database)) as con:
+            self.assertEqual([name for name, in con.execute("SELECT stop_name FROM stops WHERE stop_id LIKE 'n%' ORDER BY stop_id").fetchall()], names)
+
+    def test_header_of_a_utf16_member(self) -> None:
+        self.write_feed(('stop_id,stop_name,stop_lat,stop_lon\n' + ''.join(f's{i},Stop {i},52.0,5.0\n' for i in range(3))).encode('utf-16'))
+
+        load_gtfs_to_duckdb(self.zip_path, self.database)
+
+        with duckdb.connect(str(self.database)) as con:
+            self.assertEqual(con.execute("SELECT stop_id, stop_name FROM stops ORDER BY stop_id").fetchall(), [(f's{i}', f'Stop {i}') for i in range(3)])
@@ -0,0 +1,140 @@
+import unittest
+from decimal import Decimal
+
+import duckdb
+from xsdata.models.datatype import XmlTime
+
+from domain.gtfs.transform.daytype import getDayTypeAssignments, getDayTypes, getOperatingPeriods
+from domain.gtfs.transform.rows import fetch_rows
+from domain.gtfs.transform.servicejourney import getServiceJourneys
+from domain.gtfs.transform.stopplace import getPassengerStopAssignments, getStopPlaces
+from domain.netex.model import Codespace
+
+STOPS = [
+    # stop_id, stop_name, location_type, parent_station
+    ('p1', 'Parent 1', 1, None),
+    ('a', 'Stop a', 0, 'p1'),
+    ('b', 'Stop b', 0, 'p1'),
+    ('e', 'Entrance', 2, 'p1'),
+    ('g', 'Node', 3, 'p2'),
+    ('p2', 'Parent 2', 1, None),
+    ('lone', 'Lone', 0, None),
+    ('x1', 'Orphan 1', 0, 'missing'),
+    ('x0', 'Orphan 0', 4, 'missing'),
+]
+
+
+class TestGtfsTransform(unittest.TestCase):
+    def setUp(self) -> None:
+        self.con = duckdb.connect()
+        self.addCleanup(self.con.close)
+        self.codespace = Codespace(id='TEST', xmlns='TEST')
+
+        self.con.execute(
+            """CREATE TABLE stops (stop_id VARCHAR, stop_name VARCHAR, stop_lat DOUBLE, stop_lon DOUBLE, stop_code VARCHAR, stop_desc VARCHAR, zone_id VARCHAR,
+            stop_url VARCHAR, location_type INTEGER, parent_station VARCHAR, wheelchair_boarding INTEGER, stop_timezone VARCHAR, platform_code VARCHAR, level_id VARCHAR)"""
+        )
+        self.con.executemany(
+            "INSERT INTO stops (stop_id, stop_name, stop_lat, stop_lon, location_type, parent_station) VALUES (?, ?, 52.0, 5.0, ?, ?)", STOPS + STOPS[-1:]
+        )
+        self.con.execute(
+            """CREATE TABLE calendar (service_id VARCHAR, monday INTEGER, tuesday INTEGER, wednesday INTEGER, thursday INTEGER, friday INTEGER, saturday INTEGER,
+            sunday INTEGER, start_date VARCHAR, end_date VARCHAR)"""
+        )
+        self.con.execute("INSERT INTO calendar VALUES ('week', 1, 1, 1, 1, 1, 0, 0, '20250101', '20251231')")
+        self.con.execute("CREATE TABLE calendar_dates (service_id VARCHAR, date VARCHAR, exception_type INTEGER)")
+        self.con.executemany(
+            "INSERT INTO calendar_dates VALUES (?, ?, ?)",
+            [('week', '20250102', 2), ('extra', '20250103', 1), ('extra', '20250104', 1), ('other', '20250105', 3)],
+        )
+        self.con.execute(
+            """CREATE TABLE trips (route_id VARCHAR, service_id VARCHAR, trip_id VARCHAR, trip_headsign VARCHAR, trip_short_name VARCHAR, direction_id INTEGER,
+            block_id VARCHAR, shape_id VARCHAR, wheelchair_accessible INTEGER, bikes_allowed INTEGER)"""
+        )
+        self.con.executemany("INSERT INTO trips (route_id, service_id, trip_id) VALUES ('r', 'week', ?)", [('t1',), ('t2',), ('t3',)])
+        self.con.execute(
+            """CREATE TABLE stop_times (trip_id VARCHAR, arrival_time VARCHAR, departure_time VARCHAR, stop_id VARCHAR, stop_sequence INTEGER, stop_headsign VARCHAR,
+            pickup_type INTEGER, drop_off_type INTEGER, shape_dist_traveled FLOAT)"""
+        )
+        self.con.executemany(
+            "INSERT INTO stop_times VALUES (?, ?, ?, ?, ?, NULL, ?, ?, ?)",
+            [
+                ('t2', '23:58:00', '23:59:30', 'a', 5, 0, None, 0.0),
+                ('t2', '24:01:00', '24:01:00', 'x:b', 10, 2, 1, None),
+                ('t2', '25:10:05', '25:10:05', 'c', 12, None, 3, 1500.5),
+                ('t1', '8:00:00', '08:00:00', 'a', 1, None, None, 100.0),
+                ('t3', '09:00:00', '09:00:00', 'a', 1, None, None, None),
+            ],
+        )
+        self.con.execute("CREATE TABLE frequencies (trip_id VARCHAR, start_time VARCHAR, end_time VARCHAR, headway_secs INTEGER)")
+        self.con.execute("INSERT INTO frequencies VALUES ('t3', '09:00:00', '10:00:00', 600)")
+
+    def test_fetch_rows_in_batches(self) -> None:
+        with self.con.cursor() as cur:
+            cur.execute("SELECT * FROM range(25)")
+            self.assertEqual([i for i, in fetch_rows(cur, batch_size=10)], list(range(25)))
+
+    def test_stops_are_grouped_per_stop_place(self) -> None:
+        stop_places = list(getStopPlaces(self.con, self.codespace, '1'))
+
+        self.assertEqual(
+            [stop_place.id for stop_place in stop_places], ['TEST:StopPlace:lone', 'TEST:StopPlace:p1', 'TEST:StopPlace:p2', 'TEST:StopPlace:missing']
+        )
+        lone, p1, p2, missing = stop_places
+        self.assertEqual([quay.id for quay in lone.quays.taxi_stand_ref_or_quay_ref_or_quay], ['TEST:Quay:lone'])
+        self.assertEqual([quay.id for quay in p1.quays.taxi_stand_ref_or_quay_ref_or_quay], ['TEST:Quay:a', 'TEST:Quay:b'])
+        self.assertEqual([entrance.id for entrance in p1.entrances.parking_entrance_ref_or_entrance_ref_or_entrance], ['TEST:StopPlaceEntrance:e'])
+        self.assertEqual([access_space.id for access_space in p2.access_spaces.access_space_ref_or_access_space], ['TEST:AccessSpace:g'])
+        self.assertIsNone(p2.quays)
+        # A parent_station that does not exist is faked from its first stop
+        self.assertEqual([quay.id for quay in missing.quays.taxi_stand_ref_or_quay_ref_or_quay], ['TEST:Quay:x0', 'TEST:Quay:x1'])
+
+        self.assertEqual(
+            [(psa.id, psa.taxi_stand_ref_or_quay_ref_or_quay.ref) for psa in getPassengerStopAssignments(self.con, self.codespace, '1')],
+            [(f'TEST:PassengerStopAssignment:{stop_id}', f'TEST:Quay:{stop_id}') for stop_id in ('a', 'b', 'lone', 'x0', 'x1')],
+        )
+
+    def test_day_types_of_calendar_dates_without_calendar(self) -> None:
+        day_types = list(getDayTypes(self.con, self.codespace, '1'))
+        self.assertEqual([day_type.id for day_type in day_types], ['TEST:DayType:week', 'TEST:DayType:extra'])
+        self.assertIsNotNone(day_types[0].properties)
+        self.assertIsNone(day_types[1].properties)
+
+        self.assertEqual([operating_period.id for operating_period in getOperatingPeriods(self.con, self.codespace, '1')], ['TEST:OperatingPeriod:week'])
+        day_type_assignments = list(getDayTypeAssignments(self.con, self.codespace, '1'))
+        self.assertEqual(
+            [dta.id for dta in day_type_assignments],
+            [
+                'TEST:DayTypeAssignment:week_20250102_2',
+                'TEST:DayTypeAssignment:extra_20250103_1',
+                'TEST:DayTypeAssignment:extra_20250104_1',
+                'TEST:DayTypeAssignment:week',
+            ],
+        )
+        self.assertEqual([dta.is_available for dta in day_type_assignments[:3]], [False, True, True])
+        self.assertEqual(day_type_assignments[3].uic_operating_period_ref_or_operating_period_ref_or_operating_day_ref_or_date.ref, 'TEST:OperatingPeriod:week')
+
+    def test_calls_of_a_trip_past_midnight(self) -> None:
+        service_journeys = list(getServiceJourneys(self.con, self.codespace, '1'))
+        # A trip with frequencies is not a ServiceJourney
+        self.assertEqual([service_journey.id for service_journey in service_journeys], ['TEST:ServiceJourney:t1', 'TEST:ServiceJourney:t2'])
+
+        calls = service_journeys[1].calls.call
+        self.assertEqual([call.id for call in calls], ['TEST:Call:t2_5', 'TEST:Call:t2_10', 'TEST:Call:t2_12'])
+        self.assertEqual([call.order for call in calls], [1, 2, 3])
+        self.assertEqual(
+            [call.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view.ref for call in calls],
+            ['TEST:ScheduledStopPoint:a', 'TEST:ScheduledStopPoint:x-b', 'TEST:ScheduledStopPoint:c'],
+        )
+        self.assertEqual(
+            [(call.arrival.time, call.arrival.day_offset, call.departure.time, call.departure.day_offset) for call in calls],
+            [(XmlTime(23, 58, 0), 0, XmlTime(23, 59, 30), 0), (XmlTime(0, 1, 0), 1, XmlTime(0, 1, 0), 1), (XmlTime(1, 10, 5), 1, XmlTime(1, 10, 5), 1)],
+        )
+        self.assertEqual(
+            [(call.arrival.for_alighting, call.departure.for_boarding, call.request_stop) for call in calls],
+            [(True, True, False), (False, True, True), (True, True, True)],
+        )
+        # Only the call before one with a shape_dist_traveled has an onward distance
+        self.assertEqual(
+            [getattr(call.onward_service_link_ref_or_onward_service_link_view, 'distance', None) for call in calls], [None, Decimal('1500.5'), None]
+        )
@@ -0,0 +1,47 @@
+import io
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+from transformers.gtfswriter import GtfsTableWriter
+
+
+class TestGtfsTableWriter(unittest.TestCase):
+    def test_tables_are_streamed_next_to_each_other(self) -> None:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            with GtfsTableWriter(archive, 'trips.txt', spool=True) as trips, GtfsTableWriter(archive, 'frequencies.txt', spool=True):
+                with GtfsTableWriter(archive, 'stop_times.txt', buffer_size=16) as stop_times:
+                    for trip_id in ('1', '2'):
+                        trips.writerow({'trip_id': trip_id, 'route_id': 'r'})
+                        stop_times.writerows({'trip_id': trip_id, 'stop_sequence': sequence} for sequence in range(3))
+
+            self.assertEqual(trips.rows, 2)
+            self.assertEqual(stop_times.rows, 6)
+
+        with zipfile.ZipFile(buffer) as archive:
+            # A table without rows is not written
+            self.assertEqual(sorted(archive.namelist()), ['stop_times.txt', 'trips.txt'])
+            self.assertEqual(archive.read('trips.txt').decode(), 'trip_id,route_id\r\n1,r\r\n2,r\r\n')
+            self.assertEqual(archive.read('stop_times.txt').decode().splitlines()[:3], ['trip_id,stop_sequence', '1,0', '1,1'])
+
+    def test_chunks_are_appended_in_order(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        chunks = []
+        for i, trip_ids in enumerate([('1', '2'), (), ('3',)]):
+            with GtfsTableWriter(None, str(Path(directory.name) / f"{i}.txt")) as chunk:
+                chunk.writerows({'trip_id': trip_id, 'route_id': 'r'} for trip_id in trip_ids)
+            chunks.append((chunk.fieldnames, chunk.rows, Path(directory.name) / f"{i}.txt"))
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            with GtfsTableWriter(archive, 'trips.txt') as trips:
+                for fieldnames, rows, path in chunks:
+                    trips.append_chunk(fieldnames, rows, path)
+
+        self.assertEqual(trips.rows, 3)
+        with zipfile.ZipFile(buffer) as archive:
+            self.assertEqual(archive.read('trips.txt').decode(), 'trip_id,route_id\r\n1,r\r\n2,r\r\n3,r\r\n')
@@ -1,11 +1,14 @@
+import random
 import unittest
+from decimal import Decimal, ROUND_HALF_UP
 
+import numpy as np
 from pyproj import Transformer
 
 from domain.netex.model import LocationStructure2, Pos, ScheduledStopPoint
 from domain.netex.services.recursive_attributes import get_all_geo_elements
 
-from transformers.projection import reprojection, reprojection_update
+from transformers.projection import Reprojection, project_location, quantize_array, reprojection, reprojection_update
 
 from tests.base import MdbxStorageTestCase
 
@@ -43,6 +46,31 @@ class TestReprojection(unittest.TestCase):
         assert ssp.location is not None
         _assert_location_is_wgs84(self, ssp.location)
 
+    def test_batch_is_the_same_as_per_location(self) -> None:
+        rng = random.Random(5)
+        locations = [
+            LocationStructure2(srs_name=UTM32N, pos=Pos(value=[rng.uniform(600000, 700000), rng.uniform(5.1e6, 5.2e6)], srs_name=UTM32N, srs_dimension=2))
+            for _ in range(50)
+        ] + [LocationStructure2(srs_name="EPSG:28992", pos=Pos(value=[rng.uniform(1e5, 2e5), rng.uniform(4e5, 5e5)], srs_dimension=2)) for _ in range(50)]
+        stop_points = [ScheduledStopPoint(id=f"ssp{i}", version="1", location=location) for i, location in enumerate(locations)]
+        expected = [LocationStructure2(srs_name=location.srs_name, pos=Pos(value=list(location.pos.value), srs_name=location.pos.srs_name, srs_dimension=2)) for location in locations]  # type: ignore[union-attr]
+
+        batch = Reprojection(WGS84, force_latlon=True)
+        for stop_point in stop_points:
+            batch.add(stop_point)
+        batch.apply()
+        for location in expected:
+            project_location(location, WGS84, force_latlon=True)
+
+        self.assertEqual(batch.points, 100)
+        self.assertEqual([stop_point.location for stop_point in stop_points], expected)
+
+    def test_quantize_array_rounds_like_decimal(self) -> None:
+        values = np.concatenate((np.random.default_rng(5).uniform(-1e6, 1e6, 10_000), [0.5, -0.5, 2.5, -1e-9, 0.0, 1e-7]))
+        for quantize in ('0.000001', '1.0', '1'):
+            expected = [Decimal(value).quantize(Decimal(quantize), ROUND_HALF_UP) for value in values.tolist()]
+            self.assertEqual([str(value) for value in quantize_array(values, quantize)], [str(value) for value in expected])
+
     def test_get_all_geo_elements_is_not_empty(self) -> None:
         geo_classes = list(get_all_geo_elements())
 
@@ -0,0 +1,89 @@
+import unittest
+
+from xsdata.models.datatype import XmlTime
+
+from domain.netex.model import (
+    ArrivalStructure,
+    Call,
+    CallsRelStructure,
+    Codespace,
+    DepartureStructure,
+    LineRef,
+    ScheduledStopPointRef,
+    ServiceJourney,
+    ServiceJourneyPattern,
+    TimeDemandType,
+    TimingLink,
+)
+from transformers.timedemandtypesprofile import TimeDemandTypesProfile
+
+
+def service_journey(id: str, stops: list[tuple[str, int, int]]) -> ServiceJourney:
+    calls = [
+        Call(
+            id=f"{id}-{order}",
+            version='1',
+            order=order,
+            fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view=ScheduledStopPointRef(ref=stop, version='1'),
+            arrival=ArrivalStructure(time=XmlTime(arrival // 3600 % 24, arrival // 60 % 60, arrival % 60), day_offset=arrival // 86400),
+            departure=DepartureStructure(time=XmlTime(departure // 3600 % 24, departure // 60 % 60, departure % 60), day_offset=departure // 86400),
+        )
+        for order, (stop, arrival, departure) in enumerate(stops, start=1)
+    ]
+    return ServiceJourney(
+        id=id, version='1', flexible_line_ref_or_line_ref_or_line_view_or_flexible_line_view=LineRef(ref='l', version='1'), calls=CallsRelStructure(call=calls)
+    )
+
+
+def timing_profiles(tdtp: TimeDemandTypesProfile, service_journeys: list[ServiceJourney]) -> list[object]:
+    return [obj for sj in service_journeys for obj in tdtp.getTimingProfile(sj, TimeDemandTypesProfile.getTimingPointsFromCalls(sj), True)]
+
+
+class TestTimeDemandTypesProfile(unittest.TestCase):
+    def setUp(self) -> None:
+        self.codespace = Codespace(id='TEST', xmlns='TEST')
+
+    def journeys(self) -> list[ServiceJourney]:
+        return [
+            service_journey('sj1', [('a', 28800, 28800), ('b', 29100, 29160), ('c', 29400, 29400)]),
+            # The same profile an hour later, and past midnight
+            service_journey('sj2', [('a', 32400, 32400), ('b', 32700, 32760), ('c', 33000, 33000)]),
+            service_journey('sj3', [('a', 86700, 86700), ('b', 87000, 87060), ('c', 87300, 87300)]),
+            # A different run time between b and c
+            service_journey('sj4', [('a', 28800, 28800), ('b', 29100, 29160), ('c', 29460, 29460)]),
+        ]
+
+    def test_identical_profiles_share_a_time_demand_type(self) -> None:
+        tdtp = TimeDemandTypesProfile(self.codespace, '1')
+        service_journeys = self.journeys()
+        objects = timing_profiles(tdtp, service_journeys)
+
+        self.assertEqual([type(obj) for obj in objects], [TimingLink, TimingLink, ServiceJourneyPattern, TimeDemandType, TimeDemandType])
+        self.assertEqual(len({sj.journey_pattern_ref.ref for sj in service_journeys}), 1)
+        sj1, sj2, sj3, sj4 = service_journeys
+        self.assertEqual(sj1.time_demand_type_ref.ref, sj2.time_demand_type_ref.ref)
+        self.assertEqual(sj1.time_demand_type_ref.ref, sj3.time_demand_type_ref.ref)
+        self.assertNotEqual(sj1.time_demand_type_ref.ref, sj4.time_demand_type_ref.ref)
+        self.assertEqual((sj3.departure_time, sj3.departure_day_offset), (XmlTime(0, 5, 0), 1))
+
+        tdt = objects[3]
+        self.assertEqual([run_time.run_time.seconds for run_time in tdt.run_times.journey_run_time], [300, 240])
+        # Only b has a wait time
+        self.assertEqual(
+            [wait_time.timing_point_ref_or_scheduled_stop_point_ref_or_parking_point_ref_or_relief_point_ref.ref for wait_time in tdt.wait_times.journey_wait_time],
+            ['b'],
+        )
+
+    def test_day_offset_is_recomputed(self) -> None:
+        sj = self.journeys()[0]
+        sj.departure_day_offset = 1
+
+        timing_profiles(TimeDemandTypesProfile(self.codespace, '1'), [sj])
+        self.assertEqual((sj.departure_time, sj.departure_day_offset), (XmlTime(8, 0, 0), None))
+
+    def test_ids_do_not_depend_on_the_process(self) -> None:
+        first = [obj.id for obj in timing_profiles(TimeDemandTypesProfile(self.codespace, '1'), self.journeys())]
+        second = [obj.id for obj in timing_profiles(TimeDemandTypesProfile(self.codespace, '1'), self.journeys())]
+        self.assertEqual(first, second)
+        # blake2b, unlike hash() that is salted per process
+        self.assertEqual(TimeDemandTypesProfile.getDigest(('a', 'b')), '57061014F03C1885')
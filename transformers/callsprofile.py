@@ -1,6 +1,8 @@
+import functools
 import logging
-from typing import List
+from typing import List, NamedTuple
 
+import numpy as np
 from xsdata.models.datatype import XmlDuration, XmlTime
 
 from domain.netex.indexes.byid import getIndex
@@ -40,10 +42,91 @@ from domain.netex.model import (
     TemplateServiceJourney,
 )
 from domain.netex.services.refs import getRef
-from utils.utils import project
+from utils.utils import project, to_seconds_xmltime
 from utils.aux_logging import log_print, log_once
 
 
+@functools.lru_cache(maxsize=None)
+def getXmlTimes(offset: int | None) -> np.ndarray:
+    """The XmlTime of every second of a day, by the second. XmlTime is immutable, every time of day is created once."""
+    xml_times = np.empty(86400, dtype=object)
+    xml_times[:] = [XmlTime(hour=second // 3600, minute=second // 60 % 60, second=second % 60, offset=offset) for second in range(86400)]
+    return xml_times
+
+
+class JourneyTimes(NamedTuple):
+    """
+    The times of a journey at its stops, in seconds since midnight of the operating day. Only the times taken from
+    TimetabledPassingTimes can be missing, as -1, see CallsProfile.getTimesFromTimetabledPassingTimes(). Calls and
+    TimetabledPassingTimes are only built from them by the callers that need them.
+    """
+
+    order: list[int]
+    points: list[StopPointInJourneyPattern | None]
+    point_refs: list[PointInJourneyPatternRefStructure]
+    scheduled_stop_point_refs: list[ScheduledStopPointRef]
+    arrival: np.ndarray
+    departure: np.ndarray
+    offset: int | None = None
+
+    def getXmlTimes(self, seconds: np.ndarray) -> tuple[list[XmlTime | None], list[int | None]]:
+        """The XmlTime and day offset of the seconds, a missing time (-1) has neither."""
+        day_offsets, times = np.divmod(seconds, 86400)
+        xml_times: list[XmlTime | None] = getXmlTimes(self.offset)[times].tolist()
+        xml_day_offsets: list[int | None] = day_offsets.tolist()
+        for i in np.flatnonzero(seconds < 0).tolist():
+            xml_times[i] = None
+            xml_day_offsets[i] = None
+        return xml_times, xml_day_offsets
+
+    def getCalls(self, service_journey: ServiceJourney) -> CallsRelStructure:
+        call_id = service_journey.id.replace(":ServiceJourney:", ":Call:") + '-'
+        arrival_times, arrival_day_offsets = self.getXmlTimes(self.arrival)
+        departure_times, departure_day_offsets = self.getXmlTimes(self.departure)
+        return CallsRelStructure(
+            call=[
+                Call(
+                    id=call_id + str(order),
+                    version=service_journey.version,
+                    fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view=ssp_ref,
+                    arrival=ArrivalStructure(
+                        time=arrival_time, day_offset=arrival_day_offset, for_alighting=spijp.for_alighting, notice_assignments=spijp.notice_assignments
+                    ),
+                    departure=DepartureStructure(
+                        time=departure_time, day_offset=departure_day_offset, for_boarding=spijp.for_boarding, notice_assignments=spijp.notice_assignments
+                    ),
+                )
+                for order, spijp, ssp_ref, arrival_time, arrival_day_offset, departure_time, departure_day_offset in zip(
+                    self.order, self.points, self.scheduled_stop_point_refs, arrival_times, arrival_day_offsets, departure_times, departure_day_offsets
+                )
+            ]
+        )
+
+    def getTimetabledPassingTimes(self, service_journey: ServiceJourney) -> TimetabledPassingTimesRelStructure:
+        passing_time_id = service_journey.id.replace(":ServiceJourney:", ":TimetabledPassingTime:") + '-'
+        # The departure from a point is given at its arrival
+        arrival_times, arrival_day_offsets = self.getXmlTimes(self.arrival)
+        return TimetabledPassingTimesRelStructure(
+            timetabled_passing_time=[
+                TimetabledPassingTime(
+                    id=passing_time_id + str(order),
+                    version=service_journey.version,
+                    point_in_journey_pattern_ref=point_ref,
+                    arrival_time=arrival_time,
+                    arrival_day_offset=arrival_day_offset,
+                    departure_time=arrival_time,
+                    departure_day_offset=arrival_day_offset,
+                )
+                for order, point_ref, arrival_time, arrival_day_offset in zip(self.order, self.point_refs, arrival_times, arrival_day_offsets)
+            ]
+        )
+
+
+# The timing profiles of a run by the id and version of their ServiceJourneyPattern and TimeDemandType, owned by the
+# caller that loads them: see CallsProfile.getTimingProfile()
+TimingProfiles = dict[tuple[str, str | None, str, str | None], JourneyTimes]
+
+
 class CallsProfile:
     @staticmethod
     def getArrival(spijp: StopPointInJourneyPattern, arrival: int, offset: int = 0) -> ArrivalStructure:
@@ -139,18 +222,47 @@ class CallsProfile:
         return None
 
     @staticmethod
-    def getCallsFromTimeDemandType(service_journey: ServiceJourney, service_journey_pattern: ServiceJourneyPattern, time_demand_type: TimeDemandType) -> None:
-        # If calls are present, we don't have to do anything
-        if service_journey.calls is not None:
-            return
+    def getRunTimesFromLinksInSequence(service_journey_pattern: ServiceJourneyPattern, tdt_tl: dict[str, JourneyRunTime]) -> None:
+        """The run times of the links in sequence by their link, which become the onward links of the points in sequence."""
+        i = 0
+        for lis in service_journey_pattern.links_in_sequence.service_link_in_journey_pattern_or_timing_link_in_journey_pattern:
+            if isinstance(lis, ServiceLinkInJourneyPattern):
+                if not hasattr(lis.run_times, 'journey_run_time'):
+                    log_print("no run_times")
+                    log_print(lis)
+                for journey_run_time in lis.run_times.journey_run_time:
+                    tdt_tl[lis.service_link_ref.ref] = journey_run_time
+                    # TODO: Guard begin point equals assigned value
+                    service_journey_pattern.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern[
+                        i
+                    ].onward_service_link_ref = lis.service_link_ref
+
+            elif isinstance(lis, TimingLinkInJourneyPattern):
+                for journey_run_time in lis.run_times.journey_run_time:
+                    tdt_tl[lis.timing_link_ref.ref] = journey_run_time
+                    # TODO: Guard begin point equeals assigned value
+                    service_journey_pattern.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern[
+                        i
+                    ].onward_timing_link_ref = lis.timing_link_ref
+
+            i += 1
 
-        # Guard that the provided ServiceJourneyPattern equals to the ref
-        if service_journey.journey_pattern_ref.ref != service_journey_pattern.id:
-            return
-
-        # Guard that the provided TimeDemandType equals to the ref
-        if service_journey.time_demand_type_ref.ref != time_demand_type.id:
-            return
+    @staticmethod
+    def getTimingProfile(
+        service_journey_pattern: ServiceJourneyPattern, time_demand_type: TimeDemandType, timing_profiles: TimingProfiles | None = None
+    ) -> JourneyTimes:
+        """
+        The times of time_demand_type at the stops of service_journey_pattern, relative to the departure of a journey. With
+        timing_profiles, it is computed once per pair, the journeys that share it only add their departure time. The
+        caller keeps timing_profiles for as long as the ids and versions it loads refer to the same objects, one run.
+        """
+        key = (service_journey_pattern.id, service_journey_pattern.version, time_demand_type.id, time_demand_type.version)
+        profile = timing_profiles.get(key, None) if timing_profiles is not None else None
+        if profile is not None:
+            if service_journey_pattern.links_in_sequence is not None:
+                # Every ServiceJourneyPattern gets its onward links, even if its profile is known
+                CallsProfile.getRunTimesFromLinksInSequence(service_journey_pattern, {})
+            return profile
 
         # TODO: Check for ambiguities, for example due to Timebands or points having the same name
         tdt_tl: dict[str, JourneyRunTime] = {}
@@ -164,36 +276,21 @@ class CallsProfile:
             )
 
         if service_journey_pattern.links_in_sequence is not None:
-            i = 0
-            for lis in service_journey_pattern.links_in_sequence.service_link_in_journey_pattern_or_timing_link_in_journey_pattern:
-                if isinstance(lis, ServiceLinkInJourneyPattern):
-                    for journey_run_time in lis.run_times.journey_run_time:
-                        tdt_tl[lis.service_link_ref.ref] = journey_run_time
-                        # TODO: Guard begin point equeals assigned value
-                        service_journey_pattern.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern[
-                            i
-                        ].onward_service_link_ref = lis.service_link_ref
-
-                elif isinstance(lis, TimingLinkInJourneyPattern):
-                    for journey_run_time in lis.run_times.journey_run_time:
-                        tdt_tl[lis.timing_link_ref.ref] = journey_run_time
-                        # TODO: Guard begin point equeals assigned value
-                        service_journey_pattern.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern[
-                            i
-                        ].onward_timing_link_ref = lis.timing_link_ref
-
-                i += 1
-
-        departure: int = CallsProfile.getDepartureTime(service_journey)
-        arrival: int = departure
-        offset: int = service_journey.departure_time.offset
+            CallsProfile.getRunTimesFromLinksInSequence(service_journey_pattern, tdt_tl)
 
-        calls = CallsRelStructure(call=[])
+        wait_times: list[int] = []
+        run_times: list[int] = []
+        has_run_times: list[bool] = []
+        stops: list[int] = []
+        order: list[int] = []
+        points: list[StopPointInJourneyPattern] = []
+        point_refs: list[PointInJourneyPatternRefStructure] = []
+        ssp_refs: list[ScheduledStopPointRef] = []
 
-        order = 0
         # If there are no onward timing links, we must consider links in sequence
-        for pis in service_journey_pattern.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern:
-            order += 1
+        for i, pis in enumerate(
+            service_journey_pattern.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern
+        ):
             wait_time = None
             run_time = None
             ssp_ref = None
@@ -230,34 +327,50 @@ class CallsProfile:
                 if pis.onward_timing_link_ref:
                     run_time = tdt_tl[pis.onward_timing_link_ref.ref]
 
-            departure += CallsProfile.getDuration(wait_time)
+            wait_times.append(CallsProfile.getDuration(wait_time))
+            run_times.append(CallsProfile.getDuration(run_time.run_time) if run_time is not None else 0)
+            has_run_times.append(run_time is not None)
             if spijp is not None:
-                call = Call(
-                    id=service_journey.id.replace(":ServiceJourney:", ":Call:") + '-' + str(order),
-                    version=service_journey.version,
-                    fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view=ssp_ref,
-                    arrival=CallsProfile.getArrival(spijp, arrival, offset),
-                    departure=CallsProfile.getDeparture(spijp, departure, offset),
-                )
-                calls.call.append(call)
+                stops.append(i)
+                order.append(i + 1)
+                points.append(spijp)
+                point_refs.append(getRef(spijp))
+                ssp_refs.append(ssp_ref)
+
+        # A point departs after its wait time, and the run time of the previous point, to which it arrives
+        run = np.array(run_times, dtype=np.int64)
+        departure = np.cumsum(np.array(wait_times, dtype=np.int64) + np.concatenate(([0], run))[:-1])
+        # Without a run time, the arrival is the one of the previous point
+        last_run = np.maximum.accumulate(np.where(np.array(has_run_times, dtype=bool), np.arange(len(run)), -1))
+        previous_run = np.concatenate(([-1], last_run))[:-1]
+        arrival = np.where(previous_run >= 0, (departure + run)[previous_run], 0)
+
+        stop_indices = np.array(stops, dtype=np.intp)
+        profile = JourneyTimes(order, points, point_refs, ssp_refs, arrival[stop_indices], departure[stop_indices])
+        if timing_profiles is not None:
+            timing_profiles[key] = profile
+        return profile
 
-            if run_time is not None:
-                arrival = departure + CallsProfile.getDuration(run_time.run_time)
-                departure = arrival
-
-        # for lis in service_journey_pattern.links_in_sequence.service_link_in_journey_pattern_or_timing_link_in_journey_pattern:
-        # TODO: handle the VDV462 case
-        # lis.run_times.journey_run_time
-        # pass
-
-        service_journey.calls = calls
+    @staticmethod
+    def getTimesFromTimeDemandType(
+        service_journey: ServiceJourney,
+        service_journey_pattern: ServiceJourneyPattern,
+        time_demand_type: TimeDemandType,
+        timing_profiles: TimingProfiles | None = None,
+    ) -> JourneyTimes:
+        profile = CallsProfile.getTimingProfile(service_journey_pattern, time_demand_type, timing_profiles)
+        departure: int = CallsProfile.getDepartureTime(service_journey)
+        return profile._replace(arrival=profile.arrival + departure, departure=profile.departure + departure, offset=service_journey.departure_time.offset)
 
     @staticmethod
-    def getPassingTimesFromTimeDemandType(
-        service_journey: ServiceJourney, service_journey_pattern: ServiceJourneyPattern, time_demand_type: TimeDemandType
+    def getCallsFromTimeDemandType(
+        service_journey: ServiceJourney,
+        service_journey_pattern: ServiceJourneyPattern,
+        time_demand_type: TimeDemandType,
+        timing_profiles: TimingProfiles | None = None,
     ) -> None:
         # If calls are present, we don't have to do anything
-        if service_journey.passing_times is not None:
+        if service_journey.calls is not None:
             return
 
         # Guard that the provided ServiceJourneyPattern equals to the ref
@@ -268,118 +381,37 @@ class CallsProfile:
         if service_journey.time_demand_type_ref.ref != time_demand_type.id:
             return
 
-        # TODO: Check for ambiguities, for example due to Timebands or points having the same name
-        tdt_tl: dict[str, JourneyRunTime] = {}
-        if time_demand_type.run_times:
-            tdt_tl = getIndex(time_demand_type.run_times.journey_run_time, 'timing_link_ref.ref')
-
-        tdt_point: dict[str, JourneyWaitTime] = {}
-        if time_demand_type.wait_times:
-            tdt_point = getIndex(
-                time_demand_type.wait_times.journey_wait_time, 'timing_point_ref_or_scheduled_stop_point_ref_or_parking_point_ref_or_relief_point_ref.ref'
-            )
-
-        if service_journey_pattern.links_in_sequence is not None:
-            i = 0
-            for lis in service_journey_pattern.links_in_sequence.service_link_in_journey_pattern_or_timing_link_in_journey_pattern:
-                if isinstance(lis, ServiceLinkInJourneyPattern):
-                    if not hasattr(lis.run_times, 'journey_run_time'):
-                        log_print("no run_times")
-                        log_print(lis)
-                    for journey_run_time in lis.run_times.journey_run_time:
-                        tdt_tl[lis.service_link_ref.ref] = journey_run_time
-                        # TODO: Guard begin point equals assigned value
-                        service_journey_pattern.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern[
-                            i
-                        ].onward_service_link_ref = lis.service_link_ref
-
-                elif isinstance(lis, TimingLinkInJourneyPattern):
-                    for journey_run_time in lis.run_times.journey_run_time:
-                        tdt_tl[lis.timing_link_ref.ref] = journey_run_time
-                        # TODO: Guard begin point equeals assigned value
-                        service_journey_pattern.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern[
-                            i
-                        ].onward_timing_link_ref = lis.timing_link_ref
-
-                i += 1
-
-        departure: int = CallsProfile.getDepartureTime(service_journey)
-        arrival: int = departure
-        offset: int = service_journey.departure_time.offset
-
-        tpts = TimetabledPassingTimesRelStructure(timetabled_passing_time=[])
-
-        order = 0
-        # If there are no onward timing links, we must consider links in sequence
-        for pis in service_journey_pattern.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern:
-            order += 1
-            wait_time = None
-            run_time = None
-            spijp = None
-            # TODO: handle the VDV462 case, but then also handle the service_journey input
-            # pis.wait_time_or_wait_times.journey_pattern_wait_time_ref_or_journey_pattern_wait_time
-            if isinstance(pis, StopPointInJourneyPattern):
-                spijp = pis
-
-                wait_time = CallsProfile.getWaitTimesFromPointInJourneyPattern(pis.wait_time_or_wait_times, time_demand_type)
-
-                if wait_time is None:
-                    wait_time = tdt_point.get(pis.scheduled_stop_point_ref.ref, None)
-                    if wait_time is not None:
-                        wait_time = wait_time.wait_time
-
-                if pis.onward_timing_link_ref:
-                    run_time = tdt_tl[pis.onward_timing_link_ref.ref]
-                elif pis.onward_service_link_ref:
-                    run_time = tdt_tl[pis.onward_service_link_ref.ref]
-
-            elif isinstance(pis, TimingPointInJourneyPattern):
-                if isinstance(pis.timing_point_ref_or_scheduled_stop_point_ref_or_parking_point_ref_or_relief_point_ref, ScheduledStopPointRef):
-                    spijp = project(pis, StopPointInJourneyPattern)
-                    spijp.for_alighting = True
-                    spijp.for_boarding = True
-
-                wait_time = tdt_point.get(pis.timing_point_ref_or_scheduled_stop_point_ref_or_parking_point_ref_or_relief_point_ref.ref, None)
-                if wait_time is not None:
-                    wait_time = wait_time.wait_time
-
-                if pis.onward_timing_link_ref:
-                    run_time = tdt_tl[pis.onward_timing_link_ref.ref]
-
-            departure += CallsProfile.getDuration(wait_time)
-            if spijp is not None:
-                arrival_time, arrival_day_offset = CallsProfile.getArrivalTime(arrival, offset)
-                departure_time, departure_day_offset = CallsProfile.getDepartureTimeOffset(arrival, offset)
-                timetabled_passing_time = TimetabledPassingTime(
-                    id=service_journey.id.replace(":ServiceJourney:", ":TimetabledPassingTime:") + '-' + str(order),
-                    version=service_journey.version,
-                    point_in_journey_pattern_ref=getRef(spijp),
-                    arrival_time=arrival_time,
-                    arrival_day_offset=arrival_day_offset,
-                    departure_time=departure_time,
-                    departure_day_offset=departure_day_offset,
-                )
-                tpts.timetabled_passing_time.append(timetabled_passing_time)
-
-            if run_time is not None:
-                arrival = departure + CallsProfile.getDuration(run_time.run_time)
-                departure = arrival
-
-        # for lis in service_journey_pattern.links_in_sequence.service_link_in_journey_pattern_or_timing_link_in_journey_pattern:
         # TODO: handle the VDV462 case
-        # lis.run_times.journey_run_time
-        # pass
-
-        service_journey.passing_times = tpts
+        service_journey.calls = CallsProfile.getTimesFromTimeDemandType(service_journey, service_journey_pattern, time_demand_type, timing_profiles).getCalls(
+            service_journey
+        )
 
     @staticmethod
-    def getCallsFromTimetabledPassingTimes(service_journey: ServiceJourney | TemplateServiceJourney, service_journey_pattern: ServiceJourneyPattern):
-        if service_journey.calls is not None:
+    def getPassingTimesFromTimeDemandType(
+        service_journey: ServiceJourney,
+        service_journey_pattern: ServiceJourneyPattern,
+        time_demand_type: TimeDemandType,
+        timing_profiles: TimingProfiles | None = None,
+    ) -> None:
+        # If calls are present, we don't have to do anything
+        if service_journey.passing_times is not None:
             return
 
+        # Guard that the provided ServiceJourneyPattern equals to the ref
         if service_journey.journey_pattern_ref.ref != service_journey_pattern.id:
             return
 
+        # Guard that the provided TimeDemandType equals to the ref
+        if service_journey.time_demand_type_ref.ref != time_demand_type.id:
+            return
+
+        # TODO: handle the VDV462 case
+        service_journey.passing_times = CallsProfile.getTimesFromTimeDemandType(
+            service_journey, service_journey_pattern, time_demand_type, timing_profiles
+        ).getTimetabledPassingTimes(service_journey)
+
+    @staticmethod
+    def getScheduledStopPointRefs(service_journey_pattern: ServiceJourneyPattern) -> dict[str, ScheduledStopPointRef]:
         ssp_refs = {}
         for pis in service_journey_pattern.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern:
             if isinstance(pis, StopPointInJourneyPattern):
@@ -391,10 +423,13 @@ class CallsProfile:
                     # TODO: implement TimingPointRef nameOfRefClass
                     pass
 
-        calls = CallsRelStructure(call=[])
+        return ssp_refs
+
+    @staticmethod
+    def alignTimetabledPassingTimes(service_journey: ServiceJourney | TemplateServiceJourney, service_journey_pattern: ServiceJourneyPattern) -> None:
+        piss = service_journey_pattern.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern
         order = 1
         for timetabled_passing_time in service_journey.passing_times.timetabled_passing_time:
-
             # TODO: This should NOT be done here. It should be done in preprocessing.
             if timetabled_passing_time.point_in_journey_pattern_ref is None:
                 log_once(
@@ -402,20 +437,60 @@ class CallsProfile:
                     "timetabledpassingtime lacks pointinjourneypattern",
                     "TimetabledPassingTime has no explicit reference to ServiceJourneyPattern",
                 )
-                if len(
-                    service_journey_pattern.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern
-                ) != len(service_journey.passing_times.timetabled_passing_time):
+                if len(piss) != len(service_journey.passing_times.timetabled_passing_time):
                     log_once(logging.WARN, "timetabledpassingtimes do not align", "TimetabledPassingTime do not align with ServiceJourneyPattern")
                     # Last resort would be to filter on StopPointInJourneyPattern and see if that aligns...
                 else:
-                    pis = (
-                        service_journey_pattern.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern[
-                            order - 1
-                        ]
-                    )
+                    pis = piss[order - 1]
                     timetabled_passing_time.id = f"{service_journey.id.replace("ServiceJourney", "TimetabledPassingTime")}_{order}"
                     timetabled_passing_time.point_in_journey_pattern_ref = getRef(pis)
 
+            order += 1
+
+    @staticmethod
+    def getTimesFromTimetabledPassingTimes(
+        service_journey: ServiceJourney | TemplateServiceJourney, service_journey_pattern: ServiceJourneyPattern
+    ) -> JourneyTimes:
+        """The times of the calls of getCallsFromTimetabledPassingTimes(), without building them."""
+        CallsProfile.alignTimetabledPassingTimes(service_journey, service_journey_pattern)
+        ssp_refs = CallsProfile.getScheduledStopPointRefs(service_journey_pattern)
+
+        passing_times: list[TimetabledPassingTime] = service_journey.passing_times.timetabled_passing_time
+        return JourneyTimes(
+            list(range(1, len(passing_times) + 1)),
+            [None] * len(passing_times),
+            [passing_time.point_in_journey_pattern_ref for passing_time in passing_times],
+            [ssp_refs[passing_time.point_in_journey_pattern_ref.ref] for passing_time in passing_times],
+            np.array(
+                [
+                    to_seconds_xmltime(passing_time.arrival_time, passing_time.arrival_day_offset) if passing_time.arrival_time is not None else -1
+                    for passing_time in passing_times
+                ],
+                dtype=np.int64,
+            ),
+            np.array(
+                [
+                    to_seconds_xmltime(passing_time.departure_time, passing_time.departure_day_offset) if passing_time.departure_time is not None else -1
+                    for passing_time in passing_times
+                ],
+                dtype=np.int64,
+            ),
+        )
+
+    @staticmethod
+    def getCallsFromTimetabledPassingTimes(service_journey: ServiceJourney | TemplateServiceJourney, service_journey_pattern: ServiceJourneyPattern):
+        if service_journey.calls is not None:
+            return
+
+        if service_journey.journey_pattern_ref.ref != service_journey_pattern.id:
+            return
+
+        CallsProfile.alignTimetabledPassingTimes(service_journey, service_journey_pattern)
+        ssp_refs = CallsProfile.getScheduledStopPointRefs(service_journey_pattern)
+
+        calls = CallsRelStructure(call=[])
+        order = 1
+        for timetabled_passing_time in service_journey.passing_times.timetabled_passing_time:
             call = Call(
                 id=timetabled_passing_time.id.replace(":TimetabledPassingTime:", ":Call:"),
                 order=order,
@@ -24,7 +24,7 @@ from utils.utils import project, chain, GeneratorTester
 
 from xsdata.models.datatype import XmlDateTime, XmlDate
 
-from transformers.callsprofile import CallsProfile
+from transformers.callsprofile import CallsProfile, TimingProfiles
 
 from configuration import defaults
 
@@ -562,6 +562,7 @@ def epip_service_journey_generator(db_read: MdbxStorage, txn: TXN, generator_def
     day_types_ids: Set[str] = set()
     uic_operating_periods_ids: Set[str] = set()
     day_type_assignments_ids: Set[str] = set()
+    timing_profiles: TimingProfiles = {}
     # vehicle_types: dict[str, VehicleType] = dict()
 
     # availability_conditions: Dict[str, AvailabilityCondition] = {}
@@ -637,8 +638,9 @@ def epip_service_journey_generator(db_read: MdbxStorage, txn: TXN, generator_def
 
         elif sj.journey_pattern_ref and sj.time_demand_type_ref:
             service_journey_pattern: ServiceJourneyPattern = db_read.load_object_by_reference(txn, sj.journey_pattern_ref)
-            time_demand_type: TimeDemandType = db_read.load_object_by_reference(txn, sj.time_demand_type_ref)
-            CallsProfile.getPassingTimesFromTimeDemandType(sj, service_journey_pattern, time_demand_type)
+            # Read only, shared between the journeys of the same TimeDemandType
+            time_demand_type: TimeDemandType = db_read.load_object_by_reference(txn, sj.time_demand_type_ref, shared=True)
+            CallsProfile.getPassingTimesFromTimeDemandType(sj, service_journey_pattern, time_demand_type, timing_profiles)
 
         else:
             log_all(
@@ -660,7 +662,7 @@ def epip_service_journey_generator(db_read: MdbxStorage, txn: TXN, generator_def
 
             if len(route_point_projection) > 0:
                 if isinstance(service_journey_pattern.route_ref_or_route_view, RouteRef):
-                    route: Route = db_read.load_object_by_reference(txn, service_journey_pattern.route_ref_or_route_view)
+                    route: Route = db_read.load_object_by_reference(txn, service_journey_pattern.route_ref_or_route_view, shared=True)
                     for sl in RoutesProfile.projectRouteToServiceLinks(
                         db_read, txn, service_journey_pattern, route, route_point_projection, generator_defaults
                     ):
@@ -728,7 +730,7 @@ def epip_service_journey_generator(db_read: MdbxStorage, txn: TXN, generator_def
 
     log_all(logging.INFO, "Indexing RoutePoint to ScheduledStopPoint ")
     route_point_projection = {}
-    for ssp in db_read.iter_only_objects(txn, ScheduledStopPoint):
+    for ssp in db_read.iter_only_objects(txn, ScheduledStopPoint, fields=["id", "version", "projections"]):
         rp_to_ssp = list(RoutesProfile.route_point_projection(ssp))
         if len(rp_to_ssp) > 0:
             route_point_projection[getRef(ssp).ref] = rp_to_ssp[0]
@@ -1035,7 +1037,7 @@ def export_epip_network_offer(
 
     codespace_ref_or_codespace = GeneratorTester(db_epip.iter_only_objects(txn, Codespace))
     data_source = GeneratorTester(db_epip.iter_only_objects(txn, DataSource))
-    organisation_or_transport_organisation: list[Any] = list(db_epip.iter_only_objects(txn, Authority)) + list(db_epip.iter_only_objects(txn, Operator))
+    organisation_or_transport_organisation = GeneratorTester(chain(db_epip.iter_only_objects(txn, Authority), db_epip.iter_only_objects(txn, Operator)))
     value_set = GeneratorTester(db_epip.iter_only_objects(txn, ValueSet))
     transport_administrative_zone = GeneratorTester(db_epip.iter_only_objects(txn, TransportAdministrativeZone))
 
@@ -1101,7 +1103,9 @@ def export_epip_network_offer(
     other_referenced_objects = GeneratorTester(db_epip.fetch_all_references_by_class(txn, other_referenced_classes, True))
 
     if default_locale is None:
-        all_locales = {org.locale for org in organisation_or_transport_organisation if org.locale is not None}
+        # Only here the organisations are read before they are written, from their own generator
+        organisations = chain(db_epip.iter_only_objects(txn, Authority), db_epip.iter_only_objects(txn, Operator))
+        all_locales = {org.locale for org in organisations if org.locale is not None}
         if len(all_locales) > 1:
             log_print("TODO: Test case for multiple TimetableFrames!")
 
@@ -1141,8 +1145,8 @@ def export_epip_network_offer(
                                 data_sources=DataSourcesInFrameRelStructure(data_source=data_source.generator()) if data_source.has_value() else None,
                                 types_of_value=TypesOfValueInFrameRelStructure(choice=value_set.generator()) if value_set.has_value() else None,
                                 organisations=(
-                                    OrganisationsInFrameRelStructure(organisation_dummy_or_transport_organisation_dummy=organisation_or_transport_organisation)
-                                    if len(organisation_or_transport_organisation) > 0
+                                    OrganisationsInFrameRelStructure(organisation_dummy_or_transport_organisation_dummy=organisation_or_transport_organisation.generator())
+                                    if organisation_or_transport_organisation.has_value()
                                     else None
                                 ),
                                 vehicle_types=(
@@ -1179,7 +1183,7 @@ def export_epip_network_offer(
                                 type_of_frame_ref=TypeOfFrameRef(ref='epip:EU_PI_NETWORK', version_ref='1.0'),
                                 directions=DirectionsInFrameRelStructure(direction=direction.generator()) if direction.has_value() else None,
                                 lines=LinesInFrameRelStructure(line_dummy=line.generator()) if line.has_value() else None,
-                                network=list(network.generator())[0] if network.has_value() else None,
+                                network=network.first if network.has_value() else None,
                                 # Warning; we must handle multiple stuff
                                 destination_displays=(
                                     DestinationDisplaysInFrameRelStructure(destination_display=destination_display.generator())
@@ -45,7 +45,7 @@ from domain.netex.model import (
 from domain.netex.model.name_of_class_operating_period_ref_structure_type import NameOfClassOperatingPeriodRefStructureType
 from domain.netex.services.refs import getRef, getFakeRef
 from storage.mdbx.core.implementation import MdbxStorage
-from transformers.callsprofile import CallsProfile
+from transformers.callsprofile import CallsProfile, TimingProfiles
 from transformers.nordicprofile import NordicProfile
 from transformers.daytype import get_day_type_from_availability_condition, datetime_weekday_to_dow
 from utils.refs import getIndexByGroup
@@ -130,7 +130,7 @@ def gtfs_operator_line_memory(db_read: MdbxStorage, txn: TXN, generator_defaults
 
 
 # TODO: move to separate file (calls profiles)
-def add_calls(db_read: MdbxStorage, txn: TXN, sj: ServiceJourney) -> ServiceJourney:
+def add_calls(db_read: MdbxStorage, txn: TXN, sj: ServiceJourney, timing_profiles: TimingProfiles | None = None) -> ServiceJourney:
     if sj.calls:
         return sj
     else:
@@ -159,7 +159,7 @@ def add_calls(db_read: MdbxStorage, txn: TXN, sj: ServiceJourney) -> ServiceJour
 
             elif sj.time_demand_type_ref:
                 tdt: TimeDemandType = db_read.load_object_by_reference(txn, sj.time_demand_type_ref)
-                CallsProfile.getCallsFromTimeDemandType(sj, sjp, tdt)
+                CallsProfile.getCallsFromTimeDemandType(sj, sjp, tdt, timing_profiles)
                 sj.journey_pattern_ref = None
                 sj.time_demand_type_ref = None
                 return sj
@@ -424,9 +424,10 @@ def gtfs_sj_processing(db_read: MdbxStorage, txn: TXN) -> Generator[ServiceJourn
     calendar_combinations = []
 
     def query_sj(db_read: MdbxStorage, txn: TXN) -> Generator[ServiceJourney, None, None]:
+        timing_profiles: TimingProfiles = {}
         sj: ServiceJourney
         for sj in db_read.iter_only_objects(txn, ServiceJourney):
-            add_calls(db_read, txn, sj)
+            add_calls(db_read, txn, sj, timing_profiles)
             _tmp = calendars_to_daytype(db_read, txn, sj)
             calendar_combinations.append(_tmp)
             sj.route_ref = None  # TODO: #112
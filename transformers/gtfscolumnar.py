@@ -0,0 +1,147 @@
+import logging
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Any, TYPE_CHECKING
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from domain.netex.model import ServiceJourney, TemplateServiceJourney
+from transformers.gtfsprofile import GtfsProfile
+from utils.aux_logging import log_all
+from utils.utils import to_seconds_xmltime
+
+if TYPE_CHECKING:
+    from transformers.callsprofile import JourneyTimes
+
+
+class ColumnBatch:
+    """
+    Collects the rows of one table in NumPy columns of batch_size rows, and inserts every full batch into a DuckDB
+    table, which is created by the first batch. Without columns, they are taken from the keys of the first row given
+    to append_dict(), as text.
+    """
+
+    def __init__(self, con: duckdb.DuckDBPyConnection, table: str, columns: dict[str, Any] | None = None, batch_size: int = 100_000):
+        self.con = con
+        self.table = table
+        self.batch_size = batch_size
+        self.rows = 0
+        self._size = 0
+        self._created = False
+        self._started = time.perf_counter()
+        self._columns: dict[str, np.ndarray] = {}
+        if columns is not None:
+            self._allocate(columns)
+
+    def _allocate(self, columns: dict[str, Any]) -> None:
+        self._columns = {name: np.empty(self.batch_size, dtype=dtype) for name, dtype in columns.items()}
+
+    def append(self, *values: Any) -> None:
+        i = self._size
+        for column, value in zip(self._columns.values(), values):
+            column[i] = value
+
+        self._size += 1
+        if self._size == self.batch_size:
+            self.flush()
+
+    def extend(self, *columns: Any) -> None:
+        """append() for every row of the columns, which are of the same length, a slice of a batch at a time."""
+        rows = len(columns[0])
+        start = 0
+        while start < rows:
+            i = self._size
+            size = min(rows - start, self.batch_size - i)
+            for column, values in zip(self._columns.values(), columns):
+                column[i : i + size] = values[start : start + size]
+
+            self._size += size
+            start += size
+            if self._size == self.batch_size:
+                self.flush()
+
+    def append_dict(self, row: dict[str, Any]) -> None:
+        if not self._columns:
+            self._allocate({name: object for name in row.keys()})
+
+        # As csv.DictWriter writes them, None and '' are both empty
+        self.append(*(None if value is None or value == '' else str(value) for value in row.values()))
+
+    def flush(self) -> None:
+        if self._size == 0:
+            return
+
+        batch = pd.DataFrame({name: column[: self._size] for name, column in self._columns.items()})
+        self.con.register('batch', batch)
+        if self._created:
+            self.con.execute(f"INSERT INTO {self.table} SELECT * FROM batch")
+        else:
+            self.con.execute(f"CREATE TABLE {self.table} AS SELECT * FROM batch")
+            self._created = True
+        self.con.unregister('batch')
+
+        self.rows += self._size
+        self._size = 0
+
+    def copy_to_zip(self, archive: zipfile.ZipFile, filename: str, query: str | None = None) -> None:
+        """Write the table, or the query over it, as filename in the archive. Like GtfsProfile.writeToZipFile, an empty table is not written."""
+        self.flush()
+        if not self._created:
+            return
+
+        with tempfile.TemporaryDirectory(prefix="gtfs_") as directory:
+            path = Path(directory) / filename
+            self.con.execute(f"COPY ({query or f'SELECT * FROM {self.table}'}) TO '{path.as_posix()}' (HEADER, DELIMITER ',')")
+            archive.write(path, filename)
+
+        duration = time.perf_counter() - self._started
+        log_all(logging.INFO, f"[gtfs] {filename}: {self.rows} rows in {duration:.1f}s, {self.rows / max(duration, 1e-9):.0f} rows/s")
+
+
+STOP_TIME_COLUMNS = {'trip_id': object, 'arrival': np.int32, 'departure': np.int32, 'stop_id': object, 'stop_sequence': np.int32}
+
+
+def time_sql(column: str) -> str:
+    """GtfsProfile.addDayOffset() over a column of seconds since midnight, where a negative number is no time."""
+    return f"CASE WHEN {column} < 0 THEN NULL ELSE printf('%02d:%02d:%02d', {column} // 3600, {column} % 3600 // 60, {column} % 60) END"
+
+
+STOP_TIMES_SQL = f"""
+SELECT trip_id, {time_sql('arrival')} AS arrival_time, {time_sql('departure')} AS departure_time, stop_id, NULLIF(stop_sequence, -1) AS stop_sequence,
+NULL AS stop_headsign, NULL AS pickup_type, NULL AS drop_off_type, NULL AS continuous_pickup, NULL AS continuous_drop_off, NULL AS shape_dist_traveled,
+1 AS timepoint
+FROM stop_times"""
+
+
+def append_stop_times(stop_times: ColumnBatch, service_journey: ServiceJourney | TemplateServiceJourney, times: 'JourneyTimes | None' = None) -> None:
+    """
+    GtfsProfile.projectServiceJourneyToStopTimes() into the columns of STOP_TIME_COLUMNS, with the times in seconds. With
+    the times of the journey, see CallsProfile.getTimesFromTimetabledPassingTimes(), its calls are not needed.
+    """
+    trip_id = GtfsProfile.getOriginalGtfsId(service_journey, 'trip_id')
+    if times is not None:
+        stop_times.extend(
+            [trip_id] * len(times.order),
+            np.where(times.arrival >= 0, times.arrival, times.departure),
+            np.where(times.departure >= 0, times.departure, times.arrival),
+            [GtfsProfile.getOriginalGtfsIdFromRef(ssp_ref) for ssp_ref in times.scheduled_stop_point_refs],
+            times.order,
+        )
+        return
+
+    for call in service_journey.calls.call:
+        arrival = call.arrival or call.departure
+        departure = call.departure or call.arrival
+        arrival_time = to_seconds_xmltime(arrival.time, arrival.day_offset) if arrival.time is not None else -1
+        departure_time = to_seconds_xmltime(departure.time, departure.day_offset) if departure.time is not None else -1
+        stop_times.append(
+            trip_id,
+            arrival_time if arrival_time >= 0 else departure_time,
+            departure_time if departure_time >= 0 else arrival_time,
+            GtfsProfile.getOriginalGtfsIdFromRef(call.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view),
+            call.order if call.order is not None else -1,
+        )
@@ -0,0 +1,111 @@
+import csv
+import io
+import logging
+import shutil
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Iterable, IO, Optional, Type, Literal, Self
+
+from utils.aux_logging import log_all
+
+
+class GtfsTableWriter:
+    """
+    Writes one GTFS table into a zip member row by row, through a write buffer of buffer_size bytes, so the memory used
+    does not grow with the size of the table. The header is taken from the keys of the first row, and the member is only
+    created by the first row: like GtfsProfile.writeToZipFile, a table without rows is not written at all.
+
+    A zip archive only accepts one open member at a time. A table that is written while another one is open, for
+    example trips.txt next to stop_times.txt, is spooled to a temporary file and copied into the archive when it is
+    closed, which must be after the member written directly is closed.
+
+    Without an archive, filename is a file that gets the rows without a header: a chunk of a table that another process
+    adds to the table in the archive with append_chunk().
+    """
+
+    def __init__(self, archive: zipfile.ZipFile | None, filename: str, spool: bool = False, buffer_size: int = 1024 * 1024):
+        self.archive = archive
+        self.filename = filename
+        self.spool = spool
+        self.buffer_size = buffer_size
+        self.rows = 0
+        self.fieldnames: list[str] | None = None
+        self._file: IO[bytes] | None = None
+        self._text: io.TextIOWrapper | None = None
+        self._writer: "csv.DictWriter[str] | None" = None
+        self._started = time.perf_counter()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exception_type: Optional[Type[BaseException]],
+        exception_value: Optional[BaseException],
+        exception_traceback: Optional[TracebackType],
+    ) -> Literal[False]:
+        self.close()
+        return False
+
+    def _open(self, fieldnames: Iterable[str]) -> "csv.DictWriter[str]":
+        if self.archive is None:
+            self._file = open(self.filename, 'wb')
+        elif self.spool:
+            self._file = tempfile.TemporaryFile()
+        else:
+            self._file = self.archive.open(self.filename, 'w', force_zip64=True)
+
+        self.fieldnames = list(fieldnames)
+        self._text = io.TextIOWrapper(io.BufferedWriter(self._file, self.buffer_size), 'utf-8', newline='')  # type: ignore[arg-type]
+        self._writer = csv.DictWriter(self._text, fieldnames=self.fieldnames)
+        if self.archive is not None:
+            self._writer.writeheader()
+        return self._writer
+
+    def writerow(self, row: dict[str, Any]) -> None:
+        writer = self._writer or self._open(row.keys())
+        writer.writerow(row)
+        self.rows += 1
+
+    def writerows(self, rows: Iterable[dict[str, Any]]) -> None:
+        for row in rows:
+            self.writerow(row)
+
+    def append_chunk(self, fieldnames: list[str] | None, rows: int, path: Path) -> None:
+        """Add the rows of a chunk written by GtfsTableWriter without an archive, with these fieldnames."""
+        if rows == 0 or fieldnames is None:
+            return
+
+        if self._writer is None:
+            self._open(fieldnames)
+        assert self._text is not None
+        assert fieldnames == self.fieldnames, f"{path} does not have the columns of {self.filename}"
+
+        self._text.flush()
+        with open(path, 'rb') as chunk:
+            shutil.copyfileobj(chunk, self._text.buffer, self.buffer_size)
+        self.rows += rows
+
+    def close(self) -> None:
+        if self._text is None or self._file is None:
+            return
+
+        if self.archive is not None and self.spool:
+            # Closing the wrapper would close the temporary file as well
+            self._text.flush()
+            self._file.seek(0)
+            with self.archive.open(self.filename, 'w', force_zip64=True) as member:
+                shutil.copyfileobj(self._file, member, self.buffer_size)
+
+        self._text.close()
+        self._text = None
+        self._file = None
+
+        if self.archive is None:
+            return
+
+        duration = time.perf_counter() - self._started
+        log_all(logging.INFO, f"[gtfs] {self.filename}: {self.rows} rows in {duration:.1f}s, {self.rows / max(duration, 1e-9):.0f} rows/s")
@@ -1,14 +1,16 @@
 import logging
+import time
 from decimal import Decimal, ROUND_HALF_UP
 from itertools import chain
-from typing import Generator
+from typing import Any, Generator
 
+import numpy as np
 from mdbx.mdbx import TXN
 from pyproj import Transformer
 from pyproj.exceptions import CRSError
 
 from storage.mdbx.core.implementation import MdbxStorage
-from utils.aux_logging import log_once
+from utils.aux_logging import log_all, log_once
 from domain.netex.model import Polygon, PosList, Pos, LocationStructure2, LineString, MultiSurface, LinearRing, \
     SimplePointVersionStructure, EntityStructure
 from domain.netex.services.model_typing import Tid
@@ -19,47 +21,188 @@ from domain.netex.services.recursive_attributes import (
 
 transformers: dict[str, Transformer] = {}
 
+WGS84 = 'urn:ogc:def:crs:EPSG::4326'
+
+# The number of objects of which the coordinates are transformed together by reprojection_update()
+REPROJECTION_BATCH_SIZE = 10_000
+
+
+def quantize_array(values: np.ndarray, quantize: str = '0.000001') -> list[Decimal]:
+    """
+    Decimal(value).quantize(Decimal(quantize), ROUND_HALF_UP) for all values at once. The rounding is done on the
+    scaled floats, only the values that are too close to half way for that, are rounded as Decimal.
+    """
+    exponent = Decimal(quantize).as_tuple().exponent
+    assert isinstance(exponent, int)
+    finite = np.isfinite(values)
+    scaled = np.abs(np.where(finite, values, 0.0)) * 10.0 ** -exponent
+    rounded = np.floor(scaled + 0.5)
+    # Also negative values that round to zero, to keep their sign, and values that are not a number, to fail as Decimal
+    exact = (np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6) | ((rounded == 0) & np.signbit(values)) | ~finite
+    digits = np.where(values < 0, -rounded, rounded).astype(np.int64).tolist()
+
+    result = [Decimal(digit).scaleb(exponent) for digit in digits]
+    if exact.any():
+        q = Decimal(quantize)
+        for i in np.flatnonzero(exact).tolist():
+            result[i] = Decimal(float(values[i])).quantize(q, ROUND_HALF_UP)
+    return result
+
+
+class Reprojection:
+    """
+    Reprojects the geometries of many objects at once. add() collects the coordinates of an object, grouped by their
+    source CRS and dimension, apply() transforms every group with a single call of its Transformer, quantizes the
+    results as arrays and writes them back, as reprojection() would have done per geometry.
+    """
+
+    def __init__(self, crs_to: str, force_latlon: bool = False, quantize: str = '0.000001'):
+        self.crs_to = crs_to
+        self.force_latlon = force_latlon
+        self.quantize = quantize
+        self.points = 0
+        self._seen: set[int] = set()
+        # Per source CRS: the locations and their coordinates
+        self._locations: dict[str, tuple[list[LocationStructure2], list[Any], list[Any]]] = {}
+        # Per source CRS and dimension: the line strings and linear rings, the number of positions of each, and the coordinates per axis
+        self._lines: dict[tuple[str, int], tuple[list[LineString | LinearRing], list[int], list[list[Any]]]] = {}
+        # The objects of which srs_name is set to crs_to by apply()
+        self._srs_names: list[Any] = []
+
+    def add(self, deserialized: Tid) -> None:
+        # TODO: A general optimisation would be to precompute the paths within a class to directly have a list (per class) of possible location targets
+        for obj, path in recursive_attributes(deserialized, []):
+            if isinstance(obj, LocationStructure2):
+                self.add_location(obj)
+
+            elif isinstance(obj, SimplePointVersionStructure):
+                if obj.location:
+                    self.add_location(obj.location)
+
+            elif isinstance(obj, LineString):
+                if obj.srs_name == self.crs_to or id(obj) in self._seen:
+                    continue
+
+                self._seen.add(id(obj))
+                srs_name = obj.srs_name or WGS84
+                if srs_name != self.crs_to:
+                    self.add_line(srs_name, obj)
+                    self._srs_names.append(obj)
+
+            elif isinstance(obj, Polygon):
+                self.add_polygon(obj)
+
+            elif isinstance(obj, MultiSurface):
+                if obj.surface_members:
+                    for surface_member in obj.surface_member:
+                        if surface_member.polygon:
+                            self.add_polygon(surface_member.polygon)
+                    if obj.surface_members.polygon:
+                        for polygon in obj.surface_members.polygon:
+                            if polygon:
+                                self.add_polygon(polygon)
+
+                self._srs_names.append(obj)
+
+    def add_location(self, location: LocationStructure2) -> None:
+        if location.srs_name == self.crs_to or id(location) in self._seen:
+            return
+
+        if location.pos is not None:
+            srs_name = location.pos.srs_name or location.srs_name or WGS84
+            x, y = location.pos.value[0], location.pos.value[1]
+        elif location.longitude is not None and location.latitude is not None:
+            srs_name = location.srs_name or WGS84
+            x, y = location.latitude, location.longitude
+        else:
+            log_once(logging.WARNING, "Location without coordinates", "A location has neither a pos nor a longitude and latitude, it is not projected")
+            return
+
+        self._seen.add(id(location))
+        if srs_name != self.crs_to:
+            locations, xx, yy = self._locations.setdefault(srs_name, ([], [], []))
+            locations.append(location)
+            xx.append(x)
+            yy.append(y)
+
+    def add_polygon(self, polygon: Polygon) -> None:
+        if polygon.srs_name == self.crs_to or id(polygon) in self._seen:
+            return
+
+        self._seen.add(id(polygon))
+        srs_name = polygon.srs_name or WGS84
+        if polygon.exterior and polygon.exterior.linear_ring:
+            self.add_line(srs_name, polygon.exterior.linear_ring)
+        for interior in polygon.interior:
+            if interior and interior.linear_ring:
+                self.add_line(srs_name, interior.linear_ring)
+        self._srs_names.append(polygon)
+
+    def add_line(self, srs_name: str, linestring: LineString | LinearRing) -> None:
+        srs_dimension = linestring.srs_dimension if hasattr(linestring, 'srs_dimension') and linestring.srs_dimension else 2
+        if srs_dimension not in (2, 3):
+            return
+
+        positions = linestring.pos_or_point_property_or_pos_list
+        if not positions:
+            return
+        if isinstance(positions[0], PosList):
+            axes = [positions[0].value[axis::srs_dimension] for axis in range(srs_dimension)]
+        elif isinstance(positions[0], Pos):
+            axes = [[pos.value[axis] for pos in positions if isinstance(pos, Pos)] for axis in range(srs_dimension)]
+        else:
+            return
+
+        lines, counts, coordinates = self._lines.setdefault((srs_name, srs_dimension), ([], [], [[] for _ in range(srs_dimension)]))
+        lines.append(linestring)
+        counts.append(len(axes[0]))
+        for axis, values in zip(coordinates, axes):
+            axis.extend(values)
+
+    def transform(self, srs_name: str, coordinates: list[list[Any]]) -> list[np.ndarray]:
+        transformer = get_transformer(srs_name, self.crs_to)
+        self.points += len(coordinates[0])
+        return [np.asarray(axis, dtype=np.float64) for axis in transformer.transform(*(np.asarray(axis, dtype=np.float64) for axis in coordinates))]
+
+    def apply(self) -> None:
+        for srs_name, (locations, xx, yy) in self._locations.items():
+            px, py = self.transform(srs_name, [xx, yy])
+            for location, x, y in zip(locations, quantize_array(px, self.quantize), quantize_array(py, self.quantize)):
+                location.srs_name = self.crs_to
+                if self.force_latlon:
+                    location.pos = None
+                    location.latitude = x  # only correct in this case
+                    location.longitude = y  # only correct in this case
+                else:
+                    location.pos = Pos(value=[x, y], srs_name=self.crs_to, srs_dimension=2)
+
+        for (srs_name, srs_dimension), (lines, counts, coordinates) in self._lines.items():
+            projected = np.column_stack(self.transform(srs_name, coordinates)).ravel()
+            values = quantize_array(projected, self.quantize)
+            start = 0
+            for linestring, count in zip(lines, counts):
+                end = start + count * srs_dimension
+                linestring.pos_or_point_property_or_pos_list = [PosList(value=values[start:end], srs_dimension=srs_dimension)]  # type: ignore
+                start = end
+
+        for obj in self._srs_names:
+            obj.srs_name = self.crs_to
+
+        self._seen.clear()
+        self._locations.clear()
+        self._lines.clear()
+        self._srs_names.clear()
+
 
 def reprojection(deserialized: Tid, crs_to: str, force_latlon=False) -> Tid:
-    # TODO: This function would walk over the class iteratively.
-    # A general optimisation would be to precompute the paths within
-    # a class to directly have a list (per class) of possible location targets
-    for obj, path in recursive_attributes(deserialized, []):
-        if isinstance(obj, LocationStructure2):
-            project_location(obj, crs_to, force_latlon)
-
-        elif isinstance(obj, SimplePointVersionStructure):
-            if obj.location:
-                project_location(obj.location, crs_to, force_latlon)
-
-        elif isinstance(obj, LineString):
-            if obj.srs_name == crs_to:
-                continue
-
-            transformer = get_transformer_by_srs_name(obj, crs_to)
-            if transformer is not None:
-                project_linestring2(transformer, obj)
-                obj.srs_name = crs_to
-
-        elif isinstance(obj, Polygon):
-            project_polygon(obj, crs_to)
-
-        elif isinstance(obj, MultiSurface):
-            if obj.surface_members:
-                for surface_member in obj.surface_member:
-                    if surface_member.polygon:
-                        project_polygon(surface_member.polygon, crs_to)
-                if obj.surface_members.polygon:
-                    for polygon in obj.surface_members.polygon:
-                        if polygon:
-                            project_polygon(polygon, crs_to)
-
-            obj.srs_name = crs_to
+    batch = Reprojection(crs_to, force_latlon)
+    batch.add(deserialized)
+    batch.apply()
     # TODO: Ideally don't return anything which is not changed.
     return deserialized
 
 
-def reprojection_update(db: MdbxStorage, txn: TXN, crs_to: str, force_latlon=False) -> Generator[Tid, None, None]:
+def reprojection_update(db: MdbxStorage, txn: TXN, crs_to: str, force_latlon=False, batch_size: int = REPROJECTION_BATCH_SIZE) -> Generator[Tid, None, None]:
     # Within this function we are reading and writing towards the target database.
     # This effectively means that if we would need to resize for whatever reason,
     # we cannot hold the cursor since access has to be disabled.
@@ -67,9 +210,23 @@ def reprojection_update(db: MdbxStorage, txn: TXN, crs_to: str, force_latlon=Fal
 
     clazz: EntityStructure
     for clazz in set(db.db_names(txn).values()).intersection(set(get_all_geo_elements())):
+        started = time.perf_counter()
+        batch = Reprojection(crs_to, force_latlon)
+        objects: list[Tid] = []
         obj: Tid
         for _key, obj in db.iter_objects(txn, clazz):
-            yield reprojection(obj, crs_to, force_latlon)
+            batch.add(obj)
+            objects.append(obj)
+            if len(objects) == batch_size:
+                batch.apply()
+                yield from objects
+                objects = []
+
+        batch.apply()
+        yield from objects
+
+        duration = time.perf_counter() - started
+        log_all(logging.INFO, f"[reprojection] {clazz.__name__}: {batch.points} points in {duration:.1f}s, {batch.points / max(duration, 1e-9):.0f} points/s")
 
 
 def get_transformer_by_srs_name(location: LocationStructure2 | LineString, crs_to: str) -> Transformer | None:
@@ -81,6 +238,10 @@ def get_transformer_by_srs_name(location: LocationStructure2 | LineString, crs_t
     if srs_name == crs_to:
         return None
 
+    return get_transformer(srs_name, crs_to)
+
+
+def get_transformer(srs_name: str, crs_to: str) -> Transformer:
     mapping = f"{srs_name}_{crs_to}"
     transformer = transformers.get(mapping, None)
     if transformer is None:
@@ -186,9 +347,7 @@ def project_polygon(polygon: Polygon, crs_to: str) -> None:
     if polygon.srs_name == crs_to:
         return
 
-    mapping = f"{polygon.srs_name}_{crs_to}"
-    transformer = transformers.get(mapping, Transformer.from_crs(polygon.srs_name, crs_to))
-    transformers[mapping] = transformer
+    transformer = get_transformer(polygon.srs_name, crs_to)
     if polygon.exterior and polygon.exterior.linear_ring:
         project_linestring2(transformer, polygon.exterior.linear_ring)
     for interior in polygon.interior:
@@ -54,7 +54,8 @@ class RoutesProfile:
         if route.points_in_sequence:
             links_in_sequence = [por.onward_route_link_ref for por in route.points_in_sequence.point_on_route if por.onward_route_link_ref]
             # TODO: #142
-            route_links_in_sequence: List[RouteLink] = [db.load_object_by_reference(txn, lis) for lis in links_in_sequence]
+            # Shared, the same RouteLinks are used by every pattern on the route, the line strings are copied before changing them
+            route_links_in_sequence: List[RouteLink] = [db.load_object_by_reference(txn, lis, shared=True) for lis in links_in_sequence]
             route_i = 0
 
             if sjp.points_in_sequence:
@@ -105,7 +106,8 @@ class RoutesProfile:
                             )
 
                             object_id = m.hexdigest()[0:8].upper()
-                            combined_route_links[0].line_string.id = "LineString_" + object_id
+                            line_string = copy.deepcopy(combined_route_links[0].line_string)
+                            line_string.id = "LineString_" + object_id
 
                             sl = ServiceLink(
                                 id=getId(generator_defaults['codespace'], ServiceLink, id=object_id),
@@ -113,7 +115,7 @@ class RoutesProfile:
                                 distance=combined_route_links[0].distance,
                                 from_point_ref=project(from_ssp, ScheduledStopPointRefStructure),
                                 to_point_ref=project(to_ssp, ScheduledStopPointRefStructure),
-                                line_string=combined_route_links[0].line_string,
+                                line_string=line_string,
                                 derived_from_object_ref=combined_route_links[0].id,
                                 derived_from_version_ref_attribute=combined_route_links[0].version,
                             )
@@ -126,7 +128,7 @@ class RoutesProfile:
                                 if line_string.srs_dimension is None:
                                     line_string.srs_dimension = 2
 
-                                line_string_value = combined_route_links[0].line_string.pos_or_point_property_or_pos_list[0].value
+                                line_string_value = line_string.pos_or_point_property_or_pos_list[0].value
                                 distance: Decimal = Decimal(0)
 
                                 for k in range(1, len(combined_route_links)):
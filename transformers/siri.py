@@ -3,7 +3,7 @@ from typing import Generator
 
 from xsdata.models.datatype import XmlDate, XmlDateTime
 
-from callsprofile import CallsProfile
+from callsprofile import CallsProfile, TimingProfiles
 from netex import (
     ServiceJourney,
     DestinationDisplay,
@@ -63,6 +63,7 @@ def siri_destination_display_generator(db_read: Database) -> Generator[NaturalLa
 def siri_dated_vehicle_journey_generator(
     db_read: Database, operating_day: OperatingDay, line_ref: LineRef, direction_ref: DirectionRef, tzinfo
 ) -> Generator[DatedVehicleJourneyStructure, None, None]:
+    timing_profiles: TimingProfiles = {}
     for service_journey in load_generator(db_read, ServiceJourney):
         # TODO: Implement a filter based on ServiceCalendar / AvailabilityCondition based on the provided operating_day, line_ref, direction_ref
 
@@ -79,7 +80,7 @@ def siri_dated_vehicle_journey_generator(
                 ServiceJourneyPattern, service_journey.journey_pattern_ref.ref, service_journey.journey_pattern_ref.version
             )
             time_demand_type = db_read.get_single(TimeDemandType, service_journey.time_demand_type_ref.ref, service_journey.time_demand_type_ref.version)
-            CallsProfile.getCallsFromTimeDemandType(service_journey, service_journey_pattern, time_demand_type)
+            CallsProfile.getCallsFromTimeDemandType(service_journey, service_journey_pattern, time_demand_type, timing_profiles)
 
         service_journey: ServiceJourney
         if service_journey.calls:
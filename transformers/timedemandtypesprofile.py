@@ -1,586 +1,95 @@
-import dataclasses
-from pathlib import Path
-from typing import List, Dict, Tuple
-
-from xsdata.formats.dataclass.context import XmlContext
-from xsdata.formats.dataclass.parsers import XmlParser
-from xsdata.formats.dataclass.parsers.config import ParserConfig
-from xsdata.formats.dataclass.parsers.handlers import LxmlEventHandler
-from xsdata.formats.dataclass.serializers import XmlSerializer
-from xsdata.formats.dataclass.serializers.config import SerializerConfig
-from xsdata.models.datatype import XmlDuration
-
-from netex import (
-    ServiceJourney,
-    ServiceJourneyPattern,
-    StopPointInJourneyPattern,
-    TimetabledPassingTime,
-    PointsInJourneyPatternRelStructure,
+import hashlib
+import logging
+from typing import Any, Generator, Iterable, NamedTuple
+
+from mdbx.mdbx import TXN
+from xsdata.models.datatype import XmlDuration, XmlTime
+
+from domain.netex.indexes.byid import getIndex
+from domain.netex.model import (
     Codespace,
-    Call,
-    Version,
-    TimeDemandType,
-    TimingLink,
-    ScheduledStopPoint,
-    TimingPointRefStructure,
+    EntityStructure,
     JourneyRunTime,
-    JourneyWaitTime,
     JourneyRunTimesRelStructure,
-    TimingLinkRef,
+    JourneyWaitTime,
     JourneyWaitTimesRelStructure,
+    PointsInJourneyPatternRelStructure,
+    RouteView,
     ScheduledStopPointRef,
+    ServiceJourney,
+    ServiceJourneyPattern,
+    ServiceJourneyPatternRef,
+    StopPointInJourneyPattern,
+    TimeDemandType,
+    TimeDemandTypeRef,
+    TimingLink,
     TimingLinkRefStructure,
-    PublicationDelivery,
-    GeneralFrame,
-    ServiceLink,
     TimingPointInJourneyPattern,
+    TimingPointRefStructure,
 )
-from netexio.dbaccess import load_local
-from utils.refs import getRef, getId, getFakeRef
+from domain.netex.services.ids import getId
+from domain.netex.services.refs import getFakeRef
+from storage.mdbx.core.implementation import MdbxStorage
+from utils.aux_logging import log_all
 
+DIGEST_SIZE = 8
 
-class TimeDemandTypesProfile:
-    codespace: Codespace
-    version: Version
 
-    @staticmethod
-    def getRunTimeCall(departure: Call, arrival: Call) -> int:
-        return (
-            (arrival.arrival.day_offset or 0) * 86400 + arrival.arrival.time.hour * 3600 + arrival.arrival.time.minute * 60 + arrival.arrival.time.second
-        ) - (
-            (departure.departure.day_offset or 0) * 86400
-            + departure.departure.time.hour * 3600
-            + departure.departure.time.minute * 60
-            + departure.departure.time.second
-        )
+class TimingPoint(NamedTuple):
+    """A point of the timing profile of a ServiceJourney, its times in seconds since the start of the operating day."""
 
-    # @staticmethod
-    def getWaitTimeCall(call: Call) -> int:
-        if call.arrival is not None and call.departure is not None:
-            waiting_time_secs = (
-                (call.departure.day_offset or 0) * 86400 + call.departure.time.hour * 3600 + call.departure.time.minute * 60 + call.departure.time.second
-            ) - ((call.arrival.day_offset or 0) * 86400 + call.arrival.time.hour * 3600 + call.arrival.time.minute * 60 + call.arrival.time.second)
-            return waiting_time_secs
-        return 0
+    scheduled_stop_point_ref: str
+    arrival: int | None
+    departure: int | None
+    onward_timing_link_ref: str | None
 
-    # @staticmethod
-    # def getWaitTimeDatedCall(dated_call: DatedCall) -> int:
-    #    if dated_call.arrival is not None and dated_call.departure is not None:
-    #        return (86400 * (dated_call.departure_date.to_datetime() - dated_call.arrival_date.to_datetime()).days) + ((dated_call.departure.day_offset or 0) * 86400 + dated_call.departure.time.hour * 3600 + dated_call.departure.time.minute * 60 + dated_call.departure.time.second) - ((dated_call.arrival.day_offset or 0) * 86400 + dated_call.arrival.time.hour * 3600 +  dated_call.arrival.time.minute * 60 + dated_call.arrival.time.second)
+    @property
+    def arriving(self) -> int:
+        """The arrival, or departure at the first point."""
+        return self.arrival if self.arrival is not None else self.departure  # type: ignore[return-value]
 
-    #    return 0
+    @property
+    def departing(self) -> int:
+        """The departure, or arrival at the last point."""
+        return self.departure if self.departure is not None else self.arrival  # type: ignore[return-value]
 
-    # @staticmethod
-    # def getRunTimeDatedCall(departure: DatedCall, arrival: DatedCall) -> int:
-    #     return (86400 * (arrival.arrival_date.to_datetime() - departure.departure_date.to_datetime()).days) + ((arrival.arrival.day_offset or 0) * 86400 + arrival.arrival.time.hour * 3600 + arrival.arrival.time.minute * 60 + arrival.arrival.time.second) - ((departure.departure.day_offset or 0) * 86400 + departure.departure.time.hour * 3600 +  departure.departure.time.minute * 60 + departure.departure.time.second)
 
-    @staticmethod
-    def getRunTimePassingTime(departure: TimetabledPassingTime, arrival: TimetabledPassingTime) -> XmlDuration:
-        run_time_secs = (
-            (arrival.arrival_day_offset or 0) * 86400 + arrival.arrival_time.hour * 3600 + arrival.arrival_time.minute * 60 + arrival.arrival_time.second
-        ) - (
-            (departure.departure_day_offset or 0) * 86400
-            + departure.departure_time.hour * 3600
-            + departure.departure_time.minute * 60
-            + departure.departure_time.second
-        )
-        return XmlDuration(value=f"PT{run_time_secs}S")
+class TimeDemandTypesProfile:
+    """
+    The ServiceJourneyPattern, TimingLinks and TimeDemandType of the timing profile of a ServiceJourney. Their ids are a digest
+    of their content, so identical profiles share them across the whole feed, and the same input gives the same ids on every run.
+    """
 
-    @staticmethod
-    def getWaitTimePassingTime(passing_time: TimetabledPassingTime) -> XmlDuration:
-        if passing_time.waiting_time:
-            return passing_time.waiting_time
-        if passing_time.arrival_time is not None and passing_time.departure_time is not None:
-            waiting_time_secs = (
-                (passing_time.departure_day_offset or 0) * 86400
-                + passing_time.departure_time.hour * 3600
-                + passing_time.departure_time.minute * 60
-                + passing_time.departure_time.second
-            ) - (
-                (passing_time.arrival_day_offset or 0) * 86400
-                + passing_time.arrival_time.hour * 3600
-                + passing_time.arrival_time.minute * 60
-                + passing_time.arrival_time.second
-            )
-            return XmlDuration(value=f"PT{waiting_time_secs}S")
+    codespace: Codespace
+    version: str
 
-    @staticmethod
-    def getTimeDemandTypeHash(tdt: TimeDemandType):
-        # TODO: REVIEW and replace with hashlib.sha256 digest!!
-        # TODO: Check if the output of this code is the same as inline
-        run_times = [(x.run_time, x.timing_link_ref.ref) for x in tdt.run_times.journey_run_time] + [
-            (x.wait_time, x.timing_point_ref_or_scheduled_stop_point_ref_or_parking_point_ref_or_relief_point_ref.ref) for x in tdt.wait_times.journey_wait_time
-        ]
-        return hash(run_times)
+    def __init__(self, codespace: Codespace, version: str):
+        self.codespace = codespace
+        self.version = version
+        self.service_journeys = 0
 
-    @staticmethod
-    def getTimeDemandTypeHash2(
-        native_runtime: List[
-            Tuple[
-                XmlDuration,
-                str,
-            ]
-        ],
-        native_waittime: List[
-            Tuple[
-                XmlDuration,
-                str,
-            ]
-        ],
-    ):
-        return hash('_'.join([str(x) + '-' + str(y) for x, y in native_runtime]) + '_' + '_'.join([str(x) + '-' + str(y) for x, y in native_waittime]))
+        # The ids that were already emitted, an id is the digest of the content
+        self.service_journey_patterns: set[str] = set()
+        self.time_demand_types: set[str] = set()
+        self.timing_links: set[str] = set()
 
     @staticmethod
-    def getHexHash(hash_in: int):
-        return ("%0.2X" % (hash_in**2))[0:8]
+    def getDigest(*vectors: Iterable[Any]) -> str:
+        """A digest of the vectors, unlike hash() it is not salted per process."""
+        digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+        for vector in vectors:
+            digest.update('\x1f'.join(str(x) for x in vector).encode('utf-8'))
+            digest.update(b'\x1e')
+        return digest.hexdigest().upper()
 
     @staticmethod
-    def getServiceJourneyPatternHash(sjp: ServiceJourneyPattern):
-        # TODO: This will work for the simple cases, but will fail for routes having the same sequence, but for example a different route_ref (for a different line_ref)
-        return hash(
-            '-'.join(
-                [
-                    TimeDemandTypesProfile.getPointRefFromPointInJourneyPattern(x).ref
-                    for x in sjp.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern
-                ]
-            )
-        )
-
-    def getTimeDemandTypeByTimesGenerator(
-        self,
-        read_con,
-        write_con,
-        service_journey: ServiceJourney,
-        run_times: List[
-            Tuple[
-                XmlDuration,
-                str,
-            ]
-        ],
-        wait_times: List[
-            Tuple[
-                XmlDuration,
-                str,
-            ]
-        ],
-    ):
-        tdt_hash = TimeDemandTypesProfile.getTimeDemandTypeHash2(run_times, wait_times)
-        tdt_hash_hex = TimeDemandTypesProfile.getHexHash(tdt_hash)
-        id = getId(TimeDemandType, self.codespace, tdt_hash_hex)
-
-        tdt = load_local(read_con, TimeDemandType, 1, id)
-        if len(tdt) == 0:
-            tdt = load_local(write_con, TimeDemandType, 1, id)
-            if len(tdt) == 0:
-                order = 0
-
-                tdt = TimeDemandType(
-                    id=id,
-                    version=self.version.version,
-                    run_times=JourneyRunTimesRelStructure(
-                        journey_run_time=[
-                            JourneyRunTime(
-                                id=getId(JourneyRunTime, self.codespace, "{:s}-{:d}".format(tdt_hash_hex, (order := order + 1))),
-                                # TODO make more elegant
-                                version=self.version.version,
-                                timing_link_ref=getFakeRef(x[1], TimingLinkRef, self.version.version),
-                                run_time=x[0],
-                            )
-                            for x in run_times
-                        ]
-                    ),
-                    wait_times=JourneyWaitTimesRelStructure(
-                        journey_wait_time=[
-                            JourneyWaitTime(
-                                id=getId(JourneyWaitTime, self.codespace, "{:s}-{:d}".format(tdt_hash_hex, (order := order + 1))),
-                                version=self.version.version,
-                                timing_point_ref_or_scheduled_stop_point_ref_or_parking_point_ref_or_relief_point_ref=getFakeRef(
-                                    x[1], ScheduledStopPointRef, self.version.version
-                                ),
-                                wait_time=x[0],
-                            )
-                            for x in wait_times
-                            if x[0].seconds > 0
-                        ]
-                    ),
-                )
-
-                if len(tdt.wait_times.journey_wait_time) == 0:
-                    tdt.wait_times = None
-
-                write_con.insert_one_object(tdt)
-            else:
-                tdt = tdt[0]
-
-        service_journey.time_demand_type_ref = getRef(tdt)
-        return tdt
-
-    def getTimeDemandTypeByTimes(
-        self,
-        service_journey: ServiceJourney,
-        time_demand_types: Dict[str, TimeDemandType],
-        time_demand_types_hash: Dict[int, str],
-        ssps: Dict[str, ScheduledStopPoint],
-        tls: Dict[str, TimingLink],
-        run_times: List[
-            Tuple[
-                XmlDuration,
-                str,
-            ]
-        ],
-        wait_times: List[
-            Tuple[
-                XmlDuration,
-                str,
-            ]
-        ],
-    ):
-        tdt_hash = TimeDemandTypesProfile.getTimeDemandTypeHash2(run_times, wait_times)
-        tdt_hash_hex = TimeDemandTypesProfile.getHexHash(tdt_hash)
-
-        if tdt_hash not in time_demand_types_hash:
-            order = 0
-
-            tdt = TimeDemandType(
-                id=getId(TimeDemandType, self.codespace, tdt_hash_hex),
-                version=self.version.version,
-                run_times=JourneyRunTimesRelStructure(
-                    journey_run_time=[
-                        JourneyRunTime(
-                            id=getId(JourneyRunTime, self.codespace, "{:s}-{:d}".format(tdt_hash_hex, (order := order + 1))),
-                            # TODO make more elegant
-                            version=self.version.version,
-                            timing_link_ref=getRef(tls.get(x[1])),
-                            run_time=x[0],
-                        )
-                        for x in run_times
-                    ]
-                ),
-                wait_times=JourneyWaitTimesRelStructure(
-                    journey_wait_time=[
-                        JourneyWaitTime(
-                            id=getId(JourneyWaitTime, self.codespace, "{:s}-{:d}".format(tdt_hash_hex, (order := order + 1))),
-                            version=self.version.version,
-                            timing_point_ref_or_scheduled_stop_point_ref_or_parking_point_ref_or_relief_point_ref=getRef(ssps.get(x[1]), ScheduledStopPointRef),
-                            wait_time=x[0],
-                        )
-                        for x in wait_times
-                        if x[0].seconds > 0
-                    ]
-                ),
-            )
-
-            if len(tdt.wait_times.journey_wait_time) == 0:
-                tdt.wait_times = None
-
-            time_demand_types[tdt.id] = tdt
-            time_demand_types_hash[tdt_hash] = tdt.id
-        else:
-            tdt = time_demand_types[time_demand_types_hash[tdt_hash]]
-
-        service_journey.time_demand_type_ref = getRef(tdt)
-
-    def getTimeDemandTypeByCalls(
-        self,
-        service_journey: ServiceJourney,
-        time_demand_types: Dict[str, TimeDemandType],
-        time_demand_types_hash: Dict[int, str],
-        ssps: Dict[str, ScheduledStopPoint],
-        tls: Dict[str, TimingLink],
-    ):
-        calls: List[Call] = sorted(service_journey.calls.call, key=lambda c: c.order)
-        run_times: List[
-            Tuple[
-                XmlDuration,
-                str,
-            ]
-        ] = []
-        wait_times: List[
-            Tuple[
-                XmlDuration,
-                str,
-            ]
-        ] = []
-
-        for i in range(0, len(calls) - 1):
-            run_time = XmlDuration(value="PT{:d}S".format(TimeDemandTypesProfile.getRunTimeCall(calls[i], calls[i + 1])))
-            wait_time = XmlDuration(value="PT{:d}S".format(TimeDemandTypesProfile.getWaitTimeCall(calls[i])))
-            ssp = ssps[calls[i].fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view.ref]
-            ssp_next = ssps[calls[i + 1].fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view.ref]
-
-            if (
-                calls[i].onward_timing_link_view
-                and calls[i].onward_timing_link_view.timing_link_ref
-                and calls[i].onward_timing_link_view.timing_link_ref in tls
-            ):
-                tl_ref = calls[i].onward_timing_link_view.timing_link_ref
-            else:
-                tl_ref = getId(TimingLink, self.codespace, TimeDemandTypesProfile.getHexHash(hash(ssp.id + "-" + ssp_next.id)))
-
-            if tl_ref not in tls:
-                tls[tl_ref] = TimingLink(
-                    id=getId(TimingLink, self.codespace, TimeDemandTypesProfile.getHexHash(hash(ssp.id + "-" + ssp_next.id))),
-                    version=self.version.version,
-                    from_point_ref=getRef(ssp, TimingPointRefStructure),
-                    to_point_ref=getRef(ssp_next, TimingPointRefStructure),
-                )
-
-            run_times.append(
-                (
-                    run_time,
-                    tl_ref,
-                )
-            )
-            wait_times.append(
-                (
-                    wait_time,
-                    ssp.id,
-                )
-            )
-
-        self.getTimeDemandTypeByTimes(service_journey, time_demand_types, time_demand_types_hash, ssps, tls, run_times, wait_times)
-        service_journey.departure_time = calls[0].departure.time
-
-    def getTimeDemandTypeByCallsGenerator(self, read_con, write_con, service_journey: ServiceJourney, ssps: Dict[str, ScheduledStopPoint]):
-        calls: List[Call] = sorted(service_journey.calls.call, key=lambda c: c.order)
-        run_times: List[
-            Tuple[
-                XmlDuration,
-                str,
-            ]
-        ] = []
-        wait_times: List[
-            Tuple[
-                XmlDuration,
-                str,
-            ]
-        ] = []
-
-        for i in range(0, len(calls) - 1):
-            run_time = XmlDuration(value="PT{:d}S".format(TimeDemandTypesProfile.getRunTimeCall(calls[i], calls[i + 1])))
-            wait_time = XmlDuration(value="PT{:d}S".format(TimeDemandTypesProfile.getWaitTimeCall(calls[i])))
-            ssp = ssps[calls[i].fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view.ref]
-            ssp_next = ssps[calls[i + 1].fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view.ref]
-
-            if (
-                calls[i].onward_timing_link_view
-                and calls[i].onward_timing_link_view.timing_link_ref
-                and calls[i].onward_timing_link_view.timing_link_ref in tls
-            ):
-                tl_ref = calls[i].onward_timing_link_view.timing_link_ref
-            else:
-                tl_ref = getId(TimingLink, self.codespace, TimeDemandTypesProfile.getHexHash(hash(ssp.id + "-" + ssp_next.id)))
-
-            tl = load_local(read_con, TimingLink, 1, tl_ref)
-            if len(tl) == 0:
-                tl = load_local(write_con, TimingLink, 1, tl_ref)
-                if len(tl) == 0:
-                    tl = TimingLink(
-                        id=tl_ref,
-                        version=self.version.version,
-                        from_point_ref=getRef(ssp, TimingPointRefStructure),
-                        to_point_ref=getRef(ssp_next, TimingPointRefStructure),
-                    )
-
-                    write_con.insert_one_object(tl)
-
-            run_times.append(
-                (
-                    run_time,
-                    tl_ref,
-                )
-            )
-            wait_times.append(
-                (
-                    wait_time,
-                    ssp.id,
-                )
-            )
-
-        self.getTimeDemandTypeByTimesGenerator(read_con, write_con, service_journey, run_times, wait_times)
-        service_journey.departure_time = calls[0].departure.time
+    def getSeconds(time: XmlTime | None, day_offset: int | None) -> int | None:
+        if time is None:
+            return None
+        return (day_offset or 0) * 86400 + time.hour * 3600 + time.minute * 60 + time.second
 
     @staticmethod
-    def getObjectFromObject(obj, new_clazz, id=None):
-        attributes = set([x.name for x in dataclasses.fields(new_clazz)]).intersection(set([x.name for x in dataclasses.fields(obj.__class__)]))
-        new_obj = new_clazz(**{x: getattr(obj, x) for x in attributes})
-        if id is not None:
-            new_obj.id = id
-        return new_obj
-
-    def getTimeDemandTypeByTimetabledPassingTimes(
-        self,
-        service_journey: ServiceJourney,
-        service_journey_patterns: Dict[str, ServiceJourneyPattern],
-        time_demand_types: Dict[str, TimeDemandType],
-        time_demand_types_hash: Dict[int, str],
-        ssps: Dict[str, ScheduledStopPoint],
-        tls: Dict[str, TimingLink],
-        sls: Dict[str, ServiceLink],
-    ):
-        pass_times: List[TimetabledPassingTime] = service_journey.passing_times.timetabled_passing_time
-        run_times: List[
-            Tuple[
-                XmlDuration,
-                str,
-            ]
-        ] = []
-        wait_times: List[
-            Tuple[
-                XmlDuration,
-                str,
-            ]
-        ] = []
-
-        sjp: ServiceJourneyPattern = service_journey_patterns[service_journey.journey_pattern_ref.ref]
-        piss = {x.id: x for x in sjp.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern}
-
-        for i in range(0, len(pass_times) - 1):
-            run_time = TimeDemandTypesProfile.getRunTimePassingTime(pass_times[i], pass_times[i + 1])
-            wait_time = TimeDemandTypesProfile.getWaitTimePassingTime(pass_times[i])
-            # dit moet uit het journey pattern komen, waarbij ook nog een onward timing link beschikbaar is
-            pis = piss[pass_times[i].point_in_journey_pattern_ref.ref]
-            if isinstance(pis, StopPointInJourneyPattern):
-                pis: StopPointInJourneyPattern = pis
-                ssp = pis.scheduled_stop_point_ref
-                if pis.onward_timing_link_ref is not None:
-                    tl_ref = pis.onward_timing_link_ref.ref
-                elif pis.onward_service_link_ref is not None:
-                    sl: ServiceLink = sls[pis.onward_service_link_ref.ref]
-                    tl_ref = sl.id.replace('ServiceLink', 'TimingLink')
-                    if tl_ref not in tls:
-                        tls[tl_ref] = TimeDemandTypesProfile.getObjectFromObject(sl, TimingLink, tl_ref)
-                    pis.onward_service_link_ref = None
-                else:
-                    # TODO should infer onwards
-                    pass
-            elif isinstance(pis, TimingPointRefStructure):
-                # TODO: wellicht iets doen waarbij ssps alle mogelijke 'points' direct al heeft
-                pass
-
-            run_times.append(
-                (
-                    run_time,
-                    tl_ref,
-                )
-            )
-            wait_times.append(
-                (
-                    wait_time,
-                    ssp.ref,
-                )
-            )
-
-        self.getTimeDemandTypeByTimes(service_journey, time_demand_types, time_demand_types_hash, ssps, tls, run_times, wait_times)
-        service_journey.departure_time = pass_times[0].departure_time
-
-    def getTimeDemandTypeByTimetabledPassingTimesGenerator(self, read_con, write_con, service_journey: ServiceJourney, ssps: Dict[str, ScheduledStopPoint]):
-        pass_times: List[TimetabledPassingTime] = service_journey.passing_times.timetabled_passing_time
-        run_times: List[
-            Tuple[
-                XmlDuration,
-                str,
-            ]
-        ] = []
-        wait_times: List[
-            Tuple[
-                XmlDuration,
-                str,
-            ]
-        ] = []
-
-        sjp = load_local(read_con, ServiceJourneyPattern, 1, service_journey.journey_pattern_ref.ref)
-        if len(sjp) == 0:
-            sjp = load_local(write_con, ServiceJourneyPattern, 1, service_journey.journey_pattern_ref.ref)
-
-        sjp = sjp[0]
-
-        piss = {x.id: x for x in sjp.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern}
-
-        for i in range(0, len(pass_times) - 1):
-            run_time = TimeDemandTypesProfile.getRunTimePassingTime(pass_times[i], pass_times[i + 1])
-            wait_time = TimeDemandTypesProfile.getWaitTimePassingTime(pass_times[i])
-            # dit moet uit het journey pattern komen, waarbij ook nog een onward timing link beschikbaar is
-            pis = piss[pass_times[i].point_in_journey_pattern_ref.ref]
-            if isinstance(pis, StopPointInJourneyPattern):
-                pis: StopPointInJourneyPattern = pis
-                ssp = pis.scheduled_stop_point_ref
-                if pis.onward_timing_link_ref is not None:
-                    tl_ref = pis.onward_timing_link_ref.ref
-                elif pis.onward_service_link_ref is not None:
-                    sl: ServiceLink = sls[pis.onward_service_link_ref.ref]
-                    tl_ref = sl.id.replace('ServiceLink', 'TimingLink')
-                    tl = load_local(read_con, TimingLink, 1, tl_ref)
-                    if len(tl) == 0:
-                        tl = load_local(write_con, TimingLink, 1, tl_ref)
-                        if len(tl) == 0:
-                            tl = TimeDemandTypesProfile.getObjectFromObject(sl, TimingLink, tl_ref)
-                            write_con.insert_one_object(tl)
-
-                    pis.onward_service_link_ref = None
-                else:
-                    # TODO should infer onwards
-                    pass
-            elif isinstance(pis, TimingPointRefStructure):
-                # TODO: wellicht iets doen waarbij ssps alle mogelijke 'points' direct al heeft
-                pass
-
-            run_times.append(
-                (
-                    run_time,
-                    tl_ref,
-                )
-            )
-            wait_times.append(
-                (
-                    wait_time,
-                    ssp.ref,
-                )
-            )
-
-        tdt = self.getTimeDemandTypeByTimesGenerator(read_con, write_con, service_journey, run_times, wait_times)
-        service_journey.departure_time = pass_times[0].departure_time
-        return tdt
-
-    def getTimeDemandTypeGenerator(self, read_con, write_con, service_journey: ServiceJourney, ssps: Dict[str, ScheduledStopPoint]):
-
-        if service_journey.time_demand_type_ref is not None:
-            tdt = load_local(write_con, TimeDemandType, 1, service_journey.time_demand_type_ref.ref)
-            if len(tdt) > 0:
-                return tdt[0]
-
-        if service_journey.calls is not None:
-            # if isinstance(service_journey.calls.call[0], DatedCall):
-            #    self.getTimeDemandTypeByDatedCalls(service_journey, time_demand_types, time_demand_types_hash, ssps, tls)
-            if isinstance(service_journey.calls.call[0], Call):
-                self.getTimeDemandTypeByCallsGenerator(read_con, write_con, service_journey, ssps)
-        elif service_journey.passing_times is not None:
-            self.getTimeDemandTypeByTimetabledPassingTimesGenerator(read_con, write_con, service_journey, ssps)
-
-    def getTimeDemandType(
-        self,
-        service_journey: ServiceJourney,
-        service_journey_patterns: Dict[str, ServiceJourneyPattern],
-        time_demand_types: Dict[str, TimeDemandType],
-        time_demand_types_hash: Dict[int, str],
-        ssps: Dict[str, ScheduledStopPoint],
-        tls: Dict[str, TimingLink],
-        sls: Dict[str, ServiceLink],
-    ):
-
-        if service_journey.time_demand_type_ref is not None and service_journey.time_demand_type_ref.ref in time_demand_types:
-            return time_demand_types[service_journey.time_demand_type_ref.ref]
-
-        if service_journey.calls is not None:
-            # if isinstance(service_journey.calls.call[0], DatedCall):
-            #    self.getTimeDemandTypeByDatedCalls(service_journey, time_demand_types, time_demand_types_hash, ssps, tls)
-            if isinstance(service_journey.calls.call[0], Call):
-                self.getTimeDemandTypeByCalls(service_journey, time_demand_types, time_demand_types_hash, ssps, tls)
-        elif service_journey.passing_times is not None:
-            self.getTimeDemandTypeByTimetabledPassingTimes(service_journey, service_journey_patterns, time_demand_types, time_demand_types_hash, ssps, tls, sls)
-
-    @staticmethod
-    def getPointRefFromPointInJourneyPattern(pis):
+    def getPointRefFromPointInJourneyPattern(pis: Any) -> Any:
         if isinstance(pis, StopPointInJourneyPattern):
             return pis.scheduled_stop_point_ref
         elif isinstance(pis, TimingPointInJourneyPattern):
@@ -588,270 +97,225 @@ class TimeDemandTypesProfile:
 
         return None
 
-    def getServiceJourneyPatternGenerator(
-        self, read_con, write_con, service_journey: ServiceJourney, ssps: Dict[str, ScheduledStopPoint]
-    ) -> ServiceJourneyPattern:
-        if service_journey.journey_pattern_ref is not None:
-            # Have we already processed it?
-            sjp = write_con.get_single(ServiceJourneyPattern, service_journey.journey_pattern_ref.ref, service_journey.journey_pattern_ref.version)
-            if sjp is not None:
-                return sjp
-
-            sjp = read_con.get_single(ServiceJourneyPattern, service_journey.journey_pattern_ref.ref, service_journey.journey_pattern_ref.version)
-            if sjp is not None:
-                # TODO zorg er voor dat hier de onwards in ieder geval zijn gezet
-                piss = sjp.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern
-                for i in range(0, len(piss) - 1):
-                    if isinstance(piss[i], StopPointInJourneyPattern):
-                        pis: StopPointInJourneyPattern = piss[i]
-                        pis_next = piss[i + 1]
-                        if pis.onward_timing_link_ref is None and pis.onward_timing_link_ref is None:
-                            ssp = ssps[TimeDemandTypesProfile.getPointRefFromPointInJourneyPattern(pis).ref]
-                            ssp_next = ssps[TimeDemandTypesProfile.getPointRefFromPointInJourneyPattern(pis_next).ref]
-                            tl_ref = getId(TimingLink, self.codespace, TimeDemandTypesProfile.getHexHash(hash(ssp.id + "-" + ssp_next.id)))
-
-                            tl = read_con.get_single(TimingLink, tl_ref)
-                            if tl is None:
-                                tl = write_con.get_single(TimingLink, tl_ref)
-                                if tl is None:
-                                    tl = TimingLink(
-                                        id=tl_ref,
-                                        version=self.version.version,
-                                        from_point_ref=getRef(ssp, TimingPointRefStructure),
-                                        to_point_ref=getRef(ssp_next, TimingPointRefStructure),
-                                    )
-                                    write_con.insert_one_object(tl)
-
-                            pis.onward_timing_link_ref = getRef(tl, TimingLinkRefStructure)
-
-                write_con.insert_one_object(sjp)
-            return sjp
-
-        if isinstance(service_journey.calls.call[0], Call):
-            calls: List[Call] = service_journey.calls.call
-            ssps_in_seq: List[TimingPointRefStructure] = []
-            onward_tls: List[str] = []
-
-            for i in range(0, len(calls) - 1):
-                ssp = getRef(ssps[calls[i].fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view.ref], TimingPointRefStructure)
-                ssp_next = getRef(
-                    ssps[calls[i + 1].fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view.ref], TimingPointRefStructure
+    @staticmethod
+    def getTimingPointsFromCalls(service_journey: ServiceJourney) -> list[TimingPoint]:
+        points = []
+        for call in sorted(service_journey.calls.call, key=lambda c: c.order):
+            onward = call.onward_timing_link_view.timing_link_ref if call.onward_timing_link_view else None
+            points.append(
+                TimingPoint(
+                    call.fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view.ref,
+                    TimeDemandTypesProfile.getSeconds(call.arrival.time, call.arrival.day_offset) if call.arrival else None,
+                    TimeDemandTypesProfile.getSeconds(call.departure.time, call.departure.day_offset) if call.departure else None,
+                    onward.ref if onward else None,
                 )
-
-                if calls[i].onward_timing_link_view and calls[i].onward_timing_link_view.timing_link_ref:
-                    tl_ref = calls[i].onward_timing_link_view.timing_link_ref
-                else:
-                    tl_ref = getId(TimingLink, self.codespace, TimeDemandTypesProfile.getHexHash(hash(ssp.ref + "-" + ssp_next.ref)))
-
-                # TODO: Something smart that if the table does not exist in read, it will never try again.
-                tl = read_con.get_single(TimingLink, tl_ref)
-                if tl is None:
-                    tl = write_con.get_single(TimingLink, tl_ref)
-                    if tl is None:
-                        tl = TimingLink(
-                            id=tl_ref,
-                            version=self.version.version,
-                            from_point_ref=getRef(ssp, TimingPointRefStructure),
-                            to_point_ref=getRef(ssp_next, TimingPointRefStructure),
-                        )
-
-                        write_con.insert_one_object(tl)
-
-                ssps_in_seq.append(ssp)
-                onward_tls.append(tl_ref)
-
-            ssps_in_seq.append(
-                getRef(ssps[calls[-1].fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view.ref], TimingPointRefStructure)
             )
+        return points
 
-            sjp_hash = hash('-'.join(x.ref for x in ssps_in_seq))
-            sjp_hash_hex = TimeDemandTypesProfile.getHexHash(sjp_hash)
-            id = getId(ServiceJourneyPattern, self.codespace, sjp_hash_hex)
-            if service_journey.journey_pattern_ref is not None:
-                id = service_journey.journey_pattern_ref.ref
-
-            sjp = write_con.get_single(ServiceJourneyPattern, id, service_journey.version)
-            if sjp is not None:
-                return sjp
-
-            suffix = id.split(':')[-1]
-
-            piss = [
-                (i, ssps_in_seq[i], getFakeRef(onward_tls[i], TimingLinkRefStructure, version=self.version.version)) for i in range(0, len(ssps_in_seq) - 1)
-            ]
-            piss.append((len(ssps_in_seq) - 1, ssps_in_seq[-1], None))
-
-            sjp = ServiceJourneyPattern(
-                id=id,
-                version=self.version.version,
-                points_in_sequence=PointsInJourneyPatternRelStructure(
-                    point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern=[
-                        StopPointInJourneyPattern(
-                            id=getId(StopPointInJourneyPattern, self.codespace, "{:s}-{:d}".format(suffix, x[0] + 1)),
-                            version=self.version.version,
-                            order=x[0] + 1,
-                            scheduled_stop_point_ref=getRef(ssps[x[1].ref]),
-                            onward_timing_link_ref=x[2],
-                        )
-                        for x in piss
-                    ]
-                ),
-            )
-
-            service_journey.journey_pattern_ref = getRef(sjp)
-
-            write_con.insert_one_object(sjp)
-            return sjp
-
-    def getServiceJourneyPattern(
-        self,
-        service_journey: ServiceJourney,
-        service_journey_patterns: Dict[str, ServiceJourneyPattern],
-        service_journey_patterns_hash: Dict[int, str],
-        ssps: Dict[str, ScheduledStopPoint],
-        tls: Dict[str, TimingLink],
-    ):
-        if service_journey.journey_pattern_ref is not None and service_journey.journey_pattern_ref.ref in service_journey_patterns:
-            # TODO zorg er voor dat hier de onwards in ieder geval zijn gezet
-            sjp = service_journey_patterns[service_journey.journey_pattern_ref.ref]
-            piss = sjp.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern
-            for i in range(0, len(piss) - 1):
-                if isinstance(piss[i], StopPointInJourneyPattern):
-                    pis: StopPointInJourneyPattern = piss[i]
-                    pis_next = piss[i + 1]
-                    if pis.onward_timing_link_ref is None and pis.onward_timing_link_ref is None:
-                        ssp = ssps[TimeDemandTypesProfile.getPointRefFromPointInJourneyPattern(pis).ref]
-                        ssp_next = ssps[TimeDemandTypesProfile.getPointRefFromPointInJourneyPattern(pis_next).ref]
-                        tl_ref = getId(TimingLink, self.codespace, TimeDemandTypesProfile.getHexHash(hash(ssp.id + "-" + ssp_next.id)))
-                        if tl_ref not in tls:
-                            tls[tl_ref] = TimingLink(
-                                id=tl_ref,
-                                version=self.version.version,
-                                from_point_ref=getRef(ssp, TimingPointRefStructure),
-                                to_point_ref=getRef(ssp_next, TimingPointRefStructure),
-                            )
-
-                        pis.onward_timing_link_ref = getRef(tls[tl_ref], TimingLinkRefStructure)
-
-            return sjp
-
-        if isinstance(service_journey.calls.call[0], Call):
-            calls: List[Call] = service_journey.calls.call
-            ssps_in_seq: List[TimingPointRefStructure] = []
-            onward_tls: List[str] = []
-
-            for i in range(0, len(calls) - 1):
-                ssp = getRef(ssps[calls[i].fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view.ref], TimingPointRefStructure)
-                ssp_next = getRef(
-                    ssps[calls[i + 1].fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view.ref], TimingPointRefStructure
+    @staticmethod
+    def getTimingPointsFromTimetabledPassingTimes(service_journey: ServiceJourney, service_journey_pattern: ServiceJourneyPattern) -> list[TimingPoint]:
+        piss = getIndex(service_journey_pattern.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern)
+        points = []
+        for passing_time in service_journey.passing_times.timetabled_passing_time:
+            pis = piss[passing_time.point_in_journey_pattern_ref.ref]
+            points.append(
+                TimingPoint(
+                    TimeDemandTypesProfile.getPointRefFromPointInJourneyPattern(pis).ref,
+                    TimeDemandTypesProfile.getSeconds(passing_time.arrival_time, passing_time.arrival_day_offset),
+                    TimeDemandTypesProfile.getSeconds(passing_time.departure_time, passing_time.departure_day_offset),
+                    pis.onward_timing_link_ref.ref if pis.onward_timing_link_ref else None,
                 )
-
-                if (
-                    calls[i].onward_timing_link_view
-                    and calls[i].onward_timing_link_view.timing_link_ref
-                    and calls[i].onward_timing_link_view.timing_link_ref in tls
-                ):
-                    tl_ref = calls[i].onward_timing_link_view.timing_link_ref
-                else:
-                    tl_ref = getId(TimingLink, self.codespace, TimeDemandTypesProfile.getHexHash(hash(ssp.ref + "-" + ssp_next.ref)))
-
-                if tl_ref not in tls:
-                    tls[tl_ref] = TimingLink(
-                        id=getId(TimingLink, self.codespace, TimeDemandTypesProfile.getHexHash(hash(ssp.ref + "-" + ssp_next.ref))),
-                        version=self.version.version,
-                        from_point_ref=ssp,
-                        to_point_ref=ssp_next,
+            )
+        return points
+
+    def getTimingLinks(self, points: list[TimingPoint]) -> tuple[list[str], list[TimingLink]]:
+        """The onward TimingLink of every point but the last, inferred from the pair of points if it is not given, and those that are new."""
+        timing_link_refs: list[str] = []
+        timing_links: list[TimingLink] = []
+        for point, next_point in zip(points, points[1:]):
+            tl_ref = point.onward_timing_link_ref
+            if tl_ref is None:
+                tl_ref = getId(self.codespace, TimingLink, self.getDigest((point.scheduled_stop_point_ref, next_point.scheduled_stop_point_ref)))
+                if tl_ref not in self.timing_links:
+                    self.timing_links.add(tl_ref)
+                    timing_links.append(
+                        TimingLink(
+                            id=tl_ref,
+                            version=self.version,
+                            from_point_ref=TimingPointRefStructure(
+                                ref=point.scheduled_stop_point_ref, name_of_ref_class="ScheduledStopPoint", version=self.version
+                            ),
+                            to_point_ref=TimingPointRefStructure(
+                                ref=next_point.scheduled_stop_point_ref, name_of_ref_class="ScheduledStopPoint", version=self.version
+                            ),
+                        )
                     )
-                ssps_in_seq.append(ssp)
-                onward_tls.append(tl_ref)
-
-            ssps_in_seq.append(
-                getRef(ssps[calls[-1].fare_scheduled_stop_point_ref_or_scheduled_stop_point_ref_or_scheduled_stop_point_view.ref], TimingPointRefStructure)
+            timing_link_refs.append(tl_ref)
+
+        return timing_link_refs, timing_links
+
+    def getOnwardTimingLinks(self, service_journey_pattern: ServiceJourneyPattern) -> list[TimingLink]:
+        """Completes the points of service_journey_pattern without an onward TimingLink, returns the TimingLinks that are new."""
+        piss = service_journey_pattern.points_in_sequence.point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern
+        points = [
+            TimingPoint(
+                TimeDemandTypesProfile.getPointRefFromPointInJourneyPattern(pis).ref,
+                None,
+                None,
+                pis.onward_timing_link_ref.ref if pis.onward_timing_link_ref else None,
             )
-
-            sjp_hash = hash('-'.join(x.ref for x in ssps_in_seq))
-            sjp_hash_hex = TimeDemandTypesProfile.getHexHash(sjp_hash)
-
-            if (
-                sjp_hash not in service_journey_patterns_hash
-                or service_journey.journey_pattern_ref is None
-                or service_journey_patterns[service_journey_patterns_hash[sjp_hash]].id != service_journey.journey_pattern_ref.ref
-            ):
-                piss = [
-                    (i, ssps_in_seq[i], getFakeRef(onward_tls[i], TimingLinkRefStructure, version=self.version.version)) for i in range(0, len(ssps_in_seq) - 1)
+            for pis in piss
+        ]
+        timing_link_refs, timing_links = self.getTimingLinks(points)
+        for pis, tl_ref in zip(piss, timing_link_refs):
+            if pis.onward_timing_link_ref is None:
+                pis.onward_timing_link_ref = getFakeRef(tl_ref, TimingLinkRefStructure, self.version)
+
+        return timing_links
+
+    def getServiceJourneyPattern(self, service_journey: ServiceJourney, stop_refs: list[str], timing_link_refs: list[str]) -> ServiceJourneyPattern | None:
+        """Refers service_journey to the ServiceJourneyPattern of its sequence of stops, returns it if it is new."""
+        line = service_journey.flexible_line_ref_or_line_ref_or_line_view_or_flexible_line_view
+
+        # A ServiceJourneyPattern can refer to a single Route, and therefore Line, see service_journey_pattern_from_calls()
+        digest = self.getDigest((getattr(line, 'ref', None) or '',), stop_refs, timing_link_refs)
+        sjp_id = getId(self.codespace, ServiceJourneyPattern, digest)
+        service_journey.journey_pattern_ref = getFakeRef(sjp_id, ServiceJourneyPatternRef, self.version)
+
+        if sjp_id in self.service_journey_patterns:
+            return None
+        self.service_journey_patterns.add(sjp_id)
+
+        return ServiceJourneyPattern(
+            id=sjp_id,
+            version=self.version,
+            route_ref_or_route_view=RouteView(flexible_line_ref_or_line_ref_or_line_view=line) if line is not None else None,
+            points_in_sequence=PointsInJourneyPatternRelStructure(
+                point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern=[
+                    StopPointInJourneyPattern(
+                        id=getId(self.codespace, StopPointInJourneyPattern, f"{digest}-{order}"),
+                        version=self.version,
+                        order=order,
+                        scheduled_stop_point_ref=getFakeRef(stop_ref, ScheduledStopPointRef, self.version),
+                        onward_timing_link_ref=getFakeRef(timing_link_refs[order - 1], TimingLinkRefStructure, self.version)
+                        if order <= len(timing_link_refs)
+                        else None,
+                    )
+                    for order, stop_ref in enumerate(stop_refs, start=1)
                 ]
-                piss.append((len(ssps_in_seq) - 1, ssps_in_seq[-1], None))
-
-                id = getId(ServiceJourneyPattern, self.codespace, sjp_hash_hex)
-                if service_journey.journey_pattern_ref is not None:
-                    id = service_journey.journey_pattern_ref.ref
-                suffix = id.split(':')[-1]
-
-                sjp = ServiceJourneyPattern(
-                    id=id,
-                    derived_from_object_ref=service_journey.id,
-                    version=self.version.version,
-                    points_in_sequence=PointsInJourneyPatternRelStructure(
-                        point_in_journey_pattern_or_stop_point_in_journey_pattern_or_timing_point_in_journey_pattern=[
-                            StopPointInJourneyPattern(
-                                id=getId(StopPointInJourneyPattern, self.codespace, "{:s}-{:d}".format(suffix, x[0] + 1)),
-                                version=self.version.version,
-                                order=x[0] + 1,
-                                scheduled_stop_point_ref=getRef(ssps[x[1].ref]),
-                                onward_timing_link_ref=x[2],
-                            )
-                            for x in piss
-                        ]
-                    ),
-                )
-
-                service_journey_patterns[sjp.id] = sjp
-                service_journey_patterns_hash[sjp_hash] = sjp.id
-            else:
-                sjp = service_journey_patterns[service_journey_patterns_hash[sjp_hash]]
-
-            service_journey.journey_pattern_ref = getRef(sjp)
+            ),
+        )
 
-            return sjp
+    def getTimeDemandType(self, service_journey: ServiceJourney, points: list[TimingPoint], timing_link_refs: list[str]) -> TimeDemandType | None:
+        """Refers service_journey to the TimeDemandType of its run and wait times, returns it if it is new."""
+        stop_refs = [point.scheduled_stop_point_ref for point in points]
+        run_times = [next_point.arriving - point.departing for point, next_point in zip(points, points[1:])]
+        wait_times = [point.departure - point.arrival if point.arrival is not None and point.departure is not None else 0 for point in points[:-1]]
+
+        digest = self.getDigest(stop_refs, timing_link_refs, run_times, wait_times)
+        tdt_id = getId(self.codespace, TimeDemandType, digest)
+        service_journey.time_demand_type_ref = getFakeRef(tdt_id, TimeDemandTypeRef, self.version)
+
+        if tdt_id in self.time_demand_types:
+            return None
+        self.time_demand_types.add(tdt_id)
+
+        journey_run_times = [
+            JourneyRunTime(
+                id=getId(self.codespace, JourneyRunTime, f"{digest}-{order}"),
+                version=self.version,
+                timing_link_ref=getFakeRef(tl_ref, TimingLinkRefStructure, self.version),
+                run_time=XmlDuration(value=f"PT{run_time}S"),
+            )
+            for order, (tl_ref, run_time) in enumerate(zip(timing_link_refs, run_times), start=1)
+        ]
+        journey_wait_times = [
+            JourneyWaitTime(
+                id=getId(self.codespace, JourneyWaitTime, f"{digest}-{order}"),
+                version=self.version,
+                timing_point_ref_or_scheduled_stop_point_ref_or_parking_point_ref_or_relief_point_ref=getFakeRef(stop_ref, ScheduledStopPointRef, self.version),
+                wait_time=XmlDuration(value=f"PT{wait_time}S"),
+            )
+            for order, (stop_ref, wait_time) in enumerate(zip(stop_refs, wait_times), start=len(run_times) + 1)
+            if wait_time > 0
+        ]
 
-    def __init__(self, codespace: Codespace, version: Version):
-        self.codespace = codespace
-        self.version = version
+        return TimeDemandType(
+            id=tdt_id,
+            version=self.version,
+            run_times=JourneyRunTimesRelStructure(journey_run_time=journey_run_times),
+            wait_times=JourneyWaitTimesRelStructure(journey_wait_time=journey_wait_times) if journey_wait_times else None,
+        )
 
+    def getTimingProfile(self, service_journey: ServiceJourney, points: list[TimingPoint], with_pattern: bool) -> list[EntityStructure]:
+        """
+        Replaces the passing times of service_journey by a reference to its TimeDemandType, and if with_pattern, to its
+        ServiceJourneyPattern. Returns the objects that are new.
+        """
+        self.service_journeys += 1
+        timing_link_refs, new_objects = self.getTimingLinks(points)
+        objects: list[EntityStructure] = list(new_objects)
+
+        if with_pattern:
+            sjp = self.getServiceJourneyPattern(service_journey, [point.scheduled_stop_point_ref for point in points], timing_link_refs)
+            if sjp is not None:
+                objects.append(sjp)
 
-if __name__ == '__main__':
-    ns_map = {'': 'http://www.netex.org.uk/netex', 'gml': 'http://www.opengis.net/gml/3.2'}
+        tdt = self.getTimeDemandType(service_journey, points, timing_link_refs)
+        if tdt is not None:
+            objects.append(tdt)
 
-    context = XmlContext()
-    config = ParserConfig(fail_on_unknown_properties=False)
-    parser = XmlParser(context=context, config=config, handler=LxmlEventHandler)
+        day_offset, seconds = divmod(points[0].departing, 86400)
+        service_journey.departure_time = XmlTime(hour=seconds // 3600, minute=seconds // 60 % 60, second=seconds % 60)
+        # Also when the journey already had one, the first departure is recomputed
+        service_journey.departure_day_offset = day_offset or None
 
-    publication_delivery: PublicationDelivery = parser.from_path(Path("netex-output-epip/Flix_Line_025.xml"), PublicationDelivery)
-    general_frame: GeneralFrame = publication_delivery.data_objects.choice[0]
-    codespace: Codespace = general_frame.codespaces.codespace_ref_or_codespace[0]
-    version: Version = general_frame.versions.version_ref_or_version[0]
+        return objects
 
-    ssps: Dict[str, ScheduledStopPoint] = {x.id: x for x in general_frame.members.choice if isinstance(x, ScheduledStopPoint)}
-    sjs: List[ServiceJourney] = [x for x in general_frame.members.choice if isinstance(x, ServiceJourney)]
-    sjps = {}
-    sjps_hash = {}
-    tls = {}
-    sls = {}
-    tdts = {}
-    tdts_hash = {}
+    def logDeduplication(self) -> None:
+        log_all(
+            logging.INFO,
+            f"[timedemandtypesprofile] {self.service_journeys} ServiceJourneys share {len(self.time_demand_types)} TimeDemandTypes "
+            f"(dedup ratio {self.service_journeys / max(len(self.time_demand_types), 1):.1f}) "
+            f"and {len(self.service_journey_patterns)} new ServiceJourneyPatterns",
+        )
 
-    tdtp = TimeDemandTypesProfile(codespace=codespace, version=version)
 
-    for sj in sjs:
-        tdtp.getServiceJourneyPattern(sj, sjps, sjps_hash, ssps, tls)
-        tdtp.getTimeDemandType(sj, sjps, tdts, tdts_hash, ssps, tls, sls)
+def time_demand_types_from_service_journeys(
+    db_read: MdbxStorage, txn: TXN, generator_defaults: dict[str, Any]
+) -> Generator[ServiceJourney | ServiceJourneyPattern | TimingLink | TimeDemandType, None, None]:
+    """
+    Every ServiceJourney, those with calls or passing times refer to a deduplicated TimeDemandType instead. A ServiceJourney
+    with calls refers to the deduplicated ServiceJourneyPattern of its calls, one with passing times keeps its own, which
+    is completed with onward TimingLinks.
+    """
+    tdtp = TimeDemandTypesProfile(generator_defaults['codespace'], generator_defaults['version'])
+    completed: dict[str, ServiceJourneyPattern] = {}
+
+    sj: ServiceJourney
+    for sj in db_read.iter_only_objects(txn, ServiceJourney):
+        if sj.time_demand_type_ref is not None:
+            pass
+
+        elif sj.calls is not None and len(sj.calls.call) > 1:
+            yield from tdtp.getTimingProfile(sj, TimeDemandTypesProfile.getTimingPointsFromCalls(sj), True)
+            sj.calls = None
+
+        elif sj.passing_times is not None and sj.journey_pattern_ref is not None:
+            sjp = completed.get(sj.journey_pattern_ref.ref, None)
+            if sjp is None:
+                sjp = db_read.load_object_by_reference(txn, sj.journey_pattern_ref)
+                if sjp is not None:
+                    yield from tdtp.getOnwardTimingLinks(sjp)
+                    yield sjp
+                    completed[sjp.id] = sjp
 
-    general_frame.members.choice += list(sjps.values()) + list(tls.values()) + list(tdts.values())
+            if sjp is not None:
+                yield from tdtp.getTimingProfile(sj, TimeDemandTypesProfile.getTimingPointsFromTimetabledPassingTimes(sj, sjp), False)
+                sj.passing_times = None
+            else:
+                log_all(logging.WARNING, f"[timedemandtypesprofile] {sj.id} refers to the unknown {sj.journey_pattern_ref.ref}")
 
-    serializer_config = SerializerConfig(ignore_default_attributes=True)
-    serializer_config.pretty_print = True
-    serializer_config.ignore_default_attributes = True
-    serializer = XmlSerializer(config=serializer_config)
+        yield sj
 
-    with open('netex-output/wpd-tdts.xml', 'w') as out:
-        serializer.write(out, publication_delivery, ns_map)
+    tdtp.logDeduplication()
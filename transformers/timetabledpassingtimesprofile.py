@@ -3,7 +3,7 @@ from typing import cast
 from domain.netex.indexes.byid import getIndex
 from domain.netex.services.ids import getId
 from domain.netex.services.refs import getRef
-from transformers.callsprofile import CallsProfile
+from transformers.callsprofile import CallsProfile, TimingProfiles
 from domain.netex.model import (
     ServiceJourney,
     ServiceJourneyPattern,
@@ -287,6 +287,7 @@ class TimetablePassingTimesProfile:
         sjps = {TimetablePassingTimesProfile.sjp_hash(sjp.points_in_sequence): sjp for sjp in self.service_journey_patterns}
         existing_sjps = getIndex(self.service_journey_patterns)
         existing_tdts = getIndex(self.time_demand_types)
+        timing_profiles: TimingProfiles = {}
 
         sj: ServiceJourney
         for sj in self.service_journeys:
@@ -307,7 +308,7 @@ class TimetablePassingTimesProfile:
                 # For VDV462 we need to differentiate
                 service_journey_pattern = existing_sjps[sj.journey_pattern_ref.ref]
                 time_demand_type: TimeDemandType = existing_tdts[sj.time_demand_type_ref.ref]
-                CallsProfile.getPassingTimesFromTimeDemandType(sj, service_journey_pattern, time_demand_type)
+                CallsProfile.getPassingTimesFromTimeDemandType(sj, service_journey_pattern, time_demand_type, timing_profiles)
 
             # if there are calls -> create service journey patterns
             elif sj.calls:
@@ -0,0 +1,85 @@
+import re
+from collections.abc import Callable
+from typing import Any
+
+_TOKEN_RE = re.compile(r"([^.[]+)|\[(\d*|\*)\]")
+
+
+def safe_attrgetter(path: str, default: Any = None) -> Callable[[object], Any]:
+    """
+    Supports:
+
+        id
+        name.value
+        quays[0].id
+        quays[].id
+        quays[*].id
+        stop_places[].quays[].id
+
+    Missing attributes return `default`.
+    """
+
+    operations: list[str | int | None] = []
+
+    for match in _TOKEN_RE.finditer(path):
+        attr, index = match.groups()
+
+        if attr is not None:
+            operations.append(attr)
+        elif index in ("", "*"):
+            operations.append(None)          # wildcard
+        else:
+            operations.append(int(index))
+
+    def apply(obj: Any, pos: int) -> Any:
+        if obj is default:
+            return default
+
+        if pos == len(operations):
+            return [obj]
+
+        op = operations[pos]
+
+        try:
+            if op is None:
+                # Wildcard
+                if obj is None:
+                    return default
+
+                result = []
+
+                for item in obj:
+                    value = apply(item, pos + 1)
+
+                    if value is default:
+                        continue
+
+                    if isinstance(value, list):
+                        result.extend(value)
+                    else:
+                        result.append(value)
+
+                return result if result else default
+
+            elif isinstance(op, int):
+                return apply(obj[op], pos + 1)
+
+            else:
+                if isinstance(obj, dict):
+                    return apply(obj.get(op, default), pos + 1)
+
+                return apply(getattr(obj, op), pos + 1)
+
+        except (AttributeError, IndexError, KeyError, TypeError):
+            return default
+
+    return lambda obj: apply(obj, 0)
+
+
+def attribute_path_field(path: str) -> str:
+    """The field of the object itself that path starts with, for example stop_places for stop_places[].quays[].id"""
+    match = _TOKEN_RE.match(path)
+    if match is None or match.group(1) is None:
+        raise ValueError(f"{path} does not start with a field")
+
+    return match.group(1)